@@ -0,0 +1,55 @@
+# Headless benchmark of the driver loop - runs experiment_sequence against the interface stand-in
+# Run from the repository root, as control.py: python Driver/Benchmarks/driver_loop_benchmark.py
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+sys.path.insert(1, os.path.abspath(os.path.join(".", "Driver", "CartPoleSimulation")))
+
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "1"
+
+os.chdir("Driver")
+
+from DriverFunctions.PhysicalCartPoleDriver import PhysicalCartPoleDriver
+from DriverFunctions.interface_stand_in import InterfaceStandIn
+from DriverFunctions.benchmark_harness import (DriverLoopBenchmark, save_benchmark_results, load_benchmark_results,
+                                               compare_with_baseline, format_benchmark_results)
+from CartPoleSimulation.CartPole import CartPole
+from globals import CONTROL_PERIOD_MS, CONTROLLER_NAME
+
+NUMBER_OF_CYCLES = 5000
+SOURCE = 'simulated'  # 'simulated' or path to a recording (relative to Driver folder) which frames are replayed
+PACED = False  # True - frames come at CONTROL_PERIOD_MS as from the chip, False - as fast as possible
+CONTROL_ENABLED = True  # Run the PC controller in every cycle
+RECORDING = False  # Record to file during the benchmark to include logging cost
+
+BASELINE_PATH = f'./Benchmarks/Baselines/driver_loop_{CONTROLLER_NAME}_{"paced" if PACED else "unpaced"}.json'
+SAVE_AS_BASELINE = False  # Overwrite the baseline with the results of this run
+
+if __name__ == '__main__':
+    CartPoleInstance = CartPole()
+    CartPoleInstance.dt_controller = float(CONTROL_PERIOD_MS) / 1000.0
+    driver = PhysicalCartPoleDriver(CartPoleInstance, InterfaceInstance=InterfaceStandIn(source=SOURCE, paced=PACED, seed=0))
+    driver.controlEnabled = CONTROL_ENABLED
+    if RECORDING:
+        driver.mlm.recording_on_off()
+
+    benchmark = DriverLoopBenchmark(driver, NUMBER_OF_CYCLES)
+    results = benchmark.run()
+
+    print()
+    print(format_benchmark_results(results))
+
+    if os.path.exists(BASELINE_PATH) and not SAVE_AS_BASELINE:
+        regressions = compare_with_baseline(results, load_benchmark_results(BASELINE_PATH))
+        if regressions:
+            print(f'\nRegressions with respect to {BASELINE_PATH}:')
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        else:
+            print(f'\nNo regressions with respect to {BASELINE_PATH}')
+    else:
+        save_benchmark_results(results, BASELINE_PATH)
+        print(f'\nSaved baseline to {BASELINE_PATH}')
@@ -0,0 +1,147 @@
+# Compares writing recordings as csv text rows with the binary columnar recorder
+# Reports time per row spent in the control thread and bytes per row, and checks the columnar recording reads back exactly
+# Also compares getting the row values with a lambda per column against the compiled row extractor of RecordingSchema
+# Run from the repository root, as control.py: python Driver/Benchmarks/recording_benchmark.py
+import sys
+import os
+import csv
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+
+os.chdir("Driver")
+
+import numpy as np
+
+from DriverFunctions.columnar_recording import ColumnarRecorder
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.recording_schema import Column, DerivedColumn, RecordingSchema, STRING_DTYPE, recording_lambdas
+
+NUMBER_OF_ROWS = 50000
+NUMBER_OF_FLOAT32_COLUMNS = 8  # State entries
+NUMBER_OF_FLOAT64_COLUMNS = 22  # Timing, raw sensor values, commands...
+
+PROTOCOLS = ['Experiment Protocol: swing-up, phase: idle', 'Experiment Protocol: swing-up, phase: swinging']
+
+
+class BenchmarkDriver:
+    """Stands in for PhysicalCartPoleDriver, its values change with every row."""
+
+    def __init__(self, rng):
+        self.float32_values = rng.normal(size=(NUMBER_OF_ROWS, NUMBER_OF_FLOAT32_COLUMNS)).astype(np.float32)
+        self.float64_values = rng.normal(size=(NUMBER_OF_ROWS, NUMBER_OF_FLOAT64_COLUMNS))
+        self.th = types.SimpleNamespace()
+        self.set_row(0)
+
+    def set_row(self, row):
+        self.row = row
+        self.s = self.float32_values[row]
+        self.th.values = self.float64_values[row]
+        self.measurement = PROTOCOLS[(row // 1000) % 2]
+
+
+def create_columns():
+    """Declared as MainLoggingManager.RECORDED_COLUMNS, with derived columns."""
+    columns = {'time': Column('driver.row * 0.02')}
+    for i in range(NUMBER_OF_FLOAT32_COLUMNS):
+        columns[f'state_{i}'] = Column(f'driver.s[{i}]', 'f4')
+    for i in range(NUMBER_OF_FLOAT64_COLUMNS):
+        columns[f'value_{i}'] = Column(f'driver.th.values[{i}]')
+    columns['invalid_steps'] = Column('driver.row % 3', 'i8')
+    columns['measurement'] = Column('driver.measurement', STRING_DTYPE)
+    columns['state_0_squared'] = DerivedColumn('state_0 ** 2', 'f4')
+    columns['value_0_squared'] = DerivedColumn('value_0 ** 2')
+    return columns
+
+
+def benchmark_csv(path, columns, driver):
+    """Lambda per column, as the csv recording of DataManager."""
+    lambdas = recording_lambdas(columns, {}, driver)
+    time_in_loop = 0.0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(lambdas.keys()))
+        for row in range(NUMBER_OF_ROWS):
+            driver.set_row(row)
+            time_start = time.perf_counter()
+            writer.writerow([lambdas[key]() for key in lambdas])
+            time_in_loop += time.perf_counter() - time_start
+    return time_in_loop
+
+
+def benchmark_columnar(path, columns, driver):
+    """Compiled row extractor and preallocated row buffer, as the columnar recording."""
+    recorder = ColumnarRecorder()
+    recorder.start_recording(path, RecordingSchema(columns, {}), 'benchmark', [])
+    extract_row = recorder.schema.extract_row
+    time_in_loop = 0.0
+    for row in range(NUMBER_OF_ROWS):
+        driver.set_row(row)
+        time_start = time.perf_counter()
+        recorder.record_row(extract_row(driver))
+        time_in_loop += time.perf_counter() - time_start
+    recorder.finish_experiment(wait_till_complete=True)
+    return time_in_loop, recorder.path
+
+
+def benchmark_extraction(columns, driver):
+    """Time per row of getting the values only: lambdas (with the dict lookups of FunctionalDict) vs compiled extractor."""
+    lambdas = recording_lambdas(columns, {}, driver)
+    extract_row = RecordingSchema(columns, {}).extract_row
+    time_start = time.perf_counter()
+    for _ in range(NUMBER_OF_ROWS):
+        [lambdas[key]() for key in lambdas]
+    time_lambdas = time.perf_counter() - time_start
+    time_start = time.perf_counter()
+    for _ in range(NUMBER_OF_ROWS):
+        extract_row(driver)
+    time_extractor = time.perf_counter() - time_start
+    return time_lambdas, time_extractor
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        columns = create_columns()
+        driver = BenchmarkDriver(np.random.default_rng(0))
+
+        csv_path = os.path.join(directory, 'benchmark.csv')
+        time_csv = benchmark_csv(csv_path, columns, driver)
+        time_columnar, columnar_path = benchmark_columnar(os.path.join(directory, 'benchmark_columnar.csv'), columns, driver)
+        time_lambdas, time_extractor = benchmark_extraction(columns, driver)
+
+        print(f'{NUMBER_OF_ROWS} rows, {len(columns)} columns')
+        print(f"{'format':<12}{'us/row':>10}{'bytes/row':>12}")
+        print(f"{'csv':<12}{time_csv / NUMBER_OF_ROWS * 1e6:>10.2f}{os.path.getsize(csv_path) / NUMBER_OF_ROWS:>12.1f}")
+        print(f"{'columnar':<12}{time_columnar / NUMBER_OF_ROWS * 1e6:>10.2f}{os.path.getsize(columnar_path) / NUMBER_OF_ROWS:>12.1f}")
+        print(f'Getting the values only: lambdas {time_lambdas / NUMBER_OF_ROWS * 1e6:.2f} us/row, '
+              f'compiled extractor {time_extractor / NUMBER_OF_ROWS * 1e6:.2f} us/row')
+
+        time_start = time.perf_counter()
+        recording_csv = load_recording(csv_path)
+        time_load_csv = time.perf_counter() - time_start
+        time_start = time.perf_counter()
+        recording_columnar = load_recording(columnar_path)
+        time_load_columnar = time.perf_counter() - time_start
+        print(f'Loading: csv {time_load_csv * 1000:.1f} ms, columnar {time_load_columnar * 1000:.1f} ms')
+
+        lambdas = recording_lambdas(columns, {}, driver)
+        expected = {key: [] for key in lambdas}
+        for row in range(NUMBER_OF_ROWS):
+            driver.set_row(row)
+            for key in lambdas:
+                expected[key].append(lambdas[key]())
+
+        def read_back_equal(key):
+            if key == 'measurement':
+                return list(recording_columnar[key]) == expected[key]
+            recorded = recording_columnar[key].to_numpy()
+            expected_values = np.asarray(expected[key], dtype=recorded.dtype)
+            if isinstance(columns[key], DerivedColumn):
+                # Vectorized square may differ from the scalar ** in the last bit
+                return np.allclose(recorded, expected_values, rtol=4 * np.finfo(recorded.dtype).eps, atol=0)
+            return np.array_equal(recorded, expected_values)
+
+        identical = list(recording_columnar.columns) == list(columns) and all(read_back_equal(key) for key in columns)
+        print(f'Columnar recording read back identical (derived columns to the last bit): {identical}')
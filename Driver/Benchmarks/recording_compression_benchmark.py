@@ -0,0 +1,113 @@
+# Compares csv recordings with columnar recordings, uncompressed and compressed (zlib, and zstd/lz4 if installed)
+# Reports file size and time to load everything, a 60 s time window and three columns of a one hour recording
+# Run from the repository root, as control.py: python Driver/Benchmarks/recording_compression_benchmark.py
+import sys
+import os
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+
+os.chdir("Driver")
+
+import numpy as np
+
+from DriverFunctions.columnar_recording import ColumnarRecorder, compression_functions
+from DriverFunctions.recording_loader import load_recording, convert_recording
+from DriverFunctions.recording_schema import Column, RecordingSchema, STRING_DTYPE
+
+DURATION_S = 3600.0
+CONTROL_PERIOD_S = 0.02
+WINDOW_S = (1800.0, 1860.0)
+SELECTED_COLUMNS = ['time', 'angle', 'Q']
+REPETITIONS = 3
+
+
+def create_recording_values(rng):
+    """Signals shaped like a recording of swing-up experiments: quantized sensors, smooth state, us resolved latencies."""
+    n = int(DURATION_S / CONTROL_PERIOD_S)
+    t = np.arange(n) * CONTROL_PERIOD_S + rng.normal(0.0, 2e-5, n)
+    angle = np.pi * np.cos(2 * np.pi * t / 16.0) * np.exp(-(t % 16.0) / 4.0)
+    angle_raw = np.round(angle / (2 * np.pi) * 4096 + 2048 + rng.normal(0.0, 1.0, n))
+    position = 0.1 * np.sin(2 * np.pi * t / 7.0)
+    position_raw = np.round(position / 0.00005)
+    Q = np.clip(np.round(np.sin(2 * np.pi * t / 3.0) * 0.8 + rng.normal(0.0, 0.05, n), 4), -1, 1)
+    latency = np.round(np.abs(rng.gamma(2.0, 0.0004, n)), 6)
+
+    float32_columns = {
+        'angle': angle, 'angleD': np.gradient(angle, CONTROL_PERIOD_S), 'angle_cos': np.cos(angle),
+        'angle_sin': np.sin(angle), 'position': position, 'positionD': np.gradient(position, CONTROL_PERIOD_S),
+    }
+    float64_columns = {
+        'time': t, 'deltaTimeMs': np.round(np.gradient(t) * 1000, 3), 'angle_raw': angle_raw, 'position_raw': position_raw,
+        'target_position': np.round(position * 10) / 10, 'Q': Q, 'actualMotorSave': np.round(Q * 8000),
+        'latency': latency, 'pythonLatency': np.round(latency * 0.7, 6), 'controller_steptime': np.round(latency * 0.3, 6),
+        'sensorToActuationLatency': np.round(latency * 1.5, 6),
+    }
+    columns = {name: Column(f'driver.float32_values[{i}]', 'f4') for i, name in enumerate(float32_columns)}
+    columns.update({name: Column(f'driver.float64_values[{i}]') for i, name in enumerate(float64_columns)})
+    columns['experimentPhase'] = Column('driver.phase', STRING_DTYPE)
+    values = types.SimpleNamespace(
+        float32=np.stack(list(float32_columns.values()), axis=1).astype(np.float32),
+        float64=np.stack(list(float64_columns.values()), axis=1),
+        phase=np.where((t % 16.0) < 8.0, 'reset', 'swingup'),
+    )
+    return columns, values
+
+
+def write_columnar(path, columns, values, compression):
+    recorder = ColumnarRecorder(compression=compression)
+    recorder.start_recording(path, RecordingSchema(columns, {}), 'benchmark', [])
+    driver = types.SimpleNamespace()
+    for row in range(len(values.float64)):
+        driver.float32_values = values.float32[row]
+        driver.float64_values = values.float64[row]
+        driver.phase = values.phase[row]
+        recorder.record_row(recorder.schema.extract_row(driver))
+    recorder.finish_experiment(wait_till_complete=True)
+    return recorder.path
+
+
+def time_load(path, **kwargs):
+    times = []
+    for _ in range(REPETITIONS):
+        time_start = time.perf_counter()
+        recording = load_recording(path, **kwargs)
+        times.append(time.perf_counter() - time_start)
+    return min(times), recording
+
+
+def available_compressions():
+    compressions = ['none', 'zlib']
+    for compression in ['zstd', 'lz4']:
+        try:
+            compression_functions(compression)
+            compressions.append(compression)
+        except ImportError:
+            print(f'{compression} not installed, skipped')
+    return compressions
+
+
+if __name__ == '__main__':
+    columns, values = create_recording_values(np.random.default_rng(0))
+    rows = len(values.float64)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for compression in available_compressions():
+            paths[compression] = write_columnar(os.path.join(directory, f'benchmark_{compression}.csv'), columns, values, compression)
+        paths['csv'] = convert_recording(paths['none'], 'csv', os.path.join(directory, 'benchmark.csv'))
+
+        print(f'\n{rows} rows ({DURATION_S / 3600:.1f} h at {1 / CONTROL_PERIOD_S:.0f} Hz), {len(columns)} columns')
+        print(f"{'format':<10}{'MB':>8}{'bytes/row':>11}{'all ms':>10}{'window ms':>11}{'3 columns ms':>14}")
+        reference = load_recording(paths['none'])
+        for name, path in paths.items():
+            time_all, recording = time_load(path)
+            time_window, window = time_load(path, time_window=WINDOW_S)
+            time_columns, _ = time_load(path, columns=SELECTED_COLUMNS)
+            size = os.path.getsize(path)
+            print(f'{name:<10}{size / 1e6:>8.2f}{size / rows:>11.1f}{time_all * 1000:>10.1f}{time_window * 1000:>11.1f}{time_columns * 1000:>14.1f}')
+            if name != 'csv':
+                expected_window = reference.loc[reference['time'].between(*WINDOW_S)].reset_index(drop=True)
+                if not (recording.equals(reference) and window.equals(expected_window)):
+                    print(f'{name}: recording read back differs from the uncompressed one')
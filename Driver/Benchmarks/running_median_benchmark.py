@@ -0,0 +1,64 @@
+# Compares np.median over a ring buffer (as IncomingDataProcessor did before) with the incremental RunningMedian
+# Checks the results are identical and prints time per update for each window length
+# Run from the repository root, as control.py: python Driver/Benchmarks/running_median_benchmark.py
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+
+os.chdir("Driver")
+
+import numpy as np
+
+from DriverFunctions.running_median import RunningMedian
+
+WINDOW_LENGTHS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+NUMBER_OF_SAMPLES = 20000
+# Differences of ADC readings are mostly small integers with many repeated values - test also continuous values
+DATA_KINDS = ['integer', 'continuous']
+
+
+def median_with_numpy(samples, window_length):
+    buffer = np.zeros(window_length, dtype=np.float32)
+    buffer_index = 0
+    medians = []
+    time_start = time.perf_counter()
+    for sample in samples:
+        buffer[buffer_index] = sample
+        buffer_index = (buffer_index + 1) % window_length
+        medians.append(np.median(buffer))
+    return medians, time.perf_counter() - time_start
+
+
+def median_running(samples, window_length):
+    running_median = RunningMedian(window_length, dtype=np.float32)
+    medians = []
+    time_start = time.perf_counter()
+    for sample in samples:
+        medians.append(running_median.update(sample))
+    return medians, time.perf_counter() - time_start
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    samples_all = {
+        'integer': [float(x) for x in rng.integers(-20, 21, NUMBER_OF_SAMPLES)],
+        'continuous': [float(x) for x in rng.normal(0.0, 3.0, NUMBER_OF_SAMPLES)],
+    }
+
+    print(f'{NUMBER_OF_SAMPLES} updates per run, time per update in us')
+    print(f"{'data':<12}{'length':>8}{'np.median':>12}{'running':>12}{'speedup':>10}  identical")
+    for data_kind in DATA_KINDS:
+        samples = samples_all[data_kind]
+        for window_length in WINDOW_LENGTHS:
+            medians_numpy, time_numpy = median_with_numpy(samples, window_length)
+            medians_running, time_running = median_running(samples, window_length)
+
+            identical = (
+                    all(type(a) is type(b) for a, b in zip(medians_numpy, medians_running))
+                    and np.array_equal(np.array(medians_numpy), np.array(medians_running))
+            )
+            print(f'{data_kind:<12}{window_length:>8}'
+                  f'{time_numpy / NUMBER_OF_SAMPLES * 1e6:>12.2f}{time_running / NUMBER_OF_SAMPLES * 1e6:>12.2f}'
+                  f'{time_numpy / time_running:>10.1f}  {identical}')
@@ -1,13 +1,15 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
 import matplotlib
+
+from DriverFunctions.recording_loader import load_recording
+
 matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype'] = 42
 
 def get_data(dataset):
-    df_raw = pd.read_csv(dataset, comment='#')
+    df_raw = load_recording(dataset)
 
     time = df_raw['time'].to_numpy()
     time = time - time[0]
@@ -195,7 +197,7 @@ def plot_Q_fun(axs, datasets, labels, fontsizes, plotting_order=None):
     handle_dict = {}
 
     for i in plotting_order:
-        df_raw = pd.read_csv(datasets[i], comment='#')
+        df_raw = load_recording(datasets[i])
         time = df_raw['time'].to_numpy()
         time = time - time[0]  # Adjust time if necessary
         Q = df_raw['Q'].to_numpy()
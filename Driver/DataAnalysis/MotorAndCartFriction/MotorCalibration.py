@@ -116,7 +116,10 @@ def motor_calibration(FILE_NAME):
     motor_input_max = data.motor_input.max()
     motor_input_min = data.motor_input.min()
 
-    data = data.loc[data['measurement'].str.contains('State:moving')]
+    if 'experimentPhase' in data:
+        data = data.loc[data['experimentPhase'] == 'moving']
+    else:  # Older recordings with the protocol description in every row
+        data = data.loc[data['measurement'].str.contains('State:moving')]
     data = data.loc[np.logical_and(data['motor_input'] != 0, np.sign(data['motor_input']) == np.sign(data['positionD_last']))]
 
     data_pos = data.loc[data['motor_input'] > 0]
@@ -1,9 +1,10 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import scipy
 import numpy as np
 
+from DriverFunctions.recording_loader import load_recording
+
 sns.set()
 sns.color_palette()
 
@@ -27,10 +28,10 @@ if __name__ == "__main__":
         'MPPI RNN':     'CP_mppi-tf-RNN_2022-02-20_23-57-09 Performance 10k.csv',
     }
 
-    firmware_latency = [1000*pd.read_csv('ExperimentRecordings/Performance Measurement/' + results[name], comment='#')['latency'] for name in results]
-    python_latency = [1000*pd.read_csv('ExperimentRecordings/Performance Measurement/' + results[name], comment='#')['pythonLatency'] for name in results]
-    controller_steptime = [1000*pd.read_csv('ExperimentRecordings/Performance Measurement/' + results[name], comment='#')['controller_steptime'] for name in results]
-    delta_time = [pd.read_csv('ExperimentRecordings/Performance Measurement/' + results[name], comment='#')['deltaTimeMs'] for name in results]
+    firmware_latency = [1000*load_recording('ExperimentRecordings/Performance Measurement/' + results[name])['latency'] for name in results]
+    python_latency = [1000*load_recording('ExperimentRecordings/Performance Measurement/' + results[name])['pythonLatency'] for name in results]
+    controller_steptime = [1000*load_recording('ExperimentRecordings/Performance Measurement/' + results[name])['controller_steptime'] for name in results]
+    delta_time = [load_recording('ExperimentRecordings/Performance Measurement/' + results[name])['deltaTimeMs'] for name in results]
     delta_goal = [6, 21, 21]
     misses = [np.count_nonzero(delta_time[i].to_numpy() > delta_goal[i]) * 100 / len(delta_time[i]) for i, name in enumerate(results)]
 
@@ -0,0 +1,30 @@
+import os
+
+from DriverFunctions.recording_catalog import RecordingCatalog, index_recordings
+
+from globals import PATH_TO_EXPERIMENT_RECORDINGS
+
+# Adds recordings made before the catalog existed (or copied from other machines) to the recording catalog
+recordings_folders = [PATH_TO_EXPERIMENT_RECORDINGS]
+MAX_WORKERS = None  # Processes reading the recordings, None - one per CPU
+REINDEX = False  # Also read again the recordings already in the catalog
+
+# Example queries, printed after indexing
+QUERY_CONTROLLER = None  # e.g. 'mpc'
+QUERY_PROTOCOL = None  # e.g. 'swing-up'
+QUERY_LIMIT = 20
+
+
+if __name__ == "__main__":
+    catalog = RecordingCatalog()
+    added = index_recordings([folder for folder in recordings_folders if os.path.isdir(folder)], catalog,
+                             max_workers=MAX_WORKERS, reindex=REINDEX)
+    print(f'{added} recordings added to {catalog.path}')
+
+    recordings = catalog.query(controller=QUERY_CONTROLLER, protocol=QUERY_PROTOCOL, limit=QUERY_LIMIT)
+    print(f"\n{'started':<21}{'controller':<14}{'optimizer':<12}{'rows':>9}{'duration s':>12}{'p99 fw ms':>11}  protocols / name")
+    for recording in recordings:
+        p99 = recording['firmware_latency_p99_s']
+        print(f"{recording['started'] or '':<21}{recording['controller'] or '':<14}{recording['optimizer'] or '':<12}"
+              f"{recording['rows'] or 0:>9}{recording['duration_s'] or 0.0:>12.1f}{p99 * 1000 if p99 is not None else float('nan'):>11.2f}"
+              f"  {', '.join(recording['protocols'])} / {recording['name']}")
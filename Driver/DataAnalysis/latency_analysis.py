@@ -1,12 +1,14 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from DriverFunctions.recording_loader import load_recording
+
 file_path = 'ExperimentRecordings/CP_mppi-tf_2022-02-11_16-40-08 20ms swingup.csv'
 
 fontsize_labels = 14
 fontsize_ticks = 12
 
-data: pd.DataFrame = pd.read_csv(file_path, comment='#')  # skip comment lines starting with #
+data: pd.DataFrame = load_recording(file_path)  # csv (comment lines skipped) or columnar recording
 
 time = data['time']
 latency = data['additional_latency']*1000.0
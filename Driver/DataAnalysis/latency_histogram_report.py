@@ -0,0 +1,52 @@
+import glob
+import os
+from collections import defaultdict
+
+from DriverFunctions.recording_loader import RECORDING_EXTENSIONS
+from DriverFunctions.latency_histogram import (LATENCY_HISTOGRAM_SIDECAR_SUFFIX, LATENCY_HISTOGRAM_COLUMNS,
+                                               load_latency_histograms, merge_latency_histograms,
+                                               latency_histograms_from_recording, latency_histograms_sidecar_path,
+                                               save_latency_histograms)
+
+recordings_folder = 'ExperimentRecordings/'
+
+# Sidecars are searched recursively, recordings made before sidecars existed can get one built from their columns
+BUILD_MISSING_SIDECARS = False
+GROUP_BY = 'controller'  # Metadata field to report separately, None for one merged report
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+def print_report(title, histograms):
+    print(f'\n{title}')
+    print(f"{'':<22}{'count':>10}{'mean':>9}" + ''.join(f'{f"p{p:g}":>9}' for p in PERCENTILES) + f"{'max':>9}   (ms)")
+    for name in LATENCY_HISTOGRAM_COLUMNS:
+        if name not in histograms:
+            continue
+        summary = histograms[name].summary(PERCENTILES)
+        values = [summary['mean']] + [summary[f'p{p:g}'] for p in PERCENTILES] + [summary['max']]
+        print(f"{name:<22}{summary['count']:>10}" + ''.join(f'{v * 1000:>9.2f}' for v in values))
+
+
+if __name__ == "__main__":
+    if BUILD_MISSING_SIDECARS:
+        recording_paths = [path for extension in RECORDING_EXTENSIONS
+                           for path in glob.glob(os.path.join(recordings_folder, '**', '*' + extension), recursive=True)]
+        for recording_path in recording_paths:
+            sidecar_path = latency_histograms_sidecar_path(recording_path)
+            if not os.path.exists(sidecar_path):
+                histograms = latency_histograms_from_recording(recording_path)
+                if histograms:
+                    save_latency_histograms(histograms, sidecar_path, {'recording': os.path.basename(recording_path)})
+
+    groups = defaultdict(list)
+    sidecar_paths = sorted(glob.glob(os.path.join(recordings_folder, '**', '*' + LATENCY_HISTOGRAM_SIDECAR_SUFFIX), recursive=True))
+    for sidecar_path in sidecar_paths:
+        histograms, metadata = load_latency_histograms(sidecar_path)
+        groups[metadata.get(GROUP_BY, 'unknown') if GROUP_BY else 'all'].append(histograms)
+
+    print(f'{len(sidecar_paths)} recordings with latency histograms in {recordings_folder}')
+    for group, histograms_list in sorted(groups.items()):
+        print_report(f'{GROUP_BY}: {group} ({len(histograms_list)} recordings)' if GROUP_BY else 'All recordings',
+                     merge_latency_histograms(histograms_list))
+    if GROUP_BY and len(groups) > 1:
+        print_report('All recordings', merge_latency_histograms([h for hs in groups.values() for h in hs]))
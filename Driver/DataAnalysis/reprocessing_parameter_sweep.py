@@ -0,0 +1,37 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.offline_data_processor import reprocess_recording, reprocess_parameter_grid
+
+file_path = 'ExperimentRecordings/CP_mpc_2024-01-06_16-34-45-10ms-STM-Flush.csv'
+
+# Any of default_processing_parameters() can be swept, every combination is evaluated
+grid = {
+    'timesteps_for_derivative': [1, 2, 4],
+    'angle_d_median_len': [1, 4, 8, 16, 32, 64],
+}
+
+if __name__ == "__main__":
+    recording = load_recording(file_path)
+
+    # With the parameters the recording was made with, the recorded state should be reproduced exactly
+    processed = reprocess_recording(recording)
+    for column in ['angle', 'angleD', 'position', 'positionD']:
+        same = np.array_equal(processed[column].to_numpy(), recording[column].to_numpy().astype(processed[column].dtype))
+        print(f'{column} reproduced exactly: {same}')
+
+    results = reprocess_parameter_grid(recording, grid)
+
+    fig, axs = plt.subplots(1, 2, figsize=(16, 9))
+    for timesteps in grid['timesteps_for_derivative']:
+        selected = [(p, df) for p, df in results if p['timesteps_for_derivative'] == timesteps]
+        median_lengths = [p['angle_d_median_len'] for p, _ in selected]
+        axs[0].plot(median_lengths, [df['angleD'].std() for _, df in selected], marker='.', label=f'k={timesteps}')
+        axs[1].plot(median_lengths, [df['positionD'].std() for _, df in selected], marker='.', label=f'k={timesteps}')
+    axs[0].set_xlabel('angleD median length')
+    axs[0].set_ylabel('angleD std (rad/s)')
+    axs[1].set_xlabel('angleD median length')
+    axs[1].set_ylabel('positionD std (m/s)')
+    axs[0].legend()
+    plt.show()
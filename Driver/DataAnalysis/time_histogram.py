@@ -1,11 +1,12 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+from DriverFunctions.recording_loader import load_recording
+
 target_control_latency = 50.0
 dataset = 'CP_mpc_2024-01-06_16-34-45-10ms-STM-Flush.csv'
 
-df_raw = pd.read_csv(dataset, comment='#')
+df_raw = load_recording(dataset)
 
 try:
     latency_violations_vec = df_raw['latency_violations'].to_numpy()
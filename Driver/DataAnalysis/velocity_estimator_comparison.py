@@ -0,0 +1,76 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.offline_data_processor import reprocess_recording
+
+file_path = 'ExperimentRecordings/CP_mpc_2024-01-06_16-34-45-10ms-STM-Flush.csv'
+
+# Each entry is reprocessed with these parameters (see default_processing_parameters()) and compared
+estimators = {
+    'difference': {'velocity_estimator': 'difference', 'angle_d_median_len': 1},
+    'difference + median 4': {'velocity_estimator': 'difference', 'angle_d_median_len': 4, 'position_d_median_len': 4},
+    'difference + median 8': {'velocity_estimator': 'difference', 'angle_d_median_len': 8, 'position_d_median_len': 8},
+    'alpha-beta-gamma': {'velocity_estimator': 'alpha-beta-gamma'},
+    'kalman': {'velocity_estimator': 'kalman'},
+}
+
+REFERENCE_SMOOTHING = 5  # Half-width (samples) of the zero-phase moving average applied to the reference velocity
+MAX_LAG = 20  # Samples searched for the delay of an estimate with respect to the reference
+
+
+def zero_phase_reference(values, time):
+    """Central difference smoothed forward and backward - non-causal, so without delay. Not available online."""
+    velocity = np.gradient(np.unwrap(values), time)
+    kernel = np.ones(2 * REFERENCE_SMOOTHING + 1) / (2 * REFERENCE_SMOOTHING + 1)
+    return np.convolve(velocity, kernel, mode='same')
+
+
+def delay_and_noise(estimate, reference):
+    """
+    Delay - lag (samples) at which the estimate best matches the reference,
+    noise - std of the difference of the estimate and the reference shifted by this lag.
+    """
+    errors = [np.mean((estimate[lag:] - reference[:len(reference) - lag]) ** 2) for lag in range(MAX_LAG)]
+    lag = int(np.argmin(errors))
+    noise = np.std(estimate[lag:] - reference[:len(reference) - lag])
+    return lag, noise
+
+
+if __name__ == "__main__":
+    recording = load_recording(file_path)
+    time = recording['time'].to_numpy()
+    dt_mean = np.mean(np.diff(time))
+
+    results = {}
+    for name, parameters in estimators.items():
+        processed = reprocess_recording(recording, **parameters)
+        reference_angleD = zero_phase_reference(processed['angle'].to_numpy(dtype=np.float64), time)
+        reference_positionD = zero_phase_reference(processed['position'].to_numpy(dtype=np.float64), time)
+        results[name] = (
+            processed,
+            delay_and_noise(processed['angleD'].to_numpy(dtype=np.float64), reference_angleD),
+            delay_and_noise(processed['positionD'].to_numpy(dtype=np.float64), reference_positionD),
+        )
+
+    print(f"{'estimator':<26}{'angleD delay (ms)':>18}{'angleD noise':>14}{'positionD delay (ms)':>22}{'positionD noise':>17}")
+    for name, (_, (angle_lag, angle_noise), (position_lag, position_noise)) in results.items():
+        print(f'{name:<26}{angle_lag * dt_mean * 1000:>18.1f}{angle_noise:>14.4f}'
+              f'{position_lag * dt_mean * 1000:>22.1f}{position_noise:>17.5f}')
+
+    fig, axs = plt.subplots(2, 1, figsize=(16, 9), sharex=True)
+    for name, (processed, _, _) in results.items():
+        axs[0].plot(time, processed['angleD'], label=name)
+        axs[1].plot(time, processed['positionD'], label=name)
+    axs[0].set_ylabel('angleD (rad/s)')
+    axs[1].set_ylabel('positionD (m/s)')
+    axs[1].set_xlabel('Time (s)')
+    axs[0].legend()
+
+    fig, ax = plt.subplots(1, 1, figsize=(9, 9))
+    for name, (_, (angle_lag, angle_noise), _) in results.items():
+        ax.scatter(angle_lag * dt_mean * 1000, angle_noise, label=name)
+    ax.set_xlabel('angleD delay (ms)')
+    ax.set_ylabel('angleD noise, std around reference (rad/s)')
+    ax.legend()
+    plt.show()
@@ -1,6 +1,5 @@
 import numpy as np
 
-from time import sleep
 from abc import ABC, abstractmethod
 
 from CartPoleSimulation.CartPole.csv_logger import create_csv_file_name
@@ -22,6 +21,11 @@ class template_experiment_protocol(ABC):
         self.target_equilibrium = None
         self.data_to_save_measurement = {}
 
+    @property
+    def iteration(self):
+        """Counter of repetitions of the protocol (swing-ups, targets...), recorded as experimentIteration."""
+        return 0
+
     def is_idle(self):
         return self.current_experiment_phase == 'idle'
 
@@ -37,8 +41,8 @@ class template_experiment_protocol(ABC):
         pass
 
     def stop(self):
-        if self.driver.mlm.recording_running:
-            self.finish_recording()
+        if self.driver.mlm.recording_running or self.driver.mlm.start_recording_flag:
+            self.finish_recording()  # Also cancels a recording requested, but not started yet
         self.current_experiment_phase = 'idle'
         self.driver.controlEnabled = False
         self.driver.Q = 0.0
@@ -48,33 +52,18 @@ class template_experiment_protocol(ABC):
 
 
     def start_new_recording(self, index=None, recording_length=np.inf):
-
-        if self.driver.mlm.starting_recording:
-            for _ in range(10):
-                if not self.driver.mlm.starting_recording:
-                    break
-                sleep(0.1)
-            if self.driver.mlm.starting_recording:
-                raise Exception('The new recording for this measurement could not be started,'
-                                'because the starting recording flag of data manager is high all the time!')
-
-
-        if self.driver.mlm.recording_running:
-            print('Finishing currently running recording, before starting a new one for this measurement!')
-            self.finish_recording()
-
+        # A running recording is finished by mlm when the new one starts, at the cycle boundary, without waiting
         if index is None:
             index_string = ''
         else:
             index_string = '-' + str(index)
 
         title = self.experiment_protocol_name.replace('-', '_') + index_string
-        self.driver.mlm.csv_name = create_csv_file_name(prefix='CPP', with_date=False, title=title)
-        self.driver.mlm.recording_length = recording_length
-        self.driver.mlm.start_recording_flag = True
+        self.driver.mlm.request_recording(create_csv_file_name(prefix='CPP', with_date=False, title=title),
+                                          recording_length)
 
     def finish_recording(self):
-        self.driver.mlm.finish_csv_recording()
+        self.driver.mlm.finish_csv_recording(wait_till_complete=False)
 
     def __str__(self):
         return 'Experiment Protocol: ' + self.experiment_protocol_name
@@ -0,0 +1,108 @@
+"""
+Table-driven engine of declarative experiment protocols (protocol_spec.py).
+
+The spec is compiled once into index tables; each cycle only the transitions of the current phase are checked,
+no phase names are compared. Subclasses give the spec and may extend set_up_experiment, on_phase_entered
+and on_finished for what is specific to the set-up (calibration, firmware control, controller report).
+"""
+
+from DriverFunctions.ExperimentProtocols import template_experiment_protocol
+from DriverFunctions.ExperimentProtocols.protocol_spec import compile_protocol
+
+# Indexed by the position of the comparison in PROTOCOL_COMPARISONS
+COMPARE = (
+    lambda value, threshold: value < threshold,
+    lambda value, threshold: value > threshold,
+    lambda value, threshold: abs(value) < threshold,
+    lambda value, threshold: abs(value) > threshold,
+)
+
+
+class declarative_experiment(template_experiment_protocol):
+    def __init__(self, driver, spec):
+        super().__init__(driver=driver, experiment_protocol_name=spec.name)
+        self.spec = spec
+        self.table = compile_protocol(spec)
+
+        self.phase = None  # Index of the current phase, None when idle
+        self.counter_iterations = 0
+        self.time = None
+        self.time_phase_entered = None  # Set at the first update after entering, the time is not known before
+        self.time_timer_started = None
+
+    def set_up_experiment(self, first_iteration=True):
+        if first_iteration:
+            self.counter_iterations = 0
+            self.time = None
+        self.enter_phase(0)
+
+    def enter_phase(self, phase):
+        self.phase = phase
+        spec_phase = self.table.phases[phase]
+        self.current_experiment_phase = spec_phase.name
+        if spec_phase.target_position is not None:
+            self.target_position = spec_phase.target_position
+        if spec_phase.target_equilibrium is not None:
+            self.target_equilibrium = spec_phase.target_equilibrium
+        if spec_phase.Q is not None:
+            self.Q = spec_phase.Q
+        self.time_phase_entered = self.time
+        if spec_phase.start_timer:
+            self.time_timer_started = self.time
+        if spec_phase.record:
+            self.start_new_recording(index=self.counter_iterations)
+        self.on_phase_entered(spec_phase)
+
+    def on_phase_entered(self, spec_phase):
+        pass
+
+    def update_state(self, angle, position, time):
+        if self.phase is None:
+            return
+        self.time = time
+        if self.time_phase_entered is None:
+            self.time_phase_entered = time
+        if self.time_timer_started is None:
+            self.time_timer_started = time
+
+        target_position = self.target_position if self.target_position is not None else self.driver.target_position
+        # Order of PROTOCOL_VARIABLES
+        values = (position, angle, position - target_position, time - self.time_phase_entered,
+                  time - self.time_timer_started)
+        for next_phase, conditions in self.table.transitions[self.phase]:
+            for variable, comparison, threshold in conditions:
+                if not COMPARE[comparison](values[variable], threshold):
+                    break
+            else:
+                if next_phase == -1:
+                    self.end_iteration()
+                else:
+                    self.enter_phase(next_phase)
+                return
+
+    def end_iteration(self):
+        self.counter_iterations += 1
+        self.finish_recording()
+        if self.counter_iterations >= self.table.iterations:
+            self.stop()
+            self.on_finished()
+        else:
+            self.set_up_experiment(first_iteration=False)
+
+    def on_finished(self):
+        pass
+
+    def stop(self):
+        super().stop()
+        self.phase = None
+        self.time = None
+        self.time_phase_entered = None
+        self.time_timer_started = None
+
+    @property
+    def iteration(self):
+        return self.counter_iterations
+
+    def __str__(self):
+        return f'{self.experiment_protocol_name} (Experiment Phase: {self.current_experiment_phase}, ' \
+               f'Iteration: {self.counter_iterations}/{self.table.iterations})'
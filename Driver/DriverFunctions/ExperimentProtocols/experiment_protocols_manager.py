@@ -22,6 +22,12 @@ class ExperimentProtocolsManager:
             self.current_experiment_protocol.stop()
         self.current_experiment_protocol = self.experiment_protocols_selector.get_next_experiment_protocol()
 
+    def select_experiment_protocol(self, experiment_protocol_name):
+        if self.current_experiment_protocol.is_running():
+            self.current_experiment_protocol.stop()
+        self.current_experiment_protocol = \
+            self.experiment_protocols_selector.get_experiment_protocol_by_name(experiment_protocol_name)
+
     def experiment_protocol_step(self):
         if self.current_experiment_protocol.is_running():
             try:
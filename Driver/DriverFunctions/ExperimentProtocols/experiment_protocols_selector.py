@@ -25,3 +25,11 @@ class experiment_protocols_selector_class:
 
     def get_experiment_protocol(self):
         return self.experiment_protocols[self.current_experiment_index](self.driver)
+
+    def get_experiment_protocol_by_name(self, experiment_protocol_name):
+        """By the name protocols give themselves, e.g. 'swing-up'."""
+        names = [protocol.__name__[:-len('_experiment')].replace('_', '-') for protocol in self.experiment_protocols]
+        if experiment_protocol_name not in names:
+            raise ValueError(f'Unknown experiment protocol {experiment_protocol_name}, use one of {names}')
+        self.current_experiment_index = names.index(experiment_protocol_name)
+        return self.get_experiment_protocol()
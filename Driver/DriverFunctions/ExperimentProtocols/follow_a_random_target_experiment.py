@@ -103,6 +103,10 @@ class follow_a_random_target_experiment(template_experiment_protocol):
         else:
             raise Exception(f'unknown state {self.current_experiment_phase}')
 
+    @property
+    def iteration(self):
+        return self.counter_target_position
+
     def __str__(self):
         if self.current_experiment_phase == 'reset':
             return f'Go-to-target (State: {self.current_experiment_phase}, Total targets:{self.counter_target_position}, Q:{self.driver.Q:.2f}, Start Position={self.current_target*100:.1f}, Start Angle={self.start_angle:.1f}, Start AngleD={self.start_angleD:.1f})'
@@ -0,0 +1,175 @@
+"""
+Declarative experiment protocols - phases with outputs and transitions instead of a hand-written state machine.
+
+A ProtocolSpec is a list of phases. Entering a phase sets its outputs (target position, target equilibrium, Q),
+may restart the protocol timer and may start the recording. Each cycle the transitions of the current phase
+are checked in order, the first whose conditions all hold is taken. A condition compares one of PROTOCOL_VARIABLES
+with a threshold. A transition to END_OF_ITERATION finishes the recording and starts the next iteration
+from the first phase, or stops the protocol after the last iteration.
+
+The spec only uses what the chip knows too, so the same spec runs
+    - on the PC, executed by declarative_experiment (declarative_protocol.py) from the compiled tables,
+    - on the chip, as the C tables of generate_c_table executed by experiment_protocol.c at full loop rate;
+      Driver/generate_firmware_protocol.py writes them to the firmware sources.
+"""
+
+import math
+from typing import NamedTuple, Optional, Tuple
+
+# Order of ProtocolVariable and ProtocolComparison in Firmware/Src/CartPoleFirmware/experiment_protocol.h
+PROTOCOL_VARIABLES = {
+    'position': 'PROTOCOL_POSITION',
+    'angle': 'PROTOCOL_ANGLE',
+    'position_error': 'PROTOCOL_POSITION_ERROR',  # position - target position
+    'phase_time': 'PROTOCOL_PHASE_TIME',  # Since the phase was entered
+    'timer': 'PROTOCOL_TIMER',  # Since the last phase with start_timer was entered
+}
+PROTOCOL_COMPARISONS = {
+    '<': 'PROTOCOL_LESS',
+    '>': 'PROTOCOL_GREATER',
+    'abs<': 'PROTOCOL_ABS_LESS',
+    'abs>': 'PROTOCOL_ABS_GREATER',
+}
+
+END_OF_ITERATION = 'end-of-iteration'
+C_END_OF_ITERATION = 'PROTOCOL_END_OF_ITERATION'
+
+
+class Condition(NamedTuple):
+    variable: str  # One of PROTOCOL_VARIABLES
+    comparison: str  # One of PROTOCOL_COMPARISONS
+    threshold: float
+
+
+class Transition(NamedTuple):
+    to: str  # Name of the next phase or END_OF_ITERATION
+    conditions: Tuple[Condition, ...] = ()  # All have to hold, none - taken at the next cycle
+
+
+class Phase(NamedTuple):
+    name: str  # Recorded as experimentPhase
+    transitions: Tuple[Transition, ...]
+    target_position: Optional[float] = None  # Outputs set on entering the phase, None - unchanged
+    target_equilibrium: Optional[float] = None
+    Q: Optional[float] = None
+    start_timer: bool = False
+    record: bool = False  # Recording (offline buffers on chip) starts on entering, runs till the end of the iteration
+
+
+class ProtocolSpec(NamedTuple):
+    name: str
+    phases: Tuple[Phase, ...]  # The first one starts each iteration
+    iterations: int = 1
+
+
+def after(seconds, to, variable='phase_time'):
+    """Timed transition."""
+    return Transition(to, (Condition(variable, '>', seconds),))
+
+
+class ProtocolTable(NamedTuple):
+    """
+    Spec with indices instead of names, executed by the engines.
+    transitions[phase]: ((next phase index or -1 for END_OF_ITERATION, ((variable, comparison, threshold), ...)), ...)
+    variable and comparison are indices into PROTOCOL_VARIABLES and PROTOCOL_COMPARISONS.
+    """
+    names: Tuple[str, ...]
+    phases: Tuple[Phase, ...]
+    transitions: Tuple[tuple, ...]
+    iterations: int
+
+
+def compile_protocol(spec):
+    names = [phase.name for phase in spec.phases]
+    if not names:
+        raise ValueError(f'Protocol {spec.name} has no phases')
+    if len(set(names)) != len(names) or END_OF_ITERATION in names:
+        raise ValueError(f'Phase names of protocol {spec.name} are not unique: {names}')
+    variables = list(PROTOCOL_VARIABLES)
+    comparisons = list(PROTOCOL_COMPARISONS)
+
+    transitions = []
+    for phase in spec.phases:
+        phase_transitions = []
+        for transition in phase.transitions:
+            if transition.to != END_OF_ITERATION and transition.to not in names:
+                raise ValueError(f'Protocol {spec.name}: phase {phase.name} goes to unknown phase {transition.to}')
+            conditions = []
+            for condition in transition.conditions:
+                if condition.variable not in PROTOCOL_VARIABLES or condition.comparison not in PROTOCOL_COMPARISONS:
+                    raise ValueError(f'Protocol {spec.name}: phase {phase.name} has invalid condition {condition}, '
+                                     f'variables: {variables}, comparisons: {comparisons}')
+                conditions.append((variables.index(condition.variable), comparisons.index(condition.comparison),
+                                   float(condition.threshold)))
+            next_phase = -1 if transition.to == END_OF_ITERATION else names.index(transition.to)
+            phase_transitions.append((next_phase, tuple(conditions)))
+        transitions.append(tuple(phase_transitions))
+    return ProtocolTable(tuple(names), tuple(spec.phases), tuple(transitions), int(spec.iterations))
+
+
+def c_float(value):
+    if not math.isfinite(value):
+        raise ValueError(f'{value} can not be used on chip')
+    return f'{float(value)!r}f'
+
+
+def generate_c_table(spec, iterations=None):
+    """
+    Header with the tables of the spec for experiment_protocol.c.
+    :param iterations: Instead of these of the spec, e.g. as many as the offline buffers of the chip can hold
+    """
+    table = compile_protocol(spec)
+    variables = list(PROTOCOL_VARIABLES.values())
+    comparisons = list(PROTOCOL_COMPARISONS.values())
+    for phase in spec.phases:
+        if phase.Q is not None:
+            raise ValueError(f'Protocol {spec.name}: phase {phase.name} sets Q, '
+                             f'on chip the control signal is computed by the controller of the chip')
+
+    condition_lines, transition_lines, phase_lines = [], [], []
+    for phase, transitions in zip(table.phases, table.transitions):
+        first_transition = len(transition_lines)
+        for next_phase, conditions in transitions:
+            next_name = END_OF_ITERATION if next_phase == -1 else table.names[next_phase]
+            comment = f'  // {phase.name} -> {next_name}'
+            transition_lines.append(f'    {{{C_END_OF_ITERATION if next_phase == -1 else next_phase}, '
+                                    f'{len(condition_lines)}, {len(conditions)}}},{comment}')
+            condition_lines += [f'    {{{variables[variable]}, {comparisons[comparison]}, {c_float(threshold)}}},{comment}'
+                                for variable, comparison, threshold in conditions]
+        outputs = [flag for flag, value in [('PROTOCOL_OUTPUT_TARGET_POSITION', phase.target_position),
+                                            ('PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM', phase.target_equilibrium)]
+                   if value is not None]
+        phase_lines.append(
+            f'    {{{c_float(phase.target_position or 0.0)}, {c_float(phase.target_equilibrium or 0.0)}, '
+            f'{" | ".join(outputs) or "0"}, {str(phase.start_timer).lower()}, {str(phase.record).lower()}, '
+            f'{first_transition}, {len(transitions)}}},  // {phase.name}')
+    if not condition_lines:
+        condition_lines.append('    {PROTOCOL_POSITION, PROTOCOL_LESS, 0.0f},  // Unused, an array can not be empty')
+    if not transition_lines:
+        transition_lines.append(f'    {{{C_END_OF_ITERATION}, 0, 0}},  // Unused, an array can not be empty')
+
+    lines = [
+        f"// Generated by Driver/generate_firmware_protocol.py from the protocol '{spec.name}' - do not edit",
+        '#ifndef __EXPERIMENT_PROTOCOL_TABLE_H_',
+        '#define __EXPERIMENT_PROTOCOL_TABLE_H_',
+        '',
+        '#include "experiment_protocol.h"',
+        '',
+        f'#define PROTOCOL_ITERATIONS          {int(iterations if iterations is not None else table.iterations)}',
+        f'#define PROTOCOL_PHASES_COUNT        {len(table.phases)}',
+        '',
+        'static const ProtocolCondition PROTOCOL_CONDITIONS[] = {',
+        *condition_lines,
+        '};',
+        '',
+        'static const ProtocolTransition PROTOCOL_TRANSITIONS[] = {',
+        *transition_lines,
+        '};',
+        '',
+        'static const ProtocolPhase PROTOCOL_PHASES[PROTOCOL_PHASES_COUNT] = {',
+        *phase_lines,
+        '};',
+        '',
+        '#endif /*__EXPERIMENT_PROTOCOL_TABLE_H_*/',
+    ]
+    return '\n'.join(lines) + '\n'
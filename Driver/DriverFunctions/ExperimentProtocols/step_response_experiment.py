@@ -60,6 +60,7 @@ class step_response_experiment(template_experiment_protocol):
         self.second_round = False  # In case of bidirectional measurement, detect second "round", the opposite direction
 
         self.forward_speed = None
+        self.counter_steps = 0
 
         self.time_state_changed = None
 
@@ -74,6 +75,7 @@ class step_response_experiment(template_experiment_protocol):
 
         self.time_state_changed = None
         self.forward_speed = self.starting_speed
+        self.counter_steps = 0
 
         if ACCOUNT_FOR_MOTOR_CORRECTION:
             minimal_starting_speed = np.max((abs(self.motor_correction[1]), abs(self.motor_correction[2])))
@@ -102,8 +104,6 @@ class step_response_experiment(template_experiment_protocol):
         else:
             raise Exception(f'unknown state {self.current_experiment_phase}')
 
-        self.data_to_save_measurement = {'measurement': self}
-
     def action_resetting(self, position, time_now):
         if self.time_state_changed is None:
             self.time_state_changed = time_now
@@ -124,6 +124,7 @@ class step_response_experiment(template_experiment_protocol):
                 self.forward_speed = np.clip(self.forward_speed, -abs(self.ending_speed), abs(self.ending_speed))
                 self.Q = self.forward_speed
                 self.current_experiment_phase = 'moving'
+                self.counter_steps += 1
                 self.time_state_changed = time_now
             else:
                 if BIDIRECTIONAL and (self.second_round is False):
@@ -191,5 +192,10 @@ class step_response_experiment(template_experiment_protocol):
         else:
             return False
 
+    @property
+    def iteration(self):
+        # Each step is logged with its forward speed in the event log, when it starts
+        return self.counter_steps
+
     def __str__(self):
         return f' Step Response (State:{self.current_experiment_phase}, Forward Speed:{self.forward_speed}, Q:{self.Q})'
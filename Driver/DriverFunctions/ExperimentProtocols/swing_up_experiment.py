@@ -113,6 +113,10 @@ class swing_up_experiment(template_experiment_protocol):
                 self.set_up_experiment(first_iteration=False)
 
 
+    @property
+    def iteration(self):
+        return self.counter_swingup
+
     def __str__(self):
         if self.current_experiment_phase == 'reset':
             return f'Swingup (Experiment Phase: {self.current_experiment_phase}, Total Swingups:{self.counter_swingup}, Q:{self.driver.Q:.2f}, Start Position={self.target_position*100:.1f}, Start Angle={self.start_angle:.1f}, Start AngleD={self.start_angleD:.1f})'
@@ -1,4 +1,6 @@
 # TODO: You can easily switch between controllers in runtime using get_available_controller_names function
+import time
+
 import numpy as np
 
 from CartPoleSimulation.CartPole.state_utilities import (create_cartpole_state,
@@ -13,6 +15,7 @@ from DriverFunctions.ExperimentProtocols.experiment_protocols_manager import Exp
 
 from Driver.DriverFunctions.dancer import Dancer
 from DriverFunctions.timing_helper import TimingHelper
+from DriverFunctions.metrics_server import MetricsServer
 from Driver.DriverFunctions.interface import get_serial_port
 from Driver.DriverFunctions.main_logging_manager import MainLoggingManager
 from Driver.DriverFunctions.keyboard_controller import KeyboardController
@@ -23,7 +26,7 @@ from globals import (
     CHIP,
     OPTIMIZER_NAME, CONTROLLER_NAME,
     CONTROL_PERIOD_MS, CONTROL_SYNC,
-    ANGLE_DEVIATION, ANGLE_AVG_LENGTH,
+    ANGLE_DEVIATION, ANGLE_AVG_LENGTH, ANGLE_SUBSAMPLES_STREAM,
     ANGLE_HANGING, ANGLE_HANGING_DEFAULT, ANGLE_HANGING_POLOLU, ANGLE_HANGING_ORIGINAL,
     angle_deviation_update,
     POSITION_ENCODER_RANGE, POSITION_NORMALIZATION_FACTOR,
@@ -33,6 +36,7 @@ from globals import (
     SERIAL_PORT_NUMBER, SERIAL_BAUD,
     SEND_CHANGE_IN_TARGET_POSITION_ALWAYS,
     AUTOSTART,
+    METRICS_SERVER_ENABLED,
 )
 
 import warnings
@@ -40,14 +44,15 @@ warnings.simplefilter('ignore', np.RankWarning)
 
 
 class PhysicalCartPoleDriver:
-    def __init__(self, CartPoleInstance):
+    def __init__(self, CartPoleInstance, InterfaceInstance=None, clock=time.time):
 
         self.CartPoleInstance = CartPoleInstance
         self.CartPoleInstance.set_optimizer(optimizer_name=OPTIMIZER_NAME)
         self.CartPoleInstance.set_controller(controller_name=CONTROLLER_NAME)
         self.controller = self.CartPoleInstance.controller
 
-        self.InterfaceInstance = Interface()
+        # Interface stand-in can be provided to run the driver without the robot (benchmarks, dry-runs)
+        self.InterfaceInstance = Interface() if InterfaceInstance is None else InterfaceInstance
 
         self.log = my_logger(__name__)
 
@@ -71,7 +76,7 @@ class PhysicalCartPoleDriver:
 
         # State
         self.s = create_cartpole_state()
-        self.th = TimingHelper()
+        self.th = TimingHelper(clock=clock)  # VirtualClock of the interface stand-in for dry-runs
         self.idp = IncomingDataProcessor()  # Takes care of receiving data from the chip and serves as container for raw values
 
         # Target
@@ -86,10 +91,14 @@ class PhysicalCartPoleDriver:
 
         self.safety_switch_counter = 0
 
+        self.motor = MOTOR  # Detected at calibration, identifies the robot
+
         self.mlm = MainLoggingManager(self)
 
         self.keyboard_controller = KeyboardController(self)
 
+        self.metrics_server = MetricsServer(self) if METRICS_SERVER_ENABLED else None
+
     def run(self):
         with self.mlm.terminal_manager():
             self.setup()
@@ -119,6 +128,8 @@ class PhysicalCartPoleDriver:
 
         # set_firmware_parameters(self.InterfaceInstance)
         self.InterfaceInstance.set_config_control(controlLoopPeriodMs=CONTROL_PERIOD_MS, controlSync=CONTROL_SYNC, angle_hanging=ANGLE_HANGING, avgLen=ANGLE_AVG_LENGTH, correct_motor_dynamics=CORRECT_MOTOR_DYNAMICS)
+        if ANGLE_SUBSAMPLES_STREAM:
+            self.InterfaceInstance.stream_angle_subsamples(True, ANGLE_AVG_LENGTH)
 
         try:
             self.controller.printparams()
@@ -127,12 +138,19 @@ class PhysicalCartPoleDriver:
 
         self.th.setup()
 
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
         self.InterfaceInstance.stream_output(True)  # now start streaming state
 
     def run_experiment(self):
 
-        while not self.terminate_experiment:
-            self.experiment_sequence()
+        try:
+            while not self.terminate_experiment:
+                self.experiment_sequence()
+        except Exception as error:
+            self.mlm.trigger_flight_recorder('exception', immediately=True, details=f'Exception: {error!r}')
+            raise
 
     def quit_experiment(self):
         CostFunctionUpdater.stop_all_watchers()  # Stop all active watchers
@@ -142,26 +160,41 @@ class PhysicalCartPoleDriver:
         self.joystick.quit()
         self.mlm.live_plotter_sender.close()
         self.mlm.finish_csv_recording()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
 
     def experiment_sequence(self):
+        with self.th.span('experiment_sequence'):
+            self.experiment_sequence_stages()
+
+    def experiment_sequence_stages(self):
 
-        self.keyboard_controller.keyboard_input()
+        with self.th.span('keyboard_input'):
+            self.keyboard_controller.keyboard_input()
 
-        self.load_data_from_chip()
+        with self.th.span('read_state'):
+            self.load_data_from_chip()
 
-        self.th.time_measurement()
+        with self.th.span('timing'):
+            self.th.time_measurement()
 
-        self.th.check_latency_violation(self.controlEnabled)
+            self.th.check_latency_violation(self.controlEnabled)
 
-        self.idp.process_state_information(self.s, self.th.time_between_measurements_chip)
+        with self.th.span('process_state_information'):
+            # self.Q is still the command sent in the previous cycle - the one which acted until this measurement
+            self.idp.process_state_information(self.s, self.th.time_between_measurements_chip, self.Q)
 
-        self.s = self.th.add_latency(self.s)
+        with self.th.span('add_latency'):
+            self.s = self.th.add_latency(self.s)
 
-        self.epm.experiment_protocol_step()
+        with self.th.span('protocol_step'):
+            self.epm.experiment_protocol_step()
 
-        self.mlm.start_csv_recording_if_requested()
+        with self.th.span('start_recording'):
+            self.mlm.start_csv_recording_if_requested()
 
-        self.set_target_position()
+        with self.th.span('set_target_position'):
+            self.set_target_position()
 
         if self.controlEnabled or self.firmwareControl:
             self.th.controlled_iterations += 1
@@ -190,23 +223,26 @@ class PhysicalCartPoleDriver:
             # self.actualMotorCmd = self.command
             # self.Q = self.command / MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES
 
-        self.Q = self.joystick.action(self.s[POSITION_IDX], self.Q, self.controlEnabled)
+        with self.th.span('actuation'):
+            self.Q = self.joystick.action(self.s[POSITION_IDX], self.Q, self.controlEnabled)
 
-        if self.controlEnabled or self.epm.current_experiment_protocol.is_running():
-            self.control_signal_to_motor_command()
+            if self.controlEnabled or self.epm.current_experiment_protocol.is_running():
+                self.control_signal_to_motor_command()
 
-        if self.controlEnabled or self.epm.current_experiment_protocol.is_running():
-            self.motor_command_safety_check()
-            self.safety_switch_off()
+            if self.controlEnabled or self.epm.current_experiment_protocol.is_running():
+                self.motor_command_safety_check()
+                self.safety_switch_off()
 
-        if self.controlEnabled or (self.epm.current_experiment_protocol.is_running() and self.epm.current_experiment_protocol.Q is not None):
-            self.InterfaceInstance.set_motor(self.actualMotorCmd)
+            if self.controlEnabled or (self.epm.current_experiment_protocol.is_running() and self.epm.current_experiment_protocol.Q is not None):
+                self.InterfaceInstance.set_motor(self.actualMotorCmd)
+                self.th.mark_actuation()
 
         if self.firmwareControl:
             self.actualMotorCmd = self.command
 
         # Logging, Plotting, Terminal
-        self.mlm.step()
+        with self.th.span('mlm_step'):
+            self.mlm.step()
 
         self.actualMotorCmd_prev = self.actualMotorCmd
         self.Q_prev = self.Q
@@ -218,14 +254,16 @@ class PhysicalCartPoleDriver:
 
     def load_data_from_chip(self):
         # This function will block at the rate of the control loop
-        (angle_raw, angleD_raw, position_raw, self.target_position_from_chip, self.command,
-         invalid_steps, time_between_measurements_chip, time_current_measurement_chip,
-         firmware_latency, latency_violation_chip) = self.InterfaceInstance.read_state()
+        with self.th.span('serial_read'):
+            (angle_raw, angleD_raw, position_raw, self.target_position_from_chip, self.command,
+             invalid_steps, time_between_measurements_chip, time_current_measurement_chip,
+             firmware_latency, latency_violation_chip) = self.InterfaceInstance.read_state()
 
         self.th.load_timing_data_from_chip(
             time_current_measurement_chip, time_between_measurements_chip, latency_violation_chip, firmware_latency
         )
-        self.idp.load_state_data_from_chip(angle_raw, angleD_raw, invalid_steps, position_raw)
+        self.idp.load_state_data_from_chip(angle_raw, angleD_raw, invalid_steps, position_raw,
+                                           self.InterfaceInstance.angle_subsamples)
 
     def update_parameters_in_cartpole_instance(self):
         """
@@ -310,7 +348,7 @@ class PhysicalCartPoleDriver:
             pass
         self.dancer.danceEnabled = False
         self.target_position = self.base_target_position
-        self.th.latency_violations = 0
+        self.th.reset_latency_violations()
 
     def switch_on_control(self):
         self.controlEnabled = True
@@ -352,6 +390,7 @@ class PhysicalCartPoleDriver:
         if ANGLE_HANGING_DEFAULT:
             ANGLE_DEVIATION[...] = angle_deviation_update(ANGLE_HANGING)
 
+        self.motor = MOTOR
         print('Detected motor: {}'.format(MOTOR))
 
         self.InterfaceInstance.set_config_control(controlLoopPeriodMs=CONTROL_PERIOD_MS,
@@ -398,6 +437,7 @@ class PhysicalCartPoleDriver:
             if self.safety_switch_counter > 10:  # Allow short bumps
                 self.safety_switch_counter = 0
                 print('\nSafety Switch.')
+                self.mlm.trigger_flight_recorder('safety-switch')
                 self.controlEnabled = False
                 self.InterfaceInstance.set_motor(0)
 
@@ -0,0 +1,169 @@
+"""
+Headless benchmark of the driver loop (PhysicalCartPoleDriver.experiment_sequence).
+
+The driver is built with InterfaceStandIn instead of the serial Interface, the loop stages are timed by wrapping
+the methods experiment_sequence calls, and the results can be stored as JSON baseline and compared with a previous one.
+"""
+
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+
+from globals import CONTROLLER_NAME, OPTIMIZER_NAME, CONTROL_PERIOD_MS
+
+# Stage name -> (path to the object owning the method, method name)
+BENCHMARK_STAGES = {
+    'read': ('', 'load_data_from_chip'),
+    'process_state_information': ('idp', 'process_state_information'),
+    'protocol_step': ('epm', 'experiment_protocol_step'),
+    'controller': ('controller', 'step'),
+    'actuation': ('InterfaceInstance', 'set_motor'),
+    'mlm_step': ('mlm', 'step'),
+}
+BENCHMARK_QUANTILES = {'p50': 50.0, 'p99': 99.0, 'p99.9': 99.9}
+BENCHMARK_REGRESSION_TOLERANCE = 0.2  # Relative increase of a quantile reported as regression
+BENCHMARK_REGRESSION_MIN_INCREASE_MS = 0.05  # Ignore increases smaller than this, they are noise at the us level
+
+
+class DriverLoopBenchmark:
+    def __init__(self, driver, number_of_cycles):
+        self.driver = driver
+        self.number_of_cycles = number_of_cycles
+
+        self.stage_names = list(BENCHMARK_STAGES.keys())
+        # NaN marks a stage not executed in a cycle, e.g. controller while control is off
+        self.stage_times = np.full((number_of_cycles, len(self.stage_names)), np.nan)
+        self.cycle_times = np.full(number_of_cycles, np.nan)
+        self.current_cycle = 0
+        self.total_time = None
+
+        for stage_index, stage_name in enumerate(self.stage_names):
+            owner_path, method_name = BENCHMARK_STAGES[stage_name]
+            owner = self.driver
+            for attribute in filter(None, owner_path.split('.')):
+                owner = getattr(owner, attribute)
+            self._wrap_method(owner, method_name, stage_index)
+
+    def _wrap_method(self, owner, method_name, stage_index):
+        method = getattr(owner, method_name)
+        stage_times = self.stage_times
+        benchmark = self
+
+        def timed_method(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if benchmark.current_cycle < benchmark.number_of_cycles:
+                    elapsed = (time.perf_counter_ns() - start) * 1e-9
+                    previous = stage_times[benchmark.current_cycle, stage_index]
+                    # A stage called more than once per cycle (e.g. set_motor) is summed
+                    stage_times[benchmark.current_cycle, stage_index] = elapsed if np.isnan(previous) else previous + elapsed
+
+        # Instance attribute shadows the class method, experiment_sequence picks it up without changes
+        setattr(owner, method_name, timed_method)
+
+    def run(self):
+        driver = self.driver
+        driver.InterfaceInstance.open()
+        driver.InterfaceInstance.stream_output(True)
+        driver.th.setup()
+
+        with driver.mlm.terminal_manager():
+            time_start = time.perf_counter()
+            for self.current_cycle in range(self.number_of_cycles):
+                time_cycle_start = time.perf_counter()
+                driver.experiment_sequence()
+                self.cycle_times[self.current_cycle] = time.perf_counter() - time_cycle_start
+                if driver.terminate_experiment:
+                    break
+            self.current_cycle += 1
+            self.total_time = time.perf_counter() - time_start
+
+        driver.InterfaceInstance.close()
+        driver.mlm.finish_csv_recording()
+
+        return self.results()
+
+    def results(self):
+        cycles_done = min(self.current_cycle, self.number_of_cycles)
+        stages = {}
+        for stage_index, stage_name in enumerate(self.stage_names + ['cycle']):
+            if stage_name == 'cycle':
+                times = self.cycle_times[:cycles_done]
+            else:
+                times = self.stage_times[:cycles_done, stage_index]
+            times = times[~np.isnan(times)] * 1000.0
+            if times.size == 0:
+                continue
+            stages[stage_name] = {
+                'count': int(times.size),
+                'mean': float(times.mean()),
+                'max': float(times.max()),
+                **{name: float(np.percentile(times, q)) for name, q in BENCHMARK_QUANTILES.items()},
+            }
+
+        return {
+            'created': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'controller': CONTROLLER_NAME,
+            'optimizer': OPTIMIZER_NAME,
+            'control_period_ms': CONTROL_PERIOD_MS,
+            'interface': getattr(self.driver.InterfaceInstance, 'source', 'serial'),
+            'paced': bool(getattr(self.driver.InterfaceInstance, 'paced', True)),
+            'cycles': int(cycles_done),
+            'cycles_per_second': float(cycles_done / self.total_time) if self.total_time else 0.0,
+            'stages_ms': stages,
+        }
+
+
+def save_benchmark_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+
+def load_benchmark_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_with_baseline(results, baseline, tolerance=BENCHMARK_REGRESSION_TOLERANCE):
+    """
+    Returns a list of human-readable regressions of results with respect to baseline.
+    Quantiles are compared per stage, throughput is compared for the whole loop.
+    """
+    regressions = []
+    for stage_name, stats in results['stages_ms'].items():
+        if stage_name not in baseline['stages_ms']:
+            continue
+        stats_baseline = baseline['stages_ms'][stage_name]
+        for quantile_name in BENCHMARK_QUANTILES:
+            new, old = stats[quantile_name], stats_baseline[quantile_name]
+            if new > old * (1.0 + tolerance) and new - old > BENCHMARK_REGRESSION_MIN_INCREASE_MS:
+                regressions.append(f'{stage_name} {quantile_name}: {old:.3f}ms -> {new:.3f}ms')
+
+    if not results['paced']:
+        new, old = results['cycles_per_second'], baseline['cycles_per_second']
+        if new < old / (1.0 + tolerance):
+            regressions.append(f'cycles/s: {old:.1f} -> {new:.1f}')
+
+    return regressions
+
+
+def format_benchmark_results(results):
+    lines = [f"{results['cycles']} cycles, {results['cycles_per_second']:.1f} cycles/s "
+             f"(controller={results['controller']}, interface={results['interface']}, paced={results['paced']})"]
+    for stage_name, stats in results['stages_ms'].items():
+        lines.append(
+            f"  {stage_name:<28} p50={stats['p50']:8.3f}ms  p99={stats['p99']:8.3f}ms  "
+            f"p99.9={stats['p99.9']:8.3f}ms  max={stats['max']:8.3f}ms  (n={stats['count']})"
+        )
+    return '\n'.join(lines)
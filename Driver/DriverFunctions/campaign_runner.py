@@ -0,0 +1,299 @@
+"""
+Unattended experiment campaigns - a grid of (controller, optimizer, protocol, parameters) run back to back.
+
+Each run switches the controller (if it differs from the previous run), sets the parameters, prewarms the controller
+with CAMPAIGN_PREWARM_STEPS steps on the current state (compilation happens before the protocol starts,
+not in its first cycles), then starts the experiment protocol as the key 'n' would and runs the driver loop
+until the protocol stops by itself or max_run_s is over. The parameters are restored after the run.
+
+Progress is checkpointed as JSON in PATH_TO_CAMPAIGNS after every run: started again with the same name,
+the campaign skips the runs done and repeats an interrupted one.
+Recordings finished by MainLoggingManager are handed to a process pool which extracts their metrics
+(recording_metrics) while the next run goes; the metrics are kept in the checkpoint and written as a csv table.
+
+Parameters are attribute paths from the driver, e.g. {'controller.optimizer.num_rollouts': 64},
+or module constants of the protocol with prefix 'protocol.', e.g. {'protocol.NUMBER_OF_SWINGUPS': 10} -
+they have to be read when the protocol starts or while it runs.
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from DriverFunctions.recording_loader import load_recording
+
+from globals import CAMPAIGN_PREWARM_STEPS, CAMPAIGN_METRICS_WORKERS, CONTROL_PERIOD_MS, PATH_TO_CAMPAIGNS
+
+PROTOCOL_PARAMETER_PREFIX = 'protocol.'
+UPRIGHT_ANGLE_RAD = 0.2  # The pole counts as upright within this angle, for upright_fraction
+
+
+class CampaignRun(NamedTuple):
+    controller: str
+    optimizer: Optional[str]
+    protocol: str  # Name of the experiment protocol, e.g. 'swing-up'
+    parameters: Optional[dict] = None  # {attribute path: value}, None - none are set
+
+    @property
+    def key(self):
+        """Identifies the run in the checkpoint."""
+        return json.dumps([self.controller, self.optimizer, self.protocol, self.parameters or {}], sort_keys=True)
+
+    def __str__(self):
+        parameters = ', '.join(f'{path}={value}' for path, value in (self.parameters or {}).items())
+        return f"{self.controller}{'/' + self.optimizer if self.optimizer else ''} {self.protocol}" \
+               + (f' ({parameters})' if parameters else '')
+
+
+def campaign_grid(controllers, protocols, parameter_sets=({},)):
+    """
+    All combinations as CampaignRuns, grouped by controller so it is switched as few times as possible.
+    :param controllers: (controller, optimizer) pairs, optimizer None for controllers without one
+    """
+    return [CampaignRun(controller, optimizer, protocol, dict(parameters or {}))
+            for (controller, optimizer), protocol, parameters in itertools.product(controllers, protocols, parameter_sets)]
+
+
+def recording_metrics(path):
+    """Metrics of a finished recording, computed in a worker process."""
+    recording = load_recording(path)
+    metrics = {'rows': len(recording)}
+    if not len(recording):
+        return metrics
+    if 'time' in recording:
+        metrics['duration_s'] = float(recording['time'].iloc[-1] - recording['time'].iloc[0])
+    if 'angle' in recording:
+        angle = recording['angle'].to_numpy(dtype=np.float64)
+        metrics['angle_rms'] = float(np.sqrt(np.mean(angle ** 2)))
+        metrics['upright_fraction'] = float(np.mean(np.abs(angle) < UPRIGHT_ANGLE_RAD))
+    if 'position' in recording and 'target_position' in recording:
+        position_error = recording['position'].to_numpy(dtype=np.float64) - recording['target_position'].to_numpy()
+        metrics['position_error_rms'] = float(np.sqrt(np.mean(position_error ** 2)))
+    if 'Q' in recording:
+        metrics['Q_rms'] = float(np.sqrt(np.mean(recording['Q'].to_numpy(dtype=np.float64) ** 2)))
+    if 'latency_violations' in recording:
+        metrics['latency_violations'] = int(recording['latency_violations'].iloc[-1] - recording['latency_violations'].iloc[0])
+    if 'controller_steptime' in recording:
+        metrics['controller_steptime_p99_s'] = float(np.nanpercentile(recording['controller_steptime'], 99.0))
+    return metrics
+
+
+def set_parameter(root, path, value):
+    """Sets the attribute at the path (e.g. 'controller.optimizer.num_rollouts') from root, returns the old value."""
+    *owners, name = path.split('.')
+    owner = root
+    for attribute in owners:
+        owner = getattr(owner, attribute)
+    old_value = getattr(owner, name)
+    setattr(owner, name, value)
+    return old_value
+
+
+class CampaignRunner:
+    def __init__(self, driver, name, runs, max_run_s=None, prewarm_steps=CAMPAIGN_PREWARM_STEPS,
+                 max_workers=CAMPAIGN_METRICS_WORKERS, directory=PATH_TO_CAMPAIGNS):
+        """
+        :param max_run_s: A run is ended after this time (e.g. protocols which repeat forever), None - when the protocol stops
+        """
+        self.driver = driver
+        self.name = name
+        self.runs = list(runs)
+        keys = [run.key for run in self.runs]
+        if len(set(keys)) != len(keys):
+            raise ValueError(f'Campaign {name} has the same run more than once')
+        self.max_run_cycles = None if max_run_s is None else int(round(max_run_s * 1000.0 / CONTROL_PERIOD_MS))
+        self.prewarm_steps = prewarm_steps
+        self.max_workers = max_workers
+
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint_path = os.path.join(directory, f'{name}.json')
+        self.metrics_path = os.path.join(directory, f'{name}_metrics.csv')
+        self.checkpoint = self.load_checkpoint()
+
+        self.executor = None
+        self.metrics_futures = {}  # (run key, recording path) -> future of recording_metrics
+        self.run_recordings = []  # Finished during the current run
+        # A protocol names its recordings the same in every run, they get the number of the run appended
+        self.recording_name_suffixes = {run.key: f'_{name}-{number:03d}' for number, run in enumerate(self.runs)}
+        driver.mlm.recording_finished_callbacks.append(self.run_recordings.append)
+
+    def load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        return {'name': self.name, 'created': datetime.now().isoformat(timespec='seconds'), 'runs': {}}
+
+    def save_checkpoint(self):
+        # Written next to it and renamed - an interruption never leaves a broken checkpoint
+        temporary_path = self.checkpoint_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.checkpoint, f, indent=1)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def pending_runs(self):
+        return [run for run in self.runs if self.checkpoint['runs'].get(run.key, {}).get('status') != 'done']
+
+    def run(self):
+        driver = self.driver
+        pending = self.pending_runs()
+        print(f'\nCampaign {self.name}: {len(self.runs) - len(pending)} of {len(self.runs)} runs done, '
+              f'{len(pending)} to go, checkpoint {self.checkpoint_path}')
+
+        # Spawned, not forked: the driver already runs threads (recording writer, terminal, TF) whose locks a fork copies
+        with ProcessPoolExecutor(max_workers=self.max_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as self.executor:
+            try:
+                self.submit_missing_metrics()
+                with driver.mlm.terminal_manager():
+                    driver.setup()
+                    try:
+                        for idx, run in enumerate(pending):
+                            if driver.terminate_experiment:
+                                break
+                            print(f'\nCampaign run {idx + 1}/{len(pending)}: {run}')
+                            self.execute(run)
+                            self.collect_metrics()
+                    finally:
+                        driver.quit_experiment()
+            finally:
+                self.collect_metrics(wait=True)
+                self.save_metrics_table()
+        self.executor = None
+
+    def execute(self, run):
+        driver = self.driver
+        entry = self.checkpoint['runs'][run.key] = {
+            'run': run._asdict(), 'status': 'running', 'started': datetime.now().isoformat(timespec='seconds'),
+            'recordings': [], 'metrics': {},
+        }
+        self.save_checkpoint()
+
+        self.switch_controller(run)
+        self.prewarm_controller()
+
+        driver.epm.select_experiment_protocol(run.protocol)
+        protocol = driver.epm.current_experiment_protocol
+        protocol_module = sys.modules[type(protocol).__module__]
+        old_values = []
+        try:
+            for path, value in (run.parameters or {}).items():
+                if path.startswith(PROTOCOL_PARAMETER_PREFIX):
+                    root, path = protocol_module, path[len(PROTOCOL_PARAMETER_PREFIX):]
+                else:
+                    root = driver
+                old_values.append((root, path, set_parameter(root, path, value)))
+
+            # Frames streamed while the controller was prewarmed are stale, the protocol starts on fresh ones
+            driver.InterfaceInstance.clear_read_buffer()
+            driver.th.resync()
+
+            self.run_recordings.clear()
+            driver.mlm.recording_name_suffix = self.recording_name_suffixes[run.key]
+            protocol.start()
+            cycles = 0
+            while protocol.is_running() and not driver.terminate_experiment \
+                    and (self.max_run_cycles is None or cycles < self.max_run_cycles):
+                try:
+                    driver.experiment_sequence()
+                except Exception as error:
+                    driver.mlm.trigger_flight_recorder('exception', immediately=True, details=f'Exception: {error!r}')
+                    raise
+                cycles += 1
+            if protocol.is_running():
+                protocol.stop()
+            driver.mlm.finish_csv_recording(wait_till_complete=True)
+        finally:
+            driver.mlm.recording_name_suffix = ''
+            for root, path, value in reversed(old_values):
+                set_parameter(root, path, value)
+
+        entry.update({
+            'status': 'interrupted' if driver.terminate_experiment else 'done',
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'cycles': cycles,
+            'recordings': list(self.run_recordings),
+        })
+        for path in self.run_recordings:
+            self.submit_metrics(run.key, path)
+        self.save_checkpoint()
+
+    def switch_controller(self, run):
+        driver = self.driver
+        if driver.mlm.controller_and_optimizer_names() == (run.controller, run.optimizer or ''):
+            return
+        if run.optimizer:
+            driver.CartPoleInstance.set_optimizer(optimizer_name=run.optimizer)
+        driver.CartPoleInstance.set_controller(controller_name=run.controller)
+        driver.controller = driver.CartPoleInstance.controller
+        try:
+            driver.controller.loadparams()
+        except AttributeError:
+            pass
+
+    def prewarm_controller(self):
+        driver = self.driver
+        for _ in range(self.prewarm_steps):
+            driver.controller.step(
+                driver.s,
+                driver.th.time_current_measurement_chip or 0.0,
+                {"target_position": driver.target_position,
+                 "target_equilibrium": driver.CartPoleInstance.target_equilibrium,
+                 "Q_ccrc": driver.Q,
+                 }
+            )
+        try:
+            driver.controller.controller_reset()
+        except (AttributeError, NotImplementedError):
+            pass
+
+    def submit_metrics(self, key, path):
+        self.metrics_futures[(key, path)] = self.executor.submit(recording_metrics, path)
+
+    def submit_missing_metrics(self):
+        """Recordings of runs done before an interruption whose metrics were not collected."""
+        for key, entry in self.checkpoint['runs'].items():
+            for path in entry['recordings']:
+                if path not in entry['metrics']:
+                    self.submit_metrics(key, path)
+
+    def collect_metrics(self, wait=False):
+        collected = False
+        for (key, path), future in list(self.metrics_futures.items()):
+            if not (wait or future.done()):
+                continue
+            try:
+                metrics = future.result()
+            except Exception as error:
+                print(f'\nCampaign: metrics of {path} failed: {error!r}')
+                metrics = {'error': repr(error)}
+            self.checkpoint['runs'][key]['metrics'][path] = metrics
+            del self.metrics_futures[(key, path)]
+            collected = True
+        if collected:
+            self.save_checkpoint()
+
+    def metrics_table(self):
+        """One row per recording: run, its parameters and the metrics of the recording."""
+        rows = []
+        for entry in self.checkpoint['runs'].values():
+            run = entry['run']
+            for path in entry['recordings']:
+                row = {'controller': run['controller'], 'optimizer': run['optimizer'], 'protocol': run['protocol'],
+                       **(run['parameters'] or {}), 'status': entry['status'], 'recording': os.path.basename(path)}
+                row.update(entry['metrics'].get(path, {}))
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def save_metrics_table(self):
+        table = self.metrics_table()
+        if len(table):
+            table.to_csv(self.metrics_path, index=False)
+            print(f'\nCampaign {self.name}: metrics of {len(table)} recordings saved to {self.metrics_path}')
@@ -0,0 +1,156 @@
+"""
+Alignment of the chip timer with the host monotonic clock.
+
+The chip sends the time of each measurement in microseconds of its own timer (uint32, overflows after ~71.6 min).
+The host sees the frame some transport delay later. We fit online
+    host_time = offset + rate * chip_time + delay
+with recursive least squares with exponential forgetting (tracks the drift of the two oscillators),
+clipping residuals to a few robust standard deviations (frames delayed by USB or OS scheduling do not pull the fit).
+The fitted line includes the mean transport delay; we subtract the typical excess over the fastest frames
+(a running low quantile of residuals) to get the host time at which the measurement was taken.
+The constant part of the transport delay cannot be told apart from the clock offset,
+so the aligned time is late by the delay of the fastest frames (typically a fraction of a millisecond over USB).
+"""
+
+import time
+
+from globals import (CLOCK_ALIGNMENT_FORGETTING_FACTOR, CLOCK_ALIGNMENT_OUTLIER_THRESHOLD,
+                     CLOCK_ALIGNMENT_WARMUP_FRAMES, CHIP_TIMER_OVERFLOW_WARNING_S)
+
+CHIP_TIMER_WRAP_S = 2 ** 32 / 1e6  # The chip sends the time as uint32 microseconds
+RESIDUAL_FLOOR_QUANTILE = 0.05  # Quantile of residuals taken as transport delay of the fastest frames
+RESIDUAL_FLOOR_STEP = 0.01  # Adaptation rate of the running quantile, relative to the residual scale
+
+
+class ChipClockAligner:
+    def __init__(
+            self,
+            forgetting_factor=CLOCK_ALIGNMENT_FORGETTING_FACTOR,
+            outlier_threshold=CLOCK_ALIGNMENT_OUTLIER_THRESHOLD,
+            warmup_frames=CLOCK_ALIGNMENT_WARMUP_FRAMES,
+            clock=time.perf_counter,
+    ):
+        self.forgetting_factor = forgetting_factor
+        self.outlier_threshold = outlier_threshold
+        self.warmup_frames = warmup_frames
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+
+        # Chip timer unwrapping
+        self.time_chip_raw_previous = None
+        self.chip_timer_wraps = 0
+        self.overflow_detected = False  # True only in the frame in which an overflow was detected
+        self.overflow_warning_given = False
+
+        # Coordinates are shifted by the first sample to keep the numbers small
+        self.time_chip_origin = None
+        self.time_host_origin = None
+
+        # RLS estimate of host = offset + rate * chip (in shifted coordinates) and its 2x2 covariance
+        self.offset = 0.0
+        self.rate = 1.0
+        self.P00, self.P01, self.P11 = 1.0, 0.0, 1.0
+
+        self.residual_scale = None  # Running mean absolute residual
+        self.residual_floor = 0.0  # Running low quantile of residuals
+
+        self.time_chip = None  # Unwrapped chip time of the last frame, s
+        self.time_chip_between = None  # Difference of unwrapped chip times of two last frames, s
+        self.time_measurement_host = None  # Aligned host time of the last measurement, in clock units (s)
+        self.transport_delay = None  # Host receive time minus aligned measurement time of the last frame, s
+
+    @property
+    def drift_ppm(self):
+        return (self.rate - 1.0) * 1e6
+
+    def update(self, time_chip_raw, time_host_received=None):
+        """
+        Takes chip time of the measurement (s, as sent by chip) and host clock time at which the frame was received.
+        Returns host clock time at which the measurement was taken.
+        """
+        if time_host_received is None:
+            time_host_received = self.clock()
+
+        self.unwrap_chip_time(time_chip_raw)
+
+        if self.time_chip_origin is None:
+            self.time_chip_origin = self.time_chip
+            self.time_host_origin = time_host_received
+            self.P00, self.P01, self.P11 = 1e-4, 0.0, 1e-6
+
+        x = self.time_chip - self.time_chip_origin
+        y = time_host_received - self.time_host_origin
+        self.frames += 1
+
+        residual = y - (self.offset + self.rate * x)
+        if self.residual_scale is None:
+            self.residual_scale = max(abs(residual), 1e-5)
+
+        # Huber-like clipping: delayed frames move the estimate only by a bounded step
+        limit = self.outlier_threshold * self.residual_scale
+        if self.frames > self.warmup_frames:
+            residual_used = max(-limit, min(limit, residual))
+        else:
+            residual_used = residual
+
+        self.rls_step(x, residual_used)
+
+        residual_after = y - (self.offset + self.rate * x)
+        self.residual_scale += (1.0 - self.forgetting_factor) * (min(abs(residual_after), limit) - self.residual_scale)
+        self.residual_scale = max(self.residual_scale, 1e-6)
+        # Stochastic approximation of a low quantile, it tracks the transport delay of the fastest frames
+        step = RESIDUAL_FLOOR_STEP * self.residual_scale
+        if residual_after < self.residual_floor:
+            self.residual_floor -= step * (1.0 - RESIDUAL_FLOOR_QUANTILE)
+        else:
+            self.residual_floor += step * RESIDUAL_FLOOR_QUANTILE
+
+        self.time_measurement_host = self.time_host_origin + self.offset + self.rate * x + self.residual_floor
+        self.transport_delay = time_host_received - self.time_measurement_host
+
+        return self.time_measurement_host
+
+    def rls_step(self, x, residual):
+        lam = self.forgetting_factor
+        # Regressor is [1, x]
+        Px0 = self.P00 + self.P01 * x
+        Px1 = self.P01 + self.P11 * x
+        denominator = lam + Px0 + x * Px1
+        K0 = Px0 / denominator
+        K1 = Px1 / denominator
+
+        self.offset += K0 * residual
+        self.rate += K1 * residual
+
+        self.P00 = (self.P00 - K0 * Px0) / lam
+        self.P01 = (self.P01 - K0 * Px1) / lam
+        self.P11 = (self.P11 - K1 * Px1) / lam
+
+    def unwrap_chip_time(self, time_chip_raw):
+        self.overflow_detected = False
+        if self.time_chip_raw_previous is not None and time_chip_raw < self.time_chip_raw_previous - CHIP_TIMER_WRAP_S / 2:
+            self.chip_timer_wraps += 1
+            self.overflow_detected = True
+            self.overflow_warning_given = False
+            print(f'\nChip timer overflow detected (#{self.chip_timer_wraps}), continuing with unwrapped chip time.')
+        self.time_chip_raw_previous = time_chip_raw
+
+        time_chip = time_chip_raw + self.chip_timer_wraps * CHIP_TIMER_WRAP_S
+        self.time_chip_between = None if self.time_chip is None else time_chip - self.time_chip
+        self.time_chip = time_chip
+
+        if not self.overflow_warning_given and self.time_to_chip_timer_overflow() < CHIP_TIMER_OVERFLOW_WARNING_S:
+            self.overflow_warning_given = True
+            print(f'\nChip timer overflows in {self.time_to_chip_timer_overflow():.1f} s.')
+
+    def time_to_chip_timer_overflow(self):
+        if self.time_chip_raw_previous is None:
+            return CHIP_TIMER_WRAP_S
+        return CHIP_TIMER_WRAP_S - self.time_chip_raw_previous
+
+    def host_time_from_chip_time(self, time_chip):
+        """Host clock time corresponding to an (unwrapped) chip time, using the current estimate."""
+        return self.time_host_origin + self.offset + self.rate * (time_chip - self.time_chip_origin) + self.residual_floor
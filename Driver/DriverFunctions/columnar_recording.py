@@ -0,0 +1,509 @@
+"""
+Binary columnar recordings (.cprec) - backend of MainLoggingManager, the csv recordings (csv_recording.py) are written by the same recorder.
+
+Each row, extracted by the compiled RecordingSchema, is written into a preallocated numpy structured array
+(one typed field per column) instead of being formatted as text. Full chunks are handed over to a writer thread,
+which computes the derived columns of the whole chunk and appends its raw bytes to the file,
+so the control loop neither formats numbers nor waits for the disk.
+Chunks wait for the writer in a bounded queue (recording_queue.py), RECORDING_QUEUE_POLICY decides what happens
+when it is full; queue depth, dropped rows and flush latency are written into the footer.
+String columns (e.g. the experiment protocol) are dictionary encoded - int32 codes, each new string is stored once.
+Column types are declared in the schema; for measurement and controller values they are taken from the first row.
+
+File layout (all integers little-endian):
+    FILE_MAGIC
+    uint32 length, JSON header - columns with dtypes, dictionary encoded columns, title and header lines
+    blocks, each: BLOCK_MAGIC, uint32 rows, uint32 length of JSON with new dictionary entries, uint64 data length,
+                  the JSON, data: rows of the structured array, or if compressed: uint32 compressed length
+                  of each column, then each column compressed separately
+    footer (written when the recording is finished): FOOTER_MAGIC, JSON with number of rows, block index
+                  ([offset, rows, first time, last time]), all dictionary strings and writer statistics,
+                  uint64 length of the JSON, END_MAGIC
+A recording which was not finished (crash) has no footer and is read by scanning the blocks.
+With the footer, read_columnar_window reads a time window by seeking to its blocks only.
+
+Read with recording_loader.load_recording, convert to csv or parquet with recording_loader.convert_recording.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from DriverFunctions.recording_queue import RecordingQueue
+
+from globals import RECORDING_CHUNK_ROWS, RECORDING_QUEUE_BLOCKS, RECORDING_QUEUE_POLICY, RECORDING_COMPRESSION
+
+COLUMNAR_RECORDING_EXTENSION = '.cprec'
+FILE_MAGIC = b'CPREC01\n'
+BLOCK_MAGIC = b'BLK1'
+FOOTER_MAGIC = b'FTR1'
+END_MAGIC = b'CPEND\n'
+
+BLOCK_HEADER = struct.Struct('<4sIIQ')  # magic, rows, dictionary entries length, data length
+END_STRUCT = struct.Struct('<Q6s')  # footer length, end magic
+
+TIME_COLUMN = 'time'  # Indexed in the footer for reading time windows
+
+COMPRESSION_NONE = 'none'
+COMPRESSIONS = (COMPRESSION_NONE, 'zlib', 'zstd', 'lz4')
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+def columnar_recording_path(recording_path):
+    root, extension = os.path.splitext(recording_path)
+    if extension == COLUMNAR_RECORDING_EXTENSION:
+        return recording_path
+    return (root if extension == '.csv' else recording_path) + COLUMNAR_RECORDING_EXTENSION
+
+
+def columnar_header(schema, title, header, compression=COMPRESSION_NONE):
+    """Header of a recording of rows of the schema (its dtypes resolved)."""
+    return {
+        'columns': [[name, schema.dtype.fields[name][0].str] for name in schema.dtype.names],
+        'dictionary_encoded': schema.dictionary_encoded,
+        'compression': compression,
+        'time_column': TIME_COLUMN if TIME_COLUMN in schema.dtype.names else None,
+        'title': title,
+        'header': list(header),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+class ColumnarRecorder:
+    """
+    Records rows extracted with a RecordingSchema (recording_schema.py).
+    Has recording_running, starting_recording and finish_experiment of DataManager, which MainLoggingManager uses.
+    """
+
+    def __init__(self, chunk_rows=RECORDING_CHUNK_ROWS, queue_blocks=RECORDING_QUEUE_BLOCKS,
+                 queue_policy=RECORDING_QUEUE_POLICY, compression=RECORDING_COMPRESSION):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown recording compression {compression}, use one of {COMPRESSIONS}")
+        if compression != COMPRESSION_NONE:
+            compression_functions(compression)  # Fails now, not in the writer thread, if the package is missing
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.queue_blocks = queue_blocks
+        self.queue_policy = queue_policy
+        self.recording_running = False
+        self.starting_recording = False  # Starting is immediate, kept for the same interface as DataManager
+        self.path = None
+        self.writer = None
+        self.finishing_writers = []  # Closed, still writing the end of their recording
+        # Writer of the next recording, created off the control loop - a rollover does not wait for a thread to start
+        self.spare_writers = ThreadPoolExecutor(max_workers=1, thread_name_prefix='columnar-recording-spare')
+        self.spare_writer = None
+        self.prepare_writer()
+
+    def prepare_writer(self):
+        self.spare_writer = self.spare_writers.submit(self.create_writer)
+
+    def create_writer(self):
+        return ColumnarFileWriter(max_blocks=self.queue_blocks, policy=self.queue_policy)
+
+    def start_recording(self, path, schema, title, header, recording_length=np.inf):
+        if self.recording_running:
+            self.finish_experiment(wait_till_complete=False)
+        self.path = self.recording_path(path)
+        self.schema = schema
+        self.title = title
+        self.header = list(header)
+        self.recording_length = recording_length
+
+        self.dictionaries = {}  # Row index -> {string: code}
+        self.new_dictionary_entries = {}  # Column name -> strings added since the last block
+        self.chunk = None  # Preallocated row buffer, created when the dtypes are known from the first row
+        self.chunk_row = 0
+        self.rows_recorded = 0
+
+        if self.spare_writer.done() and self.spare_writer.exception() is None:
+            self.writer = self.spare_writer.result()
+            self.prepare_writer()
+        else:
+            self.writer = self.create_writer()
+        self.writer.open(self.path, schema.complete_rows)
+        self.recording_running = True
+        print(f'\nStarted recording to {self.path}')
+
+    @staticmethod
+    def recording_path(path):
+        return columnar_recording_path(path)
+
+    def record_row(self, row):
+        """:param row: tuple returned by schema.extract_row"""
+        if self.chunk is None:
+            self.start_chunks(row)
+
+        if self.schema.string_columns:
+            row = list(row)
+            for idx in self.schema.string_columns:
+                row[idx] = self.string_code(idx, row[idx])
+            row = tuple(row)
+
+        try:
+            self.chunk[self.chunk_row] = row
+        except (ValueError, TypeError) as error:
+            raise ValueError(f'Row {self.rows_recorded} does not fit the column types of the recording: '
+                             f'{error}') from error
+
+        self.chunk_row += 1
+        self.rows_recorded += 1
+        if self.chunk_row == self.chunk_rows:
+            self.write_chunk()
+
+        if self.rows_recorded >= self.recording_length:
+            self.finish_experiment(wait_till_complete=False)
+
+    def start_chunks(self, first_row):
+        schema = self.schema
+        if len(first_row) != len(schema.row_names):
+            raise ValueError(f'Recording started with {len(schema.row_names)} columns, '
+                             f'but the row has {len(first_row)} values')
+        schema.resolve_dtypes(first_row)
+        self.dictionaries = {idx: {} for idx in schema.string_columns}
+        self.writer.write_header(columnar_header(schema, self.title, self.header, self.compression))
+        self.chunk = np.empty(self.chunk_rows, dtype=schema.row_dtype)
+
+    def string_code(self, idx, value):
+        value = str(value)
+        dictionary = self.dictionaries[idx]
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+            self.new_dictionary_entries.setdefault(self.schema.row_names[idx], []).append(value)
+        return code
+
+    def write_chunk(self):
+        if self.chunk_row == 0:
+            return
+        self.writer.write_block(self.chunk[:self.chunk_row], self.new_dictionary_entries)
+        self.new_dictionary_entries = {}
+        # The full chunk now belongs to the writer thread
+        self.chunk = np.empty(self.chunk_rows, dtype=self.schema.row_dtype)
+        self.chunk_row = 0
+
+    def writer_statistics(self):
+        return self.writer.statistics() if self.writer is not None else None
+
+    def finish_experiment(self, wait_till_complete=True):
+        """:param wait_till_complete: Also for the recordings finished before without waiting (e.g. at rollovers)"""
+        if not self.recording_running:
+            if wait_till_complete:
+                self.wait_for_writers()
+            return
+        self.recording_running = False
+        if self.chunk is not None:
+            self.write_chunk()
+        self.writer.close(wait_till_complete=False)
+        self.finishing_writers.append(self.writer)
+        if wait_till_complete:
+            self.wait_for_writers()
+        dropped_rows = self.writer.queue.dropped_rows
+        print(f'\nFinished recording to {self.path} ({self.rows_recorded} rows'
+              + (f', {dropped_rows} dropped)' if dropped_rows else ')'))
+
+    def wait_for_writers(self):
+        for writer in self.finishing_writers:
+            writer.thread.join()
+        self.finishing_writers = []
+
+
+class ColumnarFileWriter:
+    """
+    Writes header, blocks and footer from a background thread, in the order they were submitted.
+    Blocks come through a bounded RecordingQueue; all blocks waiting are written with one write call.
+    encode_header, encode_block and encode_footer give the bytes of the file format.
+    """
+
+    def __init__(self, path=None, complete_rows=None, max_blocks=RECORDING_QUEUE_BLOCKS, policy=RECORDING_QUEUE_POLICY):
+        self.path = path
+        self.complete_rows = complete_rows  # Computes derived columns of a block, in this thread
+        self.queue = RecordingQueue(max_blocks, policy)
+
+        self.error = None  # Exception which stopped the writer thread
+        self.rows_written = 0
+        self.writes = 0
+        self.flush_time_s = 0.0
+        self.max_flush_time_s = 0.0
+
+        self.offset = 0  # In the file, of the next block
+        self.compression = COMPRESSION_NONE
+        self.time_column = None
+        self.blocks = []  # Footer index: [offset, rows] or [offset, rows, first time, last time]
+        self.dictionaries = {}  # All strings of dictionary encoded columns, in the footer for random access
+
+        self.thread = threading.Thread(target=self.run, name='columnar-recording-writer', daemon=True)
+        self.thread.start()
+
+    def open(self, path=None, complete_rows=None):
+        """
+        Creates the file from the writer thread now, before the first row - starting a recording never waits for the disk.
+        A writer created in advance (without path) gets its path and complete_rows here.
+        """
+        if path is not None:
+            self.path = path
+        if complete_rows is not None:
+            self.complete_rows = complete_rows
+        self.queue.put_control('open')
+
+    def write_header(self, header):
+        self.queue.put_control('header', header)
+
+    def write_block(self, rows, new_dictionary_entries):
+        self.queue.put_block(rows, new_dictionary_entries)
+
+    def close(self, wait_till_complete=True):
+        self.queue.put_control('close')
+        if wait_till_complete:
+            self.thread.join()
+
+    def statistics(self):
+        """Queue depth, dropped rows and flush latency, written into the footer and shown by the metrics endpoint."""
+        statistics = self.queue.statistics()
+        statistics.update({
+            'rows_written': self.rows_written,
+            'writes': self.writes,
+            'mean_flush_time_s': self.flush_time_s / self.writes if self.writes else 0.0,
+            'max_flush_time_s': self.max_flush_time_s,
+        })
+        return statistics
+
+    def open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, 'wb')
+
+    def run(self):
+        f = None  # Opened by open or with the header - no file remains of a recording finished before its first row
+        try:
+            while True:
+                data = []
+                closing = False
+                for kind, item in self.queue.get_all():
+                    if kind == 'open':
+                        f = self.open_file()
+                    elif kind == 'header':
+                        if f is None:
+                            f = self.open_file()
+                        data.append(self.encode_header(item))
+                        self.offset += len(data[-1])
+                    elif kind == 'block':
+                        rows, new_dictionary_entries = item
+                        if self.complete_rows is not None:
+                            rows = self.complete_rows(rows)
+                        data.append(self.encode_block(rows, new_dictionary_entries))
+                        self.offset += len(data[-1])
+                        self.rows_written += len(rows)
+                    elif kind == 'close':
+                        closing = True
+                        break
+
+                if data:
+                    time_start = time.perf_counter()
+                    f.write(b''.join(data))
+                    f.flush()
+                    flush_time = time.perf_counter() - time_start
+                    self.writes += 1
+                    self.flush_time_s += flush_time
+                    self.max_flush_time_s = max(self.max_flush_time_s, flush_time)
+
+                if closing:
+                    if f is not None and self.offset == 0:
+                        f.close()
+                        f = None
+                        os.remove(self.path)
+                    elif f is not None:
+                        f.write(self.encode_footer())
+                    break
+        except Exception as error:
+            self.error = error
+            self.queue.fail()
+            print(f'\nWriting recording {self.path} failed, further rows are dropped: {error!r}')
+            raise
+        finally:
+            if f is not None:
+                f.close()
+
+    def encode_header(self, header):
+        self.compression = header.get('compression', COMPRESSION_NONE)
+        self.time_column = header.get('time_column')
+        header = json.dumps(header).encode('utf-8')
+        return FILE_MAGIC + struct.pack('<I', len(header)) + header
+
+    def encode_block(self, rows, new_dictionary_entries):
+        block = [self.offset, len(rows)]
+        if self.time_column is not None and len(rows):
+            block += [float(rows[self.time_column][0]), float(rows[self.time_column][-1])]
+        self.blocks.append(block)
+        for name, strings in new_dictionary_entries.items():
+            self.dictionaries.setdefault(name, []).extend(strings)
+        return encode_block(rows, new_dictionary_entries, self.compression)
+
+    def encode_footer(self):
+        footer = json.dumps({'rows': self.rows_written, 'blocks': self.blocks, 'dictionaries': self.dictionaries,
+                             'writer': self.statistics()}).encode('utf-8')
+        return FOOTER_MAGIC + footer + END_STRUCT.pack(len(footer), END_MAGIC)
+
+
+def compression_functions(compression):
+    """(compress, decompress) of bytes; zstd and lz4 need the zstandard and lz4 packages, zlib is always available."""
+    if compression == 'zlib':
+        return (lambda data: zlib.compress(data, ZLIB_LEVEL)), zlib.decompress
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress, zstandard.ZstdDecompressor().decompress
+    if compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    raise ValueError(f"Unknown recording compression {compression}, use one of {COMPRESSIONS}")
+
+
+def encode_block(rows, new_dictionary_entries, compression=COMPRESSION_NONE):
+    dictionary_entries = json.dumps(new_dictionary_entries).encode('utf-8') if new_dictionary_entries else b''
+    if compression == COMPRESSION_NONE:
+        data = rows.tobytes()
+    else:
+        # Each column compressed on its own, so a reader decompresses only the columns it needs
+        compress, _ = compression_functions(compression)
+        columns = [compress(np.ascontiguousarray(rows[name]).tobytes()) for name in rows.dtype.names]
+        data = struct.pack(f'<{len(columns)}I', *(len(column) for column in columns)) + b''.join(columns)
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, len(rows), len(dictionary_entries), len(data)) + dictionary_entries + data
+
+
+def decode_block(data, dtype, rows, compression, names):
+    """Block data -> {name: array} of the columns in names."""
+    if compression == COMPRESSION_NONE:
+        block = np.frombuffer(data, dtype=dtype, count=rows)
+        return {name: block[name] for name in names}
+    _, decompress = compression_functions(compression)
+    lengths = struct.unpack_from(f'<{len(dtype.names)}I', data)
+    position = 4 * len(dtype.names)
+    columns = {}
+    for name, length in zip(dtype.names, lengths):
+        if name in names:
+            columns[name] = np.frombuffer(decompress(data[position:position + length]), dtype=dtype.fields[name][0], count=rows)
+        position += length
+    return columns
+
+
+def read_header(f):
+    magic = f.read(len(FILE_MAGIC))
+    if magic != FILE_MAGIC:
+        raise ValueError(f'{f.name} is not a columnar recording')
+    header_length, = struct.unpack('<I', f.read(4))
+    header = json.loads(f.read(header_length))
+    return header, len(FILE_MAGIC) + 4 + header_length
+
+
+def concatenate_columns(blocks, dtype, names):
+    return {name: np.concatenate([block[name] for block in blocks]) if blocks else np.empty(0, dtype=dtype.fields[name][0])
+            for name in names}
+
+
+def read_columnar_recording(path, columns=None):
+    """
+    :param columns: Names of columns to return, all if None
+    :return: ({column name: numpy array}, {column name: list of strings of dictionary encoded columns}, header dict)
+        header['footer'] is the footer dict (rows, blocks, writer statistics), None if the recording was not finished
+    """
+    with open(path, 'rb') as f:
+        header, position = read_header(f)
+        f.seek(0)
+        buffer = f.read()
+
+    dtype = np.dtype([(name, dtype) for name, dtype in header['columns']])
+    compression = header.get('compression', COMPRESSION_NONE)
+    names = dtype.names if columns is None else columns
+
+    dictionaries = {name: [] for name in header['dictionary_encoded']}
+    blocks = []
+    while buffer[position:position + len(BLOCK_MAGIC)] == BLOCK_MAGIC:
+        _, rows, dictionary_entries_length, data_length = BLOCK_HEADER.unpack_from(buffer, position)
+        position += BLOCK_HEADER.size
+        end = position + dictionary_entries_length + data_length
+        if end > len(buffer):
+            break  # Block cut off - recording was not finished
+        if dictionary_entries_length:
+            for name, strings in json.loads(buffer[position:position + dictionary_entries_length]).items():
+                dictionaries[name].extend(strings)
+        position += dictionary_entries_length
+        blocks.append(decode_block(memoryview(buffer)[position:end], dtype, rows, compression, names))
+        position = end
+
+    header['footer'] = read_footer(buffer, position)
+
+    data = {name: np.ascontiguousarray(column) for name, column in concatenate_columns(blocks, dtype, names).items()}
+    return data, {name: strings for name, strings in dictionaries.items() if name in data}, header
+
+
+def read_footer(buffer, position):
+    """Footer dict if it follows the last block at position, else None."""
+    if not buffer.endswith(END_MAGIC) or buffer[position:position + len(FOOTER_MAGIC)] != FOOTER_MAGIC:
+        return None
+    footer_length, _ = END_STRUCT.unpack_from(buffer, len(buffer) - END_STRUCT.size)
+    start = position + len(FOOTER_MAGIC)
+    if start + footer_length + END_STRUCT.size != len(buffer):
+        return None
+    return json.loads(buffer[start:start + footer_length])
+
+
+def read_footer_from_end(f):
+    """Footer dict read from the end of the file, without reading the blocks; None if the recording was not finished."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < END_STRUCT.size:
+        return None
+    f.seek(size - END_STRUCT.size)
+    footer_length, end_magic = END_STRUCT.unpack(f.read(END_STRUCT.size))
+    start = size - END_STRUCT.size - footer_length
+    if end_magic != END_MAGIC or start < len(FOOTER_MAGIC):
+        return None
+    f.seek(start - len(FOOTER_MAGIC))
+    if f.read(len(FOOTER_MAGIC)) != FOOTER_MAGIC:
+        return None
+    return json.loads(f.read(footer_length))
+
+
+def read_columnar_window(path, time_start=-np.inf, time_end=np.inf, columns=None):
+    """
+    Rows with time_start <= time <= time_end, reading and decompressing only the blocks (and, if compressed,
+    the columns) needed, with the time index of the footer. Unfinished recordings are read whole and filtered.
+    :return: as read_columnar_recording
+    """
+    with open(path, 'rb') as f:
+        header, _ = read_header(f)
+        time_column = header.get('time_column')
+        if time_column is None:
+            raise ValueError(f'{path} has no time column to select a window of')
+        footer = read_footer_from_end(f)
+        dtype = np.dtype([(name, dtype) for name, dtype in header['columns']])
+        names = list(dtype.names if columns is None else columns)
+        names_read = names if time_column in names else names + [time_column]
+
+        if footer is None or any(len(block) < 4 for block in footer['blocks']):
+            data, dictionaries, header = read_columnar_recording(path, names_read)
+        else:
+            compression = header.get('compression', COMPRESSION_NONE)
+            blocks = []
+            for offset, rows, block_time_start, block_time_end in footer['blocks']:
+                if block_time_end < time_start or block_time_start > time_end:
+                    continue
+                f.seek(offset)
+                _, _, dictionary_entries_length, data_length = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                f.seek(dictionary_entries_length, os.SEEK_CUR)
+                blocks.append(decode_block(f.read(data_length), dtype, rows, compression, names_read))
+            data = concatenate_columns(blocks, dtype, names_read)
+            dictionaries = {name: strings for name, strings in footer.get('dictionaries', {}).items() if name in data}
+            header['footer'] = footer
+
+    selected = (data[time_column] >= time_start) & (data[time_column] <= time_end)
+    data = {name: np.ascontiguousarray(data[name][selected]) for name in names}
+    return data, {name: strings for name, strings in dictionaries.items() if name in data}, header
@@ -0,0 +1,116 @@
+"""
+Diagnostic data of the controller in a fixed-layout numpy buffer, shared with the driver.
+
+A controller registers the buffer once, as its attribute diagnostic_buffer, and writes its values in place every step:
+
+    self.diagnostic_buffer = DiagnosticBuffer(['cost_component_angle', 'cost_component_position',
+                                               'optimizer_iterations', 'trajectory_final_position'])
+    ...
+    self.diagnostic_buffer.view(COST_COMPONENT_PREFIX)[:] = cost_components
+
+The layout (names, order, dtype) does not change afterwards, so the recording compiles it into its columns at start
+and takes the values as one slice per cycle, the live plot copies the cost components as one slice into its block -
+no dict is iterated and no array allocated in the control loop.
+Names are grouped by prefix: cost components, optimizer statistics, summary of the predicted trajectory.
+
+Controllers which only fill the dict controller_data_for_csv are wrapped in a ControllerDataBuffer,
+which copies the dict into a buffer of the same layout once per cycle (update), shared by the recording and the live plot.
+"""
+
+import numpy as np
+
+COST_COMPONENT_PREFIX = 'cost_component_'
+OPTIMIZER_PREFIX = 'optimizer_'
+TRAJECTORY_PREFIX = 'trajectory_'
+
+
+class DiagnosticBuffer:
+    def __init__(self, names, dtype=np.float64):
+        self.names = list(names)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError(f'Diagnostic names are not unique: {self.names}')
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        self.values = np.full(len(self.names), np.nan, dtype=dtype)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __setitem__(self, name, value):
+        self.values[self.index[name]] = value
+
+    def __getitem__(self, name):
+        return self.values[self.index[name]]
+
+    def group(self, prefix):
+        """Indices of the names with the prefix - a slice if they are contiguous, otherwise an index array."""
+        indices = [idx for idx, name in enumerate(self.names) if name.startswith(prefix)]
+        if not indices:
+            return slice(0, 0)
+        if indices[-1] - indices[0] + 1 == len(indices):
+            return slice(indices[0], indices[-1] + 1)
+        return np.array(indices)
+
+    def group_names(self, prefix, strip_prefix=False):
+        names = [name for name in self.names if name.startswith(prefix)]
+        return [name[len(prefix):] for name in names] if strip_prefix else names
+
+    def view(self, prefix):
+        """Writable view of a contiguous group, for the controller to fill."""
+        group = self.group(prefix)
+        if not isinstance(group, slice):
+            raise ValueError(f"Diagnostic names with prefix '{prefix}' are not contiguous: {self.names}")
+        return self.values[group]
+
+    def update(self):
+        """Called by the driver once per cycle, the controller has already written the values."""
+        pass
+
+    def as_dict(self):
+        """{name: value} for the csv recording."""
+        return dict(zip(self.names, self.values.tolist()))
+
+
+class ControllerDataBuffer(DiagnosticBuffer):
+    """Buffer with the keys of controller.controller_data_for_csv, filled from the dict by update."""
+
+    def __init__(self, controller):
+        super().__init__(controller.controller_data_for_csv.keys())
+        self.controller = controller  # The controller may replace its dict every step
+        self.names_tuple = tuple(self.names)  # Compared with the keys every cycle
+        self.stale = False  # The keys changed, the buffer is replaced at the next refresh (recording start)
+
+    def update(self):
+        controller_data = self.controller.controller_data_for_csv
+        if tuple(controller_data) != self.names_tuple:
+            # Values under other keys would land in the wrong columns
+            self.stale = True
+            self.values[:] = np.nan
+            return
+        values = self.values
+        for idx, value in enumerate(controller_data.values()):
+            try:
+                values[idx] = float(value)  # Also numpy and TF scalars
+            except (TypeError, ValueError):
+                values[idx] = np.nan  # Not a scalar, e.g. an array
+
+    def fits(self, controller):
+        return (controller is self.controller and not self.stale
+                and tuple(controller.controller_data_for_csv) == self.names_tuple)
+
+
+NO_DIAGNOSTICS = DiagnosticBuffer([])
+
+
+def diagnostic_buffer_of(controller, previous=None):
+    """
+    Buffer registered by the controller, or a ControllerDataBuffer of its controller_data_for_csv.
+    :param previous: Buffer returned before, kept if it still fits the controller (its recording columns stay valid)
+    """
+    buffer = getattr(controller, 'diagnostic_buffer', None)
+    if isinstance(buffer, DiagnosticBuffer):
+        return buffer
+    if not getattr(controller, 'controller_data_for_csv', None):
+        return NO_DIAGNOSTICS
+    if isinstance(previous, ControllerDataBuffer) and previous.fits(controller):
+        return previous
+    return ControllerDataBuffer(controller)
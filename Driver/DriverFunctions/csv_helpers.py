@@ -2,6 +2,8 @@ from datetime import datetime
 
 from globals import CONTROL_PERIOD_MS, PATH_TO_EXPERIMENT_RECORDINGS
 
+from DriverFunctions.timing_helper import LATENCY_VIOLATION_CAUSES, LOOP_STAGES
+
 
 def create_csv_title():
 
@@ -32,6 +34,8 @@ def create_csv_header():
         f"target_position: m",
         f"positionErr: m",
         f"Q: normed motor power",
+        f"latencyViolationCause: " + ", ".join(f"{code} {cause}" for code, cause in enumerate(LATENCY_VIOLATION_CAUSES)),
+        f"latencyViolationStage: " + ", ".join(f"{code} {stage}" for code, stage in enumerate(LOOP_STAGES)),
         f""
         f"Data:"
     ]
@@ -0,0 +1,59 @@
+"""
+Csv recordings written as the columnar ones - the default RECORDING_FORMAT without the costs of the control loop.
+
+CsvRecorder is the ColumnarRecorder (columnar_recording.py) with a writer thread which formats the chunks as csv text:
+rows come from the compiled RecordingSchema into the preallocated chunk, derived columns and the number formatting
+are done in the writer thread, the next file is opened by a spare writer created in advance.
+Finishing a recording only hands its last chunk to the writer - a rollover between the iterations of a protocol
+never waits for the disk.
+
+The file is as the csv recordings of DataManager: title and header lines starting with #, then the column names
+and one line per row; read it with recording_loader.load_recording.
+"""
+
+import csv
+import io
+
+import numpy as np
+
+from DriverFunctions.columnar_recording import COMPRESSION_NONE, ColumnarFileWriter, ColumnarRecorder
+
+CSV_RECORDING_EXTENSION = '.csv'
+
+
+class CsvRecorder(ColumnarRecorder):
+    def __init__(self, **recorder_parameters):
+        super().__init__(compression=COMPRESSION_NONE, **recorder_parameters)
+
+    def create_writer(self):
+        return CsvFileWriter(max_blocks=self.queue_blocks, policy=self.queue_policy)
+
+    @staticmethod
+    def recording_path(path):
+        return path if path.endswith(CSV_RECORDING_EXTENSION) else path + CSV_RECORDING_EXTENSION
+
+
+class CsvFileWriter(ColumnarFileWriter):
+    def encode_header(self, header):
+        self.names = [name for name, _ in header['columns']]
+        text = io.StringIO()
+        for line in [header['title']] + header['header']:
+            text.write(f'# {line}\n')
+        csv.writer(text, lineterminator='\n').writerow(self.names)
+        return text.getvalue().encode('utf-8')
+
+    def encode_block(self, rows, new_dictionary_entries):
+        for name, strings in new_dictionary_entries.items():
+            self.dictionaries.setdefault(name, []).extend(strings)
+        columns = []
+        for name in self.names:
+            if name in self.dictionaries:
+                columns.append(np.asarray(self.dictionaries[name], dtype=object)[rows[name]])
+            else:
+                columns.append(rows[name].astype(str))  # Shortest representation which reads back the same value
+        text = io.StringIO()
+        csv.writer(text, lineterminator='\n').writerows(zip(*columns))
+        return text.getvalue().encode('utf-8')
+
+    def encode_footer(self):
+        return b''
@@ -0,0 +1,80 @@
+"""
+Sparse event stream of a recording - experiment phase transitions, key presses and annotations.
+
+Rows of the recording only carry short categorical columns (protocol, phase, iteration, key code),
+the full description of the experiment protocol (its __str__) is formatted only when the phase changes
+and stored here, instead of in every row.
+
+Saved next to the recording as JSON lines (<recording>.events.jsonl), one event per line:
+    {"time": elapsed time of the driver (s), "row": index of the recording row, "event": kind, ...fields}
+The file is written as events happen (buffered, events are rare), so a crashed recording keeps most of them.
+"""
+
+import json
+import os
+
+from DriverFunctions.columnar_recording import COLUMNAR_RECORDING_EXTENSION
+
+EVENT_LOG_SIDECAR_SUFFIX = '.events.jsonl'
+
+
+def event_log_sidecar_path(recording_path):
+    root, extension = os.path.splitext(recording_path)
+    return (root if extension in ('.csv', COLUMNAR_RECORDING_EXTENSION) else recording_path) + EVENT_LOG_SIDECAR_SUFFIX
+
+
+class EventLog:
+    def __init__(self, path):
+        self.path = path
+        self.f = None  # Opened with the first event
+        self.number_of_events = 0
+
+        # Last recorded state of the experiment protocol, a change is logged as transition
+        self.protocol = None
+        self.phase = None
+        self.iteration = None
+        self.protocols = []  # All protocols of the recording, in order of appearance
+
+    def record(self, time, row, event, **fields):
+        if self.f is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.f = open(self.path, 'w')
+        self.f.write(json.dumps({'time': time, 'row': row, 'event': event, **fields}, default=str) + '\n')
+        self.number_of_events += 1
+
+    def check_transition(self, time, row, experiment_protocol):
+        """Logs a 'phase' event with the protocol description if protocol, phase or iteration changed."""
+        protocol = experiment_protocol.experiment_protocol_name
+        phase = experiment_protocol.current_experiment_phase
+        iteration = experiment_protocol.iteration
+        if protocol != self.protocol or phase != self.phase or iteration != self.iteration:
+            self.record(time, row, 'phase', protocol=protocol, phase=phase, iteration=iteration,
+                        previous_phase=self.phase, description=str(experiment_protocol))
+            self.protocol, self.phase, self.iteration = protocol, phase, iteration
+            if protocol not in self.protocols:
+                self.protocols.append(protocol)
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def load_event_log(path):
+    """Events of a sidecar (or of the recording at path) as list of dicts; empty if there is no sidecar."""
+    if not path.endswith(EVENT_LOG_SIDECAR_SUFFIX):
+        path = event_log_sidecar_path(path)
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Last line cut off - recording was not finished
+    return events
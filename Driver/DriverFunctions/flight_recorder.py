@@ -0,0 +1,136 @@
+"""
+Always-on flight recorder - the last FLIGHT_RECORDER_SECONDS of full-rate recording rows, kept in memory.
+
+Every cycle the row of the compiled RecordingSchema (same columns as the recordings) is written into
+a preallocated ring of the row dtype, so nothing has to be started before an interesting event.
+On a trigger the ring keeps running for FLIGHT_RECORDER_POST_TRIGGER_S (to see what followed), then it is
+copied and handed to the writer thread of a columnar recording - the control loop never waits for the disk.
+
+Triggers: safety switch, burst of latency violations, serial reconnect, exception in the control loop, key.
+Dumps are columnar recordings in PATH_TO_FLIGHT_RECORDINGS, read them with recording_loader.load_recording.
+"""
+
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from DriverFunctions.columnar_recording import ColumnarFileWriter, columnar_header, COLUMNAR_RECORDING_EXTENSION
+
+from globals import (CONTROL_PERIOD_MS, FLIGHT_RECORDER_SECONDS, FLIGHT_RECORDER_POST_TRIGGER_S,
+                     FLIGHT_RECORDER_COOLDOWN_S, PATH_TO_FLIGHT_RECORDINGS)
+
+FLIGHT_RECORDING_PREFIX = 'CPP_flight_'
+
+
+class FlightRecorder:
+    def __init__(self, driver, schema, seconds=FLIGHT_RECORDER_SECONDS, post_trigger_s=FLIGHT_RECORDER_POST_TRIGGER_S):
+        self.driver = driver
+        self.schema = schema
+        self.capacity = max(int(round(seconds * 1000.0 / CONTROL_PERIOD_MS)), 1)
+        self.post_trigger_cycles = int(round(post_trigger_s * 1000.0 / CONTROL_PERIOD_MS))
+
+        self.ring = None  # Preallocated with the row dtype known from the first row
+        self.rows_recorded = 0  # Total, the ring holds the last min(rows_recorded, capacity)
+        self.dictionaries = {}  # Row index -> {string: code}, kept for the whole session
+
+        self.dump_reasons = []  # Triggers of the pending dump
+        self.dump_details = []  # Header lines of the pending dump, e.g. the exception
+        self.dump_at_row = None  # The pending dump is taken when rows_recorded reaches it
+        self.triggered_at_row = None
+        self.time_last_dump = -np.inf
+        self.dumps = 0
+        self.writer = None  # Of the last dump, its thread may still be writing
+
+        # Last seen values of the counters which trigger a dump
+        self.violation_bursts = 0
+        self.reconnects = 0
+
+    def record(self):
+        row = self.schema.extract_row(self.driver)
+        if self.ring is None:
+            self.schema.resolve_dtypes(row)
+            self.dictionaries = {idx: {} for idx in self.schema.string_columns}
+            self.ring = np.empty(self.capacity, dtype=self.schema.row_dtype)
+
+        if self.schema.string_columns:
+            row = list(row)
+            for idx in self.schema.string_columns:
+                value = str(row[idx])
+                dictionary = self.dictionaries[idx]
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                row[idx] = code
+            row = tuple(row)
+
+        self.ring[self.rows_recorded % self.capacity] = row
+        self.rows_recorded += 1
+
+        self.check_triggers()
+        if self.dump_at_row is not None and self.rows_recorded >= self.dump_at_row:
+            self.dump()
+
+    def check_triggers(self):
+        th = self.driver.th
+        if th.violation_bursts != self.violation_bursts:
+            self.violation_bursts = th.violation_bursts
+            self.trigger('latency-violation-burst')
+        reconnects = getattr(self.driver.InterfaceInstance, 'reconnects', 0)
+        if reconnects != self.reconnects:
+            self.reconnects = reconnects
+            self.trigger('serial-reconnect')
+
+    def trigger(self, reason, immediately=False, details=None):
+        """
+        Schedules a dump after the post trigger time; triggers during the post trigger time join the same dump.
+        :param immediately: Dump now and wait till it is written (e.g. exception, the loop does not go on)
+        :param details: Line for the header of the dump
+        """
+        if self.ring is None:
+            return
+        if self.dump_at_row is None:
+            if time.perf_counter() - self.time_last_dump < FLIGHT_RECORDER_COOLDOWN_S and not immediately:
+                print(f'\nFlight recorder: {reason} ignored, last dump less than {FLIGHT_RECORDER_COOLDOWN_S} s ago')
+                return
+            self.dump_at_row = self.rows_recorded + self.post_trigger_cycles
+            self.triggered_at_row = self.rows_recorded
+            print(f'\nFlight recorder triggered: {reason}')
+        if reason not in self.dump_reasons:
+            self.dump_reasons.append(reason)
+        if details is not None:
+            self.dump_details.append(details)
+        if immediately:
+            self.dump(wait_till_complete=True)
+
+    def snapshot(self):
+        """Rows of the ring in chronological order, copied so the ring can go on."""
+        if self.rows_recorded <= self.capacity:
+            return self.ring[:self.rows_recorded].copy()
+        start = self.rows_recorded % self.capacity
+        return np.concatenate((self.ring[start:], self.ring[:start]))
+
+    def dump(self, wait_till_complete=False):
+        rows = self.snapshot()
+        rows_after_trigger = self.rows_recorded - self.triggered_at_row
+        reasons = '+'.join(self.dump_reasons)
+        details = self.dump_details
+        self.dump_reasons = []
+        self.dump_details = []
+        self.dump_at_row = None
+        self.time_last_dump = time.perf_counter()
+        self.dumps += 1
+
+        path = os.path.join(PATH_TO_FLIGHT_RECORDINGS,
+                            f"{FLIGHT_RECORDING_PREFIX}{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{reasons}{COLUMNAR_RECORDING_EXTENSION}")
+        dictionary_entries = {self.schema.row_names[idx]: list(dictionary)
+                              for idx, dictionary in self.dictionaries.items()}
+        writer = self.writer = ColumnarFileWriter(path, complete_rows=self.schema.complete_rows)
+        writer.write_header(columnar_header(self.schema, f'Flight recorder dump: {reasons}', [
+            f'Trigger: {reasons}',
+            f'Last {len(rows)} rows, {rows_after_trigger} of them after the trigger',
+        ] + details))
+        writer.write_block(rows, dictionary_entries)
+        writer.close(wait_till_complete=wait_till_complete)
+        print(f'\nFlight recorder dump ({len(rows)} rows) to {path}')
@@ -8,11 +8,16 @@ from CartPoleSimulation.CartPole._CartPole_mathematical_helpers import wrap_angl
 from CartPoleSimulation.CartPole.state_utilities import (ANGLE_IDX, ANGLE_COS_IDX, ANGLE_SIN_IDX, ANGLED_IDX,
                                                          POSITION_IDX, POSITIOND_IDX)
 
+from DriverFunctions.running_median import RunningMedian
+from DriverFunctions.velocity_estimators import create_velocity_estimator
+
 from globals import (ANGLE_DEVIATION, ANGLE_360_DEG_IN_ADC_UNITS,
                      ANGLE_NORMALIZATION_FACTOR, POSITION_NORMALIZATION_FACTOR,
                      CONTROL_PERIOD_MS,
                      TIMESTEPS_FOR_DERIVATIVE,
-                     ANGLE_D_MEDIAN_LEN, POSITION_D_MEDIAN_LEN)
+                     ANGLE_D_MEDIAN_LEN, POSITION_D_MEDIAN_LEN,
+                     VELOCITY_ESTIMATOR,
+                     ANGLE_SUBSAMPLES_ESTIMATOR, ANGLE_SUBSAMPLES_TRIM_FRACTION, ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC)
 
 
 class IncomingDataProcessor:
@@ -27,6 +32,7 @@ class IncomingDataProcessor:
         self.angle_raw_sensor = None
         self.angleD_raw_sensor = None
         self.invalid_steps = 0
+        self.angle_subsamples_rejected = 0
         self.freezme = 0
         self.position_raw = 0
         self.positionD_raw = 0
@@ -40,18 +46,23 @@ class IncomingDataProcessor:
         self.idx_for_derivative_calculation = 0
         self.idx_for_derivative_calculation_position = 0
 
-        self.angleD_buffer = np.zeros(ANGLE_D_MEDIAN_LEN, dtype=np.float32)  # Buffer for angle derivatives
-        self.positionD_buffer = np.zeros(POSITION_D_MEDIAN_LEN, dtype=np.float32)  # Buffer for position derivatives
-        self.angleD_median_buffer_index = 0
-        self.positionD_median_buffer_index = 0
+        # Sliding medians of differences, same results as np.median over a float32 buffer initialised with zeros
+        self.angleD_median = RunningMedian(ANGLE_D_MEDIAN_LEN, dtype=np.float32)
+        self.positionD_median = RunningMedian(POSITION_D_MEDIAN_LEN, dtype=np.float32)
+
+        # If None, velocities are the median filtered differences divided by time between measurements
+        self.velocity_estimator = create_velocity_estimator(VELOCITY_ESTIMATOR)
 
-    def load_state_data_from_chip(self, angle_raw, angleD_raw, invalid_steps, position_raw):
-        self.angle_raw = angle_raw
+    def load_state_data_from_chip(self, angle_raw, angleD_raw, invalid_steps, position_raw, angle_subsamples=None):
+        if angle_subsamples is None:
+            self.angle_raw = angle_raw
+        else:
+            self.angle_raw = self.angle_from_subsamples(angle_subsamples)
         self.angleD_raw = angleD_raw
         self.invalid_steps = invalid_steps
         self.position_raw = position_raw
 
-    def process_state_information(self, s, time_between_measurements_chip):
+    def process_state_information(self, s, time_between_measurements_chip, Q=0.0):
 
         # self.treat_deadangle_with_derivative()
 
@@ -64,11 +75,16 @@ class IncomingDataProcessor:
 
         angle, position, angle_difference, position_difference = self.convert_angle_and_position_skale()
 
-        angleDerivative, positionDerivative = self.calculate_first_derivatives(
-            angle_difference,
-            position_difference,
-            time_between_measurements_chip
-        )
+        if self.velocity_estimator is None:
+            angleDerivative, positionDerivative = self.calculate_first_derivatives(
+                angle_difference,
+                position_difference,
+                time_between_measurements_chip
+            )
+        else:
+            angleDerivative, positionDerivative = self.velocity_estimator.step(
+                angle, position, Q, time_between_measurements_chip
+            )
 
         # Pack the state into interface acceptable for the self.controller
         self.pack_features_into_state_variable(s, position, angle, positionDerivative, angleDerivative)
@@ -150,6 +166,37 @@ class IncomingDataProcessor:
         self.idx_for_derivative_calculation = (self.idx_for_derivative_calculation + 1) % (
                 TIMESTEPS_FOR_DERIVATIVE + 1)  # Move to next index, wrap around if necessary
 
+    def angle_from_subsamples(self, angle_subsamples):
+        """
+        Robust estimate of angle_raw from all raw ADC samples taken by the chip in the control period.
+        Samples far from the median (dead angle of the potentiometer, spikes) are rejected,
+        the rest is averaged with trimmed mean or median.
+        The result is wrapped as the chip wraps the angle it sends.
+        """
+        ADC_RANGE = ANGLE_360_DEG_IN_ADC_UNITS
+        samples = np.sort(np.asarray(angle_subsamples, dtype=np.float64))
+        if samples[-1] - samples[0] > ADC_RANGE / 2:
+            # Samples lie on both sides of the ADC range boundary - move the upper ones a full circle down
+            samples = np.sort(np.where(samples > ADC_RANGE / 2, samples - ADC_RANGE, samples))
+        n = samples.size
+        median = 0.5 * (samples[(n - 1) // 2] + samples[n // 2])
+
+        # Samples are sorted, so the kept ones are a contiguous slice
+        first = int(np.searchsorted(samples, median - ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC, 'left'))
+        last = int(np.searchsorted(samples, median + ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC, 'right'))
+        if first == last:
+            first, last = 0, n
+        self.angle_subsamples_rejected = n - (last - first)
+
+        if ANGLE_SUBSAMPLES_ESTIMATOR == 'median':
+            middle = first + last - 1
+            angle = 0.5 * (samples[middle // 2] + samples[(middle + 1) // 2])
+        else:
+            trim = int(ANGLE_SUBSAMPLES_TRIM_FRACTION * (last - first))
+            angle = samples[first + trim:last - trim].sum() / (last - first - 2 * trim)
+
+        return self.wrap_local(float(angle))
+
     def position_difference(self):
 
         # Calculate the index for the k-th past angle
@@ -165,21 +212,8 @@ class IncomingDataProcessor:
                 TIMESTEPS_FOR_DERIVATIVE + 1)  # Move to next index, wrap around if necessary
 
     def filter_differences(self):
-
-        # Update angleD buffer with current value
-        self.angleD_buffer[self.angleD_median_buffer_index] = self.angleD_raw
-        self.angleD_median_buffer_index = (self.angleD_median_buffer_index + 1) % ANGLE_D_MEDIAN_LEN
-
-        # Update positionD buffer with current value
-        self.positionD_buffer[self.positionD_median_buffer_index] = self.positionD_raw
-        self.positionD_median_buffer_index = (self.positionD_median_buffer_index + 1) % POSITION_D_MEDIAN_LEN
-
-        # Calculate medians using the updated buffers
-        angle_d_median = np.median(self.angleD_buffer)
-        position_d_median = np.median(self.positionD_buffer)
-
-        self.angleD_raw = angle_d_median
-        self.positionD_raw = position_d_median
+        self.angleD_raw = self.angleD_median.update(self.angleD_raw)
+        self.positionD_raw = self.positionD_median.update(self.positionD_raw)
 
     def convert_angle_and_position_skale(self):
         # Convert position and angle to physical units
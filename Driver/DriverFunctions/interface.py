@@ -1,8 +1,11 @@
 import serial
 import struct
 import time
+import numpy as np
 import pandas as pd
 
+from DriverFunctions.span_profiler import profiler
+
 PING_TIMEOUT            = 1.0       # Seconds
 CALIBRATE_TIMEOUT       = 10.0      # Seconds
 HARDWARE_EXPERIMENT_TIMEOUT = 30.0      # Seconds
@@ -23,6 +26,14 @@ CMD_STATE               = 0xCC
 CMD_SET_TARGET_EQUILIBRIUM = 0xCD
 CMD_RUN_HARDWARE_EXPERIMENT = 0xCE
 CMD_TRANSFER_BUFFERS    = 0xD1
+CMD_STREAM_ANGLE_SUBSAMPLES = 0xD2
+CMD_STATE_WITH_ANGLE_SUBSAMPLES = 0xD3
+ANGLE_SUBSAMPLES_MAX    = 32        # As ANGLE_SUBSAMPLES_MAX in communication_with_PC.h, the chip sends at most this many
+
+def check_angle_subsamples_count(subsamples_count):
+    # The chip would send min(averaging length, ANGLE_SUBSAMPLES_MAX) subsamples and the messages would not be parsed
+    if not 1 <= subsamples_count <= ANGLE_SUBSAMPLES_MAX:
+        raise ValueError(f'Angle subsamples count must be between 1 and {ANGLE_SUBSAMPLES_MAX}, got {subsamples_count}')
 
 def get_serial_port(chip_type="STM", serial_port_number=None):
 
@@ -83,6 +94,12 @@ class Interface:
 
         self.hardware_experiment_length = 0
 
+        self.reconnects = 0  # Reconnections after the chip stopped answering, each triggers the flight recorder
+        self.corrupted_frames = 0  # Dropped for a failed CRC or a content inconsistent with the request
+
+        self.angle_subsamples_count = 0  # If nonzero, chip sends this many raw angle samples with each state
+        self.angle_subsamples = None  # Raw angle samples (ADC units, oldest first) of the last state, if streamed
+
     def open(self, port, baud):
         self.port = port
         self.baud = baud
@@ -114,6 +131,20 @@ class Interface:
         self.device.write(bytearray(msg))
         self.clear_read_buffer()
 
+    def stream_angle_subsamples(self, en, subsamples_count):
+        """
+        Makes chip send all raw angle samples of the control period with the state.
+        subsamples_count must be the angle averaging length set with set_config_control (1 to ANGLE_SUBSAMPLES_MAX).
+        """
+        if en:
+            check_angle_subsamples_count(subsamples_count)
+        msg = [SERIAL_SOF, CMD_STREAM_ANGLE_SUBSAMPLES, 5, en]
+        msg.append(self._crc(msg))
+        self.device.write(bytearray(msg))
+        self.clear_read_buffer()
+        self.angle_subsamples_count = subsamples_count if en else 0
+        self.angle_subsamples = None
+
     def calibrate(self):
         msg = [SERIAL_SOF, CMD_CALIBRATE, 4]
         msg.append(self._crc(msg))
@@ -230,10 +261,11 @@ class Interface:
         return controlLoopPeriodMs, controlSync, angle_hanging, avgLen, correct_motor_dynamics
 
     def set_motor(self, speed):
-        msg  = [SERIAL_SOF, CMD_SET_MOTOR, 8]
-        msg += list(struct.pack('i', speed))
-        msg.append(self._crc(msg))
-        self.device.write(bytearray(msg))
+        with profiler.span('set_motor'):
+            msg  = [SERIAL_SOF, CMD_SET_MOTOR, 8]
+            msg += list(struct.pack('i', speed))
+            msg.append(self._crc(msg))
+            self.device.write(bytearray(msg))
 
     def set_target_position(self, target_position):
         msg  = [SERIAL_SOF, CMD_SET_TARGET_POSITION, 8]
@@ -256,10 +288,24 @@ class Interface:
 
     def read_state(self):
         self.clear_read_buffer()
-        message_length = 31
-        reply = self._receive_reply(CMD_STATE, message_length, READ_STATE_TIMEOUT)
-
-        (angle, angleD, position, target_position, command, invalid_steps, time_difference, time_current_measurement_chip, latency, latency_violation) = struct.unpack('=hfhfhB2I2H', bytes(reply[3:message_length-1]))
+        if self.angle_subsamples_count:
+            command_state = CMD_STATE_WITH_ANGLE_SUBSAMPLES
+            message_length = 32 + 2 * self.angle_subsamples_count
+        else:
+            command_state = CMD_STATE
+            message_length = 31
+        with profiler.span('receive_reply'):
+            reply = self._receive_reply(command_state, message_length, READ_STATE_TIMEOUT)
+            while self.angle_subsamples_count and reply[30] != self.angle_subsamples_count:
+                # Other number of subsamples than requested, the frame can not be trusted - as with a failed CRC
+                print('\nWrong angle subsamples count.')
+                self.corrupted_frames += 1
+                reply = self._receive_reply(command_state, message_length, READ_STATE_TIMEOUT)
+
+        with profiler.span('unpack_state'):
+            (angle, angleD, position, target_position, command, invalid_steps, time_difference, time_current_measurement_chip, latency, latency_violation) = struct.unpack('=hfhfhB2I2H', bytes(reply[3:30]))
+            if self.angle_subsamples_count:
+                self.angle_subsamples = np.frombuffer(bytes(reply[31:message_length-1]), dtype=np.int16)
 
         return angle, angleD, position, target_position, command, invalid_steps, time_difference/1e6, time_current_measurement_chip/1e6, latency/1e5, latency_violation
 
@@ -273,6 +319,7 @@ class Interface:
             if len(c) == 0:
                 if reconnect_at_timeout:
                     print('\n_receive_reply: no response; reconnecting.')
+                    self.reconnects += 1
                     self.device.close()
                     self.device = serial.Serial(self.port, baudrate=self.baud, timeout=timeout)
                     self.clear_read_buffer()
@@ -308,6 +355,7 @@ class Interface:
                 # Verify integrity of message
                 if crc and self.msg[cmdLen-1] != self._crc(self.msg[:cmdLen-1]):
                     print('\nCRC Failed.')
+                    self.corrupted_frames += 1
                     del self.msg[0]
                     continue
 
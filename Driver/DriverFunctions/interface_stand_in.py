@@ -0,0 +1,256 @@
+"""
+Stand-in for the serial Interface, used to run the driver without the robot.
+
+The stand-in exposes the same methods as Interface, but frames returned by read_state come either
+from a recording (scripted mode) or from a simple cartpole plant integrated on the host (simulated mode).
+It is meant for benchmarks and dry-runs of the driver loop, not for system identification -
+the plant is deliberately crude.
+With a VirtualClock each frame advances the clock by its time difference, so the driver loop runs
+faster than real time while the experiment protocols see the time of the plant (protocol_dry_run.py).
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from DriverFunctions.interface import check_angle_subsamples_count
+from DriverFunctions.timing_helper import VirtualClock
+
+from globals import (
+    CONTROL_PERIOD_MS,
+    ANGLE_DEVIATION, ANGLE_NORMALIZATION_FACTOR, ANGLE_360_DEG_IN_ADC_UNITS,
+    POSITION_NORMALIZATION_FACTOR, POSITION_ENCODER_RANGE,
+    MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES,
+    PLANT_CART_ACCELERATION_PER_Q, PLANT_CART_FRICTION,
+    PLANT_POLE_EFFECTIVE_LENGTH, PLANT_POLE_DAMPING,
+)
+
+# Simulated plant - rough numbers, angle is 0 upright and pi hanging; the model constants are in globals
+PLANT_GRAVITY = 9.81  # m/s^2
+PLANT_INTEGRATION_SUBSTEPS = 10
+PLANT_ANGLE_NOISE_ADC = 1.0  # std of the noise added to angle_raw, in ADC units
+CALIBRATION_DURATION_S = 5.0  # Time the robot takes to calibrate, only advances a VirtualClock
+
+
+class InterfaceStandIn:
+    def __init__(self, source='simulated', paced=False, seed=None, clock=time.perf_counter):
+        """
+        :param source: 'simulated' or a path to a recording with angle_raw, position_raw, deltaTimeMs columns
+        :param paced: If True read_state blocks until the next control period as the firmware would,
+                      otherwise frames are returned as fast as they are requested
+        :param clock: Host clock used for pacing and latency measurement,
+                      a VirtualClock is advanced by the frames instead (paced is ignored then)
+        """
+        self.source = source
+        self.clock = clock
+        self.virtual_clock = isinstance(clock, VirtualClock)
+        self.paced = paced and not self.virtual_clock
+        # Firmware latency is the time the host takes to answer a frame, for a VirtualClock still measured on the host
+        self.latency_clock = time.perf_counter if self.virtual_clock else clock
+        self.rng = np.random.default_rng(seed)
+
+        self.device = None
+        self.start = None
+        self.encoderDirection = 1
+        self.hardware_experiment_length = 0
+
+        self.control_period = CONTROL_PERIOD_MS / 1000.0
+        self.stream_on = False
+        self.firmware_control = False
+
+        self.motor_command = 0
+        self.target_position = 0.0
+        self.target_equilibrium = 0.0
+
+        self.angle_subsamples_count = 0
+        self.angle_subsamples = None
+
+        self.time_chip_us = 0
+        self.time_next_frame = None
+        self.time_last_frame_sent = None
+        self.firmware_latency = 0.0
+
+        self.frames_sent = 0
+
+        # Simulated plant state
+        self.angle = np.pi
+        self.angleD = 0.0
+        self.position = 0.0
+        self.positionD = 0.0
+        self.angle_raw_previous = None
+
+        # Scripted frames
+        self.script = None
+        if source != 'simulated':
+            self.load_script(source)
+
+    def load_script(self, path):
+        df = pd.read_csv(path, comment='#')
+        script = {
+            'angle_raw': df['angle_raw'].to_numpy(dtype=np.int64),
+            'position_raw': df['position_raw'].to_numpy(dtype=np.int64),
+            'deltaTimeMs': df['deltaTimeMs'].to_numpy(dtype=np.float64) if 'deltaTimeMs' in df
+            else np.full(len(df), CONTROL_PERIOD_MS, dtype=np.float64),
+            'invalid_steps': df['invalid_steps'].to_numpy(dtype=np.int64) if 'invalid_steps' in df
+            else np.zeros(len(df), dtype=np.int64),
+        }
+        if 'angleD_raw_sensor' in df:
+            script['angleD_raw'] = df['angleD_raw_sensor'].to_numpy(dtype=np.float64)
+        else:
+            script['angleD_raw'] = np.zeros(len(df), dtype=np.float64)
+        self.script = script
+
+    def open(self, port=None, baud=None):
+        self.device = 'stand-in'
+        self.time_next_frame = None
+
+    def close(self):
+        self.motor_command = 0
+        self.device = None
+
+    def clear_read_buffer(self):
+        pass
+
+    def ping(self):
+        return True
+
+    def stream_output(self, en):
+        self.stream_on = bool(en)
+
+    def stream_angle_subsamples(self, en, subsamples_count):
+        if en:
+            check_angle_subsamples_count(subsamples_count)
+        self.angle_subsamples_count = subsamples_count if en else 0
+        self.angle_subsamples = None
+
+    def calibrate(self):
+        if self.virtual_clock:
+            self.clock.advance(CALIBRATION_DURATION_S)
+        self.position = 0.0
+        self.positionD = 0.0
+        self.encoderDirection = 1
+        return True
+
+    def run_hardware_experiment(self):
+        print('Hardware experiments are not available with the interface stand-in.')
+        self.hardware_experiment_length = 0
+        return True
+
+    def control_mode(self, en):
+        self.firmware_control = bool(en)
+
+    def set_config_PID(self, setPoint, smoothing, position_KP, position_KI, position_KD, angle_KP, angle_KI, angle_KD):
+        pass
+
+    def get_config_PID(self):
+        return 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+
+    def set_config_control(self, controlLoopPeriodMs, controlSync, angle_hanging, avgLen, correct_motor_dynamics):
+        self.control_period = controlLoopPeriodMs / 1000.0
+
+    def get_config_control(self):
+        return int(self.control_period * 1000), True, 0.0, 1, False
+
+    def set_motor(self, speed):
+        self.motor_command = int(speed)
+        if self.time_last_frame_sent is not None:
+            self.firmware_latency = self.latency_clock() - self.time_last_frame_sent
+
+    def set_target_position(self, target_position):
+        self.target_position = target_position
+
+    def set_target_equilibrium(self, target_equilibrium):
+        self.target_equilibrium = target_equilibrium
+
+    def collect_raw_angle(self, lenght=100, interval_us=100):
+        angle_raw, _, _ = self.simulated_frame_raw()
+        return tuple([angle_raw] * lenght)
+
+    def read_state(self):
+        if self.paced:
+            self.wait_for_next_frame()
+
+        if self.script is None:
+            time_difference = self.control_period
+            self.plant_step(time_difference)
+            angle_raw, angleD_raw, position_raw = self.simulated_frame_raw()
+            invalid_steps = 0
+            if self.angle_subsamples_count:
+                self.angle_subsamples = self.simulated_angle_subsamples()
+        else:
+            idx = self.frames_sent % len(self.script['angle_raw'])
+            time_difference = self.script['deltaTimeMs'][idx] / 1000.0
+            angle_raw = int(self.script['angle_raw'][idx])
+            angleD_raw = float(self.script['angleD_raw'][idx])
+            position_raw = int(self.script['position_raw'][idx])
+            invalid_steps = int(self.script['invalid_steps'][idx])
+
+        # Chip time is an integer number of microseconds, as on the real firmware
+        time_difference_us = max(int(round(time_difference * 1e6)), 1)
+        self.time_chip_us += time_difference_us
+
+        self.frames_sent += 1
+        if self.virtual_clock:
+            self.clock.advance(time_difference_us / 1e6)
+            self.start = self.clock()
+        else:
+            self.start = time.time()
+        self.time_last_frame_sent = self.latency_clock()
+
+        return (angle_raw, angleD_raw, position_raw, self.target_position, self.motor_command, invalid_steps,
+                time_difference_us / 1e6, self.time_chip_us / 1e6, self.firmware_latency, 0)
+
+    def wait_for_next_frame(self):
+        now = self.clock()
+        if self.time_next_frame is None or now - self.time_next_frame > self.control_period:
+            # First frame or we are lagging by more than a period - resynchronize instead of bursting frames
+            self.time_next_frame = now
+        else:
+            while now < self.time_next_frame:
+                time.sleep(max(self.time_next_frame - now - 0.0005, 0.0))
+                now = self.clock()
+        self.time_next_frame += self.control_period
+
+    def plant_step(self, dt):
+        Q = self.motor_command / MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES
+        dt_sub = dt / PLANT_INTEGRATION_SUBSTEPS
+        for _ in range(PLANT_INTEGRATION_SUBSTEPS):
+            positionDD = PLANT_CART_ACCELERATION_PER_Q * Q - PLANT_CART_FRICTION * self.positionD
+            angleDD = (PLANT_GRAVITY * np.sin(self.angle) - positionDD * np.cos(self.angle)) / PLANT_POLE_EFFECTIVE_LENGTH \
+                      - PLANT_POLE_DAMPING * self.angleD
+            # Semi-implicit Euler
+            self.positionD += positionDD * dt_sub
+            self.position += self.positionD * dt_sub
+            self.angleD += angleDD * dt_sub
+            self.angle += self.angleD * dt_sub
+
+        # Cart hits the end of the track
+        position_limit = POSITION_ENCODER_RANGE / 2 * POSITION_NORMALIZATION_FACTOR
+        if abs(self.position) > position_limit:
+            self.position = np.sign(self.position) * position_limit
+            self.positionD = 0.0
+
+    def simulated_angle_subsamples(self):
+        angle_raw = self.angle / ANGLE_NORMALIZATION_FACTOR - float(ANGLE_DEVIATION)
+        samples = angle_raw + self.rng.normal(0.0, PLANT_ANGLE_NOISE_ADC, self.angle_subsamples_count)
+        return (np.round(samples).astype(np.int64) % int(ANGLE_360_DEG_IN_ADC_UNITS)).astype(np.int16)
+
+    def simulated_frame_raw(self):
+        angle_raw = self.angle / ANGLE_NORMALIZATION_FACTOR - float(ANGLE_DEVIATION)
+        angle_raw += self.rng.normal(0.0, PLANT_ANGLE_NOISE_ADC)
+        angle_raw = int(round(angle_raw)) % int(ANGLE_360_DEG_IN_ADC_UNITS)
+
+        if self.angle_raw_previous is None:
+            angleD_raw = 0.0
+        else:
+            angleD_raw = float(angle_raw - self.angle_raw_previous)
+            if angleD_raw >= ANGLE_360_DEG_IN_ADC_UNITS / 2:
+                angleD_raw -= ANGLE_360_DEG_IN_ADC_UNITS
+            elif angleD_raw <= -ANGLE_360_DEG_IN_ADC_UNITS / 2:
+                angleD_raw += ANGLE_360_DEG_IN_ADC_UNITS
+        self.angle_raw_previous = angle_raw
+
+        position_raw = int(round(self.position / POSITION_NORMALIZATION_FACTOR))
+
+        return angle_raw, angleD_raw, position_raw
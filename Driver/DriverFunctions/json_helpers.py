@@ -16,9 +16,16 @@ def get_max_number_in_filename(filedirectory):
             max_val = val
     return max_val
 
-def get_new_json_filename(controllername, filedirectory = JSON_PATH):
-    previd = get_max_number_in_filename(filedirectory)
-    id = previd + 1
-    id_str = str(id)
-    new_filename = filedirectory + 'control' + '_' + controllername + '-' + id_str + '.json'
-    return new_filename
+def get_new_json_filename(controllername, filedirectory = JSON_PATH, catalog=None):
+    """:param catalog: RecordingCatalog (that of MainLoggingManager) counting the files, None - the directory is scanned"""
+    if catalog is None:
+        id = get_max_number_in_filename(filedirectory) + 1
+        return filedirectory + 'control' + '_' + controllername + '-' + str(id) + '.json'
+
+    # Counter in the recording catalog, the directory is scanned only to start it
+    while True:
+        id = catalog.next_id('json:' + os.path.abspath(filedirectory), lambda: get_max_number_in_filename(filedirectory))
+        id_str = str(id)
+        new_filename = filedirectory + 'control' + '_' + controllername + '-' + id_str + '.json'
+        if not os.path.exists(new_filename):  # Not created outside of the counter
+            return new_filename
@@ -14,6 +14,7 @@ class KeyboardController:
 
         self.driver = driver
         self.key_actions = {}
+        self.key_pressed = 0  # Code (ord) of the key pressed in the current cycle, 0 if none; recorded as keyPressed
 
         self.assign_actions_to_keys()
 
@@ -45,6 +46,8 @@ class KeyboardController:
             'l': (self.driver.mlm.recording_on_off, "Start/Stop recording to a CSV file"),
             'L': (lambda: self.driver.mlm.recording_on_off(time_limited_recording=True),
                   "Start/Stop time limited recording to a CSV file"),
+            'f': (lambda: self.driver.mlm.trigger_flight_recorder('key'),
+                  "Dump flight recorder - the last seconds of full-rate data, without recording running"),
 
             ##### Real Time Data Vizualization #####
             '6': (self.driver.mlm.live_plotter_sender.on_off,
@@ -74,6 +77,9 @@ class KeyboardController:
                 lambda: self.driver.idp.change_additional_latency(change_direction="decrease"),
                 "Decrease additional latency"),
 
+            ##### Profiling  #####
+            'p': (self.driver.th.export_trace, "Export profiler trace of the last control cycles (Chrome trace JSON)"),
+
             ##### Joystick  #####
             'j': (lambda: self.driver.joystick.toggle_mode(self.driver.log), "Joystick On/Off"),
 
@@ -97,9 +103,13 @@ class KeyboardController:
 
     def keyboard_input(self):
 
-        if self.kbAvailable & self.kb.kbhit():
+        self.key_pressed = 0
+        if self.kbAvailable and self.kb.kbhit():
 
             c = self.kb.getch()
+            self.key_pressed = ord(c)
+            self.driver.mlm.log_event('key', key=c,
+                                      description=self.key_actions[c][1] if c in self.key_actions else 'Key not assigned')
             try:
                 self.driver.controller.keyboard_input(c)
             except AttributeError:
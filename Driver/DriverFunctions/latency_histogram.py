@@ -0,0 +1,257 @@
+"""
+HDR-style (high dynamic range) latency histograms with log-linear buckets, mergeable across recordings.
+
+Values are recorded as integer microseconds. Buckets double in width from one power of two to the next
+and each is split into the same number of linear sub-buckets, so every value is stored with a relative error
+below 10^-significant_digits over the whole range, e.g. 1% from microseconds to seconds with 2 digits,
+in ~2300 counters. Indexing follows HdrHistogram (Gil Tene), recording a value costs a few integer operations.
+
+Histograms with the same range and precision merge by adding the counts, which is exact -
+p99 over many sessions is computed from the merged counts, without loading the recordings.
+
+The histograms of a recording are saved next to it as a small JSON sidecar (<recording>.latency.json)
+with sparse [index, count] pairs.
+"""
+
+import copy
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from DriverFunctions.columnar_recording import COLUMNAR_RECORDING_EXTENSION
+
+from globals import LATENCY_HISTOGRAM_HIGHEST_S, LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS
+
+LATENCY_HISTOGRAM_FORMAT = 'hdr-log-linear-us-v1'
+LATENCY_HISTOGRAM_SIDECAR_SUFFIX = '.latency.json'
+
+# Histogram name -> csv column and factor to seconds, to build histograms from recordings which have no sidecar
+LATENCY_HISTOGRAM_COLUMNS = {
+    'delta_time': ('deltaTimeMs', 0.001),
+    'firmware_latency': ('latency', 1.0),
+    'python_latency': ('pythonLatency', 1.0),
+    'controller_steptime': ('controller_steptime', 1.0),
+}
+
+
+class LatencyHistogram:
+    def __init__(self, highest_s=LATENCY_HISTOGRAM_HIGHEST_S, significant_digits=LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError(f'Significant digits must be between 1 and 5, got {significant_digits}')
+        self.highest_s = highest_s
+        self.significant_digits = significant_digits
+        self.highest_us = max(int(math.ceil(highest_s * 1e6)), 2)
+
+        # Sub-buckets per bucket, enough to resolve 10^significant_digits values at the bottom of each bucket
+        self.sub_bucket_count_magnitude = int(math.ceil(math.log2(2 * 10 ** significant_digits)))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+
+        bucket_count = 1
+        smallest_untrackable_value = self.sub_bucket_count
+        while smallest_untrackable_value <= self.highest_us:
+            smallest_untrackable_value <<= 1
+            bucket_count += 1
+        self.bucket_count = bucket_count
+        self.counts_length = (bucket_count + 1) * self.sub_bucket_half_count
+
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.counts_length
+        self.total_count = 0
+        self.sum_us = 0
+        self.min_us = None
+        self.max_us = None
+        self.clipped = 0  # Values above highest_s, counted at highest_s
+
+    def same_layout(self, other):
+        return self.highest_us == other.highest_us and self.significant_digits == other.significant_digits
+
+    def counts_index(self, value_us):
+        bucket_index = (value_us | self.sub_bucket_mask).bit_length() - self.sub_bucket_count_magnitude
+        sub_bucket_index = value_us >> bucket_index
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+
+    def record(self, value_s):
+        value_us = int(value_s * 1e6 + 0.5)
+        if value_us < 0:
+            value_us = 0
+        elif value_us > self.highest_us:
+            value_us = self.highest_us
+            self.clipped += 1
+        self.counts[self.counts_index(value_us)] += 1
+        self.total_count += 1
+        self.sum_us += value_us
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+        if self.max_us is None or value_us > self.max_us:
+            self.max_us = value_us
+
+    def record_many(self, values_s):
+        values_s = np.asarray(values_s, dtype=np.float64)
+        values_us = np.clip(np.round(values_s[np.isfinite(values_s)] * 1e6), 0, None).astype(np.int64)
+        if not len(values_us):
+            return
+        self.clipped += int(np.count_nonzero(values_us > self.highest_us))
+        values_us = np.minimum(values_us, self.highest_us)
+        bucket_index = np.floor(np.log2(values_us | self.sub_bucket_mask)).astype(np.int64) + 1 - self.sub_bucket_count_magnitude
+        sub_bucket_index = values_us >> bucket_index
+        indices = ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+        counts = np.bincount(indices, minlength=self.counts_length)
+        self.counts = (np.asarray(self.counts, dtype=np.int64) + counts).tolist()
+        self.total_count += len(values_us)
+        self.sum_us += int(values_us.sum())
+        low, high = int(values_us.min()), int(values_us.max())
+        self.min_us = low if self.min_us is None else min(self.min_us, low)
+        self.max_us = high if self.max_us is None else max(self.max_us, high)
+
+    def lowest_equivalent_value_us(self, index):
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        return sub_bucket_index << bucket_index
+
+    def highest_equivalent_value_us(self, index):
+        bucket_index = max((index >> self.sub_bucket_half_count_magnitude) - 1, 0)
+        return self.lowest_equivalent_value_us(index) + (1 << bucket_index) - 1
+
+    def merge(self, other):
+        """Adds the counts of other to this histogram, returns self."""
+        if not self.same_layout(other):
+            raise ValueError('Only histograms with the same highest value and significant digits can be merged, '
+                             f'got ({self.highest_s} s, {self.significant_digits}) and ({other.highest_s} s, {other.significant_digits})')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total_count += other.total_count
+        self.sum_us += other.sum_us
+        self.clipped += other.clipped
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+        return self
+
+    def copy(self):
+        # Same layout, only the counts are not shared - cheap enough for the control loop at a recording rollover
+        histogram = copy.copy(self)
+        histogram.counts = list(self.counts)
+        return histogram
+
+    def value_at_percentile(self, percentile):
+        """In seconds, the highest value equivalent (within precision) to the value at the percentile, as HdrHistogram."""
+        if self.total_count == 0:
+            return math.nan
+        if percentile >= 100.0:
+            return self.max_us / 1e6
+        count_at_percentile = max(int(math.ceil(percentile / 100.0 * self.total_count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), count_at_percentile))
+        return min(self.highest_equivalent_value_us(index), self.max_us) / 1e6
+
+    def mean(self):
+        return self.sum_us / self.total_count / 1e6 if self.total_count else math.nan
+
+    def summary(self, percentiles=(50.0, 90.0, 99.0, 99.9)):
+        summary = {'count': self.total_count, 'mean': self.mean()}
+        summary.update({f'p{percentile:g}': self.value_at_percentile(percentile) for percentile in percentiles})
+        summary['max'] = self.max_us / 1e6 if self.max_us is not None else math.nan
+        return summary
+
+    def to_dict(self):
+        return {
+            'highest_s': self.highest_s,
+            'significant_digits': self.significant_digits,
+            'total_count': self.total_count,
+            'sum_us': self.sum_us,
+            'min_us': self.min_us,
+            'max_us': self.max_us,
+            'clipped': self.clipped,
+            'counts': [[index, count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['highest_s'], data['significant_digits'])
+        for index, count in data['counts']:
+            histogram.counts[index] = count
+        histogram.total_count = data['total_count']
+        histogram.sum_us = data['sum_us']
+        histogram.min_us = data['min_us']
+        histogram.max_us = data['max_us']
+        histogram.clipped = data.get('clipped', 0)
+        return histogram
+
+
+def create_latency_histograms():
+    return {name: LatencyHistogram() for name in LATENCY_HISTOGRAM_COLUMNS}
+
+
+def merge_latency_histograms(histograms_list):
+    """List of {name: LatencyHistogram} -> {name: merged LatencyHistogram}, inputs are not modified."""
+    merged = {}
+    for histograms in histograms_list:
+        for name, histogram in histograms.items():
+            if name in merged:
+                merged[name].merge(histogram)
+            else:
+                merged[name] = histogram.copy()
+    return merged
+
+
+def latency_histograms_sidecar_path(recording_path):
+    root, extension = os.path.splitext(recording_path)
+    return (root if extension in ('.csv', COLUMNAR_RECORDING_EXTENSION) else recording_path) + LATENCY_HISTOGRAM_SIDECAR_SUFFIX
+
+
+def save_latency_histograms(histograms, path, metadata=None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'format': LATENCY_HISTOGRAM_FORMAT,
+            'metadata': metadata or {},
+            'histograms': {name: histogram.to_dict() for name, histogram in histograms.items()},
+        }, f, separators=(',', ':'))
+
+
+def save_latency_histograms_async(histograms, path, metadata=None, executor=None):
+    """
+    Copies the histograms (so recording can go on or be reset) and writes them from a background thread.
+    :param executor: Its thread is used instead of starting one (which waits until the new thread runs)
+    """
+    snapshot = {name: histogram.copy() for name, histogram in histograms.items()}
+    if executor is not None:
+        executor.submit(save_latency_histograms, snapshot, path, metadata)
+    else:
+        threading.Thread(target=save_latency_histograms, args=(snapshot, path, metadata), daemon=True).start()
+
+
+def load_latency_histograms(path):
+    """Returns ({name: LatencyHistogram}, metadata)."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('format') != LATENCY_HISTOGRAM_FORMAT:
+        raise ValueError(f"Unknown latency histogram format {data.get('format')} in {path}")
+    histograms = {name: LatencyHistogram.from_dict(histogram) for name, histogram in data['histograms'].items()}
+    return histograms, data.get('metadata', {})
+
+
+def latency_histograms_from_recording(recording):
+    """Builds the histograms from the columns of a recording (DataFrame or path), for recordings without sidecar."""
+    import pandas as pd
+    from DriverFunctions.recording_loader import load_recording
+    if not isinstance(recording, pd.DataFrame):
+        recording = load_recording(recording)
+    histograms = {}
+    for name, (column, factor) in LATENCY_HISTOGRAM_COLUMNS.items():
+        if column in recording:
+            histogram = LatencyHistogram()
+            histogram.record_many(recording[column].dropna().to_numpy(dtype=np.float64) * factor)
+            histograms[name] = histogram
+    return histograms
@@ -0,0 +1,163 @@
+"""
+Batched and decimated sending to the live plotter - a slow or stalled live plotter never slows the control loop.
+
+LivePlotter_Sender sends every row with a blocking send on its connection, a busy receiver (remote server, GUI)
+makes the control loop wait. BatchedLivePlotterSender has the same interface, but send_data only copies the row
+into a preallocated block. Every LIVE_PLOTTER_BATCH_ROWS rows, or when the batch is LIVE_PLOTTER_BATCH_MS old,
+the filled rows are handed to a sender thread through a RecordingQueue with a single place and policy 'drop-oldest':
+if the thread is still busy, the batch waiting for it is dropped for the newer one - the plot skips data, the loop never waits.
+
+The thread can decimate a batch: each LIVE_PLOTTER_DECIMATION rows are reduced to two rows holding the minimum and
+the maximum of each column, in the order they occurred - spikes stay visible with a fraction of the rows.
+Headers and the commands of the keyboard (on/off, save, reset) go through the same queue, in order with the data.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from DriverFunctions.recording_queue import RecordingQueue
+
+from globals import LIVE_PLOTTER_BATCH_ROWS, LIVE_PLOTTER_BATCH_MS, LIVE_PLOTTER_DECIMATION, LIVE_PLOTTER_SEND_BLOCKS
+
+CLOSE_TIMEOUT_S = 2.0  # Waiting for the sender thread at quit, it may be stuck in a send
+
+
+def decimate_min_max(rows, bucket_rows, time_column=0):
+    """
+    Each bucket_rows rows -> two rows: per column min and max, the one which occurred first in the first row.
+    The time column gets the first and last time of the bucket. Rows of an incomplete last bucket are kept as they are.
+    """
+    full = len(rows) // bucket_rows * bucket_rows
+    if bucket_rows <= 2 or full == 0:
+        return rows
+    buckets = rows[:full].reshape(-1, bucket_rows, rows.shape[1])
+    idx_min = buckets.argmin(axis=1)[:, np.newaxis, :]
+    idx_max = buckets.argmax(axis=1)[:, np.newaxis, :]
+    mins = np.take_along_axis(buckets, idx_min, axis=1)[:, 0, :]
+    maxs = np.take_along_axis(buckets, idx_max, axis=1)[:, 0, :]
+    min_first = idx_min[:, 0, :] <= idx_max[:, 0, :]
+
+    decimated = np.empty((2 * len(buckets), rows.shape[1]), dtype=rows.dtype)
+    decimated[0::2] = np.where(min_first, mins, maxs)
+    decimated[1::2] = np.where(min_first, maxs, mins)
+    decimated[0::2, time_column] = buckets[:, 0, time_column]
+    decimated[1::2, time_column] = buckets[:, -1, time_column]
+    return np.concatenate((decimated, rows[full:]))
+
+
+class BatchedLivePlotterSender:
+    def __init__(self, sender, batch_rows=LIVE_PLOTTER_BATCH_ROWS, batch_ms=LIVE_PLOTTER_BATCH_MS,
+                 decimation=LIVE_PLOTTER_DECIMATION, send_blocks=LIVE_PLOTTER_SEND_BLOCKS):
+        """
+        :param sender: LivePlotter_Sender, used only from the sender thread
+        :param decimation: Rows reduced to their min and max, 0 - no decimation
+        :param send_blocks: Send a batch as one 2D array (the live plotter server has to accept it), otherwise row by row
+        """
+        self.sender = sender
+        self.batch_rows = max(int(batch_rows), 1)
+        self.batch_s = batch_ms / 1000.0
+        self.decimation = int(decimation)
+        self.send_blocks = send_blocks
+        self.queue = RecordingQueue(1, 'drop-oldest')
+
+        self.block = None  # Preallocated with the width of the first row
+        self.rows = 0
+        self.time_batch_start = 0.0
+        self.headers_queued = False  # Until the thread has sent them
+
+        self.batches_sent = 0
+        self.rows_sent = 0  # After decimation
+
+        self.thread = threading.Thread(target=self.run, name='live-plotter-sender', daemon=True)
+        self.thread.start()
+
+    @property
+    def connection_ready(self):
+        return self.sender.connection_ready
+
+    @property
+    def headers_sent(self):
+        return self.headers_queued or self.sender.headers_sent
+
+    def send_headers(self, headers):
+        self.headers_queued = True
+        self.block = None
+        self.rows = 0
+        self.queue.put_control('headers', list(headers))
+
+    def send_data(self, row, diagnostics=None):
+        """:param diagnostics: Array appended to the row, copied into the block as one slice"""
+        width = len(row) if diagnostics is None else len(row) + len(diagnostics)
+        if self.block is None or width != self.block.shape[1]:
+            self.block = np.empty((self.batch_rows, width))
+            self.rows = 0
+        if self.rows == 0:
+            self.time_batch_start = time.perf_counter()
+        if diagnostics is None:
+            self.block[self.rows] = row
+        else:
+            self.block[self.rows, :len(row)] = row
+            self.block[self.rows, len(row):] = diagnostics
+        self.rows += 1
+        if self.rows >= self.batch_rows or time.perf_counter() - self.time_batch_start >= self.batch_s:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.queue.put_block(self.block[:self.rows].copy(), {})
+            self.rows = 0
+
+    def command(self, name):
+        self.flush()  # The command comes after the rows sent before it
+        self.queue.put_control('command', name)
+
+    def on_off(self):
+        self.command('on_off')
+
+    def save_data_and_figure_if_connected(self):
+        self.command('save_data_and_figure_if_connected')
+
+    def reset_if_connected(self):
+        self.command('reset_if_connected')
+
+    def close(self):
+        self.flush()
+        self.queue.put_control('close')
+        self.thread.join(CLOSE_TIMEOUT_S)
+
+    def statistics(self):
+        statistics = self.queue.statistics()
+        statistics.update({'batches_sent': self.batches_sent, 'rows_sent': self.rows_sent})
+        return statistics
+
+    def run(self):
+        while True:
+            for kind, item in self.queue.get_all():
+                try:
+                    if kind == 'block':
+                        if not (self.sender.connection_ready and self.sender.headers_sent):
+                            continue
+                        rows = item[0]
+                        if self.decimation:
+                            rows = decimate_min_max(rows, self.decimation)
+                        if self.send_blocks:
+                            self.sender.send_data(rows)
+                        else:
+                            for row in rows:
+                                self.sender.send_data(row)
+                        self.batches_sent += 1
+                        self.rows_sent += len(rows)
+                    elif kind == 'headers':
+                        self.sender.send_headers(item)
+                        self.headers_queued = False
+                    elif kind == 'command':
+                        getattr(self.sender, item)()
+                    elif kind == 'close':
+                        self.sender.close()
+                        return
+                except Exception as error:
+                    if kind == 'headers':
+                        self.headers_queued = False
+                    print(f'\nLive plotter sender: {kind} failed: {error!r}')
@@ -1,95 +1,166 @@
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
 import numpy as np
-from SI_Toolkit.Functions.FunctionalDict import FunctionalDict
 from SI_Toolkit.LivePlotter.live_plotter_sender import LivePlotter_Sender
 from SI_Toolkit.Functions.General.TerminalContentManager import TerminalContentManager
 
 from CartPoleSimulation.CartPole.state_utilities import ANGLE_IDX, ANGLE_COS_IDX, ANGLE_SIN_IDX, ANGLED_IDX, \
     POSITION_IDX, POSITIOND_IDX
 
-from CartPoleSimulation.CartPole.data_manager import DataManager
 from CartPoleSimulation.CartPole.csv_logger import create_csv_file_name
 from DriverFunctions.csv_helpers import create_csv_header, create_csv_title
+from DriverFunctions.columnar_recording import ColumnarRecorder
+from DriverFunctions.csv_recording import CsvRecorder
+from DriverFunctions.recording_schema import Column, DerivedColumn, RecordingSchema, STRING_DTYPE, check_columns
+from DriverFunctions.flight_recorder import FlightRecorder
+from DriverFunctions.live_plot_batching import BatchedLivePlotterSender
+from DriverFunctions.controller_diagnostics import COST_COMPONENT_PREFIX, diagnostic_buffer_of
+from DriverFunctions.terminal_dashboard import TerminalDashboard
+from DriverFunctions.event_log import EventLog, event_log_sidecar_path
+from DriverFunctions.latency_histogram import latency_histograms_sidecar_path, save_latency_histograms_async
+from DriverFunctions.recording_catalog import RecordingCatalog
+from DriverFunctions.json_helpers import get_new_json_filename
 
 from globals import (
-    CONTROLLER_NAME, CONTROL_PERIOD_MS, PRINT_PERIOD_MS, CONTROL_SYNC,
-    PATH_TO_EXPERIMENT_RECORDINGS, TIME_LIMITED_RECORDING_LENGTH,
+    CONTROLLER_NAME, CONTROL_PERIOD_MS,
+    PATH_TO_EXPERIMENT_RECORDINGS, TIME_LIMITED_RECORDING_LENGTH, LATENCY_HISTOGRAMS_SIDECAR, RECORDING_FORMAT,
+    EVENT_LOG_SIDECAR, RECORD_MEASUREMENT_DESCRIPTION, FLIGHT_RECORDER_ENABLED, RECORDING_CATALOG_ENABLED, CHIP, MOTOR,
     DEFAULT_ADDRESS, LIVE_PLOTTER_USE_REMOTE_SERVER, LIVE_PLOTTER_REMOTE_USERNAME, LIVE_PLOTTER_REMOTE_IP
 )
 
 
+# Variables logged when recording is on, as expressions of the driver - just add a new column here and it will be logged
+# Indices and other constants are put into the expressions as values (f-strings), the expressions use only driver
+# The columnar recording compiles them into one row extractor (recording_schema.py),
+# derived columns are computed from other columns for whole chunks when the chunk is written
+RECORDED_COLUMNS = {
+    'time': Column('driver.th.elapsedTime'),
+    'deltaTimeMs': Column('driver.th.time_between_measurements_chip * 1000'),
+
+    'angle_raw': Column('driver.idp.angle_raw'),
+    'angleD_raw': Column('driver.idp.angleD_raw'),
+    'angle': Column(f'driver.s[{ANGLE_IDX}]', 'f4'),
+    'angleD': Column(f'driver.s[{ANGLED_IDX}]', 'f4'),
+    'angle_cos': Column(f'driver.s[{ANGLE_COS_IDX}]', 'f4'),
+    'angle_sin': Column(f'driver.s[{ANGLE_SIN_IDX}]', 'f4'),
+    'position_raw': Column('driver.idp.position_raw', 'i8'),
+    'position': Column(f'driver.s[{POSITION_IDX}]', 'f4'),
+    'positionD': Column(f'driver.s[{POSITIOND_IDX}]', 'f4'),
+
+    'target_position': Column('driver.target_position'),
+    'target_equilibrium': Column('driver.CartPoleInstance.target_equilibrium'),
+
+    'actualMotorSave': Column('driver.actualMotorCmd_prev'),
+    'Q': Column('driver.Q_prev'),
+    'Q_ccrc': Column('driver.Q_ccrc_prev'),
+
+    # Short categorical columns, the full description of the protocol is in the event log at each phase transition
+    'experimentProtocol': Column('driver.epm.current_experiment_protocol.experiment_protocol_name', STRING_DTYPE),
+    'experimentPhase': Column('driver.epm.current_experiment_protocol.current_experiment_phase', STRING_DTYPE),
+    'experimentIteration': Column('driver.epm.current_experiment_protocol.iteration', 'i8'),
+    'keyPressed': Column('driver.keyboard_controller.key_pressed', 'i8'),
+
+    'angle_squared': DerivedColumn('angle ** 2', 'f4'),
+    'position_squared': DerivedColumn('(position - target_position) ** 2'),
+    'Q_squared': DerivedColumn('Q ** 2'),
+
+    'latency': Column('driver.th.firmware_latency'),
+    'latency_violations': Column('driver.th.latency_violations'),
+    'latencyViolationCause': Column('driver.th.latency_violation_cause', 'i8'),
+    'latencyViolationStage': Column('driver.th.latency_violation_stage', 'i8'),
+    'pythonLatency': Column('driver.th.python_latency'),
+    'controller_steptime': Column('driver.th.controller_steptime_previous'),
+    'sensorToActuationLatency': Column('driver.th.sensor_to_actuation_latency'),
+    'chipClockDriftPpm': Column('driver.th.clock_aligner.drift_ppm'),
+    'clockAlignmentExcess': Column('driver.th.clock_alignment_excess'),
+    'additionalLatency': Column('driver.th.additional_latency'),
+    'invalid_steps': Column('driver.idp.invalid_steps', 'i8'),
+    'angleSubsamplesRejected': Column('driver.idp.angle_subsamples_rejected', 'i8'),
+    'freezme': Column('driver.idp.freezme'),
+
+    'angle_raw_sensor': Column('driver.idp.angle_raw_sensor'),
+    'angleD_raw_sensor': Column('driver.idp.angleD_raw_sensor'),
+}
+if RECORD_MEASUREMENT_DESCRIPTION:
+    RECORDED_COLUMNS['measurement'] = Column('driver.epm.current_experiment_protocol', STRING_DTYPE)
+check_columns(RECORDED_COLUMNS, globals())
+
+
 class MainLoggingManager:
     def __init__(self, driver):
 
         self.driver = driver
 
-        # The below dict lists variables to be logged with csv file when recording is on
-        # Just add new variable here and it will be logged
-        self.dict_data_to_save_basic = FunctionalDict({
-
-            'time': lambda: driver.th.elapsedTime,
-            'deltaTimeMs': lambda: driver.th.time_between_measurements_chip * 1000,
-
-            'angle_raw': lambda: driver.idp.angle_raw,
-            'angleD_raw': lambda: driver.idp.angleD_raw,
-            'angle': lambda: driver.s[ANGLE_IDX],
-            'angleD': lambda: driver.s[ANGLED_IDX],
-            'angle_cos': lambda: driver.s[ANGLE_COS_IDX],
-            'angle_sin': lambda: driver.s[ANGLE_SIN_IDX],
-            'position_raw': lambda: driver.idp.position_raw,
-            'position': lambda: driver.s[POSITION_IDX],
-            'positionD': lambda: driver.s[POSITIOND_IDX],
-
-            'target_position': lambda: driver.target_position,
-            'target_equilibrium': lambda: driver.CartPoleInstance.target_equilibrium,
-
-            'actualMotorSave': lambda: driver.actualMotorCmd_prev,
-            'Q': lambda: driver.Q_prev,
-            'Q_ccrc': lambda: driver.Q_ccrc_prev,
-
-            'measurement': lambda: driver.epm.current_experiment_protocol,
-
-            'angle_squared': lambda: driver.s[ANGLE_IDX] ** 2,
-            'position_squared': lambda: (driver.s[POSITION_IDX] - driver.target_position) ** 2,
-            'Q_squared': lambda: driver.Q_prev ** 2,
-
-            'latency': lambda: driver.th.firmware_latency,
-            'latency_violations': lambda: driver.th.latency_violations,
-            'pythonLatency': lambda: driver.th.python_latency,
-            'controller_steptime': lambda: driver.th.controller_steptime_previous,
-            'additionalLatency': lambda: driver.th.additional_latency,
-            'invalid_steps': lambda: driver.idp.invalid_steps,
-            'freezme': lambda: driver.idp.freezme,
-
-            'angle_raw_sensor': lambda: driver.idp.angle_raw_sensor,
-            'angleD_raw_sensor': lambda: driver.idp.angleD_raw_sensor,
-        })
+        self.recording_schema = None  # Compiled at recording start
+        self.flight_recorder = FlightRecorder(driver, RecordingSchema(RECORDED_COLUMNS, globals())) \
+            if FLIGHT_RECORDER_ENABLED else None
 
         self.data_to_save_measurement = {}
         self.data_to_save_controller = {}
-
-        self.data_manager = DataManager()
+        # DiagnosticBuffer of the controller, resolved at recording start or for the live plot headers
+        self.diagnostics = None
+        self.live_plot_cost_components = slice(0, 0)  # Of the diagnostics, plotted
+
+        # Both write from a background thread, the next file is opened in advance
+        if RECORDING_FORMAT == 'csv':
+            self.data_manager = CsvRecorder()
+        elif RECORDING_FORMAT == 'columnar':
+            self.data_manager = ColumnarRecorder()
+        else:
+            raise ValueError(f"Unknown recording format {RECORDING_FORMAT}, use 'csv' or 'columnar'")
 
         self.csv_name = None
+        self.recording_name_suffix = ''  # Appended to the names of requested recordings, e.g. by campaigns to keep runs apart
         self.recording_length = np.inf
         self.start_recording_flag = False  # Gives signal to start recording during the current control iteration, starting recording may take more than one control iteration
+        self.time_recording_requested = None  # perf_counter of the request, until the first row of the new recording
+        self.rollover_latency_s = None  # Last, from the request of a recording to its first row
+        self.max_rollover_latency_s = 0.0
+        self.max_rollover_loop_time_s = 0.0  # Time spent in the control loop finishing a recording and starting the next
+        self.latency_histograms_recording = None  # Recording whose latency histograms are still to be saved next to it
+        self.event_log = None  # Of the current recording
+        self.rows_recorded = 0
+        self.recording_catalog = RecordingCatalog() if RECORDING_CATALOG_ENABLED else None
+        # Saves sidecars and catalog entries of finished recordings; one thread started now, not at each rollover
+        self.housekeeping = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recording-housekeeping')
+        self.housekeeping.submit(lambda: None)
+        self.catalog_entry = None  # Of the current recording, completed and added when it is finished
+        self.catalog_start = None  # (time, latency violations) at the start of the current recording
+        self.current_recording = None  # Path of the running recording
+        self.recording_finished_callbacks = []  # Called with the path of each finished recording, e.g. by the campaign runner
 
         # Console Printing
-        self.printCount = 0
         self.tcm = None  # Terminal Content Manager
+        self.terminal_dashboard = TerminalDashboard(driver)
 
-        self.live_plotter_sender = LivePlotter_Sender(
+        self.live_plotter_sender = BatchedLivePlotterSender(LivePlotter_Sender(
             DEFAULT_ADDRESS,
             LIVE_PLOTTER_USE_REMOTE_SERVER,
             LIVE_PLOTTER_REMOTE_USERNAME,
             LIVE_PLOTTER_REMOTE_IP
-        )
+        ))
 
     def step(self):
-        self.csv_recording_step()
+        if self.diagnostics is not None:
+            self.diagnostics.update()  # Copies controller_data_for_csv if wrapped, no-op for a registered buffer
+
+        with self.driver.th.span('recording'):
+            self.csv_recording_step()
 
-        self.plot_live()
+        if self.flight_recorder is not None and self.driver.Q_prev is not None:
+            with self.driver.th.span('flight_recorder'):
+                self.flight_recorder.record()
 
-        self.write_current_data_to_terminal()
+        with self.driver.th.span('live_plot'):
+            self.plot_live()
+
+        with self.driver.th.span('terminal'):
+            self.write_current_data_to_terminal()
 
     @property
     def recording_running(self):
@@ -99,42 +170,84 @@ class MainLoggingManager:
     def starting_recording(self):
         return self.data_manager.starting_recording
 
+    def new_json_filename(self, controller_name):
+        """For a controller configuration saved as json, numbered by the catalog of the recordings if enabled."""
+        return get_new_json_filename(controller_name, catalog=self.recording_catalog)
+
+    def writer_statistics(self):
+        """Queue and flush statistics of the recording writer thread."""
+        return self.data_manager.writer_statistics()
+
     def recording_on_off(self, time_limited_recording=False):
         # (Exclude situation when recording is just being initialized, it may take more than one control iteration)
         if not self.starting_recording:
             if not self.recording_running:
-                if hasattr(self.driver.controller, "controller_name"):
-                    controller_name = self.driver.controller.controller_name
-                else:
-                    controller_name = ''
-                if hasattr(self.driver.controller, "optimizer_name") and self.driver.controller.has_optimizer:
-                    optimizer_name = self.driver.controller.optimizer_name
-                else:
-                    optimizer_name = ''
-                self.csv_name = create_csv_file_name(controller_name=controller_name,
-                                                     controller=self.driver.controller,
-                                                     optimizer_name=optimizer_name, prefix='CPP')
-                if time_limited_recording:
-                    self.recording_length = TIME_LIMITED_RECORDING_LENGTH
-                else:
-                    self.recording_length = np.inf
-
-                self.start_recording_flag = True
+                controller_name, optimizer_name = self.controller_and_optimizer_names()
+                self.request_recording(create_csv_file_name(controller_name=controller_name,
+                                                            controller=self.driver.controller,
+                                                            optimizer_name=optimizer_name, prefix='CPP'),
+                                       TIME_LIMITED_RECORDING_LENGTH if time_limited_recording else np.inf)
 
             else:
                 self.finish_csv_recording(wait_till_complete=False)
 
+    def request_recording(self, csv_name, recording_length=np.inf):
+        """
+        The recording is started at the cycle boundary (start_csv_recording_if_requested), a running one is finished
+        there first without waiting for its writer - back to back recordings never stall the control loop.
+        """
+        self.csv_name = self.recording_name(csv_name)
+        self.recording_length = recording_length
+        self.start_recording_flag = True
+        self.time_recording_requested = time.perf_counter()
+
+    def rollover_statistics(self):
+        return {
+            'latency_s': self.rollover_latency_s,
+            'max_latency_s': self.max_rollover_latency_s,
+            'max_loop_time_s': self.max_rollover_loop_time_s,
+        }
+
+    def controller_and_optimizer_names(self):
+        if hasattr(self.driver.controller, "controller_name"):
+            controller_name = self.driver.controller.controller_name
+        else:
+            controller_name = ''
+        if hasattr(self.driver.controller, "optimizer_name") and self.driver.controller.has_optimizer:
+            optimizer_name = self.driver.controller.optimizer_name
+        else:
+            optimizer_name = ''
+        return controller_name, optimizer_name
+
+    def refresh_diagnostics(self):
+        """
+        Takes the diagnostic buffer of the controller (the wrapper of controller_data_for_csv is kept while its keys
+        do not change). Called at recording start only, once resolved - the recorded columns and the plotted ones
+        always come from the same buffer.
+        """
+        diagnostics = diagnostic_buffer_of(self.driver.controller, self.diagnostics)
+        if diagnostics is not self.diagnostics:
+            self.diagnostics = diagnostics
+            self.diagnostics.update()
+            self.live_plot_cost_components = diagnostics.group(COST_COMPONENT_PREFIX)
+            if self.live_plotter_sender.connection_ready and self.live_plotter_sender.headers_sent:
+                self.send_live_plot_headers()
+
+    def send_live_plot_headers(self):
+        headers = ['time', 'Angle', 'Position', 'Q', "ΔQ", 'Target Position', 'AngleD', 'PositionD', ]
+        controller_headers = self.diagnostics.group_names(COST_COMPONENT_PREFIX, strip_prefix=True)
+        self.live_plotter_sender.send_headers(headers + controller_headers)
+
     def plot_live(self):
         if self.live_plotter_sender.connection_ready:
 
             if not self.live_plotter_sender.headers_sent:
-                headers = ['time', 'Angle', 'Position', 'Q', "ΔQ", 'Target Position', 'AngleD', 'PositionD', ]
-                controller_headers = list(self.driver.controller.controller_data_for_csv.keys())
-                controller_headers = [header[len('cost_component_'):] for header in controller_headers if
-                                      'cost_component_' in header]
-                self.live_plotter_sender.send_headers(headers + controller_headers)
+                if self.diagnostics is None:
+                    self.refresh_diagnostics()
+                self.send_live_plot_headers()
             else:
-                buffer = np.array([
+                # Copied into the preallocated block of the batched sender, the cost components as one slice
+                self.live_plotter_sender.send_data([
                     self.driver.th.elapsedTime,
                     self.driver.s[ANGLE_IDX],
                     self.driver.s[POSITION_IDX] * 100,
@@ -143,105 +256,159 @@ class MainLoggingManager:
                     self.driver.target_position * 100,
                     self.driver.s[ANGLED_IDX],
                     self.driver.s[POSITIOND_IDX] * 100,
-                ])
-                buffer_controller = np.array(
-                    [self.driver.controller.controller_data_for_csv[key] for key in
-                     self.driver.controller.controller_data_for_csv.keys()]
-                )
-
-                buffer = np.append(buffer, buffer_controller)
-
-                self.live_plotter_sender.send_data(buffer)
+                ], self.diagnostics.values[self.live_plot_cost_components])
 
     def start_csv_recording_if_requested(self):
 
         if self.start_recording_flag:
             self.start_recording_flag = False
-            combined_keys = list(self.dict_data_to_save_basic.keys()) + list(
-                self.data_to_save_measurement.keys()) + list(self.data_to_save_controller.keys())
-
-            self.data_manager.start_csv_recording(
-                self.csv_name,
-                combined_keys,
+            time_start = time.perf_counter()
+            self.close_recording_sidecars()
+            if self.recording_running:
+                # Rollover to the new recording, the writer thread completes the file of the previous one
+                self.data_manager.finish_experiment(wait_till_complete=False)
+
+            self.refresh_diagnostics()
+            extra_dicts = [self.data_to_save_measurement, self.data_to_save_controller]
+            extra_buffers = [self.diagnostics]
+            if self.recording_schema is not None and self.recording_schema.compiled_for(extra_dicts, extra_buffers):
+                # Same columns as the previous recording, its extractor is reused and the dtypes resolved anew
+                self.recording_schema = copy.copy(self.recording_schema)
+            else:
+                self.recording_schema = RecordingSchema(RECORDED_COLUMNS, globals(), extra_dicts, extra_buffers)
+            self.data_manager.start_recording(
+                os.path.join(PATH_TO_EXPERIMENT_RECORDINGS, self.csv_name),
+                self.recording_schema,
                 create_csv_title(),
                 create_csv_header(),
-                PATH_TO_EXPERIMENT_RECORDINGS,
-                mode='online',
-                wait_till_complete=False,
                 recording_length=self.recording_length
             )
 
+            self.rows_recorded = 0
+            self.current_recording = self.recording_path()
+            if LATENCY_HISTOGRAMS_SIDECAR:
+                self.driver.th.reset_latency_histograms()
+                self.latency_histograms_recording = self.recording_path()
+            if EVENT_LOG_SIDECAR:
+                self.event_log = EventLog(event_log_sidecar_path(self.recording_path()))
+            if self.recording_catalog is not None:
+                controller_name, optimizer_name = self.controller_and_optimizer_names()
+                self.catalog_entry = {
+                    'path': self.recording_path(),
+                    'format': os.path.splitext(self.recording_path())[1][1:],
+                    'controller': controller_name or None,
+                    'optimizer': optimizer_name or None,
+                    'chip': CHIP,
+                    'motor': getattr(self.driver, 'motor', MOTOR),
+                    'started': datetime.now().isoformat(timespec='seconds'),
+                }
+                self.catalog_start = (self.driver.th.elapsedTime, self.driver.th.latency_violations)
+
+            self.max_rollover_loop_time_s = max(self.max_rollover_loop_time_s, time.perf_counter() - time_start)
+
     def csv_recording_step(self):
         if self.driver.actualMotorCmd_prev is not None and self.driver.Q_prev is not None:
             if self.recording_running:
-                self.data_manager.step([
-                    self.dict_data_to_save_basic,
-                    self.data_to_save_measurement,
-                    self.data_to_save_controller
-                ])
+                if self.event_log is not None:
+                    self.event_log.check_transition(self.driver.th.elapsedTime, self.rows_recorded,
+                                                    self.driver.epm.current_experiment_protocol)
+                # The diagnostics are taken as one slice of their buffer
+                self.data_manager.record_row(self.recording_schema.extract_row(
+                    self.driver, (self.data_to_save_measurement, self.data_to_save_controller), (self.diagnostics,)))
+                self.rows_recorded += 1
+                if self.time_recording_requested is not None:
+                    self.rollover_latency_s = time.perf_counter() - self.time_recording_requested
+                    self.max_rollover_latency_s = max(self.max_rollover_latency_s, self.rollover_latency_s)
+                    self.time_recording_requested = None
+                if self.latency_histograms_recording is not None:
+                    self.driver.th.record_latency_histograms()
+            elif (self.current_recording is not None or self.latency_histograms_recording is not None
+                  or self.event_log is not None):
+                # Recording finished by the recorder itself (time limited recording)
+                self.close_recording_sidecars()
 
     def finish_csv_recording(self, wait_till_complete=True):
-        if self.recording_running:
-            self.data_manager.finish_experiment(wait_till_complete=wait_till_complete)
+        self.start_recording_flag = False  # A recording requested, but not started yet, is cancelled too
+        self.time_recording_requested = None
+        self.close_recording_sidecars()
+        self.data_manager.finish_experiment(wait_till_complete=wait_till_complete)
         self.recording_length = np.inf
 
+    def recording_name(self, csv_name):
+        """Name under which a recording requested as csv_name is saved."""
+        if self.recording_name_suffix:
+            name, extension = os.path.splitext(csv_name)
+            csv_name = name + self.recording_name_suffix + extension
+        return csv_name
+
+    def recording_path(self, csv_name=None):
+        return self.data_manager.recording_path(
+            os.path.join(PATH_TO_EXPERIMENT_RECORDINGS, self.csv_name if csv_name is None else csv_name))
+
+    def close_recording_sidecars(self):
+        if self.catalog_entry is not None:
+            self.add_recording_to_catalog()
+        if self.latency_histograms_recording is not None:
+            self.save_latency_histograms()
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+        if self.current_recording is not None:
+            path, self.current_recording = self.current_recording, None
+            for callback in self.recording_finished_callbacks:
+                callback(path)
+
+    def add_recording_to_catalog(self):
+        th = self.driver.th
+        time_start, latency_violations_start = self.catalog_start
+        entry = dict(self.catalog_entry, rows=self.rows_recorded, duration_s=th.elapsedTime - time_start,
+                     latency_violations=th.latency_violations - latency_violations_start)
+        latency_histograms = None
+        if self.latency_histograms_recording is not None:
+            latency_histograms = {name: histogram.copy() for name, histogram in th.latency_histograms.items()}
+        if self.event_log is not None:
+            protocols = self.event_log.protocols
+        else:
+            protocols = [self.driver.epm.current_experiment_protocol.experiment_protocol_name]
+        self.recording_catalog.add_async(entry, protocols, latency_histograms, executor=self.housekeeping)
+        self.catalog_entry = None
+
+    def trigger_flight_recorder(self, reason, immediately=False, details=None):
+        if self.flight_recorder is not None:
+            self.flight_recorder.trigger(reason, immediately=immediately, details=details)
+        self.log_event('flight_recorder', reason=reason)
+
+    def log_event(self, event, **fields):
+        """Adds an event (e.g. key press) to the event log of the running recording, ignored if not recording."""
+        if self.event_log is not None and self.recording_running:
+            self.event_log.record(self.driver.th.elapsedTime, self.rows_recorded, event, **fields)
+
+    def annotate(self, text):
+        self.log_event('annotation', text=text)
+
+    def save_latency_histograms(self):
+        metadata = {
+            'recording': os.path.basename(self.latency_histograms_recording),
+            'controller': getattr(self.driver.controller, 'controller_name', CONTROLLER_NAME),
+            'control_period_ms': CONTROL_PERIOD_MS,
+            'saved': datetime.now().isoformat(timespec='seconds'),
+        }
+        save_latency_histograms_async(self.driver.th.latency_histograms,
+                                      latency_histograms_sidecar_path(self.latency_histograms_recording), metadata,
+                                      executor=self.housekeeping)
+        self.latency_histograms_recording = None
+
+    @contextmanager
     def terminal_manager(self):
         self.tcm = TerminalContentManager(special_print_function=True)
-        return self.tcm
+        with self.tcm:
+            self.terminal_dashboard.start(self.tcm)
+            try:
+                yield self.tcm
+            finally:
+                self.terminal_dashboard.stop()
 
     def write_current_data_to_terminal(self):
-        self.printCount += 1
-
         self.driver.th.latency_data_for_statistics_in_terminal()
-
-        if True or self.printCount >= PRINT_PERIOD_MS / CONTROL_PERIOD_MS:
-            self.printCount = 0
-
-            ESC = '\033['
-            BACK_TO_BEGINNING = '\r'
-            CLEAR_LINE = ESC + 'K'  # Clear the entire line
-
-            self.tcm.print_temporary(BACK_TO_BEGINNING + CLEAR_LINE)
-
-            # Controller
-            if self.driver.controlEnabled:
-                if 'mpc' in CONTROLLER_NAME:
-                    mode = 'CONTROLLER:   {} (Period={}ms, Synch={}, Horizon={}, Rollouts={}, Predictor={})'.format(
-                        CONTROLLER_NAME, CONTROL_PERIOD_MS, CONTROL_SYNC, self.driver.controller.optimizer.mpc_horizon,
-                        self.driver.controller.optimizer.num_rollouts, self.driver.controller.predictor.predictor_name)
-                else:
-                    mode = 'CONTROLLER:   {} (Period={}ms, Synch={})'.format(CONTROLLER_NAME, CONTROL_PERIOD_MS,
-                                                                             CONTROL_SYNC)
-            else:
-                mode = 'CONTROLLER:   Firmware'
-            self.tcm.print_temporary(BACK_TO_BEGINNING + mode + CLEAR_LINE)
-
-            # Experiment Protocol
-            self.tcm.print_temporary(
-                BACK_TO_BEGINNING + f'MEASUREMENT: {self.driver.epm.current_experiment_protocol}' + CLEAR_LINE)
-
-            # State
-            self.tcm.print_temporary(
-                BACK_TO_BEGINNING + "STATE:  angle:{:+.3f}rad, angle raw:{:04}, position:{:+.2f}cm, position raw:{:04}, target:{}, Q:{:+.2f}, command:{:+05d}, invalid_steps:{}, freezme:{}"
-                .format(
-                    self.driver.s[ANGLE_IDX],
-                    self.driver.idp.angle_raw,
-                    self.driver.s[POSITION_IDX] * 100,
-                    self.driver.idp.position_raw,
-                    f"{self.driver.CartPoleInstance.target_position}, {self.driver.CartPoleInstance.target_equilibrium}",
-                    self.driver.Q,
-                    self.driver.actualMotorCmd,
-                    self.driver.idp.invalid_steps,
-                    self.driver.idp.freezme
-                ) + CLEAR_LINE
-                )
-
-            # Timing
-            timing_string, timing_latency_string = self.driver.th.strings_for_statistics_in_terminal()
-            if timing_string:
-                self.tcm.print_temporary(BACK_TO_BEGINNING + timing_string + CLEAR_LINE)
-
-            if timing_latency_string:
-                self.tcm.print_temporary(BACK_TO_BEGINNING + timing_latency_string + CLEAR_LINE)
-
-            self.tcm.print_to_terminal()
+        # Rendered by the thread of the terminal dashboard
+        self.terminal_dashboard.publish()
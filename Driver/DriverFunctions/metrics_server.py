@@ -0,0 +1,204 @@
+"""
+Local HTTP endpoint with live telemetry of the control loop, for long unattended runs.
+
+    http://127.0.0.1:<METRICS_SERVER_PORT>/metrics       OpenMetrics text (Prometheus scrape target)
+    http://127.0.0.1:<METRICS_SERVER_PORT>/metrics.json  the same as JSON
+
+The server runs in a daemon thread and is bound to localhost only.
+Requests are answered by reading attributes of the driver and its timing helper directly, without locks:
+the control thread does no extra work and a scrape at most sees values from two neighbouring cycles.
+"""
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from DriverFunctions.timing_helper import LATENCY_VIOLATION_CAUSES, LOOP_STAGES
+
+from globals import METRICS_SERVER_PORT, CONTROL_PERIOD_MS
+
+METRICS_SERVER_HOST = '127.0.0.1'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class MetricsServer:
+    def __init__(self, driver, port=METRICS_SERVER_PORT):
+        self.driver = driver
+        self.port = port
+        self.http_server = None
+        self.thread = None
+        # Cycle rate is computed between two scrapes - requests are served one at a time, so no lock is needed
+        self.previous_sample = None
+
+    def start(self):
+        handler = type('MetricsRequestHandler', (MetricsRequestHandler,), {'metrics_server': self})
+        self.http_server = HTTPServer((METRICS_SERVER_HOST, self.port), handler)
+        self.thread = threading.Thread(target=self.http_server.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+        print(f'\nMetrics served at http://{METRICS_SERVER_HOST}:{self.port}/metrics (and /metrics.json)')
+
+    def stop(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+    def cycle_rate(self, total_iterations):
+        now = time.monotonic()
+        previous_sample, self.previous_sample = self.previous_sample, (now, total_iterations)
+        if previous_sample is not None and now > previous_sample[0] and total_iterations >= previous_sample[1]:
+            return (total_iterations - previous_sample[1]) / (now - previous_sample[0])
+        # First scrape (or counter reset) - from the recent time between measurements
+        delta_time = self.driver.th.delta_time_statistics.window.mean()
+        return 1.0 / delta_time if delta_time > 0.0 else math.nan
+
+    def collect(self):
+        driver = self.driver
+        th = driver.th
+        protocol = driver.epm.current_experiment_protocol
+
+        return {
+            'cycles': th.total_iterations,
+            'cycle_rate_hz': self.cycle_rate(th.total_iterations),
+            'control_period_s': CONTROL_PERIOD_MS / 1000.0,
+            'control_enabled': bool(driver.controlEnabled),
+            'firmware_control': bool(driver.firmwareControl),
+            'latency_s': {
+                'delta_time': th.delta_time_statistics.summary(),
+                'firmware_latency': th.firmware_latency_statistics.summary(),
+                'python_latency': th.python_latency_statistics.summary(),
+                'controller_steptime': th.controller_steptime_statistics.summary(),
+                'sensor_to_actuation': th.sensor_to_actuation_latency,
+                'clock_alignment_excess': th.clock_alignment_excess,
+            },
+            'latency_violations': th.latency_violations,
+            'latency_violations_per_cause': dict(zip(LATENCY_VIOLATION_CAUSES[1:], th.latency_violations_per_cause[1:])),
+            'latency_violations_per_stage': dict(zip(LOOP_STAGES, th.latency_violations_per_stage)),
+            'stage_budget_overruns': dict(zip(LOOP_STAGES[1:], th.stage_overruns[1:])),
+            'dropped_frames': th.missed_measurements,
+            'invalid_steps': driver.idp.invalid_steps,
+            'recording': {
+                'running': bool(driver.mlm.recording_running),
+                'starting': bool(driver.mlm.starting_recording),
+                'name': driver.mlm.csv_name,
+                'writer': driver.mlm.writer_statistics(),
+                'rollover': driver.mlm.rollover_statistics(),
+            },
+            'live_plot': driver.mlm.live_plotter_sender.statistics(),
+            'protocol': {
+                'name': protocol.experiment_protocol_name,
+                'phase': protocol.current_experiment_phase,
+                'running': protocol.is_running(),
+            },
+        }
+
+
+def openmetrics_text(metrics):
+    lines = []
+
+    def metric(name, metric_type, samples, help_text):
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.append(f'# HELP {name} {help_text}')
+        suffix = {'counter': '_total', 'info': '_info'}.get(metric_type, '')
+        for labels, value in samples:
+            label_string = ','.join(f'{key}="{escape_label_value(label)}"' for key, label in labels.items())
+            lines.append(f'{name}{suffix}{{{label_string}}} {format_value(value)}' if label_string
+                         else f'{name}{suffix} {format_value(value)}')
+
+    metric('cartpole_cycles', 'counter', [({}, metrics['cycles'])], 'Control loop iterations.')
+    metric('cartpole_cycle_rate_hz', 'gauge', [({}, metrics['cycle_rate_hz'])], 'Control loop iterations per second since the last scrape.')
+    metric('cartpole_control_enabled', 'gauge', [({}, metrics['control_enabled'])], 'Python controller active.')
+    metric('cartpole_latency_seconds', 'gauge', [
+        ({'quantity': quantity, 'statistic': statistic}, value)
+        for quantity, summary in metrics['latency_s'].items() if isinstance(summary, dict)
+        for statistic, value in summary.items()
+    ], 'Mean and std over the last cycles, quantiles and max since the statistics were reset.')
+    metric('cartpole_sensor_to_actuation_seconds', 'gauge', [({}, metrics['latency_s']['sensor_to_actuation'])],
+           'From measurement on chip to motor command sent, last cycle.')
+    metric('cartpole_clock_alignment_excess_seconds', 'gauge', [({}, metrics['latency_s']['clock_alignment_excess'])],
+           'Frame received minus aligned measurement time, delay over the fastest frames, last cycle.')
+    metric('cartpole_latency_violations', 'counter', [
+        ({'cause': cause}, count) for cause, count in metrics['latency_violations_per_cause'].items()
+    ], 'Latency violations by cause.')
+    metric('cartpole_latency_violations_by_stage', 'counter', [
+        ({'stage': stage}, count) for stage, count in metrics['latency_violations_per_stage'].items()
+    ], 'Latency violations by the loop stage most over its budget.')
+    metric('cartpole_stage_budget_overruns', 'counter', [
+        ({'stage': stage}, count) for stage, count in metrics['stage_budget_overruns'].items()
+    ], 'Cycles in which the loop stage took longer than its budget.')
+    metric('cartpole_dropped_frames', 'counter', [({}, metrics['dropped_frames'])], 'Measurements missed between received frames.')
+    metric('cartpole_recording', 'gauge', [({}, metrics['recording']['running'])], 'Recording running.')
+    writer = metrics['recording']['writer']
+    if writer is not None:
+        metric('cartpole_recording_queue_depth', 'gauge', [({}, writer['depth'])],
+               'Blocks of rows waiting for the recording writer thread.')
+        metric('cartpole_recording_dropped_rows', 'counter', [({}, writer['dropped_rows'])],
+               'Rows dropped because the recording queue was full (drop-oldest policy).')
+        metric('cartpole_recording_flush_seconds', 'gauge', [
+            ({'statistic': 'mean'}, writer['mean_flush_time_s']), ({'statistic': 'max'}, writer['max_flush_time_s']),
+        ], 'Duration of the writes of the recording writer thread.')
+    rollover = metrics['recording']['rollover']
+    metric('cartpole_recording_rollover_seconds', 'gauge', [
+        ({'statistic': 'last'}, rollover['latency_s'] if rollover['latency_s'] is not None else math.nan),
+        ({'statistic': 'max'}, rollover['max_latency_s']),
+    ], 'From the request of a recording (e.g. next protocol iteration) to its first recorded row.')
+    metric('cartpole_recording_rollover_loop_seconds', 'gauge', [({}, rollover['max_loop_time_s'])],
+           'Longest time the control loop spent finishing a recording and starting the next.')
+    metric('cartpole_live_plot_dropped_rows', 'counter', [({}, metrics['live_plot']['dropped_rows'])],
+           'Rows not sent to the live plotter because its sender thread was busy.')
+    metric('cartpole_protocol', 'info', [({
+        'name': metrics['protocol']['name'],
+        'phase': metrics['protocol']['phase'],
+        'recording': metrics['recording']['name'] or '',
+    }, 1)], 'Experiment protocol, its phase and the current recording.')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if value != int(value) else str(int(value))
+
+
+def json_compatible(value):
+    """NaN and infinity are not valid JSON - null instead, numpy scalars as python numbers."""
+    if isinstance(value, dict):
+        return {key: json_compatible(item) for key, item in value.items()}
+    if isinstance(value, (bool, int, str)) or value is None:
+        return value
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    metrics_server = None  # Set on the subclass created by MetricsServer.start
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            body = openmetrics_text(self.metrics_server.collect()).encode('utf-8')
+            content_type = OPENMETRICS_CONTENT_TYPE
+        elif path == '/metrics.json':
+            body = json.dumps(json_compatible(self.metrics_server.collect())).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404, 'Available: /metrics, /metrics.json')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Would print over the statistics in terminal
@@ -0,0 +1,233 @@
+"""
+Offline (batch) counterpart of IncomingDataProcessor.process_state_information.
+
+Recomputes the state from raw columns of an existing recording with numpy over whole arrays,
+so that a different TIMESTEPS_FOR_DERIVATIVE, median length or angle deviation can be evaluated without the robot.
+The computation follows the online path operation by operation and in the same dtypes, so with the parameters
+of the recording it reproduces the recorded state exactly: online_dtype gives the dtype of each operation
+on the python and numpy scalars the online path gets, the arrays are cast to it before the operation.
+
+The dead angle treatment (treat_deadangle_with_derivative) is sequential and is not reproduced -
+it is disabled in the online path as well, invalid_steps are only passed through.
+"""
+
+import itertools
+import operator
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from CartPoleSimulation.CartPole._CartPole_mathematical_helpers import wrap_angle_rad_inplace
+from CartPoleSimulation.CartPole.state_utilities import create_cartpole_state
+
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.velocity_estimators import create_velocity_estimator, estimate_velocities
+
+from globals import (ANGLE_DEVIATION, ANGLE_360_DEG_IN_ADC_UNITS,
+                     ANGLE_NORMALIZATION_FACTOR, POSITION_NORMALIZATION_FACTOR,
+                     TIMESTEPS_FOR_DERIVATIVE,
+                     ANGLE_D_MEDIAN_LEN, POSITION_D_MEDIAN_LEN,
+                     VELOCITY_ESTIMATOR)
+
+MEDIAN_BUFFER_DTYPE = np.float32  # As in IncomingDataProcessor
+MEDIAN_CHUNK_LENGTH = 2 ** 16  # Rows of sliding windows sorted at once, limits memory for long recordings
+
+RAW_COLUMNS = ['angle_raw', 'position_raw', 'invalid_steps', 'deltaTimeMs']
+
+
+def default_processing_parameters():
+    # Read when called - ANGLE_DEVIATION is updated in place at calibration
+    return {
+        'timesteps_for_derivative': TIMESTEPS_FOR_DERIVATIVE,
+        'angle_d_median_len': ANGLE_D_MEDIAN_LEN,
+        'position_d_median_len': POSITION_D_MEDIAN_LEN,
+        'angle_deviation': float(ANGLE_DEVIATION),
+        'angle_deviation_finetune': 0.0,
+        'angle_derivative_source': 'sensor',  # 'sensor' - angleD_raw_sensor column as sent by chip, 'angle_raw' - k-step difference
+        'velocity_estimator': VELOCITY_ESTIMATOR,  # See velocity_estimators.py, recursive ones run sample by sample
+    }
+
+
+def raw_columns_from_recording(recording):
+    """Extracts raw columns as numpy arrays from a DataFrame or a path to a recording."""
+    if not isinstance(recording, pd.DataFrame):
+        recording = load_recording(recording)
+
+    columns = {
+        # Float - estimated from angle subsamples on PC it is not an integer
+        'angle_raw': recording['angle_raw'].to_numpy(dtype=np.float64),
+        'position_raw': recording['position_raw'].to_numpy(dtype=np.int64),
+        'invalid_steps': recording['invalid_steps'].to_numpy(dtype=np.int64) if 'invalid_steps' in recording
+        else np.zeros(len(recording), dtype=np.int64),
+        # Chip sends integer microseconds, recover them exactly from the logged milliseconds
+        'time_between_measurements_chip': np.round(recording['deltaTimeMs'].to_numpy(dtype=np.float64) * 1000.0) / 1e6,
+    }
+    if 'angleD_raw_sensor' in recording:
+        columns['angleD_raw_sensor'] = recording['angleD_raw_sensor'].to_numpy(dtype=np.float64)
+    if 'Q' in recording:
+        # Logged Q is the command of the previous cycle, which is what the estimator gets online
+        columns['Q'] = recording['Q'].fillna(0.0).to_numpy(dtype=np.float64)
+    if 'time' in recording:
+        columns['time'] = recording['time'].to_numpy(dtype=np.float64)
+
+    return columns
+
+
+def reprocess_recording(recording, state_dtype=None, **parameters):
+    """
+    Recomputes the state of every sample of the recording.
+    :param recording: DataFrame or path to a recording with at least angle_raw, position_raw and deltaTimeMs
+    :param state_dtype: Of the state the online path writes into, by default of create_cartpole_state()
+    :param parameters: Overrides of default_processing_parameters()
+    :return: DataFrame with raw (filtered) differences and state columns named as in the recordings
+    """
+    columns = recording if isinstance(recording, dict) else raw_columns_from_recording(recording)
+    p = default_processing_parameters()
+    unknown_parameters = set(parameters) - set(p)
+    if unknown_parameters:
+        raise ValueError(f'Unknown processing parameters: {sorted(unknown_parameters)}')
+    p.update(parameters)
+
+    k = p['timesteps_for_derivative']
+    time_between_measurements_chip = columns['time_between_measurements_chip']
+
+    # Differences - position_difference() and the angleD from chip
+    positionD_raw = k_step_difference(columns['position_raw'], k)
+    if p['angle_derivative_source'] == 'sensor' and 'angleD_raw_sensor' in columns:
+        angleD_raw = columns['angleD_raw_sensor']
+    elif p['angle_derivative_source'] in ('sensor', 'angle_raw'):
+        if p['angle_derivative_source'] == 'sensor':
+            print('Recording has no angleD_raw_sensor column, computing angle difference from angle_raw.')
+        angleD_raw = k_step_difference(columns['angle_raw'], k, wrap=True)
+    else:
+        raise ValueError(f"Unknown angle derivative source {p['angle_derivative_source']}")
+
+    # filter_differences()
+    angleD_raw = sliding_median(angleD_raw, p['angle_d_median_len'])
+    positionD_raw = sliding_median(positionD_raw, p['position_d_median_len'])
+
+    # convert_angle_and_position_skale() - the chip sends python ints, the median is a numpy scalar of the buffer dtype
+    angle = (columns['angle_raw'].astype(np.float64) + p['angle_deviation']) * ANGLE_NORMALIZATION_FACTOR \
+        - p['angle_deviation_finetune']
+    wrap_angle_rad_inplace(angle)  # Online math.fmod, float64
+    position_dtype = online_dtype(operator.mul, 0, POSITION_NORMALIZATION_FACTOR)
+    position = columns['position_raw'].astype(position_dtype) * POSITION_NORMALIZATION_FACTOR
+    median = MEDIAN_BUFFER_DTYPE(0)
+    angle_difference_dtype = online_dtype(operator.mul, median, ANGLE_NORMALIZATION_FACTOR)
+    position_difference_dtype = online_dtype(operator.mul, median, POSITION_NORMALIZATION_FACTOR)
+    angle_difference = angleD_raw.astype(angle_difference_dtype) * ANGLE_NORMALIZATION_FACTOR
+    position_difference = positionD_raw.astype(position_difference_dtype) * POSITION_NORMALIZATION_FACTOR
+
+    # calculate_first_derivatives() or the velocity estimator, time between measurements is a python float
+    velocity_estimator = create_velocity_estimator(p['velocity_estimator'])
+    if velocity_estimator is None:
+        angleD_dtype = online_dtype(operator.truediv, angle_difference_dtype.type(0), 1.0)
+        positionD_dtype = online_dtype(operator.truediv, position_difference_dtype.type(0), 1.0)
+        angleD = angle_difference.astype(angleD_dtype) / time_between_measurements_chip.astype(angleD_dtype)
+        positionD = position_difference.astype(positionD_dtype) / time_between_measurements_chip.astype(positionD_dtype)
+    else:
+        Q = columns['Q'] if 'Q' in columns else np.zeros(len(angle))
+        angleD, positionD = estimate_velocities(velocity_estimator, angle, position, Q, time_between_measurements_chip)
+
+    # pack_features_into_state_variable() - cos and sin are taken before the cast to the state dtype
+    if state_dtype is None:
+        state_dtype = create_cartpole_state().dtype
+    processed = {}
+    if 'time' in columns:
+        processed['time'] = columns['time']
+    processed.update({
+        'angle_raw': columns['angle_raw'],
+        'angleD_raw': angleD_raw,
+        'position_raw': columns['position_raw'],
+        'positionD_raw': positionD_raw,
+        'invalid_steps': columns['invalid_steps'],
+        'angle': angle.astype(state_dtype),
+        'angleD': angleD.astype(state_dtype),
+        'angle_cos': np.cos(angle).astype(state_dtype),
+        'angle_sin': np.sin(angle).astype(state_dtype),
+        'position': position.astype(state_dtype),
+        'positionD': positionD.astype(state_dtype),
+    })
+
+    return pd.DataFrame(processed)
+
+
+def online_dtype(operation, *online_operands):
+    """
+    dtype of the result of an operation of IncomingDataProcessor on scalars of the types it gets online.
+    Python and numpy scalars are promoted by other rules than arrays (and by numpy version, NEP 50).
+    """
+    return np.asarray(operation(*online_operands)).dtype
+
+
+def k_step_difference(values, k, wrap=False):
+    """
+    (x[n] - x[n-k]) / k as in IncomingDataProcessor - zero for the first k samples
+    and where the past value is -1, which the online history buffer uses as 'no value yet'.
+    """
+    difference = np.zeros(len(values), dtype=np.float64)
+    if len(values) <= k:
+        return difference
+    past = values[:-k]
+    valid = past != -1
+    step = values[k:] - past
+    if wrap:
+        step = wrap_adc_difference(step)
+    difference[k:][valid] = step[valid] / k
+    return difference
+
+
+def wrap_adc_difference(difference):
+    # Vectorized IncomingDataProcessor.wrap_local
+    ADC_RANGE = ANGLE_360_DEG_IN_ADC_UNITS
+    difference = difference.astype(np.float64)
+    return np.where(difference >= ADC_RANGE / 2, difference - ADC_RANGE,
+                    np.where(difference <= -ADC_RANGE / 2, difference + ADC_RANGE, difference))
+
+
+def sliding_median(values, window_length, dtype=MEDIAN_BUFFER_DTYPE):
+    """Median over the last window_length values, the window initially filled with zeros - as RunningMedian."""
+    values = np.asarray(values).astype(dtype)
+    if window_length == 1:
+        return values
+
+    padded = np.concatenate((np.zeros(window_length - 1, dtype=dtype), values))
+    windows = sliding_window_view(padded, window_length)
+    medians = np.empty(len(values), dtype=dtype)
+    for start in range(0, len(values), MEDIAN_CHUNK_LENGTH):
+        medians[start:start + MEDIAN_CHUNK_LENGTH] = np.median(windows[start:start + MEDIAN_CHUNK_LENGTH], axis=1)
+    return medians
+
+
+def parameter_grid(grid):
+    """{'name': [values], ...} -> list of parameter dicts, one for each combination."""
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Raw columns of the recording are sent to each worker process once, not with every task
+_worker_columns = None
+
+
+def _initialize_worker(columns):
+    global _worker_columns
+    _worker_columns = columns
+
+
+def _reprocess_in_worker(parameters):
+    return reprocess_recording(_worker_columns, **parameters)
+
+
+def reprocess_parameter_grid(recording, grid, max_workers=None):
+    """
+    Reprocesses the recording for every combination of parameters in grid, in parallel processes.
+    :param grid: {'parameter name': [values], ...}, see default_processing_parameters() for the names
+    :return: List of (parameters, processed DataFrame)
+    """
+    columns = raw_columns_from_recording(recording)
+    parameters_list = parameter_grid(grid)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_initialize_worker, initargs=(columns,)) as executor:
+        processed = list(executor.map(_reprocess_in_worker, parameters_list))
+    return list(zip(parameters_list, processed))
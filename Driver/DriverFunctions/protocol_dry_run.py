@@ -0,0 +1,220 @@
+"""
+Faster-than-real-time dry-run of an experiment protocol against the simulated plant of InterfaceStandIn.
+
+The driver runs its normal loop (experiment_sequence) with the interface stand-in and a VirtualClock:
+each frame advances the clock by one control period and a calibration by CALIBRATION_DURATION_S, so timeouts,
+stabilization times and the recalibration cadence of the protocol play out in simulated time, as fast as the CPU allows.
+Nothing is recorded - the recording requests of the protocol are intercepted, as the benchmark harness wraps
+the loop stages, and reported with their length and the phase they were started in;
+the flight recorder and the export of profiler traces are switched off.
+
+The report gives the expected duration, the phase timeline, the time spent per phase, the recordings which
+would be produced, the calibrations and the timeouts (TimeoutError of the protocol, caught by ExperimentProtocolsManager).
+The plant is crude: conditions on the pole (swung up, stable) hold only as far as the controller manages
+the simulated plant - max_duration_s ends protocols which would wait forever.
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from DriverFunctions.timing_helper import VirtualClock
+
+DRY_RUN_MAX_DURATION_S = 4 * 3600.0  # Of simulated time
+
+
+class ProtocolDryRun:
+    def __init__(self, driver, experiment_protocol_name=None, max_duration_s=DRY_RUN_MAX_DURATION_S):
+        """
+        :param driver: Built with InterfaceStandIn(clock=clock) and clock=clock, clock a VirtualClock
+        :param experiment_protocol_name: e.g. 'swing-up', None - the current protocol of the driver
+        """
+        if not isinstance(driver.th.clock, VirtualClock) or getattr(driver.InterfaceInstance, 'clock', None) is not driver.th.clock:
+            raise ValueError('Dry-run needs the driver and its InterfaceStandIn built with the same VirtualClock')
+        self.driver = driver
+        self.clock = driver.th.clock
+        self.max_duration_s = max_duration_s
+
+        if experiment_protocol_name is not None:
+            driver.epm.select_experiment_protocol(experiment_protocol_name)
+        self.protocol = driver.epm.current_experiment_protocol
+
+        self.time_started = None
+        self.cycles = 0
+        self.wall_time = None
+        self.end = None  # 'finished', 'max_duration' or 'terminated'
+
+        self.timeline = []  # {'time_s', 'phase', 'iteration'} at each change of phase or iteration
+        self.recordings = []  # Would be produced, see request_recording
+        self.current_recording = None
+        self.calibrations = []
+        self.timeouts = []
+
+        driver.mlm.flight_recorder = None
+        driver.th.export_trace_on_violation_burst = False
+
+        # Instance attributes shadow the methods, the driver picks them up without changes
+        driver.mlm.request_recording = self.request_recording
+        driver.mlm.finish_csv_recording = self.finish_recording
+        self._observe(driver.InterfaceInstance, 'calibrate', self.calibrations)
+        self._observe(self.protocol, 'update_state', self.timeouts, TimeoutError)
+
+    def _observe(self, owner, method_name, events, exception_type=None):
+        """Notes each call of the method (or each exception_type it raises) in events."""
+        method = getattr(owner, method_name)
+        dry_run = self
+
+        def observed_method(*args, **kwargs):
+            event = dry_run.event()  # Before the call, the protocol stops itself before raising a timeout
+            if exception_type is None:
+                events.append(event)
+                return method(*args, **kwargs)
+            try:
+                return method(*args, **kwargs)
+            except exception_type as error:
+                events.append(dict(event, message=str(error)))
+                raise
+
+        setattr(owner, method_name, observed_method)
+
+    def now(self):
+        return self.clock() - self.time_started
+
+    def event(self):
+        return {'time_s': self.now(), 'phase': self.protocol.current_experiment_phase,
+                'iteration': self.protocol.iteration}
+
+    def request_recording(self, csv_name, recording_length=np.inf):
+        # As MainLoggingManager: a running recording is finished when the next one starts
+        self.finish_recording()
+        mlm = self.driver.mlm
+        self.current_recording = dict(
+            self.event(),
+            path=mlm.recording_path(mlm.recording_name(csv_name)),
+            rows=0,
+            recording_length=recording_length,
+        )
+
+    def finish_recording(self, wait_till_complete=True):
+        if self.current_recording is None:
+            return
+        recording = self.current_recording
+        recording['duration_s'] = self.now() - recording['time_s']
+        if not np.isfinite(recording['recording_length']):
+            recording['recording_length'] = None
+        self.recordings.append(recording)
+        self.current_recording = None
+
+    def run(self):
+        driver = self.driver
+        driver.InterfaceInstance.open()
+        driver.InterfaceInstance.stream_output(True)
+        driver.th.setup()
+
+        time_start = time.perf_counter()
+        with driver.mlm.terminal_manager():
+            self.time_started = self.clock()
+            self.protocol.start()
+            self.observe_phase()
+            while self.protocol.is_running():
+                if driver.terminate_experiment:
+                    self.end = 'terminated'
+                    break
+                if self.max_duration_s is not None and self.now() >= self.max_duration_s:
+                    self.end = 'max_duration'
+                    break
+                driver.experiment_sequence()
+                self.cycles += 1
+                if not self.protocol.is_running():
+                    # stop() finishes the running recording within the cycle, the driver sees none running
+                    self.finish_recording()
+                self.record_row()
+                self.observe_phase()
+            else:
+                self.end = 'finished'
+            if self.protocol.is_running():
+                self.protocol.stop()
+                self.observe_phase()
+            self.finish_recording()
+        self.wall_time = time.perf_counter() - time_start
+
+        driver.InterfaceInstance.set_motor(0)
+        driver.InterfaceInstance.close()
+        return self.report()
+
+    def record_row(self):
+        """The row of the cycle, recorded at its end."""
+        if self.current_recording is not None:
+            self.current_recording['rows'] += 1
+            if self.current_recording['rows'] >= self.current_recording['recording_length']:
+                self.finish_recording()
+
+    def observe_phase(self):
+        event = self.event()
+        if not self.timeline or (self.timeline[-1]['phase'], self.timeline[-1]['iteration']) \
+                != (event['phase'], event['iteration']):
+            self.timeline.append(event)
+
+    def report(self):
+        duration = self.now()
+        phase_durations = defaultdict(float)
+        for entry, next_entry in zip(self.timeline, self.timeline[1:] + [{'time_s': duration}]):
+            if entry['phase'] != 'idle':
+                phase_durations[entry['phase']] += next_entry['time_s'] - entry['time_s']
+        controller_name, optimizer_name = self.driver.mlm.controller_and_optimizer_names()
+        return {
+            'protocol': self.protocol.experiment_protocol_name,
+            'controller': controller_name,
+            'optimizer': optimizer_name,
+            'end': self.end,
+            'duration_s': duration,
+            'cycles': self.cycles,
+            'wall_time_s': self.wall_time,
+            'speed_up': duration / self.wall_time if self.wall_time else None,
+            'timeline': self.timeline,
+            'phase_durations_s': dict(phase_durations),
+            'recordings': self.recordings,
+            'calibrations': self.calibrations,
+            'timeouts': self.timeouts,
+        }
+
+
+def save_dry_run_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+
+def format_dry_run_report(report):
+    ends = {'finished': 'finished', 'max_duration': 'stopped at the maximal duration', 'terminated': 'terminated'}
+    controller = report['controller'] + ('/' + report['optimizer'] if report['optimizer'] else '')
+    lines = [f"Dry-run of {report['protocol']} (controller={controller}): {ends.get(report['end'], report['end'])} "
+             f"after {report['duration_s']:.1f}s of simulated time, {report['cycles']} cycles in "
+             f"{report['wall_time_s']:.1f}s" + (f", {report['speed_up']:.1f}x real time" if report['speed_up'] else '')]
+
+    lines.append('Phases:')
+    for entry in report['timeline']:
+        lines.append(f"  {entry['time_s']:10.2f}s  {entry['phase']} (iteration {entry['iteration']})")
+    lines.append('Time per phase: ' + ', '.join(f'{phase} {duration:.1f}s'
+                                                for phase, duration in report['phase_durations_s'].items()))
+
+    recordings = report['recordings']
+    lines.append(f"Recordings: {len(recordings)}, {sum(recording['duration_s'] for recording in recordings):.1f}s, "
+                 f"{sum(recording['rows'] for recording in recordings)} rows")
+    for recording in recordings:
+        lines.append(f"  {recording['time_s']:10.2f}s  {os.path.basename(recording['path'])} "
+                     f"{recording['duration_s']:.1f}s ({recording['rows']} rows), "
+                     f"from {recording['phase']} (iteration {recording['iteration']})")
+
+    for name in ['calibrations', 'timeouts']:
+        if report[name]:
+            lines.append(f'{name.capitalize()}: {len(report[name])}')
+            for event in report[name]:
+                lines.append(f"  {event['time_s']:10.2f}s  in {event['phase']} (iteration {event['iteration']})"
+                             + (f": {event['message']}" if 'message' in event else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,243 @@
+"""
+SQLite catalog of recordings - finding a past session without grepping file names.
+
+MainLoggingManager adds each recording when it is finished (from a background thread, as the latency histograms):
+controller, optimizer, chip and motor, experiment protocols, start, duration, rows, latency violations
+and a summary of firmware and python latency.
+Recordings made before the catalog existed (or on another machine) are added by DataAnalysis/index_recordings.py,
+which reads them in parallel processes (index_recordings).
+
+Queried columns are indexed (controller, optimizer, start time, protocol), so queries do not scan the table.
+next_id gives the next number of a series (e.g. the json controller configurations) from a counter table
+instead of listing the directory.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+from DriverFunctions.event_log import load_event_log
+from DriverFunctions.flight_recorder import FLIGHT_RECORDING_PREFIX
+from DriverFunctions.latency_histogram import (latency_histograms_from_recording, latency_histograms_sidecar_path,
+                                               load_latency_histograms)
+from DriverFunctions.recording_loader import RECORDING_EXTENSIONS, load_recording, recording_comment_lines
+
+from globals import RECORDING_CATALOG_PATH
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    format TEXT,
+    controller TEXT,
+    optimizer TEXT,
+    chip TEXT,
+    motor TEXT,
+    started TEXT,
+    duration_s REAL,
+    rows INTEGER,
+    latency_violations INTEGER,
+    firmware_latency_mean_s REAL,
+    firmware_latency_p99_s REAL,
+    python_latency_mean_s REAL,
+    python_latency_p99_s REAL,
+    cataloged TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_controller ON recordings (controller, optimizer);
+CREATE INDEX IF NOT EXISTS recordings_started ON recordings (started);
+CREATE TABLE IF NOT EXISTS recording_protocols (
+    recording_id INTEGER NOT NULL REFERENCES recordings (id) ON DELETE CASCADE,
+    protocol TEXT NOT NULL,
+    PRIMARY KEY (recording_id, protocol)
+);
+CREATE INDEX IF NOT EXISTS recording_protocols_protocol ON recording_protocols (protocol);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+RECORDING_FIELDS = ['path', 'name', 'format', 'controller', 'optimizer', 'chip', 'motor', 'started', 'duration_s', 'rows',
+                    'latency_violations', 'firmware_latency_mean_s', 'firmware_latency_p99_s',
+                    'python_latency_mean_s', 'python_latency_p99_s']
+
+# Name of create_csv_file_name, e.g. CP_mppi-tf_2022-02-13_10-20-30.csv -> controller 'mppi-tf'
+RECORDING_NAME_PATTERN = re.compile(r'^[A-Za-z]+_(?P<controller>.*?)_?(?P<date>\d{4}-\d{2}-\d{2})_(?P<time>\d{2}-\d{2}-\d{2})')
+# Title of create_csv_title
+RECORDING_TITLE_PATTERN = re.compile(r'from (?P<date>\d{2}\.\d{2}\.\d{4}) at time (?P<time>\d{2}:\d{2}:\d{2})')
+
+
+class RecordingCatalog:
+    def __init__(self, path=RECORDING_CATALOG_PATH):
+        self.path = os.path.abspath(path)  # Resolved once, a later change of the working directory does not move it
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self.connect()) as connection, connection:
+            connection.executescript(CATALOG_SCHEMA)
+
+    def connect(self):
+        # One connection per call - the catalog is used from background threads and processes
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA foreign_keys = ON')
+        return connection
+
+    def add(self, entry, protocols=()):
+        """Adds the recording or replaces the entry with the same path. entry: {field of RECORDING_FIELDS: value}"""
+        entry = dict(entry, path=os.path.abspath(entry['path']), cataloged=datetime.now().isoformat(timespec='seconds'))
+        entry.setdefault('name', os.path.basename(entry['path']))
+        fields = [field for field in RECORDING_FIELDS + ['cataloged'] if field in entry]
+        with closing(self.connect()) as connection, connection:
+            connection.execute('DELETE FROM recordings WHERE path = ?', (entry['path'],))
+            cursor = connection.execute(
+                f"INSERT INTO recordings ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                [entry[field] for field in fields])
+            connection.executemany('INSERT OR IGNORE INTO recording_protocols (recording_id, protocol) VALUES (?, ?)',
+                                   [(cursor.lastrowid, protocol) for protocol in protocols if protocol])
+            return cursor.lastrowid
+
+    def add_async(self, entry, protocols=(), latency_histograms=None, executor=None):
+        """
+        :param latency_histograms: {name: LatencyHistogram} of the recording, not changed anymore, summarized in the thread
+        :param executor: Its thread is used instead of starting one
+        """
+        def add():
+            self.add(dict(entry, **latency_summary(latency_histograms or {})), protocols)
+        if executor is not None:
+            executor.submit(add)
+        else:
+            threading.Thread(target=add, daemon=True).start()
+
+    def query(self, controller=None, optimizer=None, protocol=None, since=None, until=None, limit=None):
+        """
+        Recordings matching all given conditions, newest first, as dicts with 'protocols' (list).
+        :param since: until: ISO date(-time) strings, compared with the start of the recording
+        """
+        conditions, parameters = [], []
+        for column, value in [('controller', controller), ('optimizer', optimizer)]:
+            if value is not None:
+                conditions.append(f'r.{column} = ?')
+                parameters.append(value)
+        if protocol is not None:
+            conditions.append('r.id IN (SELECT recording_id FROM recording_protocols WHERE protocol = ?)')
+            parameters.append(protocol)
+        if since is not None:
+            conditions.append('r.started >= ?')
+            parameters.append(since)
+        if until is not None:
+            conditions.append('r.started < ?')
+            parameters.append(until)
+        sql = ('SELECT r.*, (SELECT group_concat(protocol) FROM recording_protocols WHERE recording_id = r.id) AS protocols'
+               ' FROM recordings AS r')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY r.started DESC'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with closing(self.connect()) as connection:
+            rows = connection.execute(sql, parameters).fetchall()
+        return [dict(row, protocols=row['protocols'].split(',') if row['protocols'] else []) for row in rows]
+
+    def paths(self):
+        with closing(self.connect()) as connection:
+            return {row['path'] for row in connection.execute('SELECT path FROM recordings')}
+
+    def next_id(self, series, initial=None):
+        """
+        Next number of the series (1, 2, ...), atomic across processes.
+        :param initial: Called when the series is not in the catalog yet, returns the last number used so far
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute('BEGIN IMMEDIATE')
+            if connection.execute('SELECT 1 FROM counters WHERE name = ?', (series,)).fetchone() is None:
+                connection.execute('INSERT INTO counters (name, value) VALUES (?, ?)',
+                                   (series, initial() if initial is not None else 0))
+            connection.execute('UPDATE counters SET value = value + 1 WHERE name = ?', (series,))
+            return connection.execute('SELECT value FROM counters WHERE name = ?', (series,)).fetchone()['value']
+
+
+def latency_summary(histograms):
+    """Catalog fields from {name: LatencyHistogram}."""
+    entry = {}
+    for name in ['firmware_latency', 'python_latency']:
+        if name in histograms and histograms[name].total_count:
+            entry[f'{name}_mean_s'] = histograms[name].mean()
+            entry[f'{name}_p99_s'] = histograms[name].value_at_percentile(99.0)
+    return entry
+
+
+def recording_entry(path):
+    """(entry, protocols) of a recording file, from its name, title, columns and sidecars - for the indexer."""
+    entry = {'path': path, 'format': os.path.splitext(path)[1][1:]}
+    match = RECORDING_NAME_PATTERN.match(os.path.basename(path))
+    if match:
+        entry['controller'] = match['controller'] or None
+        entry['started'] = datetime.strptime(f"{match['date']} {match['time']}", '%Y-%m-%d %H-%M-%S').isoformat()
+    comment_lines = recording_comment_lines(path)
+    match = RECORDING_TITLE_PATTERN.search(comment_lines[0]) if comment_lines else None
+    if match:
+        entry['started'] = datetime.strptime(f"{match['date']} {match['time']}", '%d.%m.%Y %H:%M:%S').isoformat()
+
+    recording = load_recording(path)
+    entry['rows'] = len(recording)
+    if len(recording) and 'time' in recording:
+        entry['duration_s'] = float(recording['time'].iloc[-1] - recording['time'].iloc[0])
+    if len(recording) and 'latency_violations' in recording:
+        entry['latency_violations'] = int(recording['latency_violations'].iloc[-1] - recording['latency_violations'].iloc[0])
+
+    sidecar_path = latency_histograms_sidecar_path(path)
+    if os.path.exists(sidecar_path):
+        histograms, metadata = load_latency_histograms(sidecar_path)
+        entry['controller'] = metadata.get('controller', entry.get('controller'))
+    else:
+        histograms = latency_histograms_from_recording(recording)
+    entry.update(latency_summary(histograms))
+
+    protocols = []
+    if 'experimentProtocol' in recording:
+        protocols = [str(protocol) for protocol in recording['experimentProtocol'].dropna().unique()]
+    for event in load_event_log(path):
+        if event['event'] == 'phase' and event.get('protocol') not in protocols:
+            protocols.append(event['protocol'])
+    return entry, protocols
+
+
+def recording_paths(directories):
+    paths = []
+    for directory in directories:
+        for root, _, filenames in os.walk(directory):
+            paths += [os.path.join(root, filename) for filename in sorted(filenames)
+                      if os.path.splitext(filename)[1] in RECORDING_EXTENSIONS
+                      and not filename.startswith(FLIGHT_RECORDING_PREFIX)]
+    return paths
+
+
+def index_recordings(directories, catalog=None, max_workers=None, reindex=False):
+    """
+    Adds the recordings found in the directories (recursively) to the catalog, read in parallel processes.
+    Recordings already in the catalog are skipped unless reindex. Returns the number of recordings added.
+    """
+    catalog = catalog or RecordingCatalog()
+    paths = recording_paths(directories)
+    if not reindex:
+        cataloged = catalog.paths()
+        paths = [path for path in paths if os.path.abspath(path) not in cataloged]
+
+    added = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {path: executor.submit(recording_entry, path) for path in paths}
+        for path, future in futures.items():
+            try:
+                entry, protocols = future.result()
+            except Exception as error:
+                print(f'{path}: not indexed, {error!r}')
+                continue
+            catalog.add(entry, protocols)
+            added += 1
+    return added
@@ -0,0 +1,70 @@
+"""
+Loads recordings of any format as a DataFrame with the same columns, so analysis scripts do not depend on the format.
+
+    .csv    csv recording (csv_recording.py or DataManager), comment lines start with #
+    .cprec  binary columnar recording of ColumnarRecorder (optionally compressed, with a time index)
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from DriverFunctions.columnar_recording import (COLUMNAR_RECORDING_EXTENSION, read_columnar_recording,
+                                                read_columnar_window)
+
+RECORDING_EXTENSIONS = ['.csv', COLUMNAR_RECORDING_EXTENSION]
+
+
+def load_recording(path, columns=None, time_window=None):
+    """
+    :param columns: Names of columns to load, all if None
+    :param time_window: (t0, t1) - only rows with t0 <= time <= t1; columnar recordings read only the blocks needed
+    :return: DataFrame, string columns of columnar recordings decoded to strings as read from csv
+    """
+    extension = os.path.splitext(path)[1]
+    if extension == COLUMNAR_RECORDING_EXTENSION:
+        if time_window is None:
+            data, dictionaries, _ = read_columnar_recording(path, columns)
+        else:
+            data, dictionaries, _ = read_columnar_window(path, time_window[0], time_window[1], columns)
+        for name, strings in dictionaries.items():
+            data[name] = np.asarray(strings, dtype=object)[data[name]]
+        return pd.DataFrame(data)
+
+    if time_window is None:
+        return pd.read_csv(path, comment='#', usecols=columns)
+    recording = pd.read_csv(path, comment='#', usecols=None if columns is None else list(set(columns) | {'time'}))
+    recording = recording.loc[recording['time'].between(time_window[0], time_window[1])].reset_index(drop=True)
+    return recording if columns is None else recording[columns]
+
+
+def recording_comment_lines(path):
+    """Title and header lines of the recording (without #)."""
+    if os.path.splitext(path)[1] == COLUMNAR_RECORDING_EXTENSION:
+        _, _, header = read_columnar_recording(path, columns=[])
+        return [header['title']] + header['header']
+    lines = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            lines.append(line[1:].strip())
+    return lines
+
+
+def convert_recording(path, output_format='csv', output_path=None):
+    """Converts a columnar recording to 'csv' (with the usual # comment lines) or 'parquet', returns the output path."""
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + '.' + output_format
+    recording = load_recording(path)
+    if output_format == 'csv':
+        with open(output_path, 'w', newline='') as f:
+            for line in recording_comment_lines(path):
+                f.write(f'# {line}\n')
+            recording.to_csv(f, index=False)
+    elif output_format == 'parquet':
+        recording.to_parquet(output_path, index=False)  # Needs pyarrow or fastparquet
+    else:
+        raise ValueError(f"Unknown output format {output_format}, use 'csv' or 'parquet'")
+    return output_path
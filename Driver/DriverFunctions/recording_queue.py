@@ -0,0 +1,132 @@
+"""
+Bounded queue between the control loop (single producer) and the writer thread of a recording.
+
+Blocks of rows are queued; when max_blocks are waiting (the disk stalls) the policy decides:
+    'block'        the control loop waits until the writer has taken a block - lossless, but the loop stalls
+    'drop-oldest'  the oldest waiting block is dropped - the loop never waits, rows are lost (counted)
+    'spill'        the block is kept in memory beyond the bound - lossless and the loop never waits, memory grows
+Control items (header, close) are never dropped and do not count towards the bound.
+
+Dictionary entries of a dropped block are carried over to the next block, so codes of string columns
+recorded later still decode.
+"""
+
+import threading
+import time
+from collections import deque
+
+RECORDING_QUEUE_POLICIES = ('block', 'drop-oldest', 'spill')
+
+
+class RecordingQueue:
+    def __init__(self, max_blocks, policy='spill'):
+        if policy not in RECORDING_QUEUE_POLICIES:
+            raise ValueError(f'Unknown recording queue policy {policy}, use one of {RECORDING_QUEUE_POLICIES}')
+        self.max_blocks = max(int(max_blocks), 1)
+        self.policy = policy
+        self.items = deque()  # (kind, item), kind 'block' or a control item
+        self.blocks = 0  # Blocks in items
+        self.condition = threading.Condition()
+        self.carried_dictionary_entries = {}  # Of dropped blocks, for the next block taken
+        self.consumer_failed = False  # Writer thread died - blocks are dropped instead of waiting forever
+
+        self.max_depth = 0
+        self.dropped_blocks = 0
+        self.dropped_rows = 0
+        self.spilled_blocks = 0  # Put while the queue was full
+        self.blocked_count = 0
+        self.blocked_time_s = 0.0
+
+    @property
+    def depth(self):
+        return self.blocks
+
+    def put_block(self, rows, new_dictionary_entries):
+        with self.condition:
+            if self.blocks >= self.max_blocks and not self.consumer_failed:
+                if self.policy == 'block':
+                    self.blocked_count += 1
+                    time_start = time.perf_counter()
+                    while self.blocks >= self.max_blocks and not self.consumer_failed:
+                        self.condition.wait()
+                    self.blocked_time_s += time.perf_counter() - time_start
+                elif self.policy == 'drop-oldest':
+                    self.drop_oldest_block()
+                else:
+                    self.spilled_blocks += 1
+            if self.consumer_failed:
+                self.dropped_blocks += 1
+                self.dropped_rows += len(rows)
+                return
+            self.items.append(('block', (rows, new_dictionary_entries)))
+            self.blocks += 1
+            self.max_depth = max(self.max_depth, self.blocks)
+            self.condition.notify_all()
+
+    def put_control(self, kind, item=None):
+        with self.condition:
+            self.items.append((kind, item))
+            self.condition.notify_all()
+
+    def fail(self):
+        """Called by the consumer which stops taking items, e.g. after a write error."""
+        with self.condition:
+            self.consumer_failed = True
+            for kind, item in self.items:
+                if kind == 'block':
+                    self.dropped_blocks += 1
+                    self.dropped_rows += len(item[0])
+            self.items.clear()
+            self.blocks = 0
+            self.condition.notify_all()
+
+    def drop_oldest_block(self):
+        for idx, (kind, item) in enumerate(self.items):
+            if kind == 'block':
+                rows, new_dictionary_entries = item
+                del self.items[idx]
+                self.blocks -= 1
+                self.dropped_blocks += 1
+                self.dropped_rows += len(rows)
+                self.carried_dictionary_entries = merge_dictionary_entries(self.carried_dictionary_entries,
+                                                                           new_dictionary_entries)
+                return
+
+    def get_all(self):
+        """Waits for at least one item, returns all queued items - the writer batches them into one write."""
+        with self.condition:
+            while not self.items:
+                self.condition.wait()
+            items = list(self.items)
+            self.items.clear()
+            self.blocks = 0
+            if self.carried_dictionary_entries:
+                for idx, (kind, item) in enumerate(items):
+                    if kind == 'block':
+                        rows, new_dictionary_entries = item
+                        items[idx] = (kind, (rows, merge_dictionary_entries(self.carried_dictionary_entries,
+                                                                            new_dictionary_entries)))
+                        self.carried_dictionary_entries = {}
+                        break
+            self.condition.notify_all()
+            return items
+
+    def statistics(self):
+        return {
+            'policy': self.policy,
+            'max_blocks': self.max_blocks,
+            'depth': self.blocks,
+            'max_depth': self.max_depth,
+            'dropped_blocks': self.dropped_blocks,
+            'dropped_rows': self.dropped_rows,
+            'spilled_blocks': self.spilled_blocks,
+            'blocked_count': self.blocked_count,
+            'blocked_time_s': self.blocked_time_s,
+        }
+
+
+def merge_dictionary_entries(earlier, later):
+    merged = {name: list(strings) for name, strings in earlier.items()}
+    for name, strings in later.items():
+        merged.setdefault(name, []).extend(strings)
+    return merged
@@ -0,0 +1,212 @@
+"""
+Recorded columns compiled into a single row extractor.
+
+Columns are declared as python expressions in terms of the driver (e.g. 'driver.th.firmware_latency') with a dtype.
+At recording start RecordingSchema generates one function which evaluates all of them and returns the row as a tuple -
+one call per cycle instead of a lambda and a dict lookup per column.
+Derived columns (e.g. 'angle ** 2') are expressions of other columns; the columnar recorder computes them
+for a whole chunk with numpy when the chunk is flushed, so they cost nothing in the control loop.
+The csv and the columnar recorders both record with the schema; recording_lambdas gives the same declarations
+as per-row lambdas, for DataManager.
+
+dtype 'str' - the value is recorded as its string, dictionary encoded in the chunks of the recorders.
+"""
+
+import ast
+import builtins
+from typing import NamedTuple
+
+import numpy as np
+
+STRING_DTYPE = 'str'
+STRING_CODE_DTYPE = '<i4'
+
+# Attribute chains of the driver bound to locals once per row in the generated extractor
+DRIVER_LOCALS = {'driver.th.': 'th.', 'driver.idp.': 'idp.', 'driver.s[': 's['}
+
+
+class Column(NamedTuple):
+    expression: str  # Evaluated every recorded cycle, may use driver and names of the namespace given to the schema
+    dtype: str = 'f8'
+
+
+class DerivedColumn(NamedTuple):
+    expression: str  # Of names of other (not derived) columns, evaluated for arrays at flush
+    dtype: str = 'f8'
+
+
+def expression_names(expression):
+    """Names an expression reads, without those it binds itself (e.g. in a comprehension)."""
+    nodes = [node for node in ast.walk(ast.parse(expression, mode='eval')) if isinstance(node, ast.Name)]
+    bound = {node.id for node in nodes if not isinstance(node.ctx, ast.Load)}
+    return {node.id for node in nodes if isinstance(node.ctx, ast.Load)} - bound
+
+
+def check_columns(columns, namespace, extra_names=()):
+    """
+    Raises ValueError for an expression which does not compile or reads a name it can not resolve - at declaration,
+    not when the recording starts. Columns may use driver and the namespace,
+    derived columns the other (not derived) columns, extra_names and np.
+    """
+    row_names = {name for name, column in columns.items() if isinstance(column, Column)} | set(extra_names)
+    for name, column in columns.items():
+        try:
+            compile(column.expression, f'<column {name}>', 'eval')
+            names = expression_names(column.expression)
+        except SyntaxError as error:
+            raise ValueError(f'Recorded column {name}: invalid expression {column.expression!r}: {error.msg}') from None
+        if isinstance(column, DerivedColumn):
+            known = row_names | {'np'}
+        else:
+            known = set(namespace) | {'driver'}
+        unknown = sorted(names - known - set(dir(builtins)))
+        if unknown:
+            raise ValueError(f'Recorded column {name}: {column.expression!r} uses unknown names {unknown}')
+
+
+class _ColumnsExpander(ast.NodeTransformer):
+    """Replaces names of columns (only names, not attributes or keywords) by their expressions."""
+
+    def __init__(self, expressions):
+        self.expressions = expressions
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and node.id in self.expressions:
+            return ast.parse(self.expressions[node.id], mode='eval').body
+        return node
+
+
+def expand_derived(expression, expressions):
+    """Expression of a derived column in terms of the expressions of the columns it uses."""
+    used = expression_names(expression)  # Names bound in the expression itself are not columns
+    tree = _ColumnsExpander({name: expressions[name] for name in used if name in expressions}).visit(
+        ast.parse(expression, mode='eval'))
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def storage_dtype(dtype):
+    return STRING_CODE_DTYPE if dtype == STRING_DTYPE else dtype
+
+
+def inferred_dtype(value):
+    """dtype of columns from the measurement and controller dicts, not known before the first row."""
+    if not (value is None or isinstance(value, (int, float, np.number, np.bool_))):
+        return STRING_DTYPE
+    if isinstance(value, np.floating) and value.dtype == np.float32:
+        return '<f4'
+    return '<f8'
+
+
+class RecordingSchema:
+    def __init__(self, columns, namespace, extra_dicts=(), extra_buffers=()):
+        """
+        :param columns: {name: Column or DerivedColumn}, in the order of the recording
+        :param namespace: Names which the expressions use (besides driver), e.g. globals() of the caller
+        :param extra_dicts: Dicts (e.g. of measurement and controller) whose items are recorded after the columns,
+            their keys are fixed at recording start and their dtypes taken from the first row
+        :param extra_buffers: DiagnosticBuffers (fixed names and dtype) recorded after the dicts,
+            all values of a buffer are taken with one call
+        """
+        check_columns(columns, namespace)
+        self.columns = dict(columns)
+        self.extra_keys = [list(d.keys()) for d in extra_dicts]
+        self.extra_callable = [[callable(d[key]) for key in keys] for d, keys in zip(extra_dicts, self.extra_keys)]
+        self.extra_buffer_layouts = [buffer_layout(buffer) for buffer in extra_buffers]
+
+        extra_names = [key for keys in self.extra_keys for key in keys]
+        extra_names += [name for names, _ in self.extra_buffer_layouts for name in names]
+        self.declared_row_names = [name for name, column in self.columns.items() if isinstance(column, Column)]
+        self.row_names = self.declared_row_names + extra_names
+        self.derived_names = [name for name, column in self.columns.items() if isinstance(column, DerivedColumn)]
+        self.names = list(self.columns) + extra_names
+        if len(set(self.names)) != len(self.names):
+            raise ValueError(f'Recorded column names are not unique: {self.names}')
+
+        self.source = self.generate_extractor_source()
+        namespace = dict(namespace)
+        exec(compile(self.source, '<recording row extractor>', 'exec'), namespace)
+        self.extract_row = namespace['extract_row']
+
+        self.derived_code = {name: compile(self.columns[name].expression, f'<derived column {name}>', 'eval')
+                             for name in self.derived_names}
+
+        self.row_dtype = None  # Of the row buffer, the extracted rows; known from the first row
+        self.dtype = None  # Of the recording, with derived columns
+        self.string_columns = []  # Indices of the row which are dictionary encoded
+
+    def generate_extractor_source(self):
+        items = []
+        locals_used = set()
+        for name in self.declared_row_names:
+            expression = self.columns[name].expression
+            for chain, local in DRIVER_LOCALS.items():
+                if chain in expression:
+                    expression = expression.replace(chain, local)
+                    locals_used.add(chain)
+            items.append(f'({expression})')
+        for i, (keys, callables) in enumerate(zip(self.extra_keys, self.extra_callable)):
+            items += [f'extra_{i}[{key!r}]()' if is_callable else f'extra_{i}[{key!r}]'
+                      for key, is_callable in zip(keys, callables)]
+        # One C call per buffer, its values as python scalars unpacked into the row
+        items += [f'*extra_buffers[{i}].values.tolist()' for i in range(len(self.extra_buffer_layouts))]
+
+        lines = ['def extract_row(driver, extra_dicts=(), extra_buffers=()):']
+        lines += [f'    {local[:-1]} = {chain[:-1]}' for chain, local in DRIVER_LOCALS.items() if chain in locals_used]
+        lines += [f'    extra_{i} = extra_dicts[{i}]' for i in range(len(self.extra_keys))]
+        lines.append('    return (' + ''.join(f'\n        {item},' for item in items) + '\n    )')
+        return '\n'.join(lines) + '\n'
+
+    def compiled_for(self, extra_dicts, extra_buffers=()):
+        """True if the extractor fits these extra dicts and buffers - a copy of the schema can be used for the next recording."""
+        keys = [list(d.keys()) for d in extra_dicts]
+        return keys == self.extra_keys and \
+            [[callable(d[key]) for key in k] for d, k in zip(extra_dicts, keys)] == self.extra_callable and \
+            [buffer_layout(buffer) for buffer in extra_buffers] == self.extra_buffer_layouts
+
+    def resolve_dtypes(self, first_row):
+        """Fixes the dtypes of columns from the extra dicts and of derived columns with the first extracted row."""
+        buffer_dtypes = [dtype for names, dtype in self.extra_buffer_layouts for _ in names]
+        row_dtypes = [self.columns[name].dtype for name in self.declared_row_names]
+        row_dtypes += [inferred_dtype(value) for value in
+                       first_row[len(self.declared_row_names):len(first_row) - len(buffer_dtypes)]]
+        row_dtypes += buffer_dtypes
+        self.string_columns = [idx for idx, dtype in enumerate(row_dtypes) if dtype == STRING_DTYPE]
+        self.row_dtype = np.dtype([(name, storage_dtype(dtype)) for name, dtype in zip(self.row_names, row_dtypes)])
+
+        dtypes = dict(zip(self.row_names, row_dtypes))
+        dtypes.update({name: self.columns[name].dtype for name in self.derived_names})
+        self.dtype = np.dtype([(name, storage_dtype(dtypes[name])) for name in self.names])
+
+    @property
+    def dictionary_encoded(self):
+        return [self.row_names[idx] for idx in self.string_columns]
+
+    def complete_rows(self, rows):
+        """Rows of the row buffer -> rows of the recording, derived columns computed for all rows at once."""
+        if not self.derived_names:
+            return rows
+        completed = np.empty(len(rows), dtype=self.dtype)
+        columns = {name: rows[name] for name in self.row_names}
+        for name in self.row_names:
+            completed[name] = columns[name]
+        for name in self.derived_names:
+            completed[name] = eval(self.derived_code[name], {'np': np}, columns)
+        return completed
+
+
+def buffer_layout(buffer):
+    """(names, dtype) of a DiagnosticBuffer - what the compiled extractor depends on."""
+    return list(buffer.names), buffer.values.dtype.str
+
+
+def recording_lambdas(columns, namespace, driver):
+    """{name: lambda} evaluating the declared columns one by one, for FunctionalDict of the csv recording."""
+    namespace = dict(namespace, driver=driver)
+    expressions = {name: column.expression for name, column in columns.items() if isinstance(column, Column)}
+    lambdas = {}
+    for name, column in columns.items():
+        expression = column.expression
+        if isinstance(column, DerivedColumn):
+            expression = expand_derived(expression, expressions)
+        lambdas[name] = eval(f'lambda: {expression}', namespace)
+    return lambdas
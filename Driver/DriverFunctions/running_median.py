@@ -0,0 +1,62 @@
+"""
+Sliding-window median updated incrementally.
+
+The window is kept twice: as a ring (to know which value leaves the window) and as a sorted list.
+Each update finds the leaving and the new value with bisection (O(log n)) and moves at most n list items
+in C (list insert/delete), instead of copying and partitioning the whole window with np.median every sample.
+
+Results are identical to np.median over a buffer of the same dtype (default float32, as the buffers used before),
+including the initial fill of the window with zeros.
+"""
+
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+class RunningMedian:
+    def __init__(self, window_length, initial_value=0.0, dtype=np.float32):
+        if window_length < 1:
+            raise ValueError(f'Median window length must be at least 1, got {window_length}')
+        self.window_length = window_length
+        self.dtype = dtype
+
+        initial_value = float(dtype(initial_value))
+        self.ring = [initial_value] * window_length
+        self.sorted_window = [initial_value] * window_length
+        self.idx = 0
+
+        self.middle = window_length // 2
+        self.even = window_length % 2 == 0
+
+    def update(self, value):
+        """Puts value into the window, dropping the oldest one, and returns the median of the window."""
+        dtype = self.dtype
+        value = float(dtype(value))  # Round to buffer precision exactly as writing into a numpy buffer would
+
+        if self.window_length == 1:
+            self.ring[0] = value
+            self.sorted_window[0] = value
+            return dtype(value)
+
+        leaving_value = self.ring[self.idx]
+        self.ring[self.idx] = value
+        self.idx += 1
+        if self.idx == self.window_length:
+            self.idx = 0
+
+        if value != leaving_value:
+            del self.sorted_window[bisect_left(self.sorted_window, leaving_value)]
+            insort(self.sorted_window, value)
+
+        return self.median()
+
+    def median(self):
+        dtype = self.dtype
+        if self.even:
+            # np.median averages the two middle values in the buffer dtype
+            return (dtype(self.sorted_window[self.middle - 1]) + dtype(self.sorted_window[self.middle])) / dtype(2)
+        return dtype(self.sorted_window[self.middle])
+
+    def reset(self, initial_value=0.0):
+        self.__init__(self.window_length, initial_value, self.dtype)
@@ -0,0 +1,172 @@
+"""
+Low-overhead hierarchical span profiler.
+
+Spans are timed with perf_counter_ns and stored in a fixed-size ring buffer of preallocated lists
+(faster than numpy arrays for single item writes), so recording a span costs a few list writes
+and the memory does not grow during long sessions.
+Nesting is not stored explicitly - it follows from start and end times of the spans in the same thread,
+which is also how Chrome trace viewer and Perfetto reconstruct it.
+The ring can be exported on demand or on latency-violation bursts to Chrome trace JSON (open in ui.perfetto.dev).
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from globals import SPAN_PROFILER_ENABLED, SPAN_PROFILER_BUFFER_LENGTH, PATH_TO_TRACES
+
+
+class SpanProfiler:
+    def __init__(self, capacity=SPAN_PROFILER_BUFFER_LENGTH, enabled=SPAN_PROFILER_ENABLED):
+        self.capacity = capacity
+        self.enabled = enabled
+
+        self.names = []  # name id -> name
+        self.name_ids = {}  # name -> name id
+        self.thread_ids = {}  # threading.get_ident() -> small integer for the trace
+
+        self.span_name = [0] * capacity
+        self.span_thread = [0] * capacity
+        self.span_start_ns = [0] * capacity
+        self.span_end_ns = [0] * capacity
+        self.spans_recorded = 0  # Total, the ring holds the last min(spans_recorded, capacity) spans
+
+        self.time_origin_ns = time.perf_counter_ns()
+
+    def name_id(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+        return name_id
+
+    def span(self, name):
+        """Use as "with profiler.span('name'):" - spans opened inside are children of this one."""
+        return Span(self, self.name_id(name))
+
+    def record(self, name_id, start_ns, end_ns):
+        if not self.enabled:
+            return
+        thread = threading.get_ident()
+        thread_id = self.thread_ids.get(thread)
+        if thread_id is None:
+            thread_id = len(self.thread_ids)
+            self.thread_ids[thread] = thread_id
+        # Spans from other threads may rarely overwrite each other here; we accept it to keep recording lock-free
+        idx = self.spans_recorded % self.capacity
+        self.span_name[idx] = name_id
+        self.span_thread[idx] = thread_id
+        self.span_start_ns[idx] = start_ns
+        self.span_end_ns[idx] = end_ns
+        self.spans_recorded += 1
+
+    def last_duration(self, name):
+        """Duration in seconds of the most recently finished span with given name, None if not in the ring."""
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            return None
+        for back in range(1, min(self.spans_recorded, self.capacity) + 1):
+            idx = (self.spans_recorded - back) % self.capacity
+            if self.span_name[idx] == name_id:
+                return (self.span_end_ns[idx] - self.span_start_ns[idx]) * 1e-9
+        return None
+
+    def snapshot(self, last_n=None):
+        """
+        Copies of the spans currently in the ring, oldest first.
+        Only list slicing is done here, so it is cheap enough to call from the control loop.
+        """
+        stored = min(self.spans_recorded, self.capacity)
+        if last_n is not None:
+            stored = min(stored, last_n)
+        first = (self.spans_recorded - stored) % self.capacity
+        last = first + stored
+
+        def ordered(ring):
+            if last <= self.capacity:
+                return ring[first:last]
+            return ring[first:] + ring[:last - self.capacity]
+
+        return {
+            'names': list(self.names),
+            'threads': {thread_id: thread for thread, thread_id in self.thread_ids.items()},
+            'name': ordered(self.span_name),
+            'thread': ordered(self.span_thread),
+            'start_ns': ordered(self.span_start_ns),
+            'end_ns': ordered(self.span_end_ns),
+        }
+
+    def reset(self):
+        self.spans_recorded = 0
+
+    def export_chrome_trace(self, path=None, last_n=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot(last_n)
+        if path is None:
+            path = default_trace_path()
+        write_chrome_trace(snapshot, path, self.time_origin_ns)
+        return path
+
+    def export_chrome_trace_async(self, path=None, last_n=None, reason=''):
+        """Takes the snapshot in the calling thread and leaves JSON formatting and writing to a background thread."""
+        snapshot = self.snapshot(last_n)
+        if path is None:
+            path = default_trace_path(reason)
+        threading.Thread(target=self.export_chrome_trace, kwargs={'path': path, 'snapshot': snapshot},
+                         daemon=True).start()
+        return path
+
+
+class Span:
+    __slots__ = ('profiler', 'name_id', 'start_ns')
+
+    def __init__(self, profiler, name_id):
+        self.profiler = profiler
+        self.name_id = name_id
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self.name_id, self.start_ns, time.perf_counter_ns())
+
+
+def default_trace_path(reason=''):
+    reason_string = '-' + reason if reason else ''
+    return os.path.join(PATH_TO_TRACES, f"trace_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f')}{reason_string}.json")
+
+
+def write_chrome_trace(snapshot, path, time_origin_ns=0):
+    """Writes spans as complete ('X') events of Chrome trace event format, timestamps in microseconds."""
+    names = snapshot['names']
+    events = [
+        {
+            'name': names[name_id],
+            'ph': 'X',
+            'pid': 0,
+            'tid': thread_id,
+            'ts': (start_ns - time_origin_ns) / 1000.0,
+            'dur': (end_ns - start_ns) / 1000.0,
+        }
+        for name_id, thread_id, start_ns, end_ns in
+        zip(snapshot['name'], snapshot['thread'], snapshot['start_ns'], snapshot['end_ns'])
+    ]
+    events += [
+        {'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': thread_id, 'args': {'name': f'thread {thread}'}}
+        for thread_id, thread in snapshot['threads'].items()
+    ]
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+# Shared by the driver, timing helper and serial interface so that all spans land in one trace
+profiler = SpanProfiler()
@@ -0,0 +1,175 @@
+"""
+Constant cost per sample statistics of timing quantities, for the statistics in terminal.
+
+- RingStatistics: mean and standard deviation over the last window_length samples.
+  Samples are kept in a preallocated ring, the sums of values and of squares are updated incrementally
+  and recomputed exactly once per window length, so rounding errors of the incremental updates do not accumulate.
+- P2Quantile: P-square estimator of a quantile (Jain & Chlamtac, 1985) - five markers, no samples stored.
+  It estimates the quantile of all samples since the last reset, not only of the last window.
+- StreamingStatistics: both of the above for one quantity, with p50, p99 and maximum since reset.
+
+Arithmetic is done in python floats - for single samples it is several times faster than numpy scalars.
+"""
+
+import math
+
+
+class RingStatistics:
+    def __init__(self, window_length):
+        if window_length < 1:
+            raise ValueError(f'Window length must be at least 1, got {window_length}')
+        self.window_length = window_length
+        self.ring = [0.0] * window_length
+        self.reset()
+
+    def reset(self):
+        self.idx = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_of_squares = 0.0
+        self.updates_since_exact_sums = 0
+
+    def update(self, value):
+        value = float(value)
+        if self.count == self.window_length:
+            leaving_value = self.ring[self.idx]
+            self.sum -= leaving_value
+            self.sum_of_squares -= leaving_value * leaving_value
+        else:
+            self.count += 1
+        self.ring[self.idx] = value
+        self.sum += value
+        self.sum_of_squares += value * value
+
+        self.idx += 1
+        if self.idx == self.window_length:
+            self.idx = 0
+
+        self.updates_since_exact_sums += 1
+        if self.updates_since_exact_sums == self.window_length:
+            self.recompute_sums()
+
+    def recompute_sums(self):
+        window = self.ring if self.count == self.window_length else self.ring[:self.count]
+        self.sum = math.fsum(window)
+        self.sum_of_squares = math.fsum(v * v for v in window)
+        self.updates_since_exact_sums = 0
+
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    def std(self):
+        """Population standard deviation, as np.std."""
+        if not self.count:
+            return math.nan
+        mean = self.sum / self.count
+        return math.sqrt(max(self.sum_of_squares / self.count - mean * mean, 0.0))
+
+
+class P2Quantile:
+    def __init__(self, quantile):
+        if not 0.0 < quantile < 1.0:
+            raise ValueError(f'Quantile must be between 0 and 1, got {quantile}')
+        self.quantile = quantile
+        self.reset()
+
+    def reset(self):
+        p = self.quantile
+        self.count = 0
+        self.heights = []  # Marker heights, the first five samples until all markers are initialised
+        self.positions = [0, 1, 2, 3, 4]  # Actual marker positions (0-based)
+        self.desired_positions = [0.0, 2.0 * p, 4.0 * p, 2.0 + 2.0 * p, 4.0]
+        self.desired_increments = (0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0)
+
+    def update(self, value):
+        value = float(value)
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(value)
+            if self.count == 5:
+                q.sort()
+            return
+
+        # Cell of the new sample, extreme markers follow minimum and maximum
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired, increments = self.desired_positions, self.desired_increments
+        desired[1] += increments[1]
+        desired[2] += increments[2]
+        desired[3] += increments[3]
+        desired[4] += 1.0
+
+        # Move the middle markers by one position if they drifted from the desired positions
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1.0 and n[i + 1] - n[i] > 1) or (d <= -1.0 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            # Too few samples for markers - nearest rank of the samples seen so far
+            samples = sorted(self.heights)
+            return samples[min(int(self.quantile * len(samples)), len(samples) - 1)]
+        return self.heights[2]
+
+
+class StreamingStatistics:
+    def __init__(self, window_length):
+        self.window = RingStatistics(window_length)
+        self.p50 = P2Quantile(0.5)
+        self.p99 = P2Quantile(0.99)
+        self.max = -math.inf
+
+    def update(self, value):
+        value = float(value)
+        self.window.update(value)
+        self.p50.update(value)
+        self.p99.update(value)
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        self.window.reset()
+        self.p50.reset()
+        self.p99.reset()
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return self.p50.count
+
+    def summary(self):
+        """mean and std over the window, p50, p99 and max since reset."""
+        return {
+            'mean': self.window.mean(),
+            'std': self.window.std(),
+            'p50': self.p50.value(),
+            'p99': self.p99.value(),
+            'max': self.max if self.count else math.nan,
+        }
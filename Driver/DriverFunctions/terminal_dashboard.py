@@ -0,0 +1,137 @@
+"""
+Status of the driver in the terminal, rendered by a background thread every PRINT_PERIOD_MS.
+
+The control loop only publishes a snapshot of the values which change every cycle (publish - one tuple assignment);
+formatting the lines and printing them through the TerminalContentManager happens in the thread.
+Slowly changing parts (controller settings, experiment protocol, timing statistics) are read from the driver
+directly at render time, without locks, as the metrics endpoint does - a frame may mix two neighbouring cycles.
+"""
+
+import threading
+from typing import NamedTuple
+
+from CartPoleSimulation.CartPole.state_utilities import ANGLE_IDX, POSITION_IDX
+
+from globals import CONTROLLER_NAME, CONTROL_PERIOD_MS, CONTROL_SYNC, PRINT_PERIOD_MS
+
+ESC = '\033['
+BACK_TO_BEGINNING = '\r'
+CLEAR_LINE = ESC + 'K'  # Clear the entire line
+
+
+class TerminalSnapshot(NamedTuple):
+    control_enabled: bool
+    angle: float
+    angle_raw: int
+    position: float
+    position_raw: int
+    target_position: float
+    target_equilibrium: float
+    Q: float
+    command: int
+    invalid_steps: int
+    freezme: int
+
+
+class TerminalDashboard:
+    def __init__(self, driver, period_ms=PRINT_PERIOD_MS):
+        self.driver = driver
+        self.period_s = period_ms / 1000.0
+        self.snapshot = None  # Latest TerminalSnapshot, written by the control loop
+        self.tcm = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.render_failed = False  # The error is printed once
+
+    def publish(self):
+        driver = self.driver
+        self.snapshot = TerminalSnapshot(
+            driver.controlEnabled,
+            driver.s[ANGLE_IDX],
+            driver.idp.angle_raw,
+            driver.s[POSITION_IDX],
+            driver.idp.position_raw,
+            driver.CartPoleInstance.target_position,
+            driver.CartPoleInstance.target_equilibrium,
+            driver.Q,
+            driver.actualMotorCmd,
+            driver.idp.invalid_steps,
+            driver.idp.freezme,
+        )
+
+    def start(self, tcm):
+        self.tcm = tcm
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='terminal-dashboard', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+            self.render()  # Last state stays in the terminal
+
+    def run(self):
+        while not self.stop_event.wait(self.period_s):
+            self.render()
+
+    def render(self):
+        snapshot = self.snapshot
+        if snapshot is None or self.tcm is None:
+            return
+        try:
+            lines = self.lines(snapshot)
+        except Exception as error:
+            if not self.render_failed:
+                self.render_failed = True
+                print(f'\nTerminal dashboard: rendering failed: {error!r}')
+            return
+
+        self.tcm.print_temporary(BACK_TO_BEGINNING + CLEAR_LINE)
+        for line in lines:
+            self.tcm.print_temporary(BACK_TO_BEGINNING + line + CLEAR_LINE)
+        self.tcm.print_to_terminal()
+
+    def lines(self, snapshot):
+        driver = self.driver
+        lines = []
+
+        # Controller
+        if snapshot.control_enabled:
+            if 'mpc' in CONTROLLER_NAME:
+                lines.append('CONTROLLER:   {} (Period={}ms, Synch={}, Horizon={}, Rollouts={}, Predictor={})'.format(
+                    CONTROLLER_NAME, CONTROL_PERIOD_MS, CONTROL_SYNC, driver.controller.optimizer.mpc_horizon,
+                    driver.controller.optimizer.num_rollouts, driver.controller.predictor.predictor_name))
+            else:
+                lines.append('CONTROLLER:   {} (Period={}ms, Synch={})'.format(CONTROLLER_NAME, CONTROL_PERIOD_MS,
+                                                                              CONTROL_SYNC))
+        else:
+            lines.append('CONTROLLER:   Firmware')
+
+        # Experiment Protocol
+        lines.append(f'MEASUREMENT: {driver.epm.current_experiment_protocol}')
+
+        # State
+        lines.append(
+            "STATE:  angle:{:+.3f}rad, angle raw:{:04}, position:{:+.2f}cm, position raw:{:04}, target:{}, Q:{:+.2f}, command:{:+05d}, invalid_steps:{}, freezme:{}"
+            .format(
+                snapshot.angle,
+                snapshot.angle_raw,
+                snapshot.position * 100,
+                snapshot.position_raw,
+                f"{snapshot.target_position}, {snapshot.target_equilibrium}",
+                snapshot.Q,
+                snapshot.command,
+                snapshot.invalid_steps,
+                snapshot.freezme
+            ))
+
+        # Timing
+        timing_string, timing_latency_string = driver.th.strings_for_statistics_in_terminal()
+        if timing_string:
+            lines.append(timing_string)
+        if timing_latency_string:
+            lines.append(timing_latency_string)
+
+        return lines
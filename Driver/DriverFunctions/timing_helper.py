@@ -1,14 +1,72 @@
 import time
+from collections import deque
 
 import numpy as np
 
 from CartPoleSimulation.CartPole.latency_adder import LatencyAdder
 
-from globals import CONTROL_PERIOD_MS, STATISTICS_IN_TERMINAL_AVERAGING_LENGTH
+from DriverFunctions.span_profiler import profiler
+from DriverFunctions.clock_alignment import ChipClockAligner
+from DriverFunctions.streaming_statistics import StreamingStatistics
+from DriverFunctions.latency_histogram import create_latency_histograms
+
+from globals import (CONTROL_PERIOD_MS, STATISTICS_IN_TERMINAL_AVERAGING_LENGTH,
+                     SPAN_PROFILER_EXPORT_ON_VIOLATION_BURST, SPAN_PROFILER_BURST_VIOLATIONS,
+                     SPAN_PROFILER_BURST_WINDOW, SPAN_PROFILER_BURST_COOLDOWN_S,
+                     LATENCY_BUDGET_SERIAL_READ_MS, LATENCY_BUDGET_ESTIMATION_MS,
+                     LATENCY_BUDGET_CONTROLLER_MS, LATENCY_BUDGET_ACTUATION_MS)
+
+# Cause code of a latency violation, logged every cycle (0 - no violation); checked in this order
+LATENCY_VIOLATION_CAUSES = [
+    'none',
+    'chip',  # Flagged by firmware - command for the previous measurement came too late
+    'late_frame',  # Time between measurements above 1.5 control periods, steps were missed
+    'firmware_latency',  # Firmware latency longer than control period
+    'inconsistent_latency',  # Firmware latency shorter than controller step, obviously wrong measurement
+]
+
+# Stages of the control loop with latency budgets (s), code of the stage is its index; 0 - no stage over budget
+LOOP_STAGES = ['none', 'serial_read', 'estimation', 'controller', 'actuation']
+LOOP_STAGE_BUDGETS = [
+    None,
+    LATENCY_BUDGET_SERIAL_READ_MS / 1000.0,
+    LATENCY_BUDGET_ESTIMATION_MS / 1000.0,
+    LATENCY_BUDGET_CONTROLLER_MS / 1000.0,
+    LATENCY_BUDGET_ACTUATION_MS / 1000.0,
+]
+# Span or timer name in the driver loop -> stage code
+LOOP_STAGE_OF_SPAN = {
+    'serial_read': LOOP_STAGES.index('serial_read'),
+    'process_state_information': LOOP_STAGES.index('estimation'),
+    'controller_steptime': LOOP_STAGES.index('controller'),
+    'actuation': LOOP_STAGES.index('actuation'),
+}
+
+
+class VirtualClock:
+    """
+    Clock of dry-runs, advanced by the simulated plant instead of the wall - the loop runs as fast as the CPU allows.
+    Call it as time.time, sleep advances it.
+    """
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.advance(max(seconds, 0.0))
 
 
 class TimingHelper:
-    def __init__(self):
+    def __init__(self, clock=time.time):
+        """
+        :param clock: Gives time_current_measurement, which the experiment protocols use; VirtualClock for dry-runs
+        """
+        self.clock = clock
         self.time_current_measurement_chip = 0
         self.time_last_measurement_chip = None
         self.time_between_measurements_chip = 0
@@ -18,31 +76,80 @@ class TimingHelper:
         self.time_current_measurement = None
         self.elapsedTime = None
 
-        self.delta_time_buffer = np.zeros((0,))
-        self.firmware_latency_buffer = np.zeros((0,))
+        # Statistics in terminal - mean and std over last STATISTICS_IN_TERMINAL_AVERAGING_LENGTH samples, quantiles and max since reset
+        self.delta_time_statistics = StreamingStatistics(STATISTICS_IN_TERMINAL_AVERAGING_LENGTH)
+        self.firmware_latency_statistics = StreamingStatistics(STATISTICS_IN_TERMINAL_AVERAGING_LENGTH)
         self.python_latency = 0
-        self.python_latency_buffer = np.zeros((0,))
+        self.python_latency_statistics = StreamingStatistics(STATISTICS_IN_TERMINAL_AVERAGING_LENGTH)
         self.controller_steptime = 0
         self.controller_steptime_previous = 0
-        self.controller_steptime_buffer = np.zeros((0,))
+        self.controller_steptime_statistics = StreamingStatistics(STATISTICS_IN_TERMINAL_AVERAGING_LENGTH)
         self.controlled_iterations = 0
         self.total_iterations = 0
 
+        # Histograms of the current recording, saved next to it by MainLoggingManager
+        self.latency_histograms = create_latency_histograms()
+
         self.firmware_latency = 0
         self.latency_violation = 0
         self.latency_violations = 0
 
+        # Latency violations per cause and budget overruns per loop stage, codes as in LATENCY_VIOLATION_CAUSES, LOOP_STAGES
+        self.latency_violation_cause = 0
+        self.latency_violations_per_cause = [0] * len(LATENCY_VIOLATION_CAUSES)
+        self.latency_violation_stage = 0
+        self.latency_violations_per_stage = [0] * len(LOOP_STAGES)
+        self.stage_durations = [0.0] * len(LOOP_STAGES)  # Last duration of each stage, zeroed once it was checked
+        self.stage_overruns = [0] * len(LOOP_STAGES)
+        self.missed_measurements = 0  # Frames the chip measured but which never arrived, from gaps in chip time, not reset
+
+        # Chip clock aligned to host monotonic clock
+        self.clock_aligner = ChipClockAligner()
+        self.time_frame_received_host = None  # Host monotonic time at which the last frame was parsed
+        self.time_measurement_host = None  # Host monotonic time at which the last measurement was taken on chip
+        self.clock_alignment_excess = 0.0  # Frame received minus aligned measurement time - delay over the fastest frames
+        self.sensor_to_actuation_latency = 0.0  # From measurement on chip to motor command sent by host
+
         # Artificial Latency
         self.additional_latency = 0.0
         self.LatencyAdderInstance = LatencyAdder(latency=self.additional_latency, dt_sampling=0.005)
 
+        # Span profiler - records where the time of each control cycle goes
+        self.profiler = profiler
+        self.recent_violation_iterations = deque(maxlen=SPAN_PROFILER_BURST_VIOLATIONS)
+        self.violation_bursts = 0
+        self.export_trace_on_violation_burst = SPAN_PROFILER_EXPORT_ON_VIOLATION_BURST
+        self.time_last_trace_export = -np.inf
 
     def timer(self, attr_name, prev_attr_name=None):
         """Create a NamedTimer for a given attribute name, with an optional previous attribute name."""
         return NamedTimer(self, attr_name, prev_attr_name)
 
+    def span(self, name):
+        """Time a stage of the control loop with the span profiler, spans can be nested."""
+        stage = LOOP_STAGE_OF_SPAN.get(name)
+        if stage is not None:
+            return StageSpan(self, self.profiler.name_id(name), stage)
+        return self.profiler.span(name)
+
+    def export_trace(self, reason=''):
+        path = self.profiler.export_chrome_trace_async(reason=reason)
+        self.time_last_trace_export = time.perf_counter()
+        print(f'\nExporting profiler trace to {path}')
+
     def setup(self):
-        self.time_experiment_started = time.time()
+        self.time_experiment_started = self.clock()
+        self.clock_aligner.reset()
+
+    def resync(self):
+        """
+        After the loop paused (e.g. controller prewarmed) and the read buffer was cleared:
+        the clock alignment starts anew and the statistics do not include the pause.
+        """
+        self.clock_aligner.reset()
+        self.time_last_measurement_chip = None
+        self.stage_durations = [0.0] * len(LOOP_STAGES)
+        self.reset_timing_helper_memory()
 
     def load_timing_data_from_chip(
             self,
@@ -51,13 +158,25 @@ class TimingHelper:
             latency_violation_chip,
             firmware_latency,
     ):
+        self.time_frame_received_host = time.perf_counter()
+        self.time_measurement_host = self.clock_aligner.update(time_current_measurement_chip, self.time_frame_received_host)
+        self.clock_alignment_excess = self.clock_aligner.transport_delay
+
+        if self.clock_aligner.overflow_detected and time_between_measurements_chip < 1.0e-9:
+            # Chip timer overflow - use time difference from unwrapped chip time instead of the invalid one
+            time_between_measurements_chip = self.clock_aligner.time_chip_between
+
         self.time_current_measurement_chip = time_current_measurement_chip
         self.time_between_measurements_chip = time_between_measurements_chip
         self.latency_violation = latency_violation_chip
         self.firmware_latency = firmware_latency
 
+    def mark_actuation(self):
+        """Call right after the motor command for the current measurement was sent."""
+        self.sensor_to_actuation_latency = time.perf_counter() - self.time_measurement_host
+
     def time_measurement(self):
-        self.time_current_measurement = time.time()
+        self.time_current_measurement = self.clock()
         self.elapsedTime = self.time_current_measurement - self.time_experiment_started
 
         if self.time_between_measurements_chip < 1.0e-9:
@@ -70,17 +189,65 @@ class TimingHelper:
     # FIXME: Think if these cases are right
     def check_latency_violation(self, controlEnabled):
         # Latency Violations
+        cause = 0
         if self.latency_violation == 1:
-            self.latency_violations += 1
+            cause = 1
+            violations = 1
         elif self.time_between_measurements_chip > 1.5 * CONTROL_PERIOD_MS / 1000.0:
-            self.latency_violation = 1
-            self.latency_violations += np.floor(self.time_between_measurements_chip / (CONTROL_PERIOD_MS / 1000.0))
+            cause = 2
+            violations = np.floor(self.time_between_measurements_chip / (CONTROL_PERIOD_MS / 1000.0))
+            self.missed_measurements += max(round(self.time_between_measurements_chip / (CONTROL_PERIOD_MS / 1000.0)) - 1, 0)
         elif controlEnabled and self.firmware_latency > (CONTROL_PERIOD_MS / 1000.0):
-            self.latency_violation = 1
-            self.latency_violations += 1
+            cause = 3
+            violations = 1
         elif controlEnabled and self.firmware_latency < self.controller_steptime_previous:  # Heuristic, obviosuly wrong case
+            cause = 4
+            violations = 1
+
+        stage = self.check_stage_budgets()
+
+        self.latency_violation_cause = cause
+        if cause:
             self.latency_violation = 1
-            self.latency_violations += 1
+            self.latency_violations += violations
+            self.latency_violations_per_cause[cause] += violations
+            self.latency_violation_stage = stage
+            self.latency_violations_per_stage[stage] += violations
+        else:
+            self.latency_violation_stage = 0
+
+        if self.latency_violation == 1:
+            self.check_violation_burst()
+
+    def check_stage_budgets(self):
+        """
+        Counts the stages which overran their budget and returns the code of the one most over its budget (0 if none).
+        Runs right after the state was read: serial read is of this cycle,
+        the other stages of the previous cycle - the one whose command the firmware latency refers to.
+        """
+        stage_most_over_budget = 0
+        largest_budget_fraction = 1.0
+        durations = self.stage_durations
+        for stage in range(1, len(LOOP_STAGES)):
+            budget_fraction = durations[stage] / LOOP_STAGE_BUDGETS[stage]
+            durations[stage] = 0.0  # Stages which do not run (e.g. controller switched off) are not counted again
+            if budget_fraction > 1.0:
+                self.stage_overruns[stage] += 1
+                if budget_fraction > largest_budget_fraction:
+                    largest_budget_fraction = budget_fraction
+                    stage_most_over_budget = stage
+        return stage_most_over_budget
+
+    def check_violation_burst(self):
+        """Counts bursts of latency violations (the flight recorder dumps on them) and exports the trace if enabled."""
+        self.recent_violation_iterations.append(self.total_iterations)
+        if (len(self.recent_violation_iterations) == SPAN_PROFILER_BURST_VIOLATIONS
+                and self.total_iterations - self.recent_violation_iterations[0] < SPAN_PROFILER_BURST_WINDOW):
+            self.recent_violation_iterations.clear()
+            self.violation_bursts += 1
+            if (self.export_trace_on_violation_burst
+                    and time.perf_counter() - self.time_last_trace_export > SPAN_PROFILER_BURST_COOLDOWN_S):
+                self.export_trace(reason='violation-burst')
 
 
     def add_latency(self, s):
@@ -107,69 +274,92 @@ class TimingHelper:
         # Averaging
         self.total_iterations += 1
         if self.total_iterations > 10 and self.controlled_iterations > 10:
-            self.delta_time_buffer = np.append(self.delta_time_buffer, self.time_between_measurements_chip)
-            self.delta_time_buffer = self.delta_time_buffer[-STATISTICS_IN_TERMINAL_AVERAGING_LENGTH:]
-            self.firmware_latency_buffer = np.append(self.firmware_latency_buffer, self.firmware_latency)
-            self.firmware_latency_buffer = self.firmware_latency_buffer[-STATISTICS_IN_TERMINAL_AVERAGING_LENGTH:]
-            self.python_latency_buffer = np.append(self.python_latency_buffer, self.python_latency)
-            self.python_latency_buffer = self.python_latency_buffer[-STATISTICS_IN_TERMINAL_AVERAGING_LENGTH:]
-            self.controller_steptime_buffer = np.append(self.controller_steptime_buffer, self.controller_steptime)
-            self.controller_steptime_buffer = self.controller_steptime_buffer[-STATISTICS_IN_TERMINAL_AVERAGING_LENGTH:]
+            self.delta_time_statistics.update(self.time_between_measurements_chip)
+            self.firmware_latency_statistics.update(self.firmware_latency)
+            self.python_latency_statistics.update(self.python_latency)
+            self.controller_steptime_statistics.update(self.controller_steptime)
 
     def strings_for_statistics_in_terminal(self):
         if self.total_iterations > 10 and self.controlled_iterations > 10:
-            timing_string = "TIMING: delta time [μ={:.1f}ms, σ={:.2f}ms], firmware latency [μ={:.1f}ms, σ={:.2f}ms], \n         python latency [μ={:.1f}ms σ={:.2f}ms], controller step [μ={:.1f}ms σ={:.2f}ms]".format(
-                float(self.delta_time_buffer.mean() * 1000),
-                float(self.delta_time_buffer.std() * 1000),
-
-                float(self.firmware_latency_buffer.mean() * 1000),
-                float(self.firmware_latency_buffer.std() * 1000),
-
-                float(self.python_latency_buffer.mean() * 1000),
-                float(self.python_latency_buffer.std() * 1000),
-
-                float(self.controller_steptime_buffer.mean() * 1000),
-                float(self.controller_steptime_buffer.std() * 1000)
+            timing_string = "TIMING: delta time [{}], firmware latency [{}], \n         python latency [{}], controller step [{}]".format(
+                self.statistics_string(self.delta_time_statistics),
+                self.statistics_string(self.firmware_latency_statistics),
+                self.statistics_string(self.python_latency_statistics),
+                self.statistics_string(self.controller_steptime_statistics),
             )
 
-
-
             ###########  Latency Violations  ############
             percentage_latency_violations = 100 * self.latency_violations / self.total_iterations if self.total_iterations > 0 else 0
             timing_latency_string = f"         latency violations: {self.latency_violations}/{self.total_iterations} = {percentage_latency_violations:.1f}%"
+            timing_latency_string += " (cause: " + ", ".join(
+                f"{cause} {count:.0f}" for cause, count in zip(LATENCY_VIOLATION_CAUSES[1:], self.latency_violations_per_cause[1:])
+            ) + "; stage: " + ", ".join(
+                f"{stage} {count:.0f}" for stage, count in zip(LOOP_STAGES, self.latency_violations_per_stage)
+            ) + "; over budget: " + ", ".join(
+                f"{stage} {count}" for stage, count in zip(LOOP_STAGES[1:], self.stage_overruns[1:])
+            ) + ")"
 
             return timing_string, timing_latency_string
         else:
             return None, None
 
+    @staticmethod
+    def statistics_string(statistics):
+        summary = statistics.summary()
+        return "μ={:.1f}ms, σ={:.2f}ms, p50={:.1f}ms, p99={:.1f}ms, max={:.1f}ms".format(
+            summary['mean'] * 1000, summary['std'] * 1000,
+            summary['p50'] * 1000, summary['p99'] * 1000, summary['max'] * 1000)
+
+    def record_latency_histograms(self):
+        """Call once per recorded row - same values as in the latency columns of the recording."""
+        histograms = self.latency_histograms
+        histograms['delta_time'].record(self.time_between_measurements_chip)
+        histograms['firmware_latency'].record(self.firmware_latency)
+        histograms['python_latency'].record(self.python_latency)
+        histograms['controller_steptime'].record(self.controller_steptime_previous)
+
+    def reset_latency_histograms(self):
+        for histogram in self.latency_histograms.values():
+            histogram.reset()
+
     def reset_timing_helper_memory(self):
-        self.delta_time_buffer = np.zeros((0,))
-        self.firmware_latency_buffer = np.zeros((0,))
-        self.python_latency_buffer = np.zeros((0,))
-        self.controller_steptime_buffer = np.zeros((0,))
+        self.delta_time_statistics.reset()
+        self.firmware_latency_statistics.reset()
+        self.python_latency_statistics.reset()
+        self.controller_steptime_statistics.reset()
 
+        self.reset_latency_violations()
+
+    def reset_latency_violations(self):
         self.latency_violations = 0
+        self.latency_violations_per_cause = [0] * len(LATENCY_VIOLATION_CAUSES)
+        self.latency_violations_per_stage = [0] * len(LOOP_STAGES)
+        self.stage_overruns = [0] * len(LOOP_STAGES)
 
-    @staticmethod
-    def time_since(starting_time):
-        return time.time() - starting_time
+    def time_since(self, starting_time):
+        return self.clock() - starting_time
 
-    @staticmethod
-    def sleep(time_to_sleep):
-        time.sleep(time_to_sleep)
+    def sleep(self, time_to_sleep):
+        if isinstance(self.clock, VirtualClock):
+            self.clock.sleep(time_to_sleep)
+        else:
+            time.sleep(time_to_sleep)
 
 
 # The Named Timer class allows to time code snippets with "with" statement.
 # After exiting the "with" statement, the elapsed time is stored in the attr_name attribute of helper instrance.
+# The timed snippet is also recorded as a span (named attr_name) in the span profiler of the helper.
 class NamedTimer:
     def __init__(self, helper, attr_name, prev_attr_name=None):
         self.helper = helper  # TimingHelper instance
         self.attr_name = attr_name  # Attribute name to store the elapsed time
         self.prev_attr_name = prev_attr_name  # Attribute name to store the previous elapsed time
+        self.name_id = helper.profiler.name_id(attr_name)
+        self.stage = LOOP_STAGE_OF_SPAN.get(attr_name)  # Loop stage with latency budget, if the timed snippet is one
 
     def __enter__(self):
         # Record the start time when entering the context
-        self.start_time = time.time()
+        self.start_time_ns = time.perf_counter_ns()
         # Save the previous elapsed time if prev_attr_name is provided
         if self.prev_attr_name and hasattr(self.helper, self.attr_name):
             setattr(self.helper, self.prev_attr_name, getattr(self.helper, self.attr_name))
@@ -177,7 +367,30 @@ class NamedTimer:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         # Record the end time and calculate the elapsed time when exiting the context
-        self.end_time = time.time()
-        self.elapsed_time = self.end_time - self.start_time
+        self.end_time_ns = time.perf_counter_ns()
+        self.elapsed_time = (self.end_time_ns - self.start_time_ns) * 1e-9
+        self.helper.profiler.record(self.name_id, self.start_time_ns, self.end_time_ns)
         # Dynamically set the attribute on the TimingHelper instance
         setattr(self.helper, self.attr_name, self.elapsed_time)
+        if self.stage is not None:
+            self.helper.stage_durations[self.stage] = self.elapsed_time
+
+
+# Span of a control loop stage with latency budget, its duration is also kept by the timing helper for budget checks
+class StageSpan:
+    __slots__ = ('helper', 'name_id', 'stage', 'start_ns')
+
+    def __init__(self, helper, name_id, stage):
+        self.helper = helper
+        self.name_id = name_id
+        self.stage = stage
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end_ns = time.perf_counter_ns()
+        self.helper.profiler.record(self.name_id, self.start_ns, end_ns)
+        self.helper.stage_durations[self.stage] = (end_ns - self.start_ns) * 1e-9
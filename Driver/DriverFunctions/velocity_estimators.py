@@ -0,0 +1,188 @@
+"""
+Recursive velocity estimators, alternatives to k-step difference + median in IncomingDataProcessor.
+
+Both estimators are fixed-gain (steady-state) Kalman filters, one per axis, with gains precomputed at start
+for the nominal control period by iterating the Riccati equation:
+- 'alpha-beta-gamma': constant acceleration model driven by white jerk, needs only the measurements.
+- 'kalman': cartpole model driven by the known motor command Q - cart acceleration from Q and friction,
+  angular acceleration from gravity and cart acceleration - with white model error.
+  The model explains most of the acceleration, so less of the velocity has to come from (noisy) measurement
+  differences and the estimate lags less at the same noise level.
+
+Angles in rad (0 upright), positions in m, measurements as after IncomingDataProcessor.convert_angle_and_position_skale.
+Arithmetic is done in python floats, so the online and offline (reprocessing) results are identical.
+"""
+
+import math
+
+import numpy as np
+
+from globals import (CONTROL_PERIOD_MS,
+                     ANGLE_NORMALIZATION_FACTOR, POSITION_NORMALIZATION_FACTOR,
+                     ESTIMATOR_ANGLE_NOISE_ADC, ESTIMATOR_POSITION_NOISE_ENCODER,
+                     ESTIMATOR_ANGLE_JERK, ESTIMATOR_POSITION_JERK,
+                     ESTIMATOR_ANGLE_MODEL_ERROR, ESTIMATOR_POSITION_MODEL_ERROR,
+                     ESTIMATOR_CART_ACCELERATION_PER_Q, ESTIMATOR_CART_FRICTION,
+                     ESTIMATOR_POLE_EFFECTIVE_LENGTH, ESTIMATOR_POLE_DAMPING)
+
+GRAVITY = 9.81  # m/s^2
+
+VELOCITY_ESTIMATORS = ['difference', 'alpha-beta-gamma', 'kalman']
+
+
+def steady_state_kalman_gain(F, H, process_noise, measurement_noise, max_iterations=100000, tolerance=1e-15):
+    """Iterates the discrete Riccati equation until the gain converges, returns the gain vector for a scalar measurement."""
+    P = np.array(process_noise, dtype=np.float64)
+    K = np.zeros(F.shape[0])
+    for _ in range(max_iterations):
+        P_predicted = F @ P @ F.T + process_noise
+        S = float((H @ P_predicted @ H.T)[0, 0]) + measurement_noise
+        K_new = (P_predicted @ H.T).ravel() / S
+        P = (np.eye(F.shape[0]) - np.outer(K_new, H)) @ P_predicted
+        if np.max(np.abs(K_new - K)) < tolerance * max(1.0, np.max(np.abs(K_new))):
+            return K_new
+        K = K_new
+    return K
+
+
+def constant_velocity_gain(dt, acceleration_std, measurement_std):
+    """Gain of [position, velocity] filter, acceleration is a known input plus white noise."""
+    F = np.array([[1.0, dt], [0.0, 1.0]])
+    G = np.array([[0.5 * dt ** 2], [dt]])
+    H = np.array([[1.0, 0.0]])
+    return steady_state_kalman_gain(F, H, acceleration_std ** 2 * (G @ G.T), measurement_std ** 2)
+
+
+def constant_acceleration_gain(dt, jerk_std, measurement_std):
+    """Gain of [position, velocity, acceleration] filter driven by white jerk - alpha, beta/dt, 2*gamma/dt^2."""
+    F = np.array([[1.0, dt, 0.5 * dt ** 2], [0.0, 1.0, dt], [0.0, 0.0, 1.0]])
+    G = np.array([[dt ** 3 / 6.0], [0.5 * dt ** 2], [dt]])
+    H = np.array([[1.0, 0.0, 0.0]])
+    return steady_state_kalman_gain(F, H, jerk_std ** 2 * (G @ G.T), measurement_std ** 2)
+
+
+def wrap_angle(angle):
+    return (angle + math.pi) % (2.0 * math.pi) - math.pi
+
+
+class AlphaBetaGammaEstimator:
+    def __init__(self,
+                 dt_nominal=CONTROL_PERIOD_MS / 1000.0,
+                 angle_jerk=ESTIMATOR_ANGLE_JERK,
+                 position_jerk=ESTIMATOR_POSITION_JERK,
+                 angle_noise=ESTIMATOR_ANGLE_NOISE_ADC * ANGLE_NORMALIZATION_FACTOR,
+                 position_noise=ESTIMATOR_POSITION_NOISE_ENCODER * POSITION_NORMALIZATION_FACTOR,
+                 ):
+        self.angle_gain = tuple(float(k) for k in constant_acceleration_gain(dt_nominal, angle_jerk, angle_noise))
+        self.position_gain = tuple(float(k) for k in constant_acceleration_gain(dt_nominal, position_jerk, position_noise))
+        self.reset()
+
+    def reset(self):
+        self.angle_state = None  # [angle, angleD, angleDD]
+        self.position_state = None  # [position, positionD, positionDD]
+
+    def step(self, angle, position, Q, dt):
+        """Q is not used, it is accepted to keep the same interface as the model-based estimator."""
+        angle, position, dt = float(angle), float(position), float(dt)
+        if self.angle_state is None:
+            self.angle_state = [angle, 0.0, 0.0]
+            self.position_state = [position, 0.0, 0.0]
+            return 0.0, 0.0
+
+        self.angle_state = self.filter_step(self.angle_state, angle, dt, self.angle_gain, wrap=True)
+        self.position_state = self.filter_step(self.position_state, position, dt, self.position_gain)
+
+        return self.angle_state[1], self.position_state[1]
+
+    @staticmethod
+    def filter_step(state, measurement, dt, gain, wrap=False):
+        x, v, a = state
+        x = x + v * dt + 0.5 * a * dt * dt
+        v = v + a * dt
+        residual = measurement - x
+        if wrap:
+            residual = wrap_angle(residual)
+        x = x + gain[0] * residual
+        if wrap:
+            x = wrap_angle(x)
+        return [x, v + gain[1] * residual, a + gain[2] * residual]
+
+
+class ModelBasedKalmanEstimator:
+    def __init__(self,
+                 dt_nominal=CONTROL_PERIOD_MS / 1000.0,
+                 angle_model_error=ESTIMATOR_ANGLE_MODEL_ERROR,
+                 position_model_error=ESTIMATOR_POSITION_MODEL_ERROR,
+                 angle_noise=ESTIMATOR_ANGLE_NOISE_ADC * ANGLE_NORMALIZATION_FACTOR,
+                 position_noise=ESTIMATOR_POSITION_NOISE_ENCODER * POSITION_NORMALIZATION_FACTOR,
+                 cart_acceleration_per_Q=ESTIMATOR_CART_ACCELERATION_PER_Q,
+                 cart_friction=ESTIMATOR_CART_FRICTION,
+                 pole_effective_length=ESTIMATOR_POLE_EFFECTIVE_LENGTH,
+                 pole_damping=ESTIMATOR_POLE_DAMPING,
+                 ):
+        self.angle_gain = tuple(float(k) for k in constant_velocity_gain(dt_nominal, angle_model_error, angle_noise))
+        self.position_gain = tuple(float(k) for k in constant_velocity_gain(dt_nominal, position_model_error, position_noise))
+
+        self.cart_acceleration_per_Q = cart_acceleration_per_Q
+        self.cart_friction = cart_friction
+        self.pole_effective_length = pole_effective_length
+        self.pole_damping = pole_damping
+        self.reset()
+
+    def reset(self):
+        self.angle = None
+        self.angleD = 0.0
+        self.position = None
+        self.positionD = 0.0
+
+    def step(self, angle, position, Q, dt):
+        """Q is the motor command which acted on the cart since the previous measurement."""
+        angle, position, Q, dt = float(angle), float(position), float(Q), float(dt)
+        if self.angle is None:
+            self.angle, self.position = angle, position
+            return 0.0, 0.0
+
+        # Prediction with the model - acceleration taken constant over the step
+        positionDD = self.cart_acceleration_per_Q * Q - self.cart_friction * self.positionD
+        angleDD = (GRAVITY * math.sin(self.angle) - positionDD * math.cos(self.angle)) / self.pole_effective_length \
+                  - self.pole_damping * self.angleD
+
+        position_predicted = self.position + self.positionD * dt + 0.5 * positionDD * dt * dt
+        positionD_predicted = self.positionD + positionDD * dt
+        angle_predicted = self.angle + self.angleD * dt + 0.5 * angleDD * dt * dt
+        angleD_predicted = self.angleD + angleDD * dt
+
+        # Correction with precomputed gains
+        residual = position - position_predicted
+        self.position = position_predicted + self.position_gain[0] * residual
+        self.positionD = positionD_predicted + self.position_gain[1] * residual
+
+        residual = wrap_angle(angle - angle_predicted)
+        self.angle = wrap_angle(angle_predicted + self.angle_gain[0] * residual)
+        self.angleD = angleD_predicted + self.angle_gain[1] * residual
+
+        return self.angleD, self.positionD
+
+
+def create_velocity_estimator(name):
+    """Returns None for 'difference' - velocities are then computed from (median filtered) differences."""
+    if name == 'difference':
+        return None
+    elif name == 'alpha-beta-gamma':
+        return AlphaBetaGammaEstimator()
+    elif name == 'kalman':
+        return ModelBasedKalmanEstimator()
+    else:
+        raise ValueError(f'Unknown velocity estimator {name}, available: {VELOCITY_ESTIMATORS}')
+
+
+def estimate_velocities(estimator, angle, position, Q, time_between_measurements):
+    """Runs the estimator over whole recorded arrays, returns arrays of angleD and positionD."""
+    estimator.reset()
+    angleD = np.zeros(len(angle))
+    positionD = np.zeros(len(angle))
+    for i, (angle_i, position_i, Q_i, dt_i) in enumerate(zip(
+            np.asarray(angle).tolist(), np.asarray(position).tolist(),
+            np.asarray(Q).tolist(), np.asarray(time_between_measurements).tolist())):
+        angleD[i], positionD[i] = estimator.step(angle_i, position_i, Q_i, dt_i)
+    return angleD, positionD
@@ -0,0 +1,38 @@
+# Faster-than-real-time dry-run of an experiment protocol against the simulated plant of the interface stand-in
+# Reports the expected duration, phase timeline and the recordings the protocol would produce, see DriverFunctions/protocol_dry_run.py
+# Run from the repository root, as control.py: python Driver/dry_run_protocol.py
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+sys.path.insert(1, os.path.abspath(os.path.join(".", "Driver", "CartPoleSimulation")))
+
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # TF: If uncommented, only uses CPU
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "1"
+
+os.chdir("Driver")
+
+from DriverFunctions.PhysicalCartPoleDriver import PhysicalCartPoleDriver
+from DriverFunctions.interface_stand_in import InterfaceStandIn
+from DriverFunctions.timing_helper import VirtualClock
+from DriverFunctions.protocol_dry_run import ProtocolDryRun, format_dry_run_report, save_dry_run_report
+from CartPoleSimulation.CartPole import CartPole
+from globals import CONTROL_PERIOD_MS
+
+PROTOCOL = 'swing-up'  # Name of the experiment protocol, None - the first one of experiment_protocols_selector
+MAX_DURATION_S = 3600.0  # Of simulated time, ends protocols which repeat forever or wait for what the plant never does
+REPORT_PATH = None  # Saves the report as json too, e.g. './ExperimentRecordings/dry_run_swing_up.json'
+
+if __name__ == '__main__':
+    clock = VirtualClock()
+    CartPoleInstance = CartPole()
+    CartPoleInstance.dt_controller = float(CONTROL_PERIOD_MS) / 1000.0
+    driver = PhysicalCartPoleDriver(CartPoleInstance, InterfaceInstance=InterfaceStandIn(seed=0, clock=clock), clock=clock)
+
+    report = ProtocolDryRun(driver, PROTOCOL, MAX_DURATION_S).run()
+
+    print()
+    print(format_dry_run_report(report))
+    if REPORT_PATH is not None:
+        save_dry_run_report(report, REPORT_PATH)
+        print(f'\nSaved report to {REPORT_PATH}')
@@ -0,0 +1,17 @@
+import os
+
+from DriverFunctions.ExperimentProtocols.iros24_ex1_experiment import IROS24_EX1
+from DriverFunctions.ExperimentProtocols.protocol_spec import generate_c_table
+
+# Compiles a declarative experiment protocol (protocol_spec.py) into the tables run by the firmware (experiment_protocol.c)
+# Build and flash the firmware afterwards
+PROTOCOL = IROS24_EX1
+ITERATIONS = 1  # On chip, the offline buffers hold one run; None - as many as the spec
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'Firmware', 'Src', 'CartPoleFirmware', 'experiment_protocol_table.h')
+
+
+if __name__ == "__main__":
+    with open(TABLE_PATH, 'w') as f:
+        f.write(generate_c_table(PROTOCOL, iterations=ITERATIONS))
+    print(f"Protocol '{PROTOCOL.name}' ({len(PROTOCOL.phases)} phases) written to {os.path.normpath(TABLE_PATH)}")
@@ -1,5 +1,6 @@
 import math
 import logging
+import os
 import numpy as np
 
 from CartPole.cartpole_parameters import TrackHalfLength
@@ -82,14 +83,69 @@ TIME_LIMITED_RECORDING_LENGTH = 1000  # in time steps (1 step = CONTROL_PERIOD_M
 ##### Logging and Recordings #####
 LOGGING_LEVEL = logging.ERROR
 PATH_TO_EXPERIMENT_RECORDINGS = './ExperimentRecordings/'  # Path where the experiments data is stored
-PRINT_PERIOD_MS = 10  # shows state in terminal every this many control updates
+PRINT_PERIOD_MS = 100  # Refresh period of the state in the terminal, rendered by a background thread
 STATISTICS_IN_TERMINAL_AVERAGING_LENGTH = 500
+RECORDING_FORMAT = 'csv'  # 'csv' or 'columnar' (binary .cprec), both written from a background thread, see csv_recording.py
+RECORDING_CHUNK_ROWS = 1000  # Columnar recordings are written in blocks of this many rows
+RECORDING_COMPRESSION = 'none'  # Of columnar recording blocks: 'none', 'zlib', 'zstd' (needs zstandard) or 'lz4' (needs lz4)
+RECORDING_QUEUE_BLOCKS = 8  # Blocks waiting for the writer thread before RECORDING_QUEUE_POLICY applies
+RECORDING_QUEUE_POLICY = 'spill'  # When the disk stalls: 'block' (loop waits), 'drop-oldest' (rows lost, counted) or 'spill' (kept in memory)
+LATENCY_HISTOGRAMS_SIDECAR = True  # Saves latency histograms of each recording next to it as <recording>.latency.json
+LATENCY_HISTOGRAM_HIGHEST_S = 10.0  # Larger values are counted at this value
+LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS = 2  # Relative resolution of the histograms, 2 -> 1%
+EVENT_LOG_SIDECAR = True  # Saves phase transitions, key presses and annotations of each recording as <recording>.events.jsonl
+RECORD_MEASUREMENT_DESCRIPTION = False  # Also records str() of the experiment protocol in every row ('measurement' column, as older recordings)
+RECORDING_CATALOG_ENABLED = True  # Adds each finished recording to a SQLite catalog (controller, protocols, duration, latency...), see recording_catalog.py
+RECORDING_CATALOG_PATH = os.path.join(PATH_TO_EXPERIMENT_RECORDINGS, 'catalog.sqlite')  # Recordings made before are added with DataAnalysis/index_recordings.py
+
+##### Latency budgets #####
+# Each cycle the duration of these control loop stages is compared with its budget, overruns are counted per stage
+# and a latency violation is attributed to the stage most over its budget
+LATENCY_BUDGET_SERIAL_READ_MS = CONTROL_PERIOD_MS  # read_state, it waits for the next frame - longer if it came late
+LATENCY_BUDGET_ESTIMATION_MS = 0.5  # process_state_information
+LATENCY_BUDGET_CONTROLLER_MS = 0.6 * CONTROL_PERIOD_MS  # controller.step
+LATENCY_BUDGET_ACTUATION_MS = 0.5  # From control signal to motor command written to serial
+
+##### Chip clock alignment #####
+CLOCK_ALIGNMENT_FORGETTING_FACTOR = 0.999  # Memory of the online chip-to-host clock fit, ~1/(1-x) frames
+CLOCK_ALIGNMENT_OUTLIER_THRESHOLD = 3.0  # Residuals clipped to this many running mean absolute residuals
+CLOCK_ALIGNMENT_WARMUP_FRAMES = 50  # No clipping for first frames, until residual scale is known
+CHIP_TIMER_OVERFLOW_WARNING_S = 60.0  # Warn this long before the chip timer overflows
+
+##### Profiling (export trace with p) #####
+SPAN_PROFILER_ENABLED = True  # Records timing spans of the driver loop stages into a ring buffer
+SPAN_PROFILER_BUFFER_LENGTH = 100000  # Number of spans kept, roughly 20 spans per control cycle
+SPAN_PROFILER_EXPORT_ON_VIOLATION_BURST = True  # Export trace automatically if latency violations come in a burst
+SPAN_PROFILER_BURST_VIOLATIONS = 5  # This many latency violations... (a burst also triggers the flight recorder)
+SPAN_PROFILER_BURST_WINDOW = 50  # ...within this many control cycles is a burst
+SPAN_PROFILER_BURST_COOLDOWN_S = 10.0  # Minimal time between two automatic exports
+PATH_TO_TRACES = PATH_TO_EXPERIMENT_RECORDINGS + 'Traces/'  # Chrome trace JSON files, open with ui.perfetto.dev
+
+##### Flight recorder (dump with f) #####
+FLIGHT_RECORDER_ENABLED = True  # Keeps the last seconds of full-rate recording rows in memory, dumped on triggers
+FLIGHT_RECORDER_SECONDS = 30.0  # Length of the ring
+FLIGHT_RECORDER_POST_TRIGGER_S = 2.0  # Rows after the trigger included in the dump
+FLIGHT_RECORDER_COOLDOWN_S = 10.0  # Minimal time between two dumps (not for exceptions)
+PATH_TO_FLIGHT_RECORDINGS = PATH_TO_EXPERIMENT_RECORDINGS + 'FlightRecorder/'  # Dumps are columnar recordings (.cprec)
+
+##### Experiment campaigns (run_campaign.py) #####
+CAMPAIGN_PREWARM_STEPS = 20  # Controller steps on the current state before each run - compilation happens before the protocol starts
+CAMPAIGN_METRICS_WORKERS = None  # Processes extracting metrics of finished recordings while the next run goes, None - one per CPU
+PATH_TO_CAMPAIGNS = PATH_TO_EXPERIMENT_RECORDINGS + 'Campaigns/'  # Checkpoint and metrics of each campaign
+
+##### Metrics endpoint #####
+METRICS_SERVER_ENABLED = False  # Serves loop telemetry at http://127.0.0.1:METRICS_SERVER_PORT/metrics (OpenMetrics) and /metrics.json
+METRICS_SERVER_PORT = 9109
 
 ##### Live Plot (start with 6, save plot with 7 and reset with 8) #####
 LIVE_PLOTTER_USE_REMOTE_SERVER = False
 LIVE_PLOTTER_REMOTE_USERNAME = 'marcinpaluch'
 LIVE_PLOTTER_REMOTE_IP = '192.168.194.233'
 DEFAULT_ADDRESS = ('localhost', 6000)
+LIVE_PLOTTER_BATCH_ROWS = 5  # Rows sent together by a thread - the control loop never waits for the live plotter
+LIVE_PLOTTER_BATCH_MS = 100  # ...or when the first row of the batch is this old
+LIVE_PLOTTER_DECIMATION = 0  # >2: each this many rows are reduced to two, with min and max of each column (spikes stay visible)
+LIVE_PLOTTER_SEND_BLOCKS = False  # Send a batch as one 2D array, only if the live plotter server accepts it; otherwise row by row
 
 CONTROL_SYNC = True  # Delays Input until next Timeslot for more accurate measurements
 AUTOSTART = False  # Autostarts Zero-Controller for Performance Measurement
@@ -103,6 +159,11 @@ MOTOR_FULL_SCALE_SAFE = int(0.95 * MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES + 0.5)  # In
 ##### Angle Conversion #####
 # Angle unit conversion adc to radians: (ANGLE_TARGET + ANGLE DEVIATION - ANGLE_360_DEG_IN_ADC_UNITS/2)/ANGLE_360_DEG_IN_ADC_UNITS*math.pi
 ANGLE_AVG_LENGTH = 1  # adc routine in firmware reads ADC this many times quickly in succession to reduce noise
+# If True, chip sends all ANGLE_AVG_LENGTH raw samples with each state (2 bytes each) and the angle is estimated on PC
+ANGLE_SUBSAMPLES_STREAM = False
+ANGLE_SUBSAMPLES_ESTIMATOR = 'trimmed-mean'  # 'median' or 'trimmed-mean' of the subsamples which were not rejected
+ANGLE_SUBSAMPLES_TRIM_FRACTION = 0.25  # Fraction of subsamples cut off on each side for the trimmed mean
+ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC = 20  # Subsamples further than this from their median are rejected (dead angle, spikes)
 
 ANGLE_HANGING_DEFAULT = True  # If True default ANGLE_HANGING is loaded for a respective cartpole when motor is detected at calibration
 #  This variable changes to false after b is pressed - you can first measure angle hanging and than calibrate without overwritting
@@ -113,6 +174,25 @@ ANGLE_NORMALIZATION_FACTOR = (2 * math.pi) / ANGLE_360_DEG_IN_ADC_UNITS
 
 ANGLE_D_MEDIAN_LEN = 1
 POSITION_D_MEDIAN_LEN = 1
+
+##### Velocity estimation #####
+VELOCITY_ESTIMATOR = 'difference'  # 'difference' (k-step difference + median), 'alpha-beta-gamma' or 'kalman' (model-based, uses Q)
+ESTIMATOR_ANGLE_NOISE_ADC = 1.0  # std of angle measurement noise, ADC units
+ESTIMATOR_POSITION_NOISE_ENCODER = 0.5  # std of position measurement noise, encoder units
+ESTIMATOR_ANGLE_JERK = 300.0  # rad/s^3, process noise of alpha-beta-gamma filter, higher - faster and noisier
+ESTIMATOR_POSITION_JERK = 100.0  # m/s^3
+ESTIMATOR_ANGLE_MODEL_ERROR = 10.0  # rad/s^2, angular acceleration not explained by the model, kalman
+ESTIMATOR_POSITION_MODEL_ERROR = 2.0  # m/s^2, cart acceleration not explained by the model, kalman
+# Model of the kalman estimator; constants should be identified for the robot
+ESTIMATOR_CART_ACCELERATION_PER_Q = 20.0  # m/s^2 of cart acceleration for Q = 1
+ESTIMATOR_CART_FRICTION = 8.0  # 1/s, viscous friction of the cart
+ESTIMATOR_POLE_EFFECTIVE_LENGTH = 0.26  # m, length of the equivalent mathematical pendulum
+ESTIMATOR_POLE_DAMPING = 0.1  # 1/s, viscous friction of the pole
+# Simulated plant of InterfaceStandIn, by default as the estimator model - change them to run the estimators with a model error
+PLANT_CART_ACCELERATION_PER_Q = ESTIMATOR_CART_ACCELERATION_PER_Q
+PLANT_CART_FRICTION = ESTIMATOR_CART_FRICTION
+PLANT_POLE_EFFECTIVE_LENGTH = ESTIMATOR_POLE_EFFECTIVE_LENGTH
+PLANT_POLE_DAMPING = ESTIMATOR_POLE_DAMPING
 ##### Position Conversion #####
 
 POSITION_NORMALIZATION_FACTOR = TrackHalfLength * 2 / POSITION_ENCODER_RANGE  # 0.000084978540773
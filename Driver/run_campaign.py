@@ -0,0 +1,37 @@
+# Unattended experiment campaign - runs the grid below back to back, see DriverFunctions/campaign_runner.py
+# Run from the repository root, as control.py: python Driver/run_campaign.py
+# Interrupted (x or Ctrl+C), it resumes from the checkpoint when started again with the same CAMPAIGN_NAME
+import sys
+import os
+
+# The processes computing the metrics are spawned and import this script again (as __mp_main__), already in Driver -
+# the set-up and the driver are only for the main process
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.abspath(os.path.join(".", "Driver")))
+    sys.path.insert(1, os.path.abspath(os.path.join(".", "Driver", "CartPoleSimulation")))
+
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # TF: If uncommented, only uses CPU
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "1"
+
+    os.chdir("Driver")
+
+CAMPAIGN_NAME = 'swing-up-controllers'
+CONTROLLERS = [('mpc', 'rpgd-tf'), ('mpc', 'mppi')]  # (controller, optimizer), optimizer None if the controller has none
+PROTOCOLS = ['swing-up']
+PARAMETER_SETS = [  # Attribute paths from the driver, or 'protocol.' + module constant of the protocol
+    {'protocol.NUMBER_OF_SWINGUPS': 100},
+]
+MAX_RUN_S = None  # Ends runs of protocols which repeat forever (e.g. follow-a-random-target), None - till the protocol stops
+
+if __name__ == '__main__':
+    from DriverFunctions.PhysicalCartPoleDriver import PhysicalCartPoleDriver
+    from DriverFunctions.campaign_runner import CampaignRunner, campaign_grid
+    from CartPoleSimulation.CartPole import CartPole
+    from globals import CONTROL_PERIOD_MS
+
+    CartPoleInstance = CartPole()
+    CartPoleInstance.dt_controller = float(CONTROL_PERIOD_MS) / 1000.0
+    driver = PhysicalCartPoleDriver(CartPoleInstance)
+    runner = CampaignRunner(driver, CAMPAIGN_NAME, campaign_grid(CONTROLLERS, PROTOCOLS, PARAMETER_SETS),
+                            max_run_s=MAX_RUN_S)
+    runner.run()
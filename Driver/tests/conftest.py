@@ -0,0 +1,10 @@
+# Tests of the driver - run from the repository root: python -m pytest Driver/tests
+# The modules are imported as by control.py, with Driver and CartPoleSimulation on the path.
+# Tests of modules importing globals are skipped when the CartPoleSimulation submodule is not checked out.
+import os
+import sys
+
+DRIVER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in [os.path.join(DRIVER_PATH, 'CartPoleSimulation'), DRIVER_PATH]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
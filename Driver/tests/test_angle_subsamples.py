@@ -0,0 +1,97 @@
+import os
+import re
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+pytest.importorskip('serial')
+
+from DriverFunctions.incoming_data_processor import IncomingDataProcessor
+from DriverFunctions.interface import (ANGLE_SUBSAMPLES_MAX, CMD_STATE_WITH_ANGLE_SUBSAMPLES, SERIAL_SOF, Interface)
+from globals import ANGLE_360_DEG_IN_ADC_UNITS, ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC
+
+
+class FakeDevice:
+    def __init__(self, data=b''):
+        self.data = bytearray(data)
+        self.timeout = None
+
+    def read(self):
+        if not self.data:
+            return b''
+        return bytes([self.data.pop(0)])
+
+    def write(self, message):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+
+def state_with_subsamples_message(interface, subsamples, subsamples_count=None, angle=-100):
+    # As state_with_angle_subsamples in communication_with_PC.c
+    message = [SERIAL_SOF, CMD_STATE_WITH_ANGLE_SUBSAMPLES, 32 + 2 * len(subsamples)]
+    message += list(struct.pack('=hfhfhB2I2H', angle, 1.5, 20, 0.0, 30, 0, 20000, 123456, 50, 0))
+    message.append(len(subsamples) if subsamples_count is None else subsamples_count)
+    message += list(np.asarray(subsamples, dtype=np.int16).tobytes())
+    message.append(interface._crc(message))
+    return bytes(message)
+
+
+def test_state_with_subsamples_is_parsed():
+    interface = Interface()
+    interface.device = FakeDevice()
+    interface.stream_angle_subsamples(True, 4)
+    interface.device = FakeDevice(state_with_subsamples_message(interface, [100, -5, 2000, 7]))
+
+    state = interface.read_state()
+    assert state[0] == -100
+    assert state[6] == pytest.approx(0.02)
+    np.testing.assert_array_equal(interface.angle_subsamples, [100, -5, 2000, 7])
+
+
+def test_frame_with_other_subsamples_count_is_dropped():
+    interface = Interface()
+    interface.device = FakeDevice()
+    interface.stream_angle_subsamples(True, 4)
+    interface.device = FakeDevice(state_with_subsamples_message(interface, [1, 2, 3, 4], subsamples_count=3, angle=-1)
+                                  + state_with_subsamples_message(interface, [100, -5, 2000, 7]))
+
+    state = interface.read_state()
+    assert state[0] == -100  # The next, consistent frame
+    np.testing.assert_array_equal(interface.angle_subsamples, [100, -5, 2000, 7])
+    assert interface.corrupted_frames == 1
+
+
+@pytest.mark.parametrize('subsamples_count', [0, ANGLE_SUBSAMPLES_MAX + 1])
+def test_subsamples_count_out_of_range(subsamples_count):
+    interface = Interface()
+    interface.device = FakeDevice()
+    with pytest.raises(ValueError):
+        interface.stream_angle_subsamples(True, subsamples_count)
+
+
+def test_outlying_subsamples_are_rejected():
+    processor = IncomingDataProcessor()
+    samples = [1000, 1001, 999, 1000, 1002, 1000, 998, 1000]
+    spike = 1000 + 10 * ANGLE_SUBSAMPLES_MAX_DEVIATION_ADC
+    angle = processor.angle_from_subsamples(samples[:-2] + [spike, 0])  # Spike and dead angle
+    assert processor.angle_subsamples_rejected == 2
+    assert angle == pytest.approx(1000.0, abs=1.0)
+
+
+def test_subsamples_across_the_adc_range_boundary():
+    processor = IncomingDataProcessor()
+    samples = [ANGLE_360_DEG_IN_ADC_UNITS - 2, ANGLE_360_DEG_IN_ADC_UNITS - 1, 1, 2]
+    assert processor.angle_from_subsamples(samples) == pytest.approx(0.0, abs=1.0)
+    assert processor.angle_subsamples_rejected == 0
+
+
+def test_subsamples_maximum_is_that_of_the_firmware():
+    header = os.path.join(os.path.dirname(__file__), '..', '..', 'Firmware', 'Src', 'CartPoleFirmware',
+                          'communication_with_PC.h')
+    with open(header) as f:
+        match = re.search(r'#define\s+ANGLE_SUBSAMPLES_MAX\s+(\d+)', f.read())
+    assert int(match.group(1)) == ANGLE_SUBSAMPLES_MAX
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.benchmark_harness import BENCHMARK_QUANTILES, compare_with_baseline
+
+
+def benchmark_results(stage_ms, cycles_per_second, paced=False):
+    return {
+        'paced': paced,
+        'cycles_per_second': cycles_per_second,
+        'stages_ms': {'controller': {name: stage_ms for name in BENCHMARK_QUANTILES}},
+    }
+
+
+def test_no_regression_within_tolerance():
+    assert compare_with_baseline(benchmark_results(1.1, 950.0), benchmark_results(1.0, 1000.0)) == []
+
+
+def test_slower_stage_and_throughput_are_regressions():
+    regressions = compare_with_baseline(benchmark_results(2.0, 500.0), benchmark_results(1.0, 1000.0))
+    assert len(regressions) == len(BENCHMARK_QUANTILES) + 1
+    assert regressions[-1].startswith('cycles/s')
+
+
+def test_small_absolute_increase_is_noise():
+    assert compare_with_baseline(benchmark_results(0.02, 1000.0), benchmark_results(0.01, 1000.0)) == []
+
+
+def test_throughput_is_not_compared_when_paced():
+    assert compare_with_baseline(benchmark_results(1.0, 50.0, paced=True), benchmark_results(1.0, 1000.0)) == []
@@ -0,0 +1,193 @@
+import contextlib
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.campaign_runner import CampaignRunner, campaign_grid, recording_metrics
+
+NUMBER_OF_SWINGUPS = 1  # Module constant of the protocol, set by the runs as 'protocol.NUMBER_OF_SWINGUPS'
+CYCLES_PER_SWINGUP = 10
+
+
+class FakeProtocol:
+    def __init__(self, driver, name):
+        self.driver = driver
+        self.experiment_protocol_name = name
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.cycles = 0
+        self.swingups = NUMBER_OF_SWINGUPS  # Read at start, as the protocols do
+        self.gain = self.driver.controller.gain
+
+    def is_running(self):
+        return self.running
+
+    def stop(self):
+        self.running = False
+
+    def step(self):
+        self.cycles += 1
+        if self.cycles >= self.swingups * CYCLES_PER_SWINGUP:
+            self.stop()
+
+
+class FakeLoggingManager:
+    def __init__(self, driver, directory):
+        self.driver = driver
+        self.directory = directory
+        self.recording_finished_callbacks = []
+        self.recording_name_suffix = ''
+        self.rows = []
+
+    def terminal_manager(self):
+        return contextlib.nullcontext()
+
+    def controller_and_optimizer_names(self):
+        return self.driver.controller.name, self.driver.controller.optimizer
+
+    def finish_csv_recording(self, wait_till_complete=True):
+        if not self.rows:
+            return
+        protocol = self.driver.epm.current_experiment_protocol
+        path = os.path.join(self.directory, f'CP_{protocol.experiment_protocol_name}{self.recording_name_suffix}.csv')
+        pd.DataFrame(self.rows).to_csv(path, index=False)
+        self.rows = []
+        for callback in self.recording_finished_callbacks:
+            callback(path)
+
+    def trigger_flight_recorder(self, reason, immediately=False, details=None):
+        pass
+
+
+class FakeController:
+    def __init__(self, name, optimizer=''):
+        self.name = name
+        self.optimizer = optimizer  # Only controllers with an optimizer report it
+        self.gain = 1.0
+        self.steps = 0
+
+    def step(self, s, time, updated_attributes):
+        self.steps += 1
+
+
+class FakeDriver:
+    """Driver with the interface used by CampaignRunner; terminate_at - cycle at which 'x' is pressed."""
+
+    def __init__(self, directory, terminate_at=None):
+        self.mlm = FakeLoggingManager(self, directory)
+        self.epm = SimpleNamespace(current_experiment_protocol=None, select_experiment_protocol=self.select_protocol)
+        self.CartPoleInstance = SimpleNamespace(set_controller=self.set_controller, set_optimizer=self.set_optimizer,
+                                                controller=None, target_equilibrium=1.0)
+        self.InterfaceInstance = SimpleNamespace(clear_read_buffer=lambda: None)
+        self.th = SimpleNamespace(resync=lambda: None, time_current_measurement_chip=0.0)
+        self.s, self.target_position, self.Q = np.zeros(6), 0.0, 0.0
+        self.controller = FakeController('none')
+        self.optimizer_name = ''
+        self.controllers = []  # Switched to, in order
+        self.terminate_experiment = False
+        self.terminate_at = terminate_at
+        self.cycles = 0
+
+    def select_protocol(self, name):
+        self.epm.current_experiment_protocol = FakeProtocol(self, name)
+
+    def set_optimizer(self, optimizer_name):
+        self.optimizer_name = optimizer_name
+
+    def set_controller(self, controller_name):
+        optimizer = self.optimizer_name if controller_name == 'mpc' else ''
+        self.CartPoleInstance.controller = FakeController(controller_name, optimizer)
+        self.controllers.append((controller_name, optimizer))
+
+    def setup(self):
+        pass
+
+    def quit_experiment(self):
+        self.mlm.finish_csv_recording()
+
+    def experiment_sequence(self):
+        protocol = self.epm.current_experiment_protocol
+        time = 0.02 * len(self.mlm.rows)
+        self.mlm.rows.append({'time': time, 'angle': 0.1 * protocol.gain, 'position': 0.0, 'target_position': 0.0,
+                              'Q': 0.5, 'swingups': protocol.swingups})
+        protocol.step()
+        self.cycles += 1
+        if self.cycles == self.terminate_at:
+            self.terminate_experiment = True
+
+
+RUNS = campaign_grid([('mpc', 'mppi'), ('pid', None)], ['swing-up'],
+                     [{'protocol.NUMBER_OF_SWINGUPS': 2}, {'protocol.NUMBER_OF_SWINGUPS': 3, 'controller.gain': 2.0}])
+
+
+def runner(tmp_path, driver):
+    return CampaignRunner(driver, 'test', RUNS, prewarm_steps=3, max_workers=1, directory=str(tmp_path / 'campaigns'))
+
+
+def test_campaign_grid(tmp_path):
+    assert [(run.controller, run.optimizer, run.parameters) for run in RUNS] == [
+        ('mpc', 'mppi', {'protocol.NUMBER_OF_SWINGUPS': 2}),
+        ('mpc', 'mppi', {'protocol.NUMBER_OF_SWINGUPS': 3, 'controller.gain': 2.0}),
+        ('pid', None, {'protocol.NUMBER_OF_SWINGUPS': 2}),
+        ('pid', None, {'protocol.NUMBER_OF_SWINGUPS': 3, 'controller.gain': 2.0}),
+    ]
+    assert str(RUNS[1]) == 'mpc/mppi swing-up (protocol.NUMBER_OF_SWINGUPS=3, controller.gain=2.0)'
+    with pytest.raises(ValueError, match='same run'):
+        CampaignRunner(FakeDriver(str(tmp_path)), 'duplicate', RUNS[:1] * 2, directory=str(tmp_path))
+
+    # Runs without parameters - no dict is shared between them
+    without_parameters = campaign_grid([('pid', None)], ['swing-up', 'balance'], [None])
+    assert [run.parameters for run in without_parameters] == [{}, {}]
+    assert without_parameters[0].parameters is not without_parameters[1].parameters
+    assert without_parameters[0].key == without_parameters[0]._replace(parameters=None).key
+    assert str(without_parameters[0]._replace(parameters=None)) == 'pid swing-up'
+
+
+def test_recording_metrics(tmp_path):
+    path = str(tmp_path / 'recording.csv')
+    pd.DataFrame({'time': [0.0, 0.02, 0.04, 0.06], 'angle': [0.0, 0.1, 0.3, -0.5], 'Q': [1.0, -1.0, 1.0, -1.0],
+                  'latency_violations': [2, 2, 3, 5]}).to_csv(path, index=False)
+    metrics = recording_metrics(path)
+    assert metrics['rows'] == 4 and metrics['duration_s'] == pytest.approx(0.06)
+    assert metrics['angle_rms'] == pytest.approx(np.sqrt((0.01 + 0.09 + 0.25) / 4))
+    assert metrics['upright_fraction'] == 0.5
+    assert metrics['Q_rms'] == 1.0 and metrics['latency_violations'] == 3
+
+
+def test_interrupted_campaign_resumes(tmp_path):
+    # 'x' pressed in the second run
+    driver = FakeDriver(str(tmp_path), terminate_at=2 * CYCLES_PER_SWINGUP + 5)
+    runner(tmp_path, driver).run()
+    with open(tmp_path / 'campaigns' / 'test.json') as f:
+        checkpoint = json.load(f)
+    assert [checkpoint['runs'][run.key]['status'] for run in RUNS[:2]] == ['done', 'interrupted']
+    assert RUNS[2].key not in checkpoint['runs']
+    assert NUMBER_OF_SWINGUPS == 1 and driver.controller.gain == 1.0  # Parameters restored after each run
+
+    # Metrics of the first run were not collected before the interruption
+    checkpoint['runs'][RUNS[0].key]['metrics'] = {}
+    with open(tmp_path / 'campaigns' / 'test.json', 'w') as f:
+        json.dump(checkpoint, f)
+
+    # Started again: the interrupted run is repeated, the done one is not
+    driver = FakeDriver(str(tmp_path))
+    resumed = runner(tmp_path, driver)
+    assert resumed.pending_runs() == RUNS[1:]
+    resumed.run()
+    assert driver.controllers == [('mpc', 'mppi'), ('pid', '')]  # Switched only when the controller changes
+
+    table = pd.read_csv(tmp_path / 'campaigns' / 'test_metrics.csv')
+    assert list(table['status']) == ['done'] * 4
+    assert list(table['recording']) == [f'CP_swing-up_test-{number:03d}.csv' for number in range(4)]
+    assert list(table['protocol.NUMBER_OF_SWINGUPS']) == [2, 3, 2, 3]
+    # Each run saw its parameters: rows and angle follow NUMBER_OF_SWINGUPS and controller.gain
+    assert list(table['rows']) == [20, 30, 20, 30]
+    np.testing.assert_allclose(table['angle_rms'], [0.1, 0.2, 0.1, 0.2])
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+import DriverFunctions.timing_helper as timing_helper
+from DriverFunctions.clock_alignment import CHIP_TIMER_WRAP_S, ChipClockAligner
+
+PERIOD_S = 0.02
+DRIFT_PPM = 50.0
+OFFSET_S = 1234.5
+MIN_DELAY_S = 0.0005
+
+
+def frames(n, seed=0, chip_start=0.0):
+    """Chip time of each frame, host time it was received and host time the measurement was taken."""
+    rng = np.random.default_rng(seed)
+    time_chip = chip_start + PERIOD_S * np.arange(n)
+    time_measured = OFFSET_S + (1.0 + DRIFT_PPM * 1e-6) * (time_chip - chip_start)
+    delay = MIN_DELAY_S + rng.exponential(0.0003, n)
+    delay[rng.random(n) < 0.02] += 0.02  # USB or scheduler hiccups
+    return time_chip, time_measured + delay, time_measured
+
+
+def test_drift_and_measurement_time_are_recovered():
+    aligner = ChipClockAligner(clock=lambda: 0.0)
+    time_chip, time_received, time_measured = frames(20000)
+    aligned = np.array([aligner.update(chip, host) for chip, host in zip(time_chip, time_received)])
+
+    assert aligner.drift_ppm == pytest.approx(DRIFT_PPM, abs=5.0)
+    error = aligned[-5000:] - time_measured[-5000:]
+    # Late by the delay of the fastest frames, the hiccups do not pull the fit
+    assert np.max(np.abs(error - MIN_DELAY_S)) < 0.0002
+
+
+def test_chip_timer_overflow_is_unwrapped():
+    aligner = ChipClockAligner(clock=lambda: 0.0)
+    time_chip, time_received, _ = frames(500, chip_start=CHIP_TIMER_WRAP_S - 5.0)
+    time_chip_raw = np.mod(time_chip, CHIP_TIMER_WRAP_S)
+    for chip, host in zip(time_chip_raw, time_received):
+        aligner.update(chip, host)
+
+    assert aligner.chip_timer_wraps == 1
+    assert aligner.time_chip == pytest.approx(time_chip[-1])
+    assert aligner.time_chip_between == pytest.approx(PERIOD_S)
+    assert aligner.drift_ppm == pytest.approx(DRIFT_PPM, abs=100.0)
+
+
+def test_clock_alignment_excess_is_the_delay_over_the_fastest_frames(monkeypatch):
+    helper = timing_helper.TimingHelper(clock=timing_helper.VirtualClock())
+    time_chip, time_received, time_measured = frames(5000, seed=1)
+    excess = []
+    for chip, host in zip(time_chip, time_received):
+        monkeypatch.setattr(timing_helper, 'time', SimpleNamespace(perf_counter=lambda: host))
+        helper.load_timing_data_from_chip(chip, PERIOD_S, 0, 0.0)
+        excess.append(helper.clock_alignment_excess)
+
+    expected = time_received - time_measured - MIN_DELAY_S
+    np.testing.assert_allclose(excess[-1000:], expected[-1000:], atol=0.0002)
@@ -0,0 +1,170 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions import columnar_recording
+from DriverFunctions.columnar_recording import FOOTER_MAGIC, ColumnarRecorder, read_columnar_recording
+from DriverFunctions.recording_loader import convert_recording, load_recording, recording_comment_lines
+from DriverFunctions.recording_schema import Column, DerivedColumn, RecordingSchema, STRING_DTYPE
+
+COLUMNS = {
+    'time': Column('driver.th.elapsedTime'),
+    'angle': Column('driver.s[0]', 'f4'),
+    'invalid_steps': Column('driver.idp.invalid_steps', 'i4'),
+    'experimentPhase': Column('driver.phase', STRING_DTYPE),
+}
+PHASES = ['swingup', 'balance', 'go-to-target']
+
+
+def record(path, rows, chunk_rows=7, **recorder_parameters):
+    """Records rows of a driver stand-in, returns the recorded values by column."""
+    driver = SimpleNamespace(s=np.zeros(1, dtype=np.float32), th=SimpleNamespace(elapsedTime=0.0),
+                             idp=SimpleNamespace(invalid_steps=0), phase='')
+    measurement = {'Q': 0.0}
+    schema = RecordingSchema(COLUMNS, {}, extra_dicts=[measurement])
+    recorder = ColumnarRecorder(chunk_rows=chunk_rows, **recorder_parameters)
+    recorder.start_recording(path, schema, 'Test recording', ['Controller: none'])
+
+    expected = {name: [] for name in list(COLUMNS) + ['Q']}
+    rng = np.random.default_rng(0)
+    for row in range(rows):
+        driver.th.elapsedTime = 0.02 * row
+        driver.s[0] = rng.normal()
+        driver.idp.invalid_steps = row % 3
+        driver.phase = PHASES[(row // 10) % len(PHASES)]
+        measurement['Q'] = float(rng.uniform(-1.0, 1.0))
+        recorder.record_row(schema.extract_row(driver, (measurement,)))
+        for name, value in zip(expected, (driver.th.elapsedTime, driver.s[0], driver.idp.invalid_steps,
+                                          driver.phase, measurement['Q'])):
+            expected[name].append(value)
+    recorder.finish_experiment()
+    return recorder.path, expected
+
+
+def assert_recorded(recording, expected):
+    np.testing.assert_array_equal(recording['time'], expected['time'])
+    assert recording['angle'].dtype == np.float32  # Kept at the precision of the state
+    np.testing.assert_array_equal(recording['angle'], np.array(expected['angle'], dtype=np.float32))
+    np.testing.assert_array_equal(recording['invalid_steps'], expected['invalid_steps'])
+    assert list(recording['experimentPhase']) == expected['experimentPhase']
+    np.testing.assert_array_equal(recording['Q'], expected['Q'])
+
+
+def test_round_trip(tmp_path):
+    path, expected = record(str(tmp_path / 'recording.csv'), rows=50)
+    assert path == str(tmp_path / 'recording.cprec')
+
+    assert_recorded(load_recording(path), expected)
+    assert recording_comment_lines(path) == ['Test recording', 'Controller: none']
+
+    data, dictionaries, header = read_columnar_recording(path, columns=['experimentPhase'])
+    assert list(data) == ['experimentPhase']
+    assert data['experimentPhase'].dtype == np.int32  # Dictionary encoded, each string stored once
+    assert sorted(dictionaries['experimentPhase']) == sorted(PHASES)
+    assert header['footer']['rows'] == 50
+
+
+def test_unfinished_recording_is_readable(tmp_path):
+    path, expected = record(str(tmp_path / 'recording.cprec'), rows=50)
+    assert path == str(tmp_path / 'recording.cprec')
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f:
+        f.write(content[:content.rindex(FOOTER_MAGIC) - 10])  # Crash while writing the last block
+
+    recording = load_recording(path)
+    rows = len(recording)
+    assert rows == 49  # 7 complete blocks of 7 rows, the last block (1 row) is cut off
+    assert_recorded(recording, {name: values[:rows] for name, values in expected.items()})
+    assert read_columnar_recording(path)[2]['footer'] is None
+
+
+def test_recording_without_rows_leaves_no_file(tmp_path):
+    path, _ = record(str(tmp_path / 'empty.cprec'), rows=0)
+    assert not os.path.exists(path)
+
+
+def test_conversion_to_csv(tmp_path):
+    path, expected = record(str(tmp_path / 'recording.cprec'), rows=30)
+    csv_path = convert_recording(path, 'csv')
+
+    assert recording_comment_lines(csv_path) == ['Test recording', 'Controller: none']
+    recording = pd.read_csv(csv_path, comment='#')
+    np.testing.assert_allclose(recording['angle'], expected['angle'], rtol=1e-6)
+    assert list(recording['experimentPhase']) == expected['experimentPhase']
+
+
+def test_derived_columns_round_trip(tmp_path):
+    driver = SimpleNamespace(s=np.zeros(1, dtype=np.float32), phase='balance')
+    columns = {
+        'angle': Column('driver.s[0]', 'f4'),
+        'phase': Column('driver.phase', STRING_DTYPE),
+        'angle_squared': DerivedColumn('angle ** 2', 'f4'),
+    }
+    schema = RecordingSchema(columns, {})
+    recorder = ColumnarRecorder(chunk_rows=4)
+    recorder.start_recording(str(tmp_path / 'derived.cprec'), schema, 'Test recording', [])
+    angles = np.linspace(-1.0, 1.0, 10, dtype=np.float32)
+    for angle in angles:
+        driver.s[0] = angle
+        recorder.record_row(schema.extract_row(driver))
+    recorder.finish_experiment()
+
+    recording = load_recording(recorder.path)
+    assert list(recording.columns) == list(columns)
+    np.testing.assert_array_equal(recording['angle_squared'], angles ** 2)
+    assert list(recording['phase']) == ['balance'] * 10
+
+
+def compression_param(compression, package=None):
+    return pytest.param(compression, marks=pytest.mark.skipif(
+        package is not None and importlib.util.find_spec(package) is None, reason=f'{package} not installed'))
+
+
+@pytest.mark.parametrize('compression', [compression_param('zlib'), compression_param('zstd', 'zstandard'),
+                                         compression_param('lz4', 'lz4')])
+def test_compressed_round_trip(tmp_path, compression):
+    path, expected = record(str(tmp_path / 'recording.cprec'), rows=50, compression=compression)
+    assert_recorded(load_recording(path), expected)
+
+    # Columns are compressed on their own - a single column is read without the others
+    data, _, header = read_columnar_recording(path, columns=['angle'])
+    assert header['compression'] == compression
+    np.testing.assert_array_equal(data['angle'], np.array(expected['angle'], dtype=np.float32))
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        ColumnarRecorder(compression='bz2')
+
+
+@pytest.mark.parametrize('compression', ['none', 'zlib'])
+def test_time_window_reads_only_the_blocks_needed(tmp_path, monkeypatch, compression):
+    path, expected = record(str(tmp_path / 'recording.cprec'), rows=70, chunk_rows=10, compression=compression)
+    decoded = []
+    decode_block = columnar_recording.decode_block
+    monkeypatch.setattr(columnar_recording, 'decode_block', lambda *args: decoded.append(args) or decode_block(*args))
+
+    recording = load_recording(path, columns=['angle', 'experimentPhase'], time_window=(0.3, 0.5))
+    assert list(recording.columns) == ['angle', 'experimentPhase']
+    selected = (np.array(expected['time']) >= 0.3) & (np.array(expected['time']) <= 0.5)
+    np.testing.assert_array_equal(recording['angle'], np.array(expected['angle'], dtype=np.float32)[selected])
+    assert list(recording['experimentPhase']) == list(np.array(expected['experimentPhase'])[selected])
+    assert len(decoded) == 2  # Rows 15-25, in the blocks of rows 10-19 and 20-29 of the 7 blocks
+
+
+def test_time_window_of_unfinished_recording(tmp_path):
+    path, expected = record(str(tmp_path / 'recording.cprec'), rows=50)
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f:
+        f.write(content[:content.rindex(FOOTER_MAGIC)])  # No footer, no time index
+
+    recording = load_recording(path, time_window=(0.2, 0.4))
+    np.testing.assert_array_equal(recording['time'], [t for t in expected['time'] if 0.2 <= t <= 0.4])
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from DriverFunctions.controller_diagnostics import (COST_COMPONENT_PREFIX, NO_DIAGNOSTICS, ControllerDataBuffer,
+                                                    DiagnosticBuffer, diagnostic_buffer_of)
+
+
+def test_groups_and_views():
+    buffer = DiagnosticBuffer(['cost_component_angle', 'cost_component_position', 'optimizer_iterations',
+                               'trajectory_final_position'])
+    buffer.view(COST_COMPONENT_PREFIX)[:] = [1.0, 2.0]  # The controller writes in place
+    buffer['optimizer_iterations'] = 3
+    assert buffer.group(COST_COMPONENT_PREFIX) == slice(0, 2)
+    assert buffer.group_names(COST_COMPONENT_PREFIX, strip_prefix=True) == ['angle', 'position']
+    assert buffer.group('unknown_') == slice(0, 0)
+    assert buffer.as_dict() == {'cost_component_angle': 1.0, 'cost_component_position': 2.0,
+                                'optimizer_iterations': 3.0, 'trajectory_final_position': pytest.approx(np.nan, nan_ok=True)}
+
+
+def test_view_of_scattered_group_is_refused():
+    buffer = DiagnosticBuffer(['cost_component_angle', 'optimizer_iterations', 'cost_component_position'])
+    np.testing.assert_array_equal(buffer.group(COST_COMPONENT_PREFIX), [0, 2])
+    with pytest.raises(ValueError):
+        buffer.view(COST_COMPONENT_PREFIX)
+
+
+def test_names_are_unique():
+    with pytest.raises(ValueError):
+        DiagnosticBuffer(['a', 'a'])
+
+
+def test_controller_data_is_copied_as_floats():
+    controller = SimpleNamespace(controller_data_for_csv={'cost': 0.0, 'iterations': 0, 'trajectory': None})
+    buffer = diagnostic_buffer_of(controller)
+    assert isinstance(buffer, ControllerDataBuffer)
+
+    # The controller may replace its dict every step, with numpy scalars or arrays
+    controller.controller_data_for_csv = {'cost': np.float32(1.5), 'iterations': np.int64(7), 'trajectory': np.zeros(3)}
+    buffer.update()
+    np.testing.assert_array_equal(buffer.values, [1.5, 7.0, np.nan])
+    assert buffer.values.dtype == np.float64
+
+
+def test_changed_keys_make_the_buffer_stale():
+    controller = SimpleNamespace(controller_data_for_csv={'cost': 0.0, 'iterations': 0})
+    buffer = diagnostic_buffer_of(controller)
+    assert diagnostic_buffer_of(controller, previous=buffer) is buffer
+
+    controller.controller_data_for_csv = {'iterations': 3, 'cost': 1.0}  # Same keys, other order
+    buffer.update()
+    assert buffer.stale and np.all(np.isnan(buffer.values))  # Nothing lands in the wrong column
+    replacement = diagnostic_buffer_of(controller, previous=buffer)
+    assert replacement is not buffer and replacement.names == ['iterations', 'cost']
+
+    other_controller = SimpleNamespace(controller_data_for_csv={'iterations': 3, 'cost': 1.0})
+    assert not replacement.fits(other_controller)
+
+
+def test_registered_buffer_and_no_diagnostics():
+    registered = DiagnosticBuffer(['cost_component_angle'])
+    assert diagnostic_buffer_of(SimpleNamespace(diagnostic_buffer=registered, controller_data_for_csv={'a': 1})) \
+        is registered
+    assert diagnostic_buffer_of(SimpleNamespace(controller_data_for_csv={})) is NO_DIAGNOSTICS
+    assert diagnostic_buffer_of(SimpleNamespace()) is NO_DIAGNOSTICS
@@ -0,0 +1,73 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.controller_diagnostics import DiagnosticBuffer
+from DriverFunctions.csv_recording import CsvRecorder
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.recording_schema import Column, DerivedColumn, RecordingSchema, STRING_DTYPE
+
+RECORDED_COLUMNS = {
+    'row': Column('driver.row', 'i4'),
+    'angle': Column('driver.row / 8', 'f4'),
+    'experimentPhase': Column('driver.phase', STRING_DTYPE),
+    'angle_squared': DerivedColumn('angle ** 2', 'f4'),
+}
+
+
+class SliceOnlyBuffer(DiagnosticBuffer):
+    def as_dict(self):
+        raise AssertionError('The recording takes the values as one slice')
+
+
+def test_csv_round_trip(tmp_path):
+    driver = SimpleNamespace(row=0, phase='idle')
+    recorder = CsvRecorder(chunk_rows=4)
+    schema = RecordingSchema(RECORDED_COLUMNS, {})
+    recorder.start_recording(str(tmp_path / 'recording.csv'), schema, 'Test recording', ['Units:', 'angle: rad'])
+    for row in range(10):
+        driver.row, driver.phase = row, ('idle', 'swing up, then hold')[row > 5]
+        recorder.record_row(schema.extract_row(driver))
+    recorder.finish_experiment()
+
+    with open(tmp_path / 'recording.csv') as f:
+        assert f.readline() == '# Test recording\n'
+        assert f.readline() == '# Units:\n'
+    recording = load_recording(str(tmp_path / 'recording.csv'))
+    assert list(recording.columns) == list(RECORDED_COLUMNS)
+    np.testing.assert_array_equal(recording['angle'], np.arange(10, dtype=np.float32) / 8)
+    np.testing.assert_allclose(recording['angle_squared'], (np.arange(10) / 8) ** 2, rtol=1e-6)
+    assert list(recording['experimentPhase']) == ['idle'] * 6 + ['swing up, then hold'] * 4
+
+
+def test_empty_csv_recording_leaves_no_file(tmp_path):
+    driver = SimpleNamespace(row=0)
+    recorder = CsvRecorder(chunk_rows=10)
+    schema = RecordingSchema({'row': Column('driver.row', 'i4')}, {})
+    recorder.start_recording(str(tmp_path / 'empty'), schema, 'Empty', [])
+    recorder.start_recording(str(tmp_path / 'next'), schema, 'Next', [])
+    recorder.record_row(schema.extract_row(driver))
+    recorder.finish_experiment()
+    assert sorted(os.listdir(tmp_path)) == ['next.csv']
+
+
+def test_diagnostics_are_recorded_as_one_slice(tmp_path):
+    diagnostics = SliceOnlyBuffer(['cost_component_angle', 'optimizer_iterations'])
+    schema = RecordingSchema({'time': Column('driver.time')}, {}, extra_buffers=[diagnostics])
+    driver = SimpleNamespace(time=0.0)
+    recorder = CsvRecorder(chunk_rows=4)
+    recorder.start_recording(str(tmp_path / 'diagnostics'), schema, 'Diagnostics', [])
+    for step in range(6):
+        driver.time = step * 0.02
+        diagnostics.values[:] = [step / 2, step]
+        recorder.record_row(schema.extract_row(driver, (), (diagnostics,)))
+    recorder.finish_experiment()
+
+    recording = load_recording(str(tmp_path / 'diagnostics.csv'))
+    assert list(recording.columns) == ['time', 'cost_component_angle', 'optimizer_iterations']  # Compiled in the header
+    np.testing.assert_array_equal(recording['cost_component_angle'], np.arange(6) / 2)
+    np.testing.assert_array_equal(recording['optimizer_iterations'], np.arange(6))
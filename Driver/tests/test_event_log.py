@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.event_log import EventLog, event_log_sidecar_path, load_event_log
+
+
+class Protocol(SimpleNamespace):
+    def __str__(self):
+        return f'{self.experiment_protocol_name}: {self.current_experiment_phase} (iteration {self.iteration})'
+
+
+def test_transitions_are_logged_once(tmp_path):
+    path = event_log_sidecar_path(str(tmp_path / 'recording.cprec'))
+    assert path == str(tmp_path / 'recording.events.jsonl')
+    log = EventLog(path)
+    protocol = Protocol(experiment_protocol_name='swing-up', current_experiment_phase='swingup', iteration=0)
+    for row in range(5):
+        log.check_transition(0.02 * row, row, protocol)
+    protocol.current_experiment_phase = 'balance'
+    log.check_transition(0.1, 5, protocol)
+    log.record(0.12, 6, 'key', key='k')
+    log.close()
+
+    events = load_event_log(str(tmp_path / 'recording.cprec'))
+    assert [(event['row'], event['event']) for event in events] == [(0, 'phase'), (5, 'phase'), (6, 'key')]
+    assert events[1]['previous_phase'] == 'swingup'
+    assert events[1]['description'] == 'swing-up: balance (iteration 0)'
+    assert log.protocols == ['swing-up']
+
+
+def test_cut_off_last_line_and_missing_sidecar(tmp_path):
+    path = str(tmp_path / 'recording.events.jsonl')
+    log = EventLog(path)
+    log.record(0.0, 0, 'annotation', text='start')
+    log.close()
+    with open(path, 'a') as f:
+        f.write('{"time": 0.1, "row"')  # Crash while writing
+
+    assert [event['text'] for event in load_event_log(path)] == ['start']
+    assert load_event_log(str(tmp_path / 'other.cprec')) == []
+
+
+def test_no_file_without_events(tmp_path):
+    EventLog(str(tmp_path / 'empty.events.jsonl')).close()
+    assert not (tmp_path / 'empty.events.jsonl').exists()
+
+
+def test_step_response_is_described_in_the_event_log_not_per_row(tmp_path, monkeypatch):
+    step_response = pytest.importorskip('DriverFunctions.ExperimentProtocols.step_response_experiment')
+    for name in ['STARTING_POSITION', 'ENDING_POSITION', 'RESET_Q', 'SPEED_STEP', 'STARTING_SPEED', 'ENDING_SPEED']:
+        monkeypatch.setattr(step_response, name, getattr(step_response, name))  # Flipped by the protocol
+    monkeypatch.setattr(step_response, 'ACCOUNT_FOR_MOTOR_CORRECTION', False)
+    driver = SimpleNamespace(mlm=SimpleNamespace(request_recording=lambda *args: None))
+    protocol = step_response.step_response_experiment(driver)
+    protocol.set_up_experiment()
+
+    log = EventLog(str(tmp_path / 'recording.events.jsonl'))
+    position, time_now = 0.0, 0.0
+    for row in range(200):
+        protocol.update_state(0, position, time_now)
+        log.check_transition(time_now, row, protocol)
+        position += 0.01 * (protocol.Q or 0.0) / abs(protocol.Q or 1.0)  # Moves in the commanded direction
+        time_now += 0.02
+    log.close()
+
+    assert protocol.data_to_save_measurement == {}
+    steps = [event for event in load_event_log(str(tmp_path / 'recording.events.jsonl'))
+             if event['phase'] == 'moving']
+    assert [event['iteration'] for event in steps] == list(range(1, len(steps) + 1)) and len(steps) >= 2
+    assert 'Forward Speed' in steps[0]['description']
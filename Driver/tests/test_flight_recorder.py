@@ -0,0 +1,84 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions import flight_recorder
+from DriverFunctions.flight_recorder import FlightRecorder
+from DriverFunctions.recording_loader import load_recording, recording_comment_lines
+from DriverFunctions.recording_schema import Column, RecordingSchema, STRING_DTYPE
+
+COLUMNS = {
+    'row': Column('driver.row', 'i4'),
+    'experimentPhase': Column('driver.phase', STRING_DTYPE),
+}
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    monkeypatch.setattr(flight_recorder, 'PATH_TO_FLIGHT_RECORDINGS', str(tmp_path))
+    driver = SimpleNamespace(row=0, phase='', th=SimpleNamespace(violation_bursts=0),
+                             InterfaceInstance=SimpleNamespace(reconnects=0))
+    period_s = flight_recorder.CONTROL_PERIOD_MS / 1000.0
+    # Ring of 20 rows, 5 rows recorded after a trigger
+    return FlightRecorder(driver, RecordingSchema(COLUMNS, {}), seconds=20 * period_s, post_trigger_s=5 * period_s)
+
+
+def run(recorder, rows):
+    for _ in range(rows):
+        recorder.driver.phase = ['swingup', 'balance'][recorder.driver.row // 25 % 2]
+        recorder.record()
+        recorder.driver.row += 1
+
+
+def dumps(tmp_path, recorder):
+    if recorder.writer is not None:
+        recorder.writer.thread.join()  # Dumps are written in the background
+    return sorted(str(path) for path in tmp_path.glob(f'{flight_recorder.FLIGHT_RECORDING_PREFIX}*'))
+
+
+def test_dump_holds_the_last_rows_around_the_trigger(tmp_path, recorder):
+    run(recorder, 47)  # The ring wrapped
+    recorder.driver.th.violation_bursts = 1
+    run(recorder, 1)  # Seen after the row of the burst is recorded
+    run(recorder, 4)
+    assert recorder.dumps == 0  # Still recording the rows after the trigger
+    run(recorder, 1)
+    assert recorder.dumps == 1
+
+    path, = dumps(tmp_path, recorder)
+    assert path.endswith('_latency-violation-burst.cprec')
+    recording = load_recording(path)
+    np.testing.assert_array_equal(recording['row'], np.arange(33, 53))
+    # Codes of strings first seen before the rows kept in the ring still decode
+    assert list(recording['experimentPhase']) == ['balance'] * 17 + ['swingup'] * 3
+    assert 'Last 20 rows, 5 of them after the trigger' in recording_comment_lines(path)
+
+
+def test_triggers_join_the_pending_dump_and_cool_down(tmp_path, recorder):
+    run(recorder, 10)
+    recorder.trigger('key')
+    recorder.driver.InterfaceInstance.reconnects = 1
+    run(recorder, 5)
+    path, = dumps(tmp_path, recorder)
+    assert path.endswith('_key+serial-reconnect.cprec')
+
+    recorder.trigger('key')  # Within the cooldown
+    run(recorder, 10)
+    assert recorder.dumps == 1
+
+    # An exception dumps at once, the loop does not go on
+    recorder.trigger('exception', immediately=True, details='ValueError: test')
+    assert recorder.dumps == 2
+    path = [path for path in dumps(tmp_path, recorder) if path.endswith('_exception.cprec')][0]
+    assert 'ValueError: test' in recording_comment_lines(path)
+    assert load_recording(path)['row'].iloc[-1] == 24
+
+
+def test_no_trigger_before_the_first_row(tmp_path, recorder):
+    recorder.trigger('key', immediately=True)
+    assert recorder.dumps == 0
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+pytest.importorskip('serial')
+
+from DriverFunctions.interface_stand_in import InterfaceStandIn
+from DriverFunctions.timing_helper import VirtualClock
+
+
+def write_script(path, rows):
+    with open(path, 'w') as f:
+        f.write('# Recording\n')
+        f.write('angle_raw,position_raw,deltaTimeMs\n')
+        for angle_raw, position_raw, delta_time_ms in rows:
+            f.write(f'{angle_raw},{position_raw},{delta_time_ms}\n')
+
+
+def test_scripted_frames_are_replayed_in_a_loop(tmp_path):
+    path = tmp_path / 'script.csv'
+    write_script(path, [(100, 10, 20.0), (110, 12, 21.0)])
+    interface = InterfaceStandIn(str(path))
+    frames = [interface.read_state() for _ in range(3)]
+
+    assert [frame[0] for frame in frames] == [100, 110, 100]
+    assert [frame[2] for frame in frames] == [10, 12, 10]
+    assert frames[1][6] == pytest.approx(0.021)
+    assert frames[2][7] == pytest.approx(0.061)  # Chip time accumulates the time differences
+
+
+def test_virtual_clock_is_advanced_by_the_frames():
+    clock = VirtualClock(100.0)
+    interface = InterfaceStandIn(clock=clock, seed=0)
+    for _ in range(50):
+        interface.read_state()
+    assert clock() == pytest.approx(100.0 + 50 * interface.control_period)
+
+    interface.calibrate()
+    assert clock() > 100.0 + 50 * interface.control_period
+
+
+def test_hanging_pole_stays_hanging_without_motor():
+    interface = InterfaceStandIn(seed=0)
+    for _ in range(200):
+        interface.read_state()
+    assert abs(np.cos(interface.angle) + 1.0) < 1e-6
+
+
+def test_angle_subsamples():
+    interface = InterfaceStandIn(seed=0)
+    interface.stream_angle_subsamples(True, 8)
+    interface.read_state()
+    assert interface.angle_subsamples.shape == (8,)
+
+    interface.stream_angle_subsamples(False, 8)
+    interface.read_state()
+    assert interface.angle_subsamples is None
+
+    with pytest.raises(ValueError):
+        interface.stream_angle_subsamples(True, 33)
+
+
+def test_plant_has_its_own_constants(monkeypatch):
+    import DriverFunctions.interface_stand_in as interface_stand_in
+    from globals import ESTIMATOR_CART_ACCELERATION_PER_Q, MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES
+
+    def cart_velocity():
+        interface = InterfaceStandIn(seed=0)
+        interface.set_motor(0.5 * MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES)
+        interface.read_state()
+        return interface.positionD
+
+    velocity = cart_velocity()
+    # Plant differs from the model of the estimators
+    monkeypatch.setattr(interface_stand_in, 'PLANT_CART_ACCELERATION_PER_Q', 2 * ESTIMATOR_CART_ACCELERATION_PER_Q)
+    assert cart_velocity() == pytest.approx(2 * velocity)
@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.latency_histogram import (LatencyHistogram, latency_histograms_sidecar_path,
+                                               load_latency_histograms, merge_latency_histograms,
+                                               save_latency_histograms)
+
+
+def latencies(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([rng.lognormal(math.log(0.002), 0.5, n), rng.uniform(0.05, 0.5, n // 100)])
+
+
+@pytest.mark.parametrize('significant_digits', [2, 3])
+@pytest.mark.parametrize('percentile', [50.0, 90.0, 99.0, 99.9])
+def test_percentiles_within_precision_of_np_percentile(significant_digits, percentile):
+    samples = latencies()
+    histogram = LatencyHistogram(highest_s=10.0, significant_digits=significant_digits)
+    histogram.record_many(samples)
+
+    exact = np.percentile(np.round(samples * 1e6), percentile, method='inverted_cdf') / 1e6
+    estimate = histogram.value_at_percentile(percentile)
+    # Highest value equivalent to the exact one: never below, above by less than the precision
+    assert exact <= estimate <= exact * (1.0 + 10.0 ** -significant_digits) + 1e-6
+
+
+def test_record_and_record_many_agree():
+    samples = latencies(n=2000)
+    one_by_one, at_once = LatencyHistogram(), LatencyHistogram()
+    for value in samples:
+        one_by_one.record(value)
+    at_once.record_many(samples)
+    assert one_by_one.to_dict() == at_once.to_dict()
+
+
+def test_values_above_the_range_are_clipped():
+    histogram = LatencyHistogram(highest_s=1.0)
+    histogram.record_many([0.5, 2.0, np.nan])
+    assert histogram.total_count == 2
+    assert histogram.clipped == 1
+    assert histogram.value_at_percentile(100.0) == 1.0
+
+
+def test_merge_is_exact():
+    first, second = latencies(seed=1), latencies(seed=2)
+    histograms = [LatencyHistogram(), LatencyHistogram()]
+    histograms[0].record_many(first)
+    histograms[1].record_many(second)
+    together = LatencyHistogram()
+    together.record_many(np.concatenate([first, second]))
+
+    merged = merge_latency_histograms([{'latency': histograms[0]}, {'latency': histograms[1]}])['latency']
+    assert merged.to_dict() == together.to_dict()
+    assert histograms[0].total_count == len(first)  # Inputs are not modified
+
+    with pytest.raises(ValueError):
+        LatencyHistogram(significant_digits=2).merge(LatencyHistogram(significant_digits=3))
+
+
+def test_sidecar_round_trip(tmp_path):
+    histogram = LatencyHistogram()
+    histogram.record_many(latencies(n=1000))
+    path = latency_histograms_sidecar_path(str(tmp_path / 'recording.csv'))
+    assert path == str(tmp_path / 'recording.latency.json')
+
+    save_latency_histograms({'delta_time': histogram}, path, metadata={'controller': 'mpc'})
+    loaded, metadata = load_latency_histograms(path)
+    assert metadata == {'controller': 'mpc'}
+    assert loaded['delta_time'].to_dict() == histogram.to_dict()
+    assert loaded['delta_time'].summary() == histogram.summary()
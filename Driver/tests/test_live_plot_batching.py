@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.live_plot_batching import BatchedLivePlotterSender, decimate_min_max
+
+
+class FakeSender:
+    """LivePlotter_Sender stand-in, send_data waits for release while stalled."""
+
+    def __init__(self):
+        self.connection_ready = True
+        self.headers_sent = False
+        self.calls = []
+        self.released = threading.Event()
+        self.released.set()
+
+    def send_headers(self, headers):
+        self.headers_sent = True
+        self.calls.append(('headers', headers))
+
+    def send_data(self, rows):
+        self.released.wait()
+        self.calls.append(('data', np.array(rows)))
+
+    def on_off(self):
+        self.calls.append(('command', 'on_off'))
+
+    def close(self):
+        self.calls.append(('close', None))
+
+    def sent_rows(self):
+        return np.vstack([rows for kind, rows in self.calls if kind == 'data'])
+
+
+def wait_till_taken(batched):
+    while batched.queue.depth:
+        time.sleep(0.001)
+
+
+def test_decimation_keeps_the_extremes_in_order():
+    rng = np.random.default_rng(0)
+    rows = np.column_stack((np.arange(23) * 0.02, rng.normal(size=23), rng.normal(size=23)))
+    decimated = decimate_min_max(rows, 5)
+
+    assert len(decimated) == 4 * 2 + 3  # The incomplete last bucket is kept as it is
+    np.testing.assert_array_equal(decimated[8:], rows[20:])
+    for bucket in range(4):
+        original = rows[5 * bucket:5 * bucket + 5]
+        pair = decimated[2 * bucket:2 * bucket + 2]
+        np.testing.assert_array_equal(pair[:, 0], original[[0, -1], 0])
+        for column in (1, 2):
+            first, last = sorted([original[:, column].argmin(), original[:, column].argmax()])
+            np.testing.assert_array_equal(pair[:, column], original[[first, last], column])
+
+
+def test_no_decimation_of_short_buckets():
+    rows = np.arange(12.0).reshape(6, 2)
+    assert decimate_min_max(rows, 2) is rows
+    np.testing.assert_array_equal(decimate_min_max(rows[:3], 5), rows[:3])
+
+
+def test_rows_and_commands_arrive_in_order():
+    sender = FakeSender()
+    batched = BatchedLivePlotterSender(sender, batch_rows=4, batch_ms=1e6, decimation=0, send_blocks=True)
+    batched.send_headers(['time', 'angle', 'Q'])
+    assert batched.headers_sent
+    for row in range(10):
+        wait_till_taken(batched)  # A place for a single batch - nothing is dropped if the thread keeps up
+        batched.send_data(np.array([row, 0.5 * row]), diagnostics=np.array([-row]))
+    wait_till_taken(batched)
+    batched.on_off()  # Sends the last 2 rows first
+    batched.close()
+
+    assert [kind for kind, _ in sender.calls] == ['headers', 'data', 'data', 'data', 'command', 'close']
+    np.testing.assert_array_equal(sender.sent_rows(), [[row, 0.5 * row, -row] for row in range(10)])
+    assert batched.statistics()['rows_sent'] == 10
+
+
+def test_stalled_receiver_never_blocks_the_loop():
+    sender = FakeSender()
+    batched = BatchedLivePlotterSender(sender, batch_rows=10, batch_ms=1e6, decimation=0, send_blocks=False)
+    batched.send_headers(['time'])
+    sender.released.clear()
+
+    time_start = time.perf_counter()
+    for row in range(1000):
+        batched.send_data(np.array([row]))
+    assert time.perf_counter() - time_start < 0.5
+    sender.released.set()
+    batched.close()
+
+    statistics = batched.statistics()
+    assert statistics['dropped_blocks'] > 0
+    rows_sent = sender.sent_rows()[:, 0]
+    assert statistics['rows_sent'] + statistics['dropped_rows'] == 1000
+    assert rows_sent[-1] == 999  # The newest batch is sent, older ones are dropped
+    assert np.all(np.diff(rows_sent) > 0)
+
+
+def test_data_waits_for_the_connection():
+    sender = FakeSender()
+    sender.connection_ready = False
+    batched = BatchedLivePlotterSender(sender, batch_rows=1, batch_ms=1e6)
+    batched.send_data(np.array([1.0]))
+    batched.close()
+    assert [kind for kind, _ in sender.calls] == ['close']
@@ -0,0 +1,64 @@
+import json
+import math
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.metrics_server import MetricsServer, format_value, json_compatible, openmetrics_text
+from DriverFunctions.timing_helper import TimingHelper
+
+
+def driver_for_metrics():
+    """Only the attributes MetricsServer.collect reads."""
+    th = TimingHelper()
+    th.total_iterations = 1000
+    th.latency_violations_per_cause[1] = 3
+    th.clock_alignment_excess = 0.0015
+    for value in [0.02, 0.021, 0.019]:
+        th.delta_time_statistics.update(value)
+    writer = {'depth': 2, 'dropped_rows': 5, 'mean_flush_time_s': 0.001, 'max_flush_time_s': 0.01}
+    mlm = SimpleNamespace(
+        recording_running=True, starting_recording=False, csv_name='run "1"',
+        writer_statistics=lambda: writer,
+        rollover_statistics=lambda: {'latency_s': None, 'max_latency_s': 0.0, 'max_loop_time_s': 0.0},
+        live_plotter_sender=SimpleNamespace(statistics=lambda: {'dropped_rows': 0}),
+    )
+    protocol = SimpleNamespace(experiment_protocol_name='swing-up', current_experiment_phase='swingup',
+                               is_running=lambda: True)
+    return SimpleNamespace(th=th, mlm=mlm, controlEnabled=True, firmwareControl=False,
+                           idp=SimpleNamespace(invalid_steps=0), epm=SimpleNamespace(current_experiment_protocol=protocol))
+
+
+def test_openmetrics_text():
+    text = openmetrics_text(MetricsServer(driver_for_metrics()).collect())
+    lines = text.splitlines()
+    assert lines[-1] == '# EOF'
+    assert 'cartpole_cycles_total 1000' in lines
+    assert 'cartpole_latency_violations_total{cause="chip"} 3' in lines
+    assert 'cartpole_recording_dropped_rows_total 5' in lines
+    assert 'cartpole_protocol_info{name="swing-up",phase="swingup",recording="run \\"1\\""} 1' in lines
+    assert 'cartpole_recording_rollover_seconds{statistic="last"} NaN' in lines
+    assert 'cartpole_clock_alignment_excess_seconds 0.0015' in lines
+
+
+def test_values_and_json():
+    assert [format_value(value) for value in [3, 0.5, math.nan, math.inf, True]] == ['3', '0.5', 'NaN', '+Inf', '1']
+    assert json_compatible({'a': math.nan, 'b': {'c': 1.5, 'd': None}}) == {'a': None, 'b': {'c': 1.5, 'd': None}}
+
+
+def test_served_on_localhost():
+    server = MetricsServer(driver_for_metrics(), port=0)
+    server.start()
+    try:
+        host, port = server.http_server.server_address
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics.json', timeout=5) as response:
+            metrics = json.loads(response.read())
+        assert metrics['cycles'] == 1000
+        assert metrics['recording']['writer']['depth'] == 2
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('application/openmetrics-text')
+    finally:
+        server.stop()
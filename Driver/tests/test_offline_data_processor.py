@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.offline_data_processor import (k_step_difference, parameter_grid, reprocess_recording,
+                                                    sliding_median)
+from DriverFunctions.running_median import RunningMedian
+from globals import ANGLE_360_DEG_IN_ADC_UNITS, POSITION_NORMALIZATION_FACTOR
+
+
+@pytest.mark.parametrize('window_length', [1, 4, 7])
+def test_sliding_median_is_the_running_median(window_length):
+    values = np.random.default_rng(0).normal(0.0, 10.0, 500)
+    running_median = RunningMedian(window_length)
+    expected = [running_median.update(value) for value in values]
+    np.testing.assert_array_equal(sliding_median(values, window_length), expected)
+
+
+def test_k_step_difference():
+    values = np.array([-1, 2, 4, 6, 8, 10])
+    np.testing.assert_array_equal(k_step_difference(values, 2), [0, 0, 0, 2, 2, 2])  # -1 is 'no value yet'
+
+
+def test_k_step_difference_wraps_the_angle():
+    values = np.array([ANGLE_360_DEG_IN_ADC_UNITS - 2, 2])
+    np.testing.assert_array_equal(k_step_difference(values, 1, wrap=True), [0, 4])
+
+
+def test_parameter_grid():
+    assert parameter_grid({'a': [1, 2], 'b': ['x']}) == [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}]
+
+
+def test_constant_cart_velocity_is_recovered():
+    n = 200
+    recording = pd.DataFrame({
+        'angle_raw': np.full(n, 1000),
+        'position_raw': 10 * np.arange(n),
+        'deltaTimeMs': np.full(n, 20.0),
+    })
+    processed = reprocess_recording(recording, velocity_estimator='difference', timesteps_for_derivative=3,
+                                    position_d_median_len=5, angle_derivative_source='angle_raw')
+
+    positionD = processed['positionD'].to_numpy()[20:]
+    np.testing.assert_allclose(positionD, 10 * POSITION_NORMALIZATION_FACTOR / 0.02, rtol=1e-5)
+    np.testing.assert_array_equal(processed['angleD'].to_numpy(), 0.0)
+
+
+def test_unknown_parameter():
+    recording = pd.DataFrame({'angle_raw': [0], 'position_raw': [0], 'deltaTimeMs': [20.0]})
+    with pytest.raises(ValueError):
+        reprocess_recording(recording, median_length=3)
+
+
+def online_states(frames, state_dtype):
+    """States of IncomingDataProcessor for frames as the interface delivers them - python ints and floats."""
+    from CartPoleSimulation.CartPole.state_utilities import create_cartpole_state
+    from DriverFunctions.incoming_data_processor import IncomingDataProcessor
+
+    idp = IncomingDataProcessor()
+    states = []
+    for angle_raw, angleD_raw, position_raw, time_difference_us, Q in zip(*frames):
+        s = create_cartpole_state().astype(state_dtype)
+        idp.load_state_data_from_chip(angle_raw, angleD_raw, 0, position_raw)
+        idp.process_state_information(s, time_difference_us / 1e6, Q)
+        states.append(s)
+    return np.array(states)
+
+
+@pytest.mark.parametrize('state_dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('factor_type', [float, np.float32, np.float64])
+@pytest.mark.parametrize('velocity_estimator', ['difference', 'alpha-beta-gamma'])
+def test_reprocessing_is_bit_identical_to_the_online_processing(monkeypatch, state_dtype, factor_type,
+                                                                velocity_estimator):
+    from CartPoleSimulation.CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX, ANGLED_IDX,
+                                                             POSITION_IDX, POSITIOND_IDX)
+    import DriverFunctions.incoming_data_processor as incoming_data_processor
+    import DriverFunctions.offline_data_processor as offline_data_processor
+
+    parameters = {'timesteps_for_derivative': 3, 'angle_d_median_len': 5, 'position_d_median_len': 4,
+                  'angle_deviation': float(offline_data_processor.ANGLE_DEVIATION),
+                  'velocity_estimator': velocity_estimator}
+    for module in (incoming_data_processor, offline_data_processor):
+        monkeypatch.setattr(module, 'TIMESTEPS_FOR_DERIVATIVE', 3)
+        monkeypatch.setattr(module, 'ANGLE_D_MEDIAN_LEN', 5)
+        monkeypatch.setattr(module, 'POSITION_D_MEDIAN_LEN', 4)
+        monkeypatch.setattr(module, 'VELOCITY_ESTIMATOR', velocity_estimator)
+        monkeypatch.setattr(module, 'ANGLE_NORMALIZATION_FACTOR', factor_type(module.ANGLE_NORMALIZATION_FACTOR))
+        monkeypatch.setattr(module, 'POSITION_NORMALIZATION_FACTOR', factor_type(module.POSITION_NORMALIZATION_FACTOR))
+
+    rng = np.random.default_rng(1)
+    n = 400
+    frames = (
+        (np.cumsum(rng.integers(-40, 41, n)) % ANGLE_360_DEG_IN_ADC_UNITS).tolist(),
+        rng.normal(0.0, 30.0, n).astype(np.float32).tolist(),  # Sent by the chip as float32
+        np.cumsum(rng.integers(-15, 16, n)).tolist(),
+        rng.integers(19000, 21000, n).tolist(),  # Integer microseconds
+        rng.uniform(-1.0, 1.0, n).tolist(),
+    )
+    online = online_states(frames, state_dtype)
+
+    recording = pd.DataFrame({
+        'angle_raw': frames[0], 'angleD_raw_sensor': frames[1], 'position_raw': frames[2],
+        'deltaTimeMs': np.array(frames[3]) / 1000.0, 'Q': frames[4],
+    })
+    processed = reprocess_recording(recording, state_dtype=state_dtype, **parameters)
+
+    for name, idx in [('angle', ANGLE_IDX), ('angleD', ANGLED_IDX), ('angle_cos', ANGLE_COS_IDX),
+                      ('angle_sin', ANGLE_SIN_IDX), ('position', POSITION_IDX), ('positionD', POSITIOND_IDX)]:
+        assert processed[name].dtype == state_dtype
+        assert np.array_equal(processed[name].to_numpy(), online[:, idx]), name
@@ -0,0 +1,129 @@
+import contextlib
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('globals')
+pytest.importorskip('DriverFunctions.timing_helper')
+
+from DriverFunctions.protocol_dry_run import ProtocolDryRun, format_dry_run_report, save_dry_run_report
+from DriverFunctions.timing_helper import VirtualClock
+
+PERIOD_S = 0.02
+CALIBRATION_S = 5.0
+
+
+class FakeProtocol:
+    """Swing-up for 1 s, recorded balance for 2 s, calibration; times out in the swing-up of the second iteration."""
+
+    experiment_protocol_name = 'fake-swing-up'
+
+    def __init__(self, driver, repeat_forever=False):
+        self.driver = driver
+        self.repeat_forever = repeat_forever
+        self.current_experiment_phase = 'idle'
+        self.iteration = 0
+
+    def start(self):
+        self.enter('swingup')
+
+    def stop(self):
+        self.driver.mlm.finish_csv_recording()
+        self.current_experiment_phase = 'idle'
+
+    def is_running(self):
+        return self.current_experiment_phase != 'idle'
+
+    def enter(self, phase):
+        self.current_experiment_phase = phase
+        self.time_phase_started = self.driver.th.clock()
+
+    def update_state(self):
+        phase_time = self.driver.th.clock() - self.time_phase_started
+        if self.current_experiment_phase == 'swingup' and phase_time >= 1.0 - 1e-9:
+            if self.iteration == 1 and not self.repeat_forever:
+                self.stop()
+                raise TimeoutError('Swing-up took too long')
+            self.enter('balance')
+            self.driver.mlm.request_recording(f'CP_balance_{self.iteration}.csv', recording_length=25)
+        elif self.current_experiment_phase == 'balance' and phase_time >= 2.0 - 1e-9:
+            self.driver.InterfaceInstance.calibrate()
+            self.iteration += 1
+            self.enter('swingup')
+
+
+class FakeDriver:
+    def __init__(self, clock, interface_clock=None, repeat_forever=False):
+        self.th = SimpleNamespace(clock=clock, setup=lambda: None, export_trace_on_violation_burst=True)
+        self.InterfaceInstance = SimpleNamespace(
+            clock=clock if interface_clock is None else interface_clock, open=lambda: None,
+            stream_output=lambda en: None, set_motor=lambda Q: None, close=lambda: None,
+            calibrate=lambda: clock.advance(CALIBRATION_S))
+        self.mlm = SimpleNamespace(
+            flight_recorder=object(), terminal_manager=contextlib.nullcontext,
+            recording_name=lambda csv_name: csv_name, recording_path=lambda name: os.path.join('recordings', name),
+            controller_and_optimizer_names=lambda: ('mpc', 'mppi'))
+        protocol = FakeProtocol(self, repeat_forever)
+        self.epm = SimpleNamespace(current_experiment_protocol=protocol)
+        self.terminate_experiment = False
+
+    def experiment_sequence(self):
+        self.th.clock.advance(PERIOD_S)
+        try:
+            self.epm.current_experiment_protocol.update_state()
+        except TimeoutError:
+            pass  # As ExperimentProtocolsManager
+
+
+def test_report():
+    report = ProtocolDryRun(FakeDriver(VirtualClock())).run()
+
+    assert report['protocol'] == 'fake-swing-up' and report['end'] == 'finished'
+    assert (report['controller'], report['optimizer']) == ('mpc', 'mppi')
+    assert report['duration_s'] == pytest.approx(1.0 + 2.0 + CALIBRATION_S + 1.0)
+    assert [(entry['phase'], entry['iteration']) for entry in report['timeline']] == [
+        ('swingup', 0), ('balance', 0), ('swingup', 1), ('idle', 1)]
+    assert report['phase_durations_s'] == pytest.approx({'swingup': 2.0, 'balance': 2.0 + CALIBRATION_S})
+
+    recording, = report['recordings']
+    assert recording['path'] == os.path.join('recordings', 'CP_balance_0.csv')
+    assert (recording['phase'], recording['rows'], recording['recording_length']) == ('balance', 25, 25)
+    assert recording['duration_s'] == pytest.approx(24 * PERIOD_S)  # Finished by its length, from its first to last row
+
+    calibration, = report['calibrations']
+    assert calibration['time_s'] == pytest.approx(3.0) and calibration['phase'] == 'balance'
+    timeout, = report['timeouts']
+    assert timeout['message'] == 'Swing-up took too long' and timeout['iteration'] == 1
+
+
+def test_max_duration():
+    driver = FakeDriver(VirtualClock(), repeat_forever=True)
+    dry_run = ProtocolDryRun(driver, max_duration_s=30.0)
+    assert driver.mlm.flight_recorder is None and not driver.th.export_trace_on_violation_burst
+
+    report = dry_run.run()
+    assert report['end'] == 'max_duration'
+    assert 30.0 <= report['duration_s'] < 30.0 + CALIBRATION_S + PERIOD_S  # Checked between cycles, a calibration may be running
+    assert report['timeline'][-1]['phase'] == 'idle'
+    assert [recording['iteration'] for recording in report['recordings']] == list(range(4))
+    assert len(report['calibrations']) == 4 and not report['timeouts']
+
+
+def test_needs_the_same_virtual_clock():
+    with pytest.raises(ValueError):
+        ProtocolDryRun(FakeDriver(VirtualClock(), interface_clock=VirtualClock()))
+
+
+def test_format_and_save(tmp_path):
+    report = ProtocolDryRun(FakeDriver(VirtualClock())).run()
+    text = format_dry_run_report(report)
+    assert text.startswith('Dry-run of fake-swing-up (controller=mpc/mppi): finished after 9.0s of simulated time')
+    assert 'CP_balance_0.csv 0.5s (25 rows), from balance (iteration 0)' in text
+    assert 'Calibrations: 1' in text and ': Swing-up took too long' in text
+
+    path = str(tmp_path / 'reports' / 'dry_run.json')
+    save_dry_run_report(report, path)
+    with open(path) as f:
+        assert json.load(f) == json.loads(json.dumps(report))
@@ -0,0 +1,111 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+pytest.importorskip('DriverFunctions.ExperimentProtocols')  # The package imports CartPoleSimulation
+
+from DriverFunctions.ExperimentProtocols.protocol_spec import (PROTOCOL_COMPARISONS, PROTOCOL_VARIABLES, END_OF_ITERATION,
+                                                               Condition, Phase, ProtocolSpec, Transition, after,
+                                                               compile_protocol, generate_c_table)
+
+FIRMWARE = os.path.join(os.path.dirname(__file__), '..', '..', 'Firmware', 'Src', 'CartPoleFirmware')
+
+SPEC = ProtocolSpec('test', (
+    Phase('reset', target_position=0.0, target_equilibrium=-1.0, transitions=(
+        Transition('swingup', (Condition('position_error', 'abs<', 0.01), Condition('angle', 'abs>', np.pi - 0.1))),
+    )),
+    Phase('swingup', target_equilibrium=1.0, start_timer=True, record=True, transitions=(
+        Transition(END_OF_ITERATION, (Condition('position', '<', -0.15),)),  # Checked first
+        after(10.0, 'target', variable='timer'),
+    )),
+    Phase('target', target_position=0.09, transitions=(after(3.0, END_OF_ITERATION),)),
+), iterations=5)
+
+
+def c_array(header, name):
+    """Rows of a generated C array, each as a list of its fields."""
+    body = re.search(rf'{name}\[[A-Z_]*\] = {{\n(.*?)\n}};', header, re.S).group(1)
+    return [[field.strip() for field in re.match(r'\s*{(.*)},', line).group(1).split(',')] for line in body.split('\n')]
+
+
+def c_enum(header, last_name):
+    """Names of the C enum whose last name is last_name, in order."""
+    body = re.search(rf'typedef enum {{\n([^}}]*)}} {last_name};', header).group(1)
+    return re.findall(r'^\s*(PROTOCOL_[A-Z_]+)', body, re.M)
+
+
+def test_compile_protocol():
+    table = compile_protocol(SPEC)
+    assert table.names == ('reset', 'swingup', 'target')
+    assert table.iterations == 5
+    variables, comparisons = list(PROTOCOL_VARIABLES), list(PROTOCOL_COMPARISONS)
+    assert table.transitions[0] == ((1, ((variables.index('position_error'), comparisons.index('abs<'), 0.01),
+                                         (variables.index('angle'), comparisons.index('abs>'), np.pi - 0.1))),)
+    assert [next_phase for next_phase, _ in table.transitions[1]] == [-1, 2]
+    assert table.transitions[2] == ((-1, ((variables.index('phase_time'), comparisons.index('>'), 3.0),)),)
+
+
+@pytest.mark.parametrize('phases, message', [
+    ((), 'no phases'),
+    ((Phase('a', ()), Phase('a', ())), 'not unique'),
+    ((Phase(END_OF_ITERATION, ()),), 'not unique'),
+    ((Phase('a', (Transition('b'),)),), 'unknown phase'),
+    ((Phase('a', (Transition('a', (Condition('velocity', '<', 0.0),)),)),), 'invalid condition'),
+    ((Phase('a', (Transition('a', (Condition('angle', '<=', 0.0),)),)),), 'invalid condition'),
+])
+def test_invalid_specs(phases, message):
+    with pytest.raises(ValueError, match=message):
+        compile_protocol(ProtocolSpec('invalid', phases))
+
+
+def test_c_table_matches_the_spec():
+    table = compile_protocol(SPEC)
+    header = generate_c_table(SPEC)
+    assert '#define PROTOCOL_ITERATIONS          5' in header
+    assert f'#define PROTOCOL_PHASES_COUNT        {len(SPEC.phases)}' in header
+    conditions = c_array(header, 'PROTOCOL_CONDITIONS')
+    transitions = c_array(header, 'PROTOCOL_TRANSITIONS')
+    phases = c_array(header, 'PROTOCOL_PHASES')
+
+    # Read back, the C tables give the transitions of the compiled table
+    variables, comparisons = list(PROTOCOL_VARIABLES.values()), list(PROTOCOL_COMPARISONS.values())
+    assert len(phases) == len(table.phases)
+    for phase, c_phase, phase_transitions in zip(SPEC.phases, phases, table.transitions):
+        target_position, target_equilibrium, outputs, start_timer, record, first, count = c_phase
+        assert float(target_position.rstrip('f')) == (phase.target_position or 0.0)
+        assert float(target_equilibrium.rstrip('f')) == (phase.target_equilibrium or 0.0)
+        assert ('PROTOCOL_OUTPUT_TARGET_POSITION' in outputs) == (phase.target_position is not None)
+        assert ('PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM' in outputs) == (phase.target_equilibrium is not None)
+        assert (start_timer, record) == (str(phase.start_timer).lower(), str(phase.record).lower())
+
+        c_transitions = transitions[int(first):int(first) + int(count)]
+        assert len(c_transitions) == len(phase_transitions)
+        for (next_phase, phase_conditions), (c_next_phase, c_first, c_count) in zip(phase_transitions, c_transitions):
+            assert c_next_phase == ('PROTOCOL_END_OF_ITERATION' if next_phase == -1 else str(next_phase))
+            c_conditions = conditions[int(c_first):int(c_first) + int(c_count)]
+            assert [(variables.index(variable), comparisons.index(comparison), float(threshold.rstrip('f')))
+                    for variable, comparison, threshold in c_conditions] == list(phase_conditions)
+
+
+def test_c_table_rejects_what_the_chip_can_not_do():
+    with pytest.raises(ValueError, match='sets Q'):
+        generate_c_table(ProtocolSpec('q', (Phase('a', (), Q=0.5),)))
+    with pytest.raises(ValueError, match='on chip'):
+        generate_c_table(ProtocolSpec('inf', (Phase('a', (after(np.inf, END_OF_ITERATION),)),)))
+    assert generate_c_table(SPEC, iterations=1).count('#define PROTOCOL_ITERATIONS          1') == 1
+
+
+def test_firmware_enums_match_the_spec():
+    with open(os.path.join(FIRMWARE, 'experiment_protocol.h')) as f:
+        header = f.read()
+    assert c_enum(header, 'ProtocolVariable') == list(PROTOCOL_VARIABLES.values()) + ['PROTOCOL_VARIABLES_COUNT']
+    assert c_enum(header, 'ProtocolComparison') == list(PROTOCOL_COMPARISONS.values())
+
+
+def test_firmware_table_is_up_to_date():
+    generate_firmware_protocol = pytest.importorskip('generate_firmware_protocol')
+    with open(generate_firmware_protocol.TABLE_PATH) as f:
+        assert f.read() == generate_c_table(generate_firmware_protocol.PROTOCOL,
+                                            iterations=generate_firmware_protocol.ITERATIONS)
@@ -0,0 +1,118 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.json_helpers import get_new_json_filename
+from DriverFunctions.recording_catalog import RecordingCatalog, index_recordings, recording_entry
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return RecordingCatalog(str(tmp_path / 'catalog' / 'recordings.sqlite'))
+
+
+def add_recordings(catalog, tmp_path):
+    catalog.add({'path': str(tmp_path / 'a.csv'), 'controller': 'mpc', 'optimizer': 'mppi',
+                 'started': '2024-03-01T10:00:00'}, ['swing-up'])
+    catalog.add({'path': str(tmp_path / 'b.csv'), 'controller': 'mpc', 'optimizer': 'rpgd-tf',
+                 'started': '2024-03-02T10:00:00'}, ['swing-up', 'balance'])
+    catalog.add({'path': str(tmp_path / 'c.csv'), 'controller': 'pid', 'started': '2024-03-03T10:00:00'}, ['balance'])
+
+
+def names(recordings):
+    return [recording['name'] for recording in recordings]
+
+
+def test_query(tmp_path, catalog):
+    add_recordings(catalog, tmp_path)
+    assert names(catalog.query()) == ['c.csv', 'b.csv', 'a.csv']  # Newest first
+    assert names(catalog.query(controller='mpc', optimizer='mppi')) == ['a.csv']
+    assert names(catalog.query(protocol='balance')) == ['c.csv', 'b.csv']
+    assert names(catalog.query(since='2024-03-02', until='2024-03-03')) == ['b.csv']
+    assert names(catalog.query(controller='mpc', limit=1)) == ['b.csv']
+    assert sorted(catalog.query(controller='mpc')[0]['protocols']) == ['balance', 'swing-up']
+
+
+def test_adding_again_replaces_the_entry(tmp_path, catalog):
+    add_recordings(catalog, tmp_path)
+    catalog.add({'path': str(tmp_path / 'b.csv'), 'controller': 'mpc', 'optimizer': 'rpgd-tf', 'rows': 10,
+                 'started': '2024-03-02T10:00:00'}, ['balance'])
+    recording, = catalog.query(optimizer='rpgd-tf')
+    assert recording['rows'] == 10 and recording['protocols'] == ['balance']
+    assert names(catalog.query(protocol='swing-up')) == ['a.csv']
+    assert len(catalog.paths()) == 3
+
+
+def test_next_id(catalog):
+    assert catalog.next_id('controller-configurations', initial=lambda: 41) == 42
+    assert catalog.next_id('controller-configurations', initial=lambda: 0) == 43  # initial only for a new series
+    assert catalog.next_id('other') == 1
+
+
+def test_json_filenames_are_numbered_by_the_given_catalog(catalog, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'configurations') + '/'
+    os.makedirs(directory)
+    open(directory + 'control_mpc-7.json', 'w').close()
+    assert get_new_json_filename('mpc', directory) == directory + 'control_mpc-8.json'  # Scanned without a catalog
+
+    assert get_new_json_filename('mpc', directory, catalog) == directory + 'control_mpc-8.json'
+    monkeypatch.chdir(tmp_path)  # The catalog stays where it was created
+    assert get_new_json_filename('mpc', directory, catalog) == directory + 'control_mpc-9.json'
+    assert sorted(os.listdir(tmp_path)) == ['catalog', 'configurations']
+
+
+def test_next_id_from_threads_is_unique(catalog):
+    ids = []
+    threads = [threading.Thread(target=lambda: ids.extend(catalog.next_id('series') for _ in range(10)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ids) == list(range(1, 41))
+
+
+def write_csv_recording(path, protocols):
+    rows = len(protocols)
+    recording = pd.DataFrame({
+        'time': np.arange(rows) * 0.02,
+        'latency': np.full(rows, 0.004),
+        'latency_violations': np.arange(rows) // 4,
+        'experimentProtocol': protocols,
+    })
+    with open(path, 'w') as f:
+        f.write('# This is a recording from physical cartpole from 13.02.2022 at time 10:20:30\n')
+        recording.to_csv(f, index=False)
+
+
+def test_recording_entry(tmp_path):
+    path = str(tmp_path / 'CP_mppi-tf_2022-02-13_10-20-31.csv')
+    write_csv_recording(path, ['swing-up'] * 6 + ['balance'] * 4)
+    entry, protocols = recording_entry(path)
+
+    assert entry['controller'] == 'mppi-tf'
+    assert entry['started'] == '2022-02-13T10:20:30'  # The title wins over the name
+    assert entry['format'] == 'csv' and entry['rows'] == 10
+    assert entry['duration_s'] == pytest.approx(0.18)
+    assert entry['latency_violations'] == 2
+    assert entry['firmware_latency_mean_s'] == pytest.approx(0.004, rel=0.01)
+    assert protocols == ['swing-up', 'balance']
+
+
+def test_index_recordings_skips_cataloged_and_flight_recordings(tmp_path, catalog):
+    directory = tmp_path / 'recordings'
+    (directory / 'day2').mkdir(parents=True)
+    write_csv_recording(str(directory / 'CP_pid_2022-02-13_10-20-30.csv'), ['balance'] * 3)
+    write_csv_recording(str(directory / 'day2' / 'CP_pid_2022-02-14_10-20-30.csv'), ['balance'] * 3)
+    write_csv_recording(str(directory / 'CPP_flight_2022-02-14_10-20-30_key.csv'), ['balance'] * 3)
+    (directory / 'broken.csv').write_text('# Title\n"unterminated\n')
+
+    assert index_recordings([str(directory)], catalog, max_workers=2) == 2
+    assert sorted(names(catalog.query(controller='pid'))) == ['CP_pid_2022-02-13_10-20-30.csv',
+                                                             'CP_pid_2022-02-14_10-20-30.csv']
+    assert index_recordings([str(directory)], catalog, max_workers=2) == 0
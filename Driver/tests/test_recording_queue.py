@@ -0,0 +1,77 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from DriverFunctions.recording_queue import RecordingQueue
+
+
+def block(rows, strings=()):
+    return np.zeros(rows), ({'phase': list(strings)} if strings else {})
+
+
+def blocks_taken(queue):
+    return [item for kind, item in queue.get_all() if kind == 'block']
+
+
+def test_drop_oldest_keeps_the_newest_blocks_and_their_strings():
+    queue = RecordingQueue(max_blocks=2, policy='drop-oldest')
+    queue.put_control('header', {})
+    queue.put_block(*block(10, ['swingup']))
+    queue.put_block(*block(20, ['balance']))
+    queue.put_block(*block(30))  # Full - the block of 10 rows is dropped
+
+    statistics = queue.statistics()
+    assert statistics['dropped_blocks'] == 1 and statistics['dropped_rows'] == 10
+    assert statistics['depth'] == statistics['max_depth'] == 2
+
+    items = queue.get_all()
+    assert items[0] == ('header', {})  # Control items are never dropped
+    taken = [item for kind, item in items if kind == 'block']
+    assert [len(rows) for rows, _ in taken] == [20, 30]
+    # Strings of the dropped block come with the next block, later codes still decode
+    assert taken[0][1] == {'phase': ['swingup', 'balance']}
+
+
+def test_spill_keeps_everything():
+    queue = RecordingQueue(max_blocks=2, policy='spill')
+    for rows in range(1, 6):
+        queue.put_block(*block(rows))
+    assert queue.statistics()['spilled_blocks'] == 3
+    assert [len(rows) for rows, _ in blocks_taken(queue)] == [1, 2, 3, 4, 5]
+    assert queue.depth == 0
+
+
+def test_block_waits_for_the_consumer():
+    queue = RecordingQueue(max_blocks=1, policy='block')
+    queue.put_block(*block(1))
+    taken = []
+
+    def consumer():
+        time.sleep(0.05)
+        taken.extend(blocks_taken(queue))
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    queue.put_block(*block(2))  # Returns only after the consumer took the first block
+    thread.join()
+
+    assert [len(rows) for rows, _ in taken] == [1]
+    assert queue.statistics()['blocked_count'] == 1
+    assert queue.statistics()['blocked_time_s'] > 0.0
+    assert [len(rows) for rows, _ in blocks_taken(queue)] == [2]
+
+
+def test_failed_consumer_drops_instead_of_blocking():
+    queue = RecordingQueue(max_blocks=1, policy='block')
+    queue.put_block(*block(5))
+    queue.fail()
+    queue.put_block(*block(7))
+    assert queue.statistics()['dropped_rows'] == 12
+    assert queue.depth == 0
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RecordingQueue(4, policy='drop-newest')
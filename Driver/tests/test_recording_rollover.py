@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.columnar_recording import ColumnarRecorder
+from DriverFunctions.csv_recording import CsvRecorder
+from DriverFunctions.latency_histogram import LatencyHistogram
+from DriverFunctions.recording_loader import load_recording
+from DriverFunctions.recording_schema import Column, RecordingSchema
+
+COLUMNS = {'row': Column('driver.row', 'i4')}
+
+
+class StalledSchema(RecordingSchema):
+    """Its writer waits in complete_rows until released - a disk which does not keep up."""
+
+    def __init__(self):
+        super().__init__(COLUMNS, {})
+        self.released = threading.Event()
+
+    def complete_rows(self, rows):
+        self.released.wait()
+        return super().complete_rows(rows)
+
+
+def record_segment(recorder, driver, path, schema, rows):
+    recorder.start_recording(path, schema, 'Segment', [])
+    writer = recorder.writer
+    for _ in range(rows):
+        recorder.record_row(schema.extract_row(driver))
+        driver.row += 1
+    return writer
+
+
+def test_rollover_does_not_wait_for_the_previous_writer(tmp_path):
+    driver = SimpleNamespace(row=0)
+    recorder = ColumnarRecorder(chunk_rows=10)
+    stalled = StalledSchema()
+    writers = [record_segment(recorder, driver, str(tmp_path / 'first.cprec'), stalled, 25)]
+
+    time_start = time.perf_counter()
+    # The next iteration of the protocol starts its recording, the first is finished without waiting
+    writers.append(record_segment(recorder, driver, str(tmp_path / 'second.cprec'), RecordingSchema(COLUMNS, {}), 15))
+    assert time.perf_counter() - time_start < 0.5
+    assert writers[1] is not writers[0]
+    recorder.finish_experiment(wait_till_complete=False)
+
+    stalled.released.set()
+    for writer in writers:
+        writer.thread.join()
+    np.testing.assert_array_equal(load_recording(str(tmp_path / 'first.cprec'))['row'], np.arange(25))
+    np.testing.assert_array_equal(load_recording(str(tmp_path / 'second.cprec'))['row'], np.arange(25, 40))
+
+
+def test_csv_rollover_does_not_wait_for_the_previous_writer(tmp_path):
+    driver = SimpleNamespace(row=0)
+    recorder = CsvRecorder(chunk_rows=10)
+    stalled = StalledSchema()
+    writers = [record_segment(recorder, driver, str(tmp_path / 'first'), stalled, 25)]
+
+    time_start = time.perf_counter()
+    writers.append(record_segment(recorder, driver, str(tmp_path / 'second'), RecordingSchema(COLUMNS, {}), 15))
+    assert time.perf_counter() - time_start < 0.5
+    recorder.finish_experiment(wait_till_complete=False)
+    assert writers[0].thread.is_alive()  # Still waiting for the disk
+
+    stalled.released.set()
+    recorder.finish_experiment()  # Waits also for the recordings finished without waiting
+    assert not any(writer.thread.is_alive() for writer in writers)
+    np.testing.assert_array_equal(load_recording(str(tmp_path / 'first.csv'))['row'], np.arange(25))
+    np.testing.assert_array_equal(load_recording(str(tmp_path / 'second.csv'))['row'], np.arange(25, 40))
+
+
+def test_rollover_uses_the_spare_writer(tmp_path):
+    driver = SimpleNamespace(row=0)
+    recorder = ColumnarRecorder(chunk_rows=10)
+    schema = RecordingSchema(COLUMNS, {})
+    spare = recorder.spare_writer.result()  # Created off the loop
+    writer = record_segment(recorder, driver, str(tmp_path / 'first.cprec'), schema, 5)
+    assert writer is spare and writer.thread.is_alive()
+    recorder.finish_experiment()
+
+
+def test_empty_segment_leaves_no_file(tmp_path):
+    driver = SimpleNamespace(row=0)
+    recorder = ColumnarRecorder(chunk_rows=10)
+    schema = RecordingSchema(COLUMNS, {})
+    writers = [record_segment(recorder, driver, str(tmp_path / 'empty.cprec'), schema, 0),
+               record_segment(recorder, driver, str(tmp_path / 'next.cprec'), schema, 3)]
+    recorder.finish_experiment(wait_till_complete=False)
+    for writer in writers:
+        writer.thread.join()
+    assert sorted(os.listdir(tmp_path)) == ['next.cprec']
+
+
+def test_histogram_copy_is_independent():
+    histogram = LatencyHistogram()
+    empty = histogram.copy()
+    histogram.record_many(np.full(10, 0.002))
+    copied = histogram.copy()
+    histogram.record(0.5)  # The next recording goes on with the histograms of the driver
+
+    assert empty.total_count == 0
+    assert copied.total_count == 10 and copied.max_us < 1e4
+    assert histogram.total_count == 11
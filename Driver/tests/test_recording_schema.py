@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from DriverFunctions.recording_schema import (Column, DerivedColumn, RecordingSchema, STRING_DTYPE, check_columns,
+                                              expand_derived, recording_lambdas)
+
+ANGLE_IDX = 1
+
+COLUMNS = {
+    'time': Column('driver.th.elapsedTime'),
+    'angle': Column(f'driver.s[{ANGLE_IDX}]', 'f4'),
+    'target_position': Column('driver.target_position * POSITION_FACTOR'),
+    'phase': Column('driver.phase', STRING_DTYPE),
+    'angle_squared': DerivedColumn('angle ** 2', 'f4'),
+    'angle_wrapped': DerivedColumn('np.angle(np.exp(1j * angle))'),
+}
+NAMESPACE = {'POSITION_FACTOR': 100.0}
+
+
+def driver_stand_in():
+    return SimpleNamespace(s=np.array([0.0, 0.5, 0.0], dtype=np.float32), th=SimpleNamespace(elapsedTime=1.5),
+                           target_position=0.1, phase='swingup')
+
+
+def test_extracted_row():
+    schema = RecordingSchema(COLUMNS, NAMESPACE, extra_dicts=[{'Q': 0.25, 'steptime': lambda: 0.003}])
+    row = schema.extract_row(driver_stand_in(), ({'Q': 0.25, 'steptime': lambda: 0.003},))
+    assert row == (1.5, np.float32(0.5), 10.0, 'swingup', 0.25, 0.003)
+    assert schema.row_names == ['time', 'angle', 'target_position', 'phase', 'Q', 'steptime']
+    assert schema.names[-2:] == ['Q', 'steptime']
+    assert schema.compiled_for([{'Q': 0.0, 'steptime': lambda: 0.0}])
+    assert not schema.compiled_for([{'Q': 0.0}])
+
+
+def test_derived_columns_are_computed_for_whole_blocks():
+    schema = RecordingSchema(COLUMNS, NAMESPACE)
+    driver = driver_stand_in()
+    schema.resolve_dtypes(schema.extract_row(driver))
+    assert schema.string_columns == [3]
+
+    rows = np.zeros(3, dtype=schema.row_dtype)
+    rows['angle'] = [0.5, -1.0, 4.0]
+    completed = schema.complete_rows(rows)
+    assert completed.dtype.names == tuple(COLUMNS)
+    assert completed['angle_squared'].dtype == np.float32
+    np.testing.assert_array_equal(completed['angle_squared'], np.float32([0.25, 1.0, 16.0]))
+    np.testing.assert_allclose(completed['angle_wrapped'], [0.5, -1.0, 4.0 - 2 * np.pi])
+
+
+def test_csv_lambdas_agree_with_the_extractor():
+    driver = driver_stand_in()
+    lambdas = recording_lambdas(COLUMNS, dict(NAMESPACE, np=np), driver)
+    assert [lambdas[name]() for name in ['time', 'angle', 'target_position', 'phase']] == \
+        list(RecordingSchema(COLUMNS, NAMESPACE).extract_row(driver))
+    assert lambdas['angle_squared']() == pytest.approx(0.25)
+    assert lambdas['angle_wrapped']() == pytest.approx(0.5)
+
+
+def test_only_names_of_columns_are_expanded():
+    expressions = {'angle': 'driver.s[1]', 'a_min': 'driver.s[2]'}
+    # Attribute np.angle and keyword a_min are left as they are
+    assert expand_derived('np.angle(angle) + np.clip(angle, a_min=-1, a_max=1)', expressions) == \
+        'np.angle(driver.s[1]) + np.clip(driver.s[1], a_min=-1, a_max=1)'
+    assert expand_derived('[angle for angle in range(2)]', expressions) == '[angle for angle in range(2)]'
+
+
+@pytest.mark.parametrize('columns, message', [
+    ({'angle': Column('driver.s[ANGLE_IDXX]')}, "unknown names ['ANGLE_IDXX']"),
+    ({'angle': Column('driver.s[')}, 'invalid expression'),
+    ({'angle': Column('driver.s[1]'), 'angle_squared': DerivedColumn('angel ** 2')}, "unknown names ['angel']"),
+    ({'angle': Column('driver.s[1]'), 'derived': DerivedColumn('driver.s[1] ** 2')}, "unknown names ['driver']"),
+])
+def test_columns_are_checked_at_declaration(columns, message):
+    with pytest.raises(ValueError, match=message.replace('[', r'\[').replace(']', r'\]')):
+        check_columns(columns, NAMESPACE)
+
+
+def test_column_names_must_be_unique():
+    with pytest.raises(ValueError):
+        RecordingSchema({'Q': Column('driver.th.elapsedTime')}, {}, extra_dicts=[{'Q': 0.0}])
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from DriverFunctions.running_median import RunningMedian
+
+
+@pytest.mark.parametrize('window_length', [1, 2, 5, 8, 31])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_identical_to_np_median_of_a_buffer(window_length, dtype):
+    rng = np.random.default_rng(window_length)
+    values = np.concatenate([rng.normal(0.0, 1.0, 300), rng.integers(-3, 3, 300)])  # Also many repeated values
+    running_median = RunningMedian(window_length, dtype=dtype)
+    buffer = np.zeros(window_length, dtype=dtype)
+
+    for i, value in enumerate(values):
+        buffer[i % window_length] = value
+        assert running_median.update(value) == np.median(buffer)
+
+
+def test_reset_fills_the_window_with_the_initial_value():
+    running_median = RunningMedian(3)
+    for value in [5.0, 6.0, 7.0]:
+        running_median.update(value)
+    running_median.reset(1.0)
+    assert running_median.update(10.0) == 1.0
+
+
+def test_window_length_must_be_positive():
+    with pytest.raises(ValueError):
+        RunningMedian(0)
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.span_profiler import SpanProfiler
+
+
+def test_ring_keeps_the_last_spans_oldest_first():
+    profiler = SpanProfiler(capacity=4, enabled=True)
+    for i in range(6):
+        profiler.record(profiler.name_id(f'span{i}'), i, i + 1)
+
+    snapshot = profiler.snapshot()
+    assert [snapshot['names'][name_id] for name_id in snapshot['name']] == ['span2', 'span3', 'span4', 'span5']
+    assert snapshot['start_ns'] == [2, 3, 4, 5]
+    assert profiler.snapshot(last_n=2)['start_ns'] == [4, 5]
+
+
+def test_nested_spans_and_last_duration():
+    profiler = SpanProfiler(capacity=16, enabled=True)
+    with profiler.span('outer'):
+        with profiler.span('inner'):
+            pass
+
+    snapshot = profiler.snapshot()
+    inner, outer = 0, 1  # Inner span finishes first
+    assert snapshot['start_ns'][outer] <= snapshot['start_ns'][inner]
+    assert snapshot['end_ns'][inner] <= snapshot['end_ns'][outer]
+    assert profiler.last_duration('outer') >= profiler.last_duration('inner') >= 0.0
+    assert profiler.last_duration('missing') is None
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = SpanProfiler(capacity=16, enabled=False)
+    with profiler.span('span'):
+        pass
+    assert profiler.spans_recorded == 0
+
+
+def test_chrome_trace_export(tmp_path):
+    profiler = SpanProfiler(capacity=16, enabled=True)
+    with profiler.span('step'):
+        pass
+    path = profiler.export_chrome_trace(str(tmp_path / 'trace.json'))
+
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    complete = [event for event in events if event['ph'] == 'X']
+    assert [event['name'] for event in complete] == ['step']
+    assert complete[0]['dur'] >= 0.0
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from DriverFunctions.streaming_statistics import P2Quantile, RingStatistics, StreamingStatistics
+
+
+def timing_samples(name, n=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    if name == 'lognormal':
+        return rng.lognormal(math.log(0.02), 0.3, n)
+    if name == 'uniform':
+        return rng.uniform(0.0, 1.0, n)
+    # Bimodal, e.g. cycles with and without a recording flush
+    return rng.permutation(np.concatenate([rng.normal(1.0, 0.1, n - n // 5), rng.normal(5.0, 0.5, n // 5)]))
+
+
+@pytest.mark.parametrize('distribution', ['lognormal', 'uniform', 'bimodal'])
+@pytest.mark.parametrize('quantile', [0.5, 0.99])
+def test_p2_quantile_against_np_percentile(distribution, quantile):
+    samples = timing_samples(distribution)
+    estimator = P2Quantile(quantile)
+    for value in samples.tolist():
+        estimator.update(value)
+
+    estimate = estimator.value()
+    exact = np.percentile(samples, 100.0 * quantile)
+    assert abs(np.mean(samples <= estimate) - quantile) < 0.005  # Error in rank
+    assert estimate == pytest.approx(exact, rel=0.01)
+
+
+def test_p2_quantile_with_few_samples():
+    estimator = P2Quantile(0.5)
+    assert math.isnan(estimator.value())
+    for value in [3.0, 1.0, 2.0]:
+        estimator.update(value)
+    assert estimator.value() == 2.0
+
+
+@pytest.mark.parametrize('window_length', [1, 10, 100])
+def test_ring_statistics_over_the_last_window(window_length):
+    samples = timing_samples('lognormal', n=1000)
+    statistics = RingStatistics(window_length)
+    for i, value in enumerate(samples):
+        statistics.update(value)
+        window = samples[max(0, i + 1 - window_length):i + 1]
+        assert statistics.mean() == pytest.approx(np.mean(window), rel=1e-12)
+        assert statistics.std() == pytest.approx(np.std(window), rel=1e-6)
+
+
+def test_streaming_statistics_summary_and_reset():
+    statistics = StreamingStatistics(window_length=100)
+    samples = timing_samples('lognormal', n=5000)
+    for value in samples:
+        statistics.update(value)
+    summary = statistics.summary()
+    assert summary['max'] == samples.max()
+    assert summary['mean'] == pytest.approx(np.mean(samples[-100:]))
+    assert summary['p99'] == pytest.approx(np.percentile(samples, 99.0), rel=0.02)
+
+    statistics.reset()
+    assert statistics.count == 0
+    assert all(math.isnan(value) for value in statistics.summary().values())
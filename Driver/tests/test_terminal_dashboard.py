@@ -0,0 +1,85 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+state_utilities = pytest.importorskip('CartPoleSimulation.CartPole.state_utilities')
+
+from DriverFunctions.terminal_dashboard import TerminalDashboard
+
+
+class FakeTerminalContentManager:
+    def __init__(self):
+        self.frames = []
+        self.pending = []
+
+    def print_temporary(self, line):
+        self.pending.append(line)
+
+    def print_to_terminal(self):
+        self.frames.append(self.pending)
+        self.pending = []
+
+
+def driver_stand_in():
+    s = np.zeros(max(state_utilities.ANGLE_IDX, state_utilities.POSITION_IDX) + 1)
+    return SimpleNamespace(
+        controlEnabled=False, s=s, Q=0.0, actualMotorCmd=0,
+        idp=SimpleNamespace(angle_raw=0, position_raw=0, invalid_steps=0, freezme=0),
+        CartPoleInstance=SimpleNamespace(target_position=0.0, target_equilibrium=1),
+        epm=SimpleNamespace(current_experiment_protocol='idle'),
+        th=SimpleNamespace(strings_for_statistics_in_terminal=lambda: ('TIMING: 5ms', '')),
+    )
+
+
+def set_state(driver, angle, position, Q):
+    driver.s[state_utilities.ANGLE_IDX] = angle
+    driver.s[state_utilities.POSITION_IDX] = position
+    driver.Q = Q
+
+
+def test_renders_the_published_snapshot():
+    driver = driver_stand_in()
+    dashboard = TerminalDashboard(driver, period_ms=1e6)
+    tcm = FakeTerminalContentManager()
+    dashboard.start(tcm)
+
+    set_state(driver, 0.125, 0.05, -0.5)
+    dashboard.publish()
+    set_state(driver, 3.0, 0.1, 1.0)  # Not published - the frame shows the published cycle
+    dashboard.stop()  # Renders the last state
+
+    frame, = tcm.frames
+    text = '\n'.join(frame)
+    assert 'CONTROLLER:   Firmware' in text
+    assert 'MEASUREMENT: idle' in text
+    assert 'angle:+0.125rad' in text and 'position:+5.00cm' in text and 'Q:-0.50' in text
+    assert 'TIMING: 5ms' in text
+    assert sum(line.endswith('TIMING: 5ms\033[K') for line in frame) == 1  # Empty statistics lines are left out
+
+
+def test_thread_renders_every_period():
+    driver = driver_stand_in()
+    dashboard = TerminalDashboard(driver, period_ms=5)
+    tcm = FakeTerminalContentManager()
+    dashboard.start(tcm)
+    time.sleep(0.1)
+    assert not tcm.frames  # Nothing before the first snapshot
+    dashboard.publish()
+    time.sleep(0.1)
+    dashboard.stop()
+    assert len(tcm.frames) > 2
+
+
+def test_rendering_error_is_reported_once(capsys):
+    driver = driver_stand_in()
+    driver.th.strings_for_statistics_in_terminal = lambda: 1 / 0
+    dashboard = TerminalDashboard(driver)
+    dashboard.tcm = FakeTerminalContentManager()
+    dashboard.publish()
+    for _ in range(3):
+        dashboard.render()
+    assert capsys.readouterr().out.count('rendering failed') == 1
+    assert not dashboard.tcm.frames
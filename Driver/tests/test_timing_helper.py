@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.timing_helper import (LATENCY_VIOLATION_CAUSES, LOOP_STAGE_BUDGETS, LOOP_STAGES,
+                                           TimingHelper, VirtualClock)
+from globals import CONTROL_PERIOD_MS
+
+PERIOD_S = CONTROL_PERIOD_MS / 1000.0
+
+
+def timing_helper(time_between_measurements=PERIOD_S, firmware_latency=0.5 * PERIOD_S, latency_violation_chip=0):
+    helper = TimingHelper(clock=VirtualClock())
+    helper.export_trace_on_violation_burst = False
+    helper.time_between_measurements_chip = time_between_measurements
+    helper.firmware_latency = firmware_latency
+    helper.latency_violation = latency_violation_chip
+    helper.controller_steptime_previous = 0.1 * PERIOD_S
+    return helper
+
+
+@pytest.mark.parametrize('frame, cause', [
+    ({}, 'none'),
+    ({'latency_violation_chip': 1, 'time_between_measurements': 3 * PERIOD_S}, 'chip'),  # Checked first
+    ({'time_between_measurements': 3 * PERIOD_S}, 'late_frame'),
+    ({'firmware_latency': 2 * PERIOD_S}, 'firmware_latency'),
+    ({'firmware_latency': 0.01 * PERIOD_S}, 'inconsistent_latency'),
+])
+def test_cause_of_latency_violation(frame, cause):
+    helper = timing_helper(**frame)
+    helper.check_latency_violation(controlEnabled=True)
+    assert LATENCY_VIOLATION_CAUSES[helper.latency_violation_cause] == cause
+    assert helper.latency_violation == (cause != 'none')
+    assert sum(helper.latency_violations_per_cause[1:]) == helper.latency_violations
+
+
+def test_late_frame_counts_missed_measurements():
+    helper = timing_helper(time_between_measurements=4 * PERIOD_S)
+    helper.check_latency_violation(controlEnabled=False)
+    assert helper.latency_violations == 4
+    assert helper.missed_measurements == 3
+
+
+def test_firmware_latency_is_not_checked_without_control():
+    helper = timing_helper(firmware_latency=2 * PERIOD_S)
+    helper.check_latency_violation(controlEnabled=False)
+    assert helper.latency_violation_cause == 0
+
+
+def test_violation_is_attributed_to_the_stage_most_over_budget():
+    helper = timing_helper(firmware_latency=2 * PERIOD_S)
+    controller, actuation = LOOP_STAGES.index('controller'), LOOP_STAGES.index('actuation')
+    helper.stage_durations[controller] = 2.0 * LOOP_STAGE_BUDGETS[controller]
+    helper.stage_durations[actuation] = 3.0 * LOOP_STAGE_BUDGETS[actuation]
+    helper.check_latency_violation(controlEnabled=True)
+
+    assert helper.latency_violation_stage == actuation
+    assert helper.stage_overruns[controller] == helper.stage_overruns[actuation] == 1
+    assert helper.stage_durations == [0.0] * len(LOOP_STAGES)  # A stage which does not run again is not counted again
+
+
+def test_resync_forgets_the_pause():
+    helper = timing_helper(time_between_measurements=100 * PERIOD_S)
+    helper.check_latency_violation(controlEnabled=True)
+    helper.time_last_measurement_chip = 1.0
+    helper.resync()
+    assert helper.latency_violations == 0
+    assert helper.time_last_measurement_chip is None
+    assert helper.clock_aligner.frames == 0
+
+
+def test_serial_read_stage_is_the_read_state_span():
+    helper = timing_helper()
+    serial_read = LOOP_STAGES.index('serial_read')
+    with helper.span('serial_read'):
+        time.sleep(0.002)  # read_state waiting for the frame
+    helper.load_timing_data_from_chip(1.0, PERIOD_S, 0, 0.5 * PERIOD_S)  # The clock alignment does not change it
+
+    assert 0.002 <= helper.stage_durations[serial_read] < LOOP_STAGE_BUDGETS[serial_read]
+    helper.check_latency_violation(controlEnabled=True)
+    assert helper.stage_overruns[serial_read] == 0
@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip('globals')
+
+from DriverFunctions.velocity_estimators import (AlphaBetaGammaEstimator, ModelBasedKalmanEstimator,
+                                                 constant_velocity_gain, create_velocity_estimator,
+                                                 estimate_velocities, wrap_angle)
+
+DT = 0.02
+
+
+def test_constant_velocity_gain_is_the_steady_state_alpha_beta_filter():
+    acceleration_std, measurement_std = 2.0, 0.001
+    # Kalata's tracking index gives the steady-state alpha and beta in closed form
+    tracking_index = acceleration_std * DT ** 2 / measurement_std
+    r = (4.0 + tracking_index - math.sqrt(8.0 * tracking_index + tracking_index ** 2)) / 4.0
+    alpha = 1.0 - r ** 2
+    beta = 2.0 * (2.0 - alpha) - 4.0 * math.sqrt(1.0 - alpha)
+
+    gain = constant_velocity_gain(DT, acceleration_std, measurement_std)
+    assert gain[0] == pytest.approx(alpha, rel=1e-6)
+    assert gain[1] == pytest.approx(beta / DT, rel=1e-6)
+
+
+def test_alpha_beta_gamma_follows_constant_acceleration_without_lag():
+    t = DT * np.arange(2000)
+    position = 0.1 + 0.2 * t + 0.05 * t ** 2
+    angle = wrap_angle(math.pi - 0.3 + 0.5 * t)  # Turns through the wrap at pi
+    _, positionD = estimate_velocities(AlphaBetaGammaEstimator(), np.zeros_like(t), position, np.zeros_like(t),
+                                       np.full_like(t, DT))
+    angleD, _ = estimate_velocities(AlphaBetaGammaEstimator(), angle, np.zeros_like(t), np.zeros_like(t),
+                                    np.full_like(t, DT))
+
+    np.testing.assert_allclose(positionD[-100:], 0.2 + 0.1 * t[-100:], rtol=1e-6)
+    np.testing.assert_allclose(angleD[-1000:], 0.5, rtol=1e-6)
+
+
+def test_kalman_follows_its_own_model():
+    estimator = ModelBasedKalmanEstimator()
+    angle, angleD, position, positionD = math.pi - 0.2, 0.0, 0.0, 0.0
+    substeps = 100
+    errors = []
+    for step in range(500):
+        Q = 0.3 * math.sin(0.02 * step)
+        for _ in range(substeps):
+            dt = DT / substeps
+            positionDD = estimator.cart_acceleration_per_Q * Q - estimator.cart_friction * positionD
+            angleDD = (9.81 * math.sin(angle) - positionDD * math.cos(angle)) / estimator.pole_effective_length \
+                - estimator.pole_damping * angleD
+            positionD += positionDD * dt
+            position += positionD * dt
+            angleD += angleDD * dt
+            angle += angleD * dt
+        angleD_estimated, positionD_estimated = estimator.step(wrap_angle(angle), position, Q, DT)
+        errors.append((angleD_estimated - angleD, positionD_estimated - positionD))
+
+    errors = np.abs(np.array(errors[100:]))
+    assert errors[:, 0].max() < 0.02  # rad/s, the pole swings at up to 1.5 rad/s
+    assert errors[:, 1].max() < 0.001  # m/s, the cart moves at up to 0.7 m/s
+
+
+def test_create_velocity_estimator():
+    assert create_velocity_estimator('difference') is None
+    assert isinstance(create_velocity_estimator('kalman'), ModelBasedKalmanEstimator)
+    with pytest.raises(ValueError):
+        create_velocity_estimator('unknown')
@@ -0,0 +1 @@
+../../../Src/CartPoleFirmware/experiment_protocol_table.h
\ No newline at end of file
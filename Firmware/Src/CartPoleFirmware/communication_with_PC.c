@@ -146,6 +146,15 @@ int get_command_from_PC_message(unsigned char * rxBuffer, unsigned int* rxCnt){
 								break;
 							}
 
+							case CMD_STREAM_ANGLE_SUBSAMPLES:
+							{
+								if (pktLen == 5)
+								{
+									current_command = CMD_STREAM_ANGLE_SUBSAMPLES;
+								}
+								break;
+							}
+
 							case CMD_COLLECT_RAW_ANGLE:
 							{
 								if (pktLen == 8)
@@ -201,9 +210,8 @@ int get_command_from_PC_message(unsigned char * rxBuffer, unsigned int* rxCnt){
 	return current_command;
 }
 
-void prepare_message_to_PC_state(
+static void write_state_to_message(
 		unsigned char * buffer,
-		unsigned short message_len,
 		int angle,
 		float angleD_unprocessed,
 		short position,
@@ -216,9 +224,6 @@ void prepare_message_to_PC_state(
 		unsigned short	latency_violation
 		){
 
-	buffer[ 0] = SERIAL_SOF;
-	buffer[ 1] = CMD_STATE;
-	buffer[ 2] = message_len;
 	*((short *)&buffer[3]) = angle;
 	*((float *)&buffer[5]) = angleD_unprocessed;
 	*((short *)&buffer[9]) = position;
@@ -230,7 +235,69 @@ void prepare_message_to_PC_state(
 	*((unsigned short *)&buffer[26]) = (unsigned short)(latency / 10);
 	*((unsigned short *)&buffer[28]) = (unsigned short)(latency_violation);
 	// latency maximum: 10 * 65'535 Us = 653ms
+}
+
+void prepare_message_to_PC_state(
+		unsigned char * buffer,
+		unsigned short message_len,
+		int angle,
+		float angleD_unprocessed,
+		short position,
+		float target_position,
+		int motor_command,
+		int invalid_step,
+		unsigned long time_difference_between_measurement,
+		unsigned long time_current_measurement,
+		unsigned long latency,
+		unsigned short	latency_violation
+		){
+
+	buffer[ 0] = SERIAL_SOF;
+	buffer[ 1] = CMD_STATE;
+	buffer[ 2] = message_len;
+	write_state_to_message(buffer, angle, angleD_unprocessed, position, target_position, motor_command, invalid_step,
+			time_difference_between_measurement, time_current_measurement, latency, latency_violation);
+	buffer[message_len-1] = crc(buffer, message_len-1);
+}
+
+// Same as state message, but followed by all raw angle samples of the control period, so that PC can estimate the angle
+// Returns message length
+unsigned short prepare_message_to_PC_state_with_angle_subsamples(
+		unsigned char * buffer,
+		int angle,
+		float angleD_unprocessed,
+		short position,
+		float target_position,
+		int motor_command,
+		int invalid_step,
+		unsigned long time_difference_between_measurement,
+		unsigned long time_current_measurement,
+		unsigned long latency,
+		unsigned short	latency_violation,
+		const int * angleSamples,
+		unsigned short angleSampIndex,
+		unsigned short angle_averageLen
+		){
+
+	unsigned short subsamples = angle_averageLen > ANGLE_SUBSAMPLES_MAX ? ANGLE_SUBSAMPLES_MAX : angle_averageLen;
+	unsigned short message_len = STATE_MESSAGE_LENGTH + 1 + 2 * subsamples;
+	unsigned short i;
+
+	buffer[ 0] = SERIAL_SOF;
+	buffer[ 1] = CMD_STATE_WITH_ANGLE_SUBSAMPLES;
+	buffer[ 2] = message_len;
+	write_state_to_message(buffer, angle, angleD_unprocessed, position, target_position, motor_command, invalid_step,
+			time_difference_between_measurement, time_current_measurement, latency, latency_violation);
+
+	buffer[30] = (unsigned char)subsamples;
+	// Oldest sample first - angleSampIndex points to the sample which will be overwritten next
+	for (i = 0; i < subsamples; i++)
+	{
+		*((short *)&buffer[31 + 2 * i]) = (short)angleSamples[(angleSampIndex + i) % angle_averageLen];
+	}
+
 	buffer[message_len-1] = crc(buffer, message_len-1);
+	return message_len;
 }
 
 void prepare_message_to_PC_calibration(unsigned char * buffer, int encoderDirection){
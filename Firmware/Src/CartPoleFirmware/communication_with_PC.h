@@ -21,8 +21,15 @@
 #define CMD_SET_TARGET_EQUILIBRIUM  0xCD
 #define CMD_RUN_HARDWARE_EXPERIMENT 0xCE
 #define CMD_TRANSFER_BUFFERS        0xD1
+#define CMD_STREAM_ANGLE_SUBSAMPLES 0xD2
+#define CMD_STATE_WITH_ANGLE_SUBSAMPLES 0xD3
 #define CMD_DO_NOTHING				0x00
 
+#define STATE_MESSAGE_LENGTH		31
+#define ANGLE_SUBSAMPLES_MAX		32		// Same as ANGLE_AVERAGE_LEN_MAX and ANGLE_SUBSAMPLES_MAX in Driver/DriverFunctions/interface.py
+// State message followed by number of angle subsamples (1 byte) and the subsamples (2 bytes each)
+#define STATE_MESSAGE_WITH_ANGLE_SUBSAMPLES_MAX_LENGTH	(STATE_MESSAGE_LENGTH + 1 + 2 * ANGLE_SUBSAMPLES_MAX)
+
 int get_command_from_PC_message(unsigned char * rxBuffer, unsigned int* rxCnt);
 void prepare_message_to_PC_state(
 		unsigned char * buffer,
@@ -39,6 +46,23 @@ void prepare_message_to_PC_state(
 		unsigned short	latency_violation
 		);
 
+unsigned short prepare_message_to_PC_state_with_angle_subsamples(
+		unsigned char * buffer,
+		int angle,
+		float angleD_unprocessed,
+		short position,
+		float target_position,
+		int motor_command,
+		int invalid_step,
+		unsigned long time_difference_between_measurement,
+		unsigned long timeMeasured,
+		unsigned long latency,
+		unsigned short	latency_violation,
+		const int * angleSamples,
+		unsigned short angleSampIndex,
+		unsigned short angle_averageLen
+		);
+
 void prepare_message_to_PC_calibration(unsigned char * buffer, int encoderDirection);
 void send_information_experiment_done(unsigned char * buffer, unsigned short experiment_length);
 
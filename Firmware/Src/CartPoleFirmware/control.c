@@ -25,6 +25,7 @@ bool correct_motor_dynamics = true;
 
 
 bool            streamEnable        = false;
+bool            streamAngleSubsamples = false;	// Send all angle samples of the control period with the state
 bool 			interrupt_occurred	= false;
 
 float			ANGLE_HANGING;
@@ -60,6 +61,7 @@ static unsigned char txBuffer[200];
 
 void 			cmd_Ping(const unsigned char * buff, unsigned int len);
 void            cmd_StreamOutput(bool en);
+void            cmd_StreamAngleSubsamples(bool en);
 void 			cmd_ControlMode(bool en);
 void			cmd_SetControlConfig(const unsigned char * config);
 void 			cmd_GetControlConfig(void);
@@ -174,7 +176,7 @@ void CONTROL_BackgroundTask(void)
 			Motor_SetPower(motor_command, MOTOR_PWM_PERIOD_IN_CLOCK_CYCLES);
 		}
 
-		static unsigned char	buffer[30];
+		static unsigned char	buffer[STATE_MESSAGE_WITH_ANGLE_SUBSAMPLES_MAX_LENGTH];
 
 		static unsigned short 	ledPeriodCnt	= 0;
 		static bool				ledState 		= false;
@@ -314,22 +316,46 @@ void CONTROL_BackgroundTask(void)
 	    		latency = CONTROL_LOOP_PERIOD_MS*1000;
 	    	}
 
-	    	prepare_message_to_PC_state(
-	    			buffer,
-					31,
-					angle_int,
-					angleD_unprocessed,
-					position_short,
-					target_position,
-					motor_command,
-					invalid_step,
-					time_difference_between_measurement,
-					time_current_measurement,
-					latency,
-					latency_violation
-					);
-
-	    	Message_SendToPC(buffer, 31);
+	    	if (streamAngleSubsamples)
+	    	{
+	    		unsigned short message_len = prepare_message_to_PC_state_with_angle_subsamples(
+	    				buffer,
+						angle_int,
+						angleD_unprocessed,
+						position_short,
+						target_position,
+						motor_command,
+						invalid_step,
+						time_difference_between_measurement,
+						time_current_measurement,
+						latency,
+						latency_violation,
+						angleSamples,
+						angleSampIndex,
+						ANGLE_AVERAGE_LEN
+						);
+
+	    		Message_SendToPC(buffer, message_len);
+	    	}
+	    	else
+	    	{
+	    		prepare_message_to_PC_state(
+	    				buffer,
+						STATE_MESSAGE_LENGTH,
+						angle_int,
+						angleD_unprocessed,
+						position_short,
+						target_position,
+						motor_command,
+						invalid_step,
+						time_difference_between_measurement,
+						time_current_measurement,
+						latency,
+						latency_violation
+						);
+
+	    		Message_SendToPC(buffer, STATE_MESSAGE_LENGTH);
+	    	}
 
 	        if(new_motor_command_obtained) {
 	        	time_measurement_done = time_current_measurement;
@@ -440,6 +466,11 @@ void CONTROL_BackgroundTask(void)
 			cmd_StreamOutput(rxBuffer[3] != 0);
 			break;
 		}
+		case CMD_STREAM_ANGLE_SUBSAMPLES:
+		{
+			cmd_StreamAngleSubsamples(rxBuffer[3] != 0);
+			break;
+		}
 		case CMD_CALIBRATE:
 		{
 			calibrate=true;
@@ -549,6 +580,13 @@ void cmd_StreamOutput(bool en)
 	enable_irq();
 }
 
+void cmd_StreamAngleSubsamples(bool en)
+{
+	disable_irq();
+	streamAngleSubsamples = en;
+	enable_irq();
+}
+
 void cmd_RunHardwareExperiment(void)
 {
 	streamEnable = false;
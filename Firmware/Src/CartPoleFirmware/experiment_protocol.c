@@ -5,37 +5,27 @@
 #include <stdbool.h>
 #include "parameters.h"
 #include "hardware_bridge.h"
+#include "experiment_protocol.h"
+#include "experiment_protocol_table.h"
 
-#define TARGET_POSITION_0            0.0
-#define TARGET_POSITION_SWING_UP     0.0
-#define TARGET_POSITION_1            0.09
-#define TARGET_POSITION_2            -0.09
-
-#define TIME_FOR_SWINGUP             10.00
-#define TIME_FOR_TARGET_1            13.00
-#define TIME_OF_EXPERIMENT           16.00
+// Table-driven engine of the declarative protocol in experiment_protocol_table.h
+// Same semantics as declarative_experiment of the driver (Driver/DriverFunctions/ExperimentProtocols)
 
 #define UPDATE_INTERVAL              1
 
 int current_experiment_phase = -1;
-float time_start_stable_down;
+int experiment_iteration;
+float time_phase_entered;
+float time_timer_started;
 
 bool ControlOnChip_Enabled_var_original;
 bool USE_TARGET_SWITCHES_var_original;
 
-// Enum for experiment phases
-typedef enum {
-    EXP_RESET,
-    SWINGUP,
-    GO_TO_TARGET_1,
-    GO_TO_TARGET_2
-} ExperimentPhase;
-
-void action_reset(float position, float angle, float time, float* target_position, float* target_equilibrium);
-void action_swing_up(float time, float* target_position);
-void action_go_to_target_1(float time, float* target_position);
-void action_go_to_target_2(
-		float time, float* target_position,
+static void enter_phase(int phase, float time, float* target_position, float* target_equilibrium,
+		int* save_to_offline_buffers);
+static bool transition_taken(const ProtocolTransition* transition, const float* values);
+static void finish_experiment(
+		float* target_position,
 		int* run_hardware_experiment, int* save_to_offline_buffers,
 		bool* ControlOnChip_Enabled_var, int* motor_command, bool* USE_TARGET_SWITCHES_var);
 
@@ -53,71 +43,94 @@ void HardwareExperimentProtocol(
             *ControlOnChip_Enabled_var = true;
             *USE_TARGET_SWITCHES_var = false;
 
-            current_experiment_phase = EXP_RESET;
+            experiment_iteration = 0;
+            time_timer_started = time;
+            enter_phase(0, time, target_position, target_equilibrium, save_to_offline_buffers);
         }
-        switch(current_experiment_phase) {
-            case EXP_RESET:
-                action_reset(position, angle, time, target_position, target_equilibrium);
-                break;
-            case SWINGUP:
-            	*save_to_offline_buffers = 1;
-                action_swing_up(time, target_position);
-                break;
-            case GO_TO_TARGET_1:
-                action_go_to_target_1(time, target_position);
-                break;
-            case GO_TO_TARGET_2:
-                action_go_to_target_2(
-                		time, target_position,
+
+        // Order of ProtocolVariable
+        float values[PROTOCOL_VARIABLES_COUNT] = {
+            position,
+            angle,
+            position - *target_position,
+            time - time_phase_entered,
+            time - time_timer_started,
+        };
+
+        const ProtocolPhase* phase = &PROTOCOL_PHASES[current_experiment_phase];
+        for (int i = phase->first_transition; i < phase->first_transition + phase->transitions; i++) {
+            const ProtocolTransition* transition = &PROTOCOL_TRANSITIONS[i];
+            if (!transition_taken(transition, values)) {
+                continue;
+            }
+            if (transition->next_phase != PROTOCOL_END_OF_ITERATION) {
+                enter_phase(transition->next_phase, time, target_position, target_equilibrium, save_to_offline_buffers);
+            } else if (++experiment_iteration < PROTOCOL_ITERATIONS) {
+                *save_to_offline_buffers = 0;
+                enter_phase(0, time, target_position, target_equilibrium, save_to_offline_buffers);
+            } else {
+                finish_experiment(
+                		target_position,
                 		run_hardware_experiment, save_to_offline_buffers,
 						ControlOnChip_Enabled_var, motor_command, USE_TARGET_SWITCHES_var);
-                break;
-            default:
-                printf("Unknown experiment phase: %d\n", current_experiment_phase);
-                exit(1);
+            }
+            break;
         }
     }
 }
 
 
-void action_reset(float position, float angle, float time, float* target_position, float* target_equilibrium) {
-    *target_position = TARGET_POSITION_0;
-    *target_equilibrium = -1.0;
-    if (fabs(position - *target_position) < 0.01 && fabs(angle) > M_PI - 0.1) {
-        *target_position = TARGET_POSITION_SWING_UP;
-        *target_equilibrium = 1.0;
-        time_start_stable_down = time;
-        current_experiment_phase = SWINGUP;
+static void enter_phase(int phase, float time, float* target_position, float* target_equilibrium,
+		int* save_to_offline_buffers) {
+    const ProtocolPhase* p = &PROTOCOL_PHASES[phase];
+    if (p->outputs & PROTOCOL_OUTPUT_TARGET_POSITION) {
+        *target_position = p->target_position;
     }
-}
-
-void action_swing_up(float time, float* target_position) {
-    if (time - time_start_stable_down >= TIME_FOR_SWINGUP) {
-        *target_position = TARGET_POSITION_1;
-        current_experiment_phase = GO_TO_TARGET_1;
+    if (p->outputs & PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM) {
+        *target_equilibrium = p->target_equilibrium;
     }
+    if (p->record) {
+        *save_to_offline_buffers = 1;
+    }
+    if (p->start_timer) {
+        time_timer_started = time;
+    }
+    time_phase_entered = time;
+    current_experiment_phase = phase;
 }
 
-void action_go_to_target_1(float time, float* target_position) {
-    if (time - time_start_stable_down > TIME_FOR_TARGET_1) {
-        *target_position = TARGET_POSITION_2;
-        current_experiment_phase = GO_TO_TARGET_2;
+static bool transition_taken(const ProtocolTransition* transition, const float* values) {
+    for (int i = transition->first_condition; i < transition->first_condition + transition->conditions; i++) {
+        const ProtocolCondition* condition = &PROTOCOL_CONDITIONS[i];
+        float value = values[condition->variable];
+        bool holds;
+        switch (condition->comparison) {
+            case PROTOCOL_LESS:        holds = value < condition->threshold; break;
+            case PROTOCOL_GREATER:     holds = value > condition->threshold; break;
+            case PROTOCOL_ABS_LESS:    holds = fabsf(value) < condition->threshold; break;
+            case PROTOCOL_ABS_GREATER: holds = fabsf(value) > condition->threshold; break;
+            default:
+                printf("Unknown protocol comparison: %d\n", condition->comparison);
+                exit(1);
+        }
+        if (!holds) {
+            return false;
+        }
     }
+    return true;
 }
 
-void action_go_to_target_2(
-		float time, float* target_position,
+static void finish_experiment(
+		float* target_position,
 		int* run_hardware_experiment, int* save_to_offline_buffers,
 		bool* ControlOnChip_Enabled_var, int* motor_command, bool* USE_TARGET_SWITCHES_var) {
-    if (time - time_start_stable_down > TIME_OF_EXPERIMENT) {
-        current_experiment_phase = -1;
-        *target_position = 0.0;
-        *save_to_offline_buffers = 0;
-        *ControlOnChip_Enabled_var = ControlOnChip_Enabled_var_original;
-        *motor_command = 0;
-        Motor_Stop();
-        *USE_TARGET_SWITCHES_var = USE_TARGET_SWITCHES_var_original;
-        SetControlUpdatePeriod(CONTROL_LOOP_PERIOD_MS);
-        *run_hardware_experiment = 2;
-    }
+    current_experiment_phase = -1;
+    *target_position = 0.0;
+    *save_to_offline_buffers = 0;
+    *ControlOnChip_Enabled_var = ControlOnChip_Enabled_var_original;
+    *motor_command = 0;
+    Motor_Stop();
+    *USE_TARGET_SWITCHES_var = USE_TARGET_SWITCHES_var_original;
+    SetControlUpdatePeriod(CONTROL_LOOP_PERIOD_MS);
+    *run_hardware_experiment = 2;
 }
@@ -1,6 +1,53 @@
 #ifndef __EXPERIMENT_PROTOCOL_H_
 #define __EXPERIMENT_PROTOCOL_H_
 
+#include <stdbool.h>
+
+// Tables of a declarative protocol, generated into experiment_protocol_table.h by Driver/generate_firmware_protocol.py
+// Order of PROTOCOL_VARIABLES and PROTOCOL_COMPARISONS in Driver/DriverFunctions/ExperimentProtocols/protocol_spec.py
+typedef enum {
+    PROTOCOL_POSITION,
+    PROTOCOL_ANGLE,
+    PROTOCOL_POSITION_ERROR,    // position - target position
+    PROTOCOL_PHASE_TIME,        // since the phase was entered
+    PROTOCOL_TIMER,             // since the last phase with start_timer was entered
+    PROTOCOL_VARIABLES_COUNT
+} ProtocolVariable;
+
+typedef enum {
+    PROTOCOL_LESS,
+    PROTOCOL_GREATER,
+    PROTOCOL_ABS_LESS,
+    PROTOCOL_ABS_GREATER
+} ProtocolComparison;
+
+#define PROTOCOL_END_OF_ITERATION           -1
+
+#define PROTOCOL_OUTPUT_TARGET_POSITION     0x01
+#define PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM  0x02
+
+typedef struct {
+    ProtocolVariable variable;
+    ProtocolComparison comparison;
+    float threshold;
+} ProtocolCondition;
+
+typedef struct {
+    int next_phase;             // or PROTOCOL_END_OF_ITERATION
+    int first_condition;        // index into PROTOCOL_CONDITIONS, all have to hold
+    int conditions;
+} ProtocolTransition;
+
+typedef struct {
+    float target_position;
+    float target_equilibrium;
+    unsigned char outputs;      // PROTOCOL_OUTPUT_... set on entering the phase
+    bool start_timer;
+    bool record;                // save to offline buffers from entering the phase till the end of the iteration
+    int first_transition;       // index into PROTOCOL_TRANSITIONS, checked in order
+    int transitions;
+} ProtocolPhase;
+
 void HardwareExperimentProtocol(
 		float position, float angle, float time,
 		float* target_position, float* target_equilibrium,
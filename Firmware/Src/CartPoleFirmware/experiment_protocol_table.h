@@ -0,0 +1,32 @@
+// Generated by Driver/generate_firmware_protocol.py from the protocol 'iros24-ex1' - do not edit
+#ifndef __EXPERIMENT_PROTOCOL_TABLE_H_
+#define __EXPERIMENT_PROTOCOL_TABLE_H_
+
+#include "experiment_protocol.h"
+
+#define PROTOCOL_ITERATIONS          1
+#define PROTOCOL_PHASES_COUNT        4
+
+static const ProtocolCondition PROTOCOL_CONDITIONS[] = {
+    {PROTOCOL_POSITION_ERROR, PROTOCOL_ABS_LESS, 0.01f},  // reset -> swingup
+    {PROTOCOL_ANGLE, PROTOCOL_ABS_GREATER, 3.041592653589793f},  // reset -> swingup
+    {PROTOCOL_TIMER, PROTOCOL_GREATER, 10.0f},  // swingup -> go-to-target_1
+    {PROTOCOL_TIMER, PROTOCOL_GREATER, 13.0f},  // go-to-target_1 -> go-to-target_2
+    {PROTOCOL_TIMER, PROTOCOL_GREATER, 16.0f},  // go-to-target_2 -> end-of-iteration
+};
+
+static const ProtocolTransition PROTOCOL_TRANSITIONS[] = {
+    {1, 0, 2},  // reset -> swingup
+    {2, 2, 1},  // swingup -> go-to-target_1
+    {3, 3, 1},  // go-to-target_1 -> go-to-target_2
+    {PROTOCOL_END_OF_ITERATION, 4, 1},  // go-to-target_2 -> end-of-iteration
+};
+
+static const ProtocolPhase PROTOCOL_PHASES[PROTOCOL_PHASES_COUNT] = {
+    {0.0f, -1.0f, PROTOCOL_OUTPUT_TARGET_POSITION | PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM, false, false, 0, 1},  // reset
+    {0.0f, 1.0f, PROTOCOL_OUTPUT_TARGET_POSITION | PROTOCOL_OUTPUT_TARGET_EQUILIBRIUM, true, true, 1, 1},  // swingup
+    {0.09f, 0.0f, PROTOCOL_OUTPUT_TARGET_POSITION, false, false, 2, 1},  // go-to-target_1
+    {-0.09f, 0.0f, PROTOCOL_OUTPUT_TARGET_POSITION, false, false, 3, 1},  // go-to-target_2
+};
+
+#endif /*__EXPERIMENT_PROTOCOL_TABLE_H_*/